@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+addr.py — Address translation for Scorched Earth v1.50 (SCORCH.EXE).
+
+One home for the EXE layout constants, the code-module table and the
+conversions between the four address spaces the tools use:
+
+    file     offset into SCORCH.EXE               e.g. 0x20EA0
+    SEG:OFF  load-relative segment:offset          e.g. 1A4A:0000
+    DS       offset into the data segment          e.g. DS:0x1234 (file 0x56FB4)
+    phys     physical address inside the emulator  e.g. 0x1ADA0 (emu/loader.py layout)
+
+Module lookups are bisect-based. The *_many() forms take a sequence (or a
+numpy array, if numpy is installed) of addresses and translate each unique
+value once, so annotating millions of trace IPs costs one lookup per
+distinct address.
+
+Library:
+    import addr
+    addr.file_to_segoff(0x20EAE)        # -> (0x1A4A, 0x000E)
+    addr.module_at(0x20EAE)             # -> (0x20EA0, 0x263F0, 0x1A4A, 'extras.cpp')
+    addr.phys_to_file(0x1ADAE)          # -> 0x20EAE
+    addr.phys_to_file_many(ip_array)    # -> list / ndarray of file offsets
+"""
+
+import bisect
+import os
+import sys
+
+
+_numpy = False     # load_numpy() result; False until it has been tried
+
+
+def load_numpy():
+    """numpy, or None if it is not installed; imported on the first call.
+
+    The tools run with disasm/ on sys.path, where dis.py shadows the stdlib
+    dis that numpy's `import inspect` needs, so numpy is imported with
+    disasm/ (and an already imported disasm/dis.py) out of the way.
+    """
+    global _numpy
+    if _numpy is not False:
+        return _numpy
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = sys.path[:]
+    had_dis = 'dis' in sys.modules
+    dis = sys.modules.get('dis')
+    if dis is not None and os.path.dirname(os.path.abspath(getattr(dis, '__file__', '') or '.')) == here:
+        del sys.modules['dis']
+    sys.path[:] = [p for p in path if os.path.abspath(p or '.') != here]
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    finally:
+        sys.path[:] = path
+        if had_dis:
+            sys.modules['dis'] = dis
+        else:
+            sys.modules.pop('dis', None)
+    _numpy = numpy
+    return numpy
+
+# ---------------------------------------------------------------------------
+# EXE layout constants
+# ---------------------------------------------------------------------------
+
+MZ_HEADER    = 0x6A00          # header size in bytes; code starts at file 0x6A00
+DS_FILE_BASE = 0x055D80        # file offset of DS:0000
+DS_SEG       = 0x4F38          # DS paragraph number
+LOAD_SEG     = DS_SEG - (DS_FILE_BASE - MZ_HEADER) // 16   # == 0: SEG values are load-relative
+
+# Emulator layout (emu/loader.py): PSP at paragraph 0x80, image 0x10 paragraphs
+# (256 bytes) later. Physical address of the first image byte (file MZ_HEADER).
+EMU_IMAGE_SEG  = 0x0090
+EMU_IMAGE_BASE = EMU_IMAGE_SEG << 4
+
+# Known code-segment to module name mapping (from CLAUDE.md)
+MODULES = [
+    # (file_start, file_end, code_seg_paragraph, name)
+    (0x20EA0, 0x263F0, 0x1A4A, 'extras.cpp'),
+    (0x263F0, 0x2F830, 0x1F7F, 'icons.cpp'),
+    (0x2F830, 0x31FB0, 0x28B9, 'play.cpp'),
+    (0x31FB0, 0x33690, 0x2B3B, 'player.cpp'),
+    (0x33690, 0x38070, 0x2CBF, 'ranges.cpp'),
+    (0x38070, 0x38780, 0x3167, 'shark.cpp'),
+    (0x38780, 0x3B8D0, 0x31D8, 'shields.cpp'),
+    (0x3B8D0, 0x4C290, 0x34ED, 'menu+dialogs'),
+    (0x4C290, 0x4D000, 0x4589, 'font module'),
+]
+_MODULE_STARTS = [m[0] for m in MODULES]
+
+# ---------------------------------------------------------------------------
+# Scalar conversions
+# ---------------------------------------------------------------------------
+
+def module_index(file_off):
+    """Index into MODULES of the module containing file_off, or -1."""
+    i = bisect.bisect_right(_MODULE_STARTS, file_off) - 1
+    if i >= 0 and file_off < MODULES[i][1]:
+        return i
+    return -1
+
+
+def module_at(file_off):
+    """Return (file_start, file_end, seg, name) for file_off, or None."""
+    i = module_index(file_off)
+    return MODULES[i] if i >= 0 else None
+
+
+def module_name(file_off, default='?'):
+    i = module_index(file_off)
+    return MODULES[i][3] if i >= 0 else default
+
+
+def file_to_segoff(file_off):
+    """Return (seg, off) for a file offset, using known module code segments."""
+    i = module_index(file_off)
+    if i >= 0:
+        return MODULES[i][2], (file_off - MZ_HEADER) - MODULES[i][2] * 16
+    # Fallback: compute raw paragraph:offset
+    code_off = file_off - MZ_HEADER
+    if code_off >= 0:
+        return code_off >> 4, code_off & 0xF
+    return 0, file_off
+
+
+def segoff_to_file(seg, off):
+    return (seg - LOAD_SEG) * 16 + off + MZ_HEADER
+
+
+def ds_to_file(ds_off):
+    return DS_FILE_BASE + ds_off
+
+
+def file_to_ds(file_off):
+    """DS offset for file_off, or None if it lies outside the 64K data segment."""
+    v = file_off - DS_FILE_BASE
+    return v if 0 <= v < 0x10000 else None
+
+
+def file_to_phys(file_off, image_base=EMU_IMAGE_BASE, header_size=MZ_HEADER):
+    """Emulator physical address of a file offset (pass load_exe() info to override)."""
+    return file_off - header_size + image_base
+
+
+def phys_to_file(phys, image_base=EMU_IMAGE_BASE, header_size=MZ_HEADER):
+    return phys - image_base + header_size
+
+
+def emu_segoff_to_file(cs, ip, image_base=EMU_IMAGE_BASE, header_size=MZ_HEADER):
+    """File offset for an emulator CS:IP pair."""
+    return ((cs << 4) + ip) - image_base + header_size
+
+
+def segoff_str(file_off):
+    seg, off = file_to_segoff(file_off)
+    return f'{seg:04X}:{off:04X}'
+
+
+# ---------------------------------------------------------------------------
+# Vectorized conversions
+# ---------------------------------------------------------------------------
+
+def _array_numpy(values):
+    """numpy if values is an ndarray, else None. A caller holding an ndarray
+    has already imported numpy, so this never imports it."""
+    np = sys.modules.get('numpy')
+    return np if np is not None and isinstance(values, np.ndarray) else None
+
+
+def _map_unique(fn, values):
+    """Apply fn once per distinct value; returns a list in input order."""
+    memo = {}
+    out = []
+    append = out.append
+    for v in values:
+        r = memo.get(v)
+        if r is None:
+            r = memo[v] = fn(v)
+        append(r)
+    return out
+
+
+def module_index_many(file_offs):
+    """module_index() for every element; ndarray in → ndarray out."""
+    np = _array_numpy(file_offs)
+    if np is not None:
+        starts = np.asarray(_MODULE_STARTS)
+        ends = np.asarray([m[1] for m in MODULES])
+        idx = np.searchsorted(starts, file_offs, side='right') - 1
+        valid = (idx >= 0) & (file_offs < ends[np.clip(idx, 0, None)])
+        return np.where(valid, idx, -1)
+    return _map_unique(module_index, file_offs)
+
+
+def file_to_segoff_many(file_offs):
+    """file_to_segoff() for every element; returns a list of (seg, off)."""
+    if _array_numpy(file_offs) is not None:
+        file_offs = file_offs.tolist()
+    return _map_unique(file_to_segoff, file_offs)
+
+
+def phys_to_file_many(phys, image_base=EMU_IMAGE_BASE, header_size=MZ_HEADER):
+    """phys_to_file() for every element; ndarray in → ndarray out."""
+    delta = header_size - image_base
+    np = _array_numpy(phys)
+    if np is not None:
+        return phys.astype(np.int64) + delta
+    return [p + delta for p in phys]
+
+
+def file_to_phys_many(file_offs, image_base=EMU_IMAGE_BASE, header_size=MZ_HEADER):
+    delta = image_base - header_size
+    np = _array_numpy(file_offs)
+    if np is not None:
+        return file_offs.astype(np.int64) + delta
+    return [f + delta for f in file_offs]
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+artifacts.py — Content-addressed cache of derived EXE data for the disasm tools.
+
+Artifacts are keyed by the SHA-256 of the EXE bytes plus a per-artifact
+version, and stored under ~/.cache/scorch-disasm/artifacts/<sha256>/:
+
+    relocs-v1.u32         sorted file offsets of MZ relocation targets (array('I'))
+    insn_starts-v1.bits   instruction-start bitset from a linear decode sweep of
+                          the code image (bit n set = an instruction starts at file n)
+    strings-v1.pickle     strings_dump.py string index
+    font-v1.pickle        font_verify.py glyph atlas
+
+Binary artifacts are memory-mapped on load, so a tool pays for mapping the
+file rather than rebuilding the data. Pickled artifacts cover the
+structured ones. Bump an artifact's version when its builder changes;
+old versions are simply never read again.
+
+Usage:
+    python3 disasm/artifacts.py <exe> [--build]   # list (and build) artifacts
+    python3 disasm/artifacts.py --clear            # delete the whole store
+
+Library:
+    import artifacts
+    artifacts.relocs(data)                # -> sorted memoryview of u32 file offsets
+    artifacts.insn_starts(data)           # -> Bitset; 0x20EA0 in starts
+    artifacts.load_pickle(data, 'name', 1, build_fn)
+"""
+
+import os
+import sys
+import mmap
+import pickle
+import struct
+import hashlib
+from array import array
+
+from addr import MZ_HEADER, DS_FILE_BASE
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'scorch-disasm', 'artifacts')
+
+RELOCS_VERSION = 1
+INSN_STARTS_VERSION = 1
+
+_digest = (None, None)     # (data, sha256 hex) for the last EXE seen
+_loaded = {}               # (sha256, file name) -> artifact, for the daemon
+
+
+def exe_digest(data):
+    """SHA-256 hex digest of the EXE bytes (memoized for the current bytes object)."""
+    global _digest
+    if _digest[0] is not data:
+        _digest = (data, hashlib.sha256(data).hexdigest())
+    return _digest[1]
+
+
+def artifact_path(data, name, version, ext):
+    return os.path.join(CACHE_DIR, exe_digest(data), f'{name}-v{version}.{ext}')
+
+
+def _write_atomic(path, payload):
+    """Write bytes to path via a temp file; cache failures are not errors."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + f'.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except OSError:
+        pass   # cache is an optimization only
+
+
+def _map(path):
+    """Read-only mmap of path, or None if it is missing or empty."""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+
+
+def _memo(data, key, load):
+    memo_key = (exe_digest(data), key)
+    hit = _loaded.get(memo_key)
+    if hit is None:
+        hit = _loaded[memo_key] = load()
+    return hit
+
+
+# ---------------------------------------------------------------------------
+# Generic loaders
+# ---------------------------------------------------------------------------
+
+def load_array(data, name, version, build, typecode='I'):
+    """
+    A flat numeric array artifact: memoryview over the mapped file, cast to
+    typecode. build(data) returns an array.array (or any iterable of ints)
+    and runs only when the artifact is missing.
+    """
+    bits = array(typecode).itemsize * 8
+    path = artifact_path(data, name, version, ('u' if typecode.isupper() else 'i') + str(bits))
+
+    def load():
+        mm = _map(path)
+        if mm is not None:
+            return memoryview(mm).cast(typecode)
+        arr = build(data)
+        if not isinstance(arr, array):
+            arr = array(typecode, arr)
+        _write_atomic(path, arr.tobytes())
+        return memoryview(arr.tobytes()).cast(typecode)
+
+    return _memo(data, path, load)
+
+
+class Bitset:
+    """Read-only bitset over a bytes-like buffer: n in bs tests bit n."""
+
+    __slots__ = ('buf', 'nbits')
+
+    def __init__(self, buf, nbits):
+        self.buf = buf
+        self.nbits = nbits
+
+    def __contains__(self, n):
+        return 0 <= n < self.nbits and (self.buf[n >> 3] >> (n & 7)) & 1
+
+    def iter_set(self, start=0, end=None):
+        """Yield the set bit positions in [start, end)."""
+        end = self.nbits if end is None else min(end, self.nbits)
+        buf = self.buf
+        n = max(start, 0)
+        while n < end:
+            byte = buf[n >> 3]
+            if byte == 0:
+                n = (n | 7) + 1
+                continue
+            if (byte >> (n & 7)) & 1:
+                yield n
+            n += 1
+
+
+def load_bitset(data, name, version, build):
+    """
+    A bitset artifact (bit n = byte 0 of the file's bit n >> 3). build(data)
+    returns (bytearray, nbits); the stored file is a u32 nbits header + bits.
+    """
+    path = artifact_path(data, name, version, 'bits')
+
+    def load():
+        mm = _map(path)
+        if mm is not None:
+            nbits = struct.unpack_from('<I', mm, 0)[0]
+            return Bitset(memoryview(mm)[4:], nbits)
+        bits, nbits = build(data)
+        _write_atomic(path, struct.pack('<I', nbits) + bytes(bits))
+        return Bitset(bytes(bits), nbits)
+
+    return _memo(data, path, load)
+
+
+def load_pickle(data, name, version, build):
+    """A pickled artifact; build(data) must return plain picklable data."""
+    path = artifact_path(data, name, version, 'pickle')
+
+    def load():
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, ValueError, TypeError, AttributeError):
+            pass
+        value = build(data)
+        _write_atomic(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    return _memo(data, path, load)
+
+
+# ---------------------------------------------------------------------------
+# Shared artifacts
+# ---------------------------------------------------------------------------
+
+def build_relocs(data):
+    """Sorted file offsets of the segment words patched by MZ relocations."""
+    assert data[:2] == b'MZ', "Not an MZ executable"
+    num_relocs = struct.unpack_from('<H', data, 0x06)[0]
+    reloc_table_off = struct.unpack_from('<H', data, 0x18)[0]
+    entries = struct.iter_unpack('<HH', data[reloc_table_off:reloc_table_off + num_relocs * 4])
+    return array('I', sorted({seg * 16 + off + MZ_HEADER for off, seg in entries}))
+
+
+def relocs(data):
+    """Sorted u32 file offsets of MZ relocation targets (mapped artifact)."""
+    return load_array(data, 'relocs', RELOCS_VERSION, build_relocs)
+
+
+def build_insn_starts(data):
+    """Linear-sweep decode of the code image (MZ_HEADER..DS) into a start bitset."""
+    from instruction_set_x86 import decode
+    end = min(len(data), DS_FILE_BASE)
+    bits = bytearray((end + 7) >> 3)
+    pos = MZ_HEADER
+    while pos < end:
+        bits[pos >> 3] |= 1 << (pos & 7)
+        pos += decode(data, pos, None)[0]
+    return bits, end
+
+
+def insn_starts(data):
+    """Bitset of instruction starts from a linear sweep (mapped artifact)."""
+    return load_bitset(data, 'insn_starts', INSN_STARTS_VERSION, build_insn_starts)
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(0)
+    if args[0] == '--clear':
+        import shutil
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        print(f'cleared {CACHE_DIR}')
+        return
+
+    with open(args[0], 'rb') as f:
+        data = f.read()
+    if '--build' in args:
+        print(f'relocs       : {len(relocs(data))}')
+        print(f'insn_starts  : {sum(1 for _ in insn_starts(data).iter_set())}')
+    root = os.path.join(CACHE_DIR, exe_digest(data))
+    print(f'{root}')
+    names = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    for name in names:
+        print(f'  {name:24s} {os.path.getsize(os.path.join(root, name)):9d} bytes')
+    if not names:
+        print('  (empty; run with --build)')
+
+
+if __name__ == '__main__':
+    main()
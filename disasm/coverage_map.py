@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Coverage report for emulator runs (files written with --coverage).
+
+Usage:
+  python3 disasm/coverage_map.py COV [COV ...] [options]
+
+Several files are merged (OR) before reporting.
+
+Options:
+  --exe PATH           — EXE for decoding (default earth/SCORCH.EXE)
+  --merge OUT          — write the merged coverage to OUT
+  --uncovered [MODULE] — list labelled functions never executed (all modules,
+                         or those whose module name contains MODULE)
+  --entries            — list executed call targets that have no label
+                         (runs recorded with --calls)
+  --regions OUT        — write known-code ranges as 'START END' file offsets
+                         (hex, end exclusive), one per line
+
+The per-module table shows labelled functions with at least one executed
+instruction, and executed instruction starts against the starts found by a
+linear-sweep decode (artifacts.insn_starts) and in bytes.
+
+Examples:
+  python3 -m emu earth/SCORCH.EXE --max-steps 20000000 --calls --coverage /tmp/menu.cov
+  python3 disasm/coverage_map.py /tmp/menu.cov /tmp/round.cov --merge /tmp/all.cov
+  python3 disasm/coverage_map.py /tmp/all.cov --uncovered play.cpp
+  python3 disasm/coverage_map.py /tmp/all.cov --regions /tmp/known_code.txt
+
+Library:
+  import coverage_map
+  cov = coverage_map.load_merged(['/tmp/a.cov', '/tmp/b.cov'])
+  coverage_map.known_code(cov, data)     # -> [(start, end)] file offsets
+"""
+import sys, os, bisect, argparse
+
+import daemon
+if __name__ == '__main__':
+    daemon.forward('coverage_map', sys.argv[1:])   # runs in the resident daemon if one is up
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import addr
+import artifacts
+import dis
+import kb
+from disasm.emu.coverage import Coverage
+
+
+def load_merged(paths):
+    cov = Coverage.load(paths[0])
+    for path in paths[1:]:
+        cov.merge(Coverage.load(path))
+    return cov
+
+
+def executed_offsets(cov, data):
+    """Executed instruction starts as sorted EXE file offsets (inside the image)."""
+    lo, hi = cov.phys(cov.header_size), cov.phys(len(data))
+    return [cov.file_offset(p) for p in cov.addresses(max(lo, 0), min(hi, len(cov.map)))]
+
+
+def known_code(cov, data, labels=None, offsets=None):
+    """[(start, end)] file-offset ranges covered by executed instructions,
+    adjacent instructions merged; end is exclusive."""
+    labels = kb.load().labels if labels is None else labels
+    ranges = []
+    for off in executed_offsets(cov, data) if offsets is None else offsets:
+        try:
+            length = dis.cached_decode(data, off, labels)[0]
+        except Exception:
+            length = 1
+        end = off + max(length, 1)
+        if ranges and off <= ranges[-1][1]:
+            if end > ranges[-1][1]:
+                ranges[-1][1] = end
+        else:
+            ranges.append([off, end])
+    return [tuple(r) for r in ranges]
+
+
+def functions_in(k, start, end):
+    """[(func_start, next_label)] labelled functions starting in [start, end)."""
+    offs = k.func_offsets
+    i = bisect.bisect_left(offs, start)
+    j = bisect.bisect_left(offs, end)
+    return [(offs[n], offs[n + 1] if n + 1 < len(offs) else end) for n in range(i, j)]
+
+
+def has_any(sorted_offs, start, end):
+    i = bisect.bisect_left(sorted_offs, start)
+    return i < len(sorted_offs) and sorted_offs[i] < end
+
+
+def report(cov, data, k, uncovered=None):
+    offsets = executed_offsets(cov, data)
+    starts = artifacts.insn_starts(data)
+    regions = known_code(cov, data, k.labels, offsets)
+    print(f'{len(offsets)} executed instruction addresses, {len(cov.entries)} call targets')
+    print(f'\n{"module":14s} {"functions":>20s} {"insns":>20s} {"bytes":>20s}')
+    for start, end, _seg, name in addr.MODULES:
+        funcs = [f for f in functions_in(k, start, end) if f[0] not in k.dtypes]
+        hit = sum(1 for a, b in funcs if has_any(offsets, a, min(b, end)))
+        lo, hi = bisect.bisect_left(offsets, start), bisect.bisect_left(offsets, end)
+        n_static = sum(1 for _ in starts.iter_set(start, end))
+        n_bytes = sum(min(b, end) - max(a, start) for a, b in regions if a < end and b > start)
+
+        def pct(n, d):
+            return f'{n:6d}/{d:<6d} {100.0 * n / d:5.1f}%' if d else f'{n:6d}/0'
+        print(f'{name:14s} {pct(hit, len(funcs)):>20s} {pct(hi - lo, n_static):>20s} '
+              f'{pct(n_bytes, end - start):>20s}')
+        if uncovered is not None and uncovered.lower() in name.lower():
+            missed = [(a, b) for a, b in funcs if not has_any(offsets, a, min(b, end))]
+            for a, _ in missed:
+                print(f'    uncovered  0x{a:05X}  {k.labels[a]}')
+    other = len(offsets) - sum(bisect.bisect_left(offsets, m[1]) - bisect.bisect_left(offsets, m[0])
+                               for m in addr.MODULES)
+    if other:
+        print(f'{"(other)":14s} {"":>20s} {other:6d} outside the modules')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coverage report for emulator runs')
+    parser.add_argument('files', nargs='+', help='Coverage files written with --coverage')
+    parser.add_argument('--exe', default='earth/SCORCH.EXE', help='EXE for decoding')
+    parser.add_argument('--merge', metavar='OUT', help='Write the merged coverage to OUT')
+    parser.add_argument('--uncovered', nargs='?', const='', metavar='MODULE',
+                        help='List uncovered labelled functions')
+    parser.add_argument('--entries', action='store_true', help='List unlabelled call targets')
+    parser.add_argument('--regions', metavar='OUT', help='Write known-code ranges to OUT')
+    args = parser.parse_args()
+
+    cov = load_merged(args.files)
+    if args.merge:
+        cov.save(args.merge)
+        print(f'merged {len(args.files)} files -> {args.merge}')
+    data = daemon.read_exe(args.exe)
+    k = kb.load()
+    report(cov, data, k, args.uncovered)
+
+    if args.entries:
+        print('\nUnlabelled call targets:')
+        for phys in sorted(cov.entries):
+            off = cov.file_offset(phys)
+            if off in k.labels:
+                continue
+            sym = k.symbolize(off) if 0 <= off < len(data) else None
+            where = f'0x{off:05X}  {addr.module_name(off)}' if 0 <= off < len(data) else 'outside image'
+            print(f'  phys 0x{phys:05X}  {where}  {sym or ""}'.rstrip())
+    if args.regions:
+        regions = known_code(cov, data, k.labels)
+        with open(args.regions, 'w') as f:
+            for a, b in regions:
+                f.write(f'0x{a:05X} 0x{b:05X}\n')
+        print(f'\n{len(regions)} known-code ranges -> {args.regions}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+daemon.py — Persistent server for the disasm CLIs (used by re_loop.sh).
+
+A one-shot `python3 disasm/dis.py ...` pays interpreter startup, re-reads
+the 400 KB EXE and re-parses labels.csv/comments.csv on every call. The
+daemon keeps all of that resident: imported tool modules, EXE bytes
+(read_exe), the knowledge base (kb.load), the decoded-instruction cache in
+dis.py and the call-target index in xref.py.
+
+The CLIs stay the interface. Each tool's `__main__` block first calls
+forward(); if a daemon is listening, the request runs there and its
+stdout/stderr/exit code are replayed locally. Otherwise the tool runs
+in-process exactly as before.
+
+Usage:
+    python3 disasm/daemon.py start      # start in the background
+    python3 disasm/daemon.py stop
+    python3 disasm/daemon.py status
+    python3 disasm/daemon.py serve      # run in the foreground
+
+Protocol: one JSON request line per connection on a Unix socket,
+    {"tool": "dis", "argv": ["0x20EA0", "20"], "cwd": "/path"}
+answered by one JSON line
+    {"stdout": "...", "stderr": "...", "exit": 0}
+Control requests: {"cmd": "ping"} and {"cmd": "shutdown"}.
+
+Environment:
+    SCORCH_DISASM_SOCK       socket path (default ~/.cache/scorch-disasm/daemon-<hash>.sock)
+    SCORCH_DISASM_NO_DAEMON  set to 1 to never forward (always run in-process)
+
+Tool modules are re-imported when their source file changes; restart the
+daemon after editing shared modules (dis.py, addr.py, kb.py, emu/).
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import hashlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR  = os.path.join(os.path.expanduser('~'), '.cache', 'scorch-disasm')
+LOG_PATH   = os.path.join(CACHE_DIR, 'daemon.log')
+
+# Tools that may be run through the daemon (module names in disasm/)
+TOOLS = {'dis', 'xref', 'decode_tables', 'mem_read', 'search_bytes', 'strings_dump', 'trace_view',
+         'coverage_map'}
+
+_in_daemon = False
+
+
+def socket_path():
+    path = os.environ.get('SCORCH_DISASM_SOCK')
+    if path:
+        return path
+    # One daemon per checkout: tools from another tree must not answer.
+    digest = hashlib.sha1(SCRIPT_DIR.encode()).hexdigest()[:8]
+    return os.path.join(CACHE_DIR, f'daemon-{digest}.sock')
+
+
+# ---------------------------------------------------------------------------
+# Resident EXE cache (used by the tools in both modes)
+# ---------------------------------------------------------------------------
+
+_exe_cache = {}   # abspath -> ((mtime_ns, size), bytes)
+
+
+def read_exe(path):
+    """Return the file's bytes; reused while mtime and size are unchanged."""
+    full = os.path.abspath(path)
+    st = os.stat(full)
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _exe_cache.get(full)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    with open(full, 'rb') as f:
+        data = f.read()
+    _exe_cache[full] = (stamp, data)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Client (kept light: it runs before each tool's own imports)
+# ---------------------------------------------------------------------------
+
+def _request(msg, timeout=None):
+    """Send one request; return the decoded reply, or None if no daemon answers."""
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.settimeout(0.5)
+        s.connect(path)
+        s.settimeout(timeout)
+        s.sendall(json.dumps(msg).encode() + b'\n')
+        s.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except OSError:
+        return None
+    finally:
+        s.close()
+    if not chunks:
+        return None
+    return json.loads(b''.join(chunks))
+
+
+def forward(tool, argv):
+    """
+    Run `tool argv` in the daemon if one is listening: replays its output and
+    exits with its status. Returns False (caller runs in-process) otherwise.
+    """
+    if _in_daemon or os.environ.get('SCORCH_DISASM_NO_DAEMON') == '1':
+        return False
+    reply = _request({'tool': tool, 'argv': list(argv), 'cwd': os.getcwd()})
+    if reply is None:
+        return False
+    try:
+        sys.stdout.write(reply.get('stdout', ''))
+        sys.stdout.flush()
+    except BrokenPipeError:
+        pass
+    sys.stderr.write(reply.get('stderr', ''))
+    sys.exit(reply.get('exit', 0))
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+_modules = {}     # tool -> (source mtime_ns, module)
+
+
+def _tool_module(tool):
+    import importlib
+    mod_entry = _modules.get(tool)
+    if mod_entry is None:
+        mod = importlib.import_module(tool)
+    else:
+        mtime, mod = mod_entry
+        if os.stat(mod.__file__).st_mtime_ns == mtime:
+            return mod
+        mod = importlib.reload(mod)
+    _modules[tool] = (os.stat(mod.__file__).st_mtime_ns, mod)
+    return mod
+
+
+def run_tool(tool, argv, cwd):
+    """Run tool.main() with argv in cwd; return (stdout, stderr, exit_code)."""
+    import io
+    import traceback
+    import contextlib
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    saved_argv, saved_cwd = sys.argv, os.getcwd()
+    try:
+        os.chdir(cwd)
+        mod = _tool_module(tool)
+        sys.argv = [mod.__file__] + list(argv)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                mod.main()
+            except SystemExit as e:
+                if e.code is None:
+                    code = 0
+                elif isinstance(e.code, int):
+                    code = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    code = 1
+    except Exception:
+        err.write(traceback.format_exc())
+        code = 1
+    finally:
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+    return out.getvalue(), err.getvalue(), code
+
+
+def serve():
+    global _in_daemon
+    _in_daemon = True
+    # Tools `import daemon` for read_exe(); make that resolve to this module
+    # (not a second copy) when running as `daemon.py serve`.
+    sys.modules.setdefault('daemon', sys.modules[__name__])
+    path = socket_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if _request({'cmd': 'ping'}) is not None:
+        print(f'daemon already running on {path}')
+        return
+    if os.path.exists(path):
+        os.unlink(path)   # stale socket from a daemon that died
+
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    srv.listen(16)
+    started = time.time()
+    served = 0
+    print(f'daemon listening on {path} (pid {os.getpid()})', flush=True)
+    try:
+        while True:
+            conn, _ = srv.accept()
+            with conn:
+                try:
+                    buf = b''
+                    while not buf.endswith(b'\n'):
+                        chunk = conn.recv(65536)
+                        if not chunk:
+                            break
+                        buf += chunk
+                    msg = json.loads(buf)
+                except (OSError, ValueError):
+                    continue
+                cmd = msg.get('cmd')
+                if cmd == 'shutdown':
+                    conn.sendall(b'{"ok": true}\n')
+                    break
+                if cmd == 'ping':
+                    reply = {'pid': os.getpid(), 'uptime': time.time() - started,
+                             'served': served, 'tools': sorted(_modules)}
+                elif msg.get('tool') in TOOLS:
+                    stdout, stderr, code = run_tool(msg['tool'], msg.get('argv', []),
+                                                    msg.get('cwd', os.getcwd()))
+                    served += 1
+                    reply = {'stdout': stdout, 'stderr': stderr, 'exit': code}
+                else:
+                    reply = {'stdout': '', 'exit': 2,
+                             'stderr': f'daemon: unknown tool {msg.get("tool")!r}\n'}
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b'\n')
+                except OSError:
+                    pass
+    finally:
+        srv.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def start():
+    import subprocess
+    if _request({'cmd': 'ping'}) is not None:
+        print(f'daemon already running on {socket_path()}')
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(LOG_PATH, 'ab') as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve'],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                         start_new_session=True)
+    for _ in range(50):
+        time.sleep(0.1)
+        info = _request({'cmd': 'ping'})
+        if info is not None:
+            print(f'daemon started (pid {info["pid"]}) on {socket_path()}')
+            return
+    print(f'daemon did not start; see {LOG_PATH}')
+    sys.exit(1)
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(0)
+    cmd = args[0]
+    if cmd == 'serve':
+        serve()
+    elif cmd == 'start':
+        start()
+    elif cmd == 'stop':
+        if _request({'cmd': 'shutdown'}, timeout=5) is None:
+            print('daemon not running')
+        else:
+            print('daemon stopped')
+    elif cmd == 'status':
+        info = _request({'cmd': 'ping'}, timeout=5)
+        if info is None:
+            print('daemon not running')
+            sys.exit(1)
+        print(f'daemon pid {info["pid"]}  up {info["uptime"]:.0f}s  '
+              f'served {info["served"]}  loaded: {", ".join(info["tools"]) or "-"}')
+    else:
+        print(f'Unknown command: {cmd}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
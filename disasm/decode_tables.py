@@ -19,7 +19,8 @@ Arguments:
               b8        1 byte shown in binary
               nullstr   null-terminated string at each entry address
               struct:<n>:<f,f,...>
-                        n-byte struct; fields: u8/s8/u16/s16/u32/ptr16/farptr/b8
+                        n-byte struct; fields: u8/s8/u16/s16/u32/ptr16/farptr/b8,
+                        optionally name=type and/or type@OFF (see tables.py)
 
 Options:
     --follow   For ptr16/farptr tables: disassemble 8 lines at each target
@@ -29,62 +30,33 @@ Examples:
     python3 disasm/decode_tables.py DS:0x2158 37 farptr --follow
     python3 disasm/decode_tables.py DS:0x11F6 10 struct:52:ptr16,u16,u16,u16,s16,s16
     python3 disasm/decode_tables.py DS:0x6234 9  struct:16:u16,u16,u16
+    python3 disasm/decode_tables.py DS:0x6234 9  struct:16:w=u16,h=u16,aspect=u16@A
     python3 disasm/decode_tables.py 0x3F445 20 farptr --follow
     python3 disasm/decode_tables.py DS:0xEF22 8 u16
 """
 
 import sys
 import os
-import csv
 import struct
-import subprocess
+
+import daemon
+if __name__ == '__main__':
+    daemon.forward('decode_tables', sys.argv[1:])   # runs in the resident daemon if one is up
+
+import kb
+import tables
+from addr import MZ_HEADER, ds_to_file, file_to_ds
 
 SCRIPT_DIR   = os.path.dirname(os.path.abspath(__file__))
 ROOT         = os.path.dirname(SCRIPT_DIR)
 EXE_PATH     = os.path.join(ROOT, 'earth', 'SCORCH.EXE')
 LABELS_CSV   = os.path.join(SCRIPT_DIR, 'labels.csv')
 
-MZ_HEADER    = 0x6A00
-DS_FILE_BASE = 0x055D80
-DS_SEG       = 0x4F38
-
-MODULES = [
-    (0x20EA0, 0x263F0, 0x1A4A, 'extras.cpp'),
-    (0x263F0, 0x2F830, 0x1F7F, 'icons.cpp'),
-    (0x2F830, 0x31FB0, 0x28B9, 'play.cpp'),
-    (0x31FB0, 0x33690, 0x2B3B, 'player.cpp'),
-    (0x33690, 0x38070, 0x2CBF, 'ranges.cpp'),
-    (0x38070, 0x38780, 0x3167, 'shark.cpp'),
-    (0x38780, 0x3B8D0, 0x31D8, 'shields.cpp'),
-    (0x3B8D0, 0x4C290, 0x34ED, 'menu+dialogs'),
-    (0x4C290, 0x4D000, 0x4589, 'font module'),
-]
-
 
 # ---------------------------------------------------------------------------
-# Address helpers
+# Address helpers (conversions live in addr.py)
 # ---------------------------------------------------------------------------
 
-def ds_to_file(ds_off):
-    return DS_FILE_BASE + ds_off
-
-
-def file_to_ds(file_off):
-    v = file_off - DS_FILE_BASE
-    return v if 0 <= v < 0x10000 else None
-
-
-def file_to_segoff(file_off):
-    for start, end, seg, _name in MODULES:
-        if start <= file_off < end:
-            off = (file_off - MZ_HEADER) - (seg * 16)
-            return seg, off
-    code_off = file_off - MZ_HEADER
-    if code_off >= 0:
-        return code_off >> 4, code_off & 0xF
-    return 0, file_off
-
-
 def parse_addr(s):
     s = s.strip()
     sl = s.lower()
@@ -103,84 +75,87 @@ def parse_addr(s):
 # ---------------------------------------------------------------------------
 
 def load_labels(path):
-    labels = {}
-    if not os.path.exists(path):
-        return labels
-    with open(path, newline='') as f:
-        for row in csv.reader(f):
-            if not row or row[0].strip().startswith('#'):
-                continue
-            if len(row) < 2:
-                continue
-            key = row[0].strip()
-            name = row[1].strip()
-            if not name:
-                continue
-            try:
-                kl = key.lower()
-                if kl.startswith('ds:'):
-                    foff = ds_to_file(int(key[3:], 16))
-                elif ':' in key and not kl.startswith('0x'):
-                    seg_s, off_s = key.split(':', 1)
-                    foff = MZ_HEADER + int(seg_s, 16) * 16 + int(off_s, 16)
-                else:
-                    foff = int(key, 16)
-                labels[foff] = name
-            except ValueError:
-                pass
-    return labels
+    """Return dict file_offset -> name (file, DS: and SEG:OFF keys; see kb.py)."""
+    return kb.load(labels_path=path).labels
 
 
 # ---------------------------------------------------------------------------
 # Formatters — each returns (bytes_consumed, display_string)
 # ---------------------------------------------------------------------------
 
-def fmt_u8(exe, pos, labels):
-    v = exe[pos]
-    return 1, f'0x{v:02X}  ({v:3d})'
+def show_u8(v, labels):
+    return f'0x{v:02X}  ({v:3d})'
 
 
-def fmt_s8(exe, pos, labels):
-    v = exe[pos]
-    sv = v if v < 128 else v - 256
-    return 1, f'0x{v:02X}  ({sv:+4d})'
+def show_s8(v, labels):
+    return f'0x{v & 0xFF:02X}  ({v:+4d})'
 
 
-def fmt_b8(exe, pos, labels):
-    v = exe[pos]
-    return 1, f'{v:08b}  (0x{v:02X})'
+def show_b8(v, labels):
+    return f'{v:08b}  (0x{v:02X})'
 
 
-def fmt_u16(exe, pos, labels):
-    v = struct.unpack_from('<H', exe, pos)[0]
-    return 2, f'0x{v:04X}  ({v:5d})'
+def show_u16(v, labels):
+    return f'0x{v:04X}  ({v:5d})'
 
 
-def fmt_s16(exe, pos, labels):
-    v = struct.unpack_from('<h', exe, pos)[0]
-    return 2, f'0x{v & 0xFFFF:04X}  ({v:+6d})'
+def show_s16(v, labels):
+    return f'0x{v & 0xFFFF:04X}  ({v:+6d})'
 
 
-def fmt_u32(exe, pos, labels):
-    v = struct.unpack_from('<I', exe, pos)[0]
-    return 4, f'0x{v:08X}  ({v:9d})'
+def show_u32(v, labels):
+    return f'0x{v:08X}  ({v:9d})'
 
 
-def fmt_ptr16(exe, pos, labels):
-    v = struct.unpack_from('<H', exe, pos)[0]
+def show_ptr16(v, labels):
     file_tgt = ds_to_file(v)
     lbl = labels.get(file_tgt, '')
     note = f'  -> {lbl}' if lbl else ''
-    return 2, f'DS:0x{v:04X}  (file 0x{file_tgt:05X}){note}'
+    return f'DS:0x{v:04X}  (file 0x{file_tgt:05X}){note}'
 
 
-def fmt_farptr(exe, pos, labels):
-    off = struct.unpack_from('<H', exe, pos)[0]
-    seg = struct.unpack_from('<H', exe, pos + 2)[0]
+def show_farptr(v, labels):
+    """v is the 32-bit far pointer (seg << 16 | off)."""
+    seg, off = v >> 16, v & 0xFFFF
     file_tgt = MZ_HEADER + seg * 16 + off
     lbl = labels.get(file_tgt, '')
     note = f'  -> {lbl}' if lbl else ''
-    return 4, f'{seg:04X}:{off:04X}  (file 0x{file_tgt:05X}){note}'
+    return f'{seg:04X}:{off:04X}  (file 0x{file_tgt:05X}){note}'
+
+
+# type -> value formatter; the struct codes and sizes come from tables.TYPES
+SHOW = {
+    'u8':     show_u8,
+    's8':     show_s8,
+    'b8':     show_b8,
+    'u16':    show_u16,
+    's16':    show_s16,
+    'u32':    show_u32,
+    'ptr16':  show_ptr16,
+    'farptr': show_farptr,
+}
+
+
+def _scalar_fmt(type_):
+    code, size, _ = tables.TYPES[type_]
+    unpack = struct.Struct('<' + code).unpack_from
+    show = SHOW[type_]
+
+    def _fmt(exe, pos, labels):
+        return size, show(unpack(exe, pos)[0], labels)
+
+    _fmt.__name__ = f'fmt_{type_}'
+    return _fmt
+
+
+fmt_u8     = _scalar_fmt('u8')
+fmt_s8     = _scalar_fmt('s8')
+fmt_b8     = _scalar_fmt('b8')
+fmt_u16    = _scalar_fmt('u16')
+fmt_s16    = _scalar_fmt('s16')
+fmt_u32    = _scalar_fmt('u32')
+fmt_ptr16  = _scalar_fmt('ptr16')
+fmt_farptr = _scalar_fmt('farptr')
 
 
 def fmt_nullstr(exe, pos, labels):
@@ -192,31 +167,24 @@ def fmt_nullstr(exe, pos, labels):
 
 
 def make_struct_fmt(size, field_names):
-    FMAP = {
-        'u8':     (1, fmt_u8),
-        's8':     (1, fmt_s8),
-        'b8':     (1, fmt_b8),
-        'u16':    (2, fmt_u16),
-        's16':    (2, fmt_s16),
-        'u32':    (4, fmt_u32),
-        'ptr16':  (2, fmt_ptr16),
-        'farptr': (4, fmt_farptr),
-    }
-    field_fmts = []
-    foff = 0
-    for fn in field_names:
-        fn = fn.strip()
-        fsz, ffmt = FMAP.get(fn, (1, fmt_u8))
-        field_fmts.append((fn, foff, fsz, ffmt))
-        foff += fsz
+    """
+    Formatter for an n-byte struct. The row layout is compiled once into a
+    single Struct (tables.compile_layout); the formatter's .layout and
+    .render(values, labels) let main() decode a whole table in one pass.
+    """
+    layout = tables.compile_layout(f'{size}:{",".join(field_names)}')
+    shows = [(f.label, SHOW[f.type]) for f in layout.fields]
+    unpack = layout.struct.unpack_from
+
+    def render(values, labels):
+        return '  '.join(f'{label}={show(v, labels)}'
+                         for (label, show), v in zip(shows, values))
 
     def _struct(exe, pos, labels):
-        parts = []
-        for fname, fo, _fsz, ffmt in field_fmts:
-            _, s = ffmt(exe, pos + fo, labels)
-            parts.append(f'{fname}={s}')
-        return size, '  '.join(parts)
+        return size, render(unpack(exe, pos), labels)
 
+    _struct.layout = layout
+    _struct.render = render
     return _struct
 
 
@@ -264,13 +232,11 @@ def get_entry_size(fmt_str):
 
 def follow_target(file_tgt, disasm_n=6):
     """Disassemble N lines at a target file offset, indented."""
-    result = subprocess.run(
-        [sys.executable, os.path.join(SCRIPT_DIR, 'dis.py'),
-         f'0x{file_tgt:05X}', str(disasm_n)],
-        capture_output=True, text=True
-    )
-    for line in result.stdout.splitlines():
-        print('      ' + line)
+    import dis   # decoder + labels, only needed with --follow
+    exe = daemon.read_exe(EXE_PATH)
+    if 0 <= file_tgt < len(exe):
+        for line in dis.listing(exe, file_tgt, disasm_n, dis.load_knowledge()):
+            print('      ' + line)
     print()
 
 
@@ -293,8 +259,7 @@ def main():
     fmt_str = args[2]
     follow  = '--follow' in args
 
-    with open(EXE_PATH, 'rb') as f:
-        exe = f.read()
+    exe = daemon.read_exe(EXE_PATH)
 
     labels  = load_labels(LABELS_CSV)
     fmt_fn  = get_formatter(fmt_str)
@@ -306,13 +271,23 @@ def main():
     print(f'; Table at {addr_disp}  count={count}  format={fmt_str}')
     print()
 
+    # struct: formats decode the whole table in one iter_unpack pass
+    rows = []
+    layout = getattr(fmt_fn, 'layout', None)
+    if layout is not None:
+        t = tables.read_table(exe, addr, count, layout)
+        rows = list(zip(*t.columns.values()))
+
     cur = addr
     for i in range(count):
         if cur >= len(exe):
             print(f'  [{i:3d}]  <out of range>')
             break
 
-        size_used, text = fmt_fn(exe, cur, labels)
+        if i < len(rows):
+            size_used, text = esize, fmt_fn.render(rows[i], labels)
+        else:
+            size_used, text = fmt_fn(exe, cur, labels)
 
         ds_r = file_to_ds(cur)
         addr_str = f'DS:0x{ds_r:04X}' if ds_r is not None else f'0x{cur:05X}'
@@ -323,9 +298,7 @@ def main():
                 v = struct.unpack_from('<H', exe, cur)[0]
                 file_tgt = ds_to_file(v)
             else:
-                off = struct.unpack_from('<H', exe, cur)[0]
-                seg = struct.unpack_from('<H', exe, cur + 2)[0]
-                file_tgt = MZ_HEADER + seg * 16 + off
+                file_tgt = tables.farptr_file(struct.unpack_from('<I', exe, cur)[0])
             follow_target(file_tgt)
 
         cur += size_used
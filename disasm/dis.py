@@ -31,9 +31,14 @@ Output columns:
 
 import sys
 import os
-import csv
 import struct
 
+import daemon
+if __name__ == '__main__':
+    daemon.forward('dis', sys.argv[1:])   # runs in the resident daemon if one is up
+
+import kb
+
 # ---------------------------------------------------------------------------
 # Paths
 # ---------------------------------------------------------------------------
@@ -45,45 +50,10 @@ LABELS_CSV = os.path.join(SCRIPT_DIR, 'labels.csv')
 COMMENTS_CSV = os.path.join(SCRIPT_DIR, 'comments.csv')
 
 # ---------------------------------------------------------------------------
-# EXE / address constants
+# EXE / address constants (see addr.py)
 # ---------------------------------------------------------------------------
 
-MZ_HEADER   = 0x6A00          # header size in bytes; code starts at file 0x6A00
-DS_FILE_BASE = 0x055D80       # file offset of DS base (paragraph 0x4F38 * 16 + header)
-DS_SEG      = 0x4F38          # DS paragraph number
-
-# Known code-segment to module name mapping (from CLAUDE.md)
-MODULES = [
-    # (file_start, file_end, code_seg_paragraph, name)
-    (0x20EA0, 0x263F0, 0x1A4A, 'extras.cpp'),
-    (0x263F0, 0x2F830, 0x1F7F, 'icons.cpp'),
-    (0x2F830, 0x31FB0, 0x28B9, 'play.cpp'),
-    (0x31FB0, 0x33690, 0x2B3B, 'player.cpp'),
-    (0x33690, 0x38070, 0x2CBF, 'ranges.cpp'),
-    (0x38070, 0x38780, 0x3167, 'shark.cpp'),
-    (0x38780, 0x3B8D0, 0x31D8, 'shields.cpp'),
-    (0x3B8D0, 0x4C290, 0x34ED, 'menu+dialogs'),
-    (0x4C290, 0x4D000, 0x4589, 'font module'),
-]
-
-def file_to_segoff(file_off):
-    """Return (seg, off) for a file offset, using known module code segments."""
-    for start, end, seg, name in MODULES:
-        if start <= file_off < end:
-            off = (file_off - MZ_HEADER) - (seg * 16)
-            return seg, off
-    # Fallback: compute raw paragraph:offset
-    code_off = file_off - MZ_HEADER
-    if code_off >= 0:
-        return code_off >> 4, code_off & 0xF
-    return 0, file_off
-
-def ds_to_file(ds_off):
-    return DS_FILE_BASE + ds_off
-
-def file_to_ds(file_off):
-    v = file_off - DS_FILE_BASE
-    return v if 0 <= v < 0x10000 else None
+from addr import MZ_HEADER, file_to_segoff, ds_to_file, file_to_ds
 
 # ---------------------------------------------------------------------------
 # Known DS constants for inline annotation (merged from fpu_decode.py + RE doc)
@@ -126,93 +96,31 @@ DS_CONSTANTS = {
 # CSV loaders
 # ---------------------------------------------------------------------------
 
-def _parse_addr_key(s):
-    """
-    Parse a CSV key into (kind, value):
-      '0x20EA0' or '20EA0' → ('file', 0x20EA0)
-      'DS:0x1234'          → ('ds',   0x1234)
-    Returns None on failure.
-    """
-    s = s.strip()
-    sl = s.lower()
-    if sl.startswith('ds:'):
-        try:
-            return ('ds', int(s[3:], 16))
-        except ValueError:
-            return None
-    try:
-        return ('file', int(s, 16))
-    except ValueError:
-        return None
-
+# Parsing and caching live in kb.py; these wrappers keep the per-table API.
 
-def load_labels(path):
+def load_labels(path=LABELS_CSV):
     """Return dict file_offset -> name  (DS offsets are converted to file offsets)."""
-    labels = {}
-    if not os.path.exists(path):
-        return labels
-    with open(path, newline='') as f:
-        for row in csv.reader(f):
-            if not row or row[0].strip().startswith('#'):
-                continue
-            if len(row) < 2:
-                continue
-            key = _parse_addr_key(row[0])
-            name = row[1].strip()
-            if key and name:
-                kind, val = key
-                foff = ds_to_file(val) if kind == 'ds' else val
-                labels[foff] = name
-    return labels
-
-
-def load_comments(path):
-    """Return dict file_offset -> comment."""
-    comments = {}
-    if not os.path.exists(path):
-        return comments
-    with open(path, newline='') as f:
-        for row in csv.reader(f):
-            if not row or row[0].strip().startswith('#'):
-                continue
-            if len(row) < 2:
-                continue
-            key = _parse_addr_key(row[0])
-            cmt = ','.join(row[1:]).strip()
-            if key and cmt:
-                kind, val = key
-                foff = ds_to_file(val) if kind == 'ds' else val
-                comments[foff] = cmt
-    return comments
+    return kb.load(labels_path=path).labels
 
 
-# ---------------------------------------------------------------------------
-# Label dtype loader (optional 3rd column in labels.csv)
-# ---------------------------------------------------------------------------
+def load_comments(path=COMMENTS_CSV):
+    """Return dict file_offset -> comment."""
+    return kb.load(comments_path=path).comments
 
-def load_label_dtypes(path):
+
+def load_label_dtypes(path=LABELS_CSV):
     """
     Return dict file_offset -> dtype for labels with an explicit 3rd column.
     Supported dtype values: code (default), data/bytes, data/str,
       data/ptr16, data/farptr, data/table:N
     Entries without a 3rd column are omitted (caller treats them as 'code').
     """
-    dtypes = {}
-    if not os.path.exists(path):
-        return dtypes
-    with open(path, newline='') as f:
-        for row in csv.reader(f):
-            if not row or row[0].strip().startswith('#'):
-                continue
-            if len(row) < 3:
-                continue
-            key   = _parse_addr_key(row[0])
-            dtype = row[2].strip()
-            if key and dtype and dtype != 'code':
-                kind, val = key
-                foff = ds_to_file(val) if kind == 'ds' else val
-                dtypes[foff] = dtype
-    return dtypes
+    return kb.load(labels_path=path).dtypes
+
+
+def load_ds_labels(path=LABELS_CSV):
+    """Return dict ds_offset -> name (only DS: entries from labels.csv)."""
+    return kb.load(labels_path=path).ds_labels
 
 
 # ---------------------------------------------------------------------------
@@ -313,28 +221,6 @@ def dump_data(exe, file_start, n_rows, dtype, labels):
             pos += len(chunk)
 
 
-# ---------------------------------------------------------------------------
-# DS variable name lookup
-# ---------------------------------------------------------------------------
-
-def load_ds_labels(path):
-    """Return dict ds_offset -> name (only DS: entries from labels.csv)."""
-    dl = {}
-    if not os.path.exists(path):
-        return dl
-    with open(path, newline='') as f:
-        for row in csv.reader(f):
-            if not row or row[0].strip().startswith('#'):
-                continue
-            if len(row) < 2:
-                continue
-            key = _parse_addr_key(row[0])
-            name = row[1].strip()
-            if key and name and key[0] == 'ds':
-                dl[key[1]] = name
-    return dl
-
-
 # ---------------------------------------------------------------------------
 # Address parser (command-line arg)
 # ---------------------------------------------------------------------------
@@ -372,6 +258,25 @@ def parse_start_addr(s, emu_seg=False):
 
 from instruction_set_x86 import decode
 
+# decode() results for one (data, labels) pair. Pays off in the daemon, where
+# the EXE bytes and label dict stay the same objects across requests.
+_decode_cache = {}
+_decode_cache_src = (None, None)
+
+
+def cached_decode(data, pos, labels):
+    """decode() memoized per position while data and labels are the same objects."""
+    global _decode_cache_src
+    src_data, src_labels = _decode_cache_src
+    if data is not src_data or labels is not src_labels:
+        _decode_cache.clear()
+        _decode_cache_src = (data, labels)
+    hit = _decode_cache.get(pos)
+    if hit is None:
+        hit = _decode_cache[pos] = decode(data, pos, labels)
+    return hit
+
+
 def disassemble(data, file_start, n_lines, labels, comments, ds_labels, dtypes=None):
     """
     Disassemble n_lines instructions starting at file_start.
@@ -418,7 +323,7 @@ def disassemble(data, file_start, n_lines, labels, comments, ds_labels, dtypes=N
         cmt = comments.get(pos)
 
         # --- Decode ---
-        length, mn, op_str, is_fpu, ds_ref = decode(data, pos, label_lookup)
+        length, mn, op_str, is_fpu, ds_ref = cached_decode(data, pos, label_lookup)
 
         # --- Raw bytes ---
         raw = data[pos:pos+length]
@@ -462,6 +367,29 @@ def disassemble(data, file_start, n_lines, labels, comments, ds_labels, dtypes=N
             break
 
 
+def load_knowledge():
+    """
+    Load labels.csv/comments.csv once for repeated disassembly.
+    Returns (labels, comments, ds_labels, dtypes) in disassemble() argument order.
+    """
+    k = kb.load(LABELS_CSV, COMMENTS_CSV)
+    return k.labels, k.comments, k.ds_labels, k.dtypes
+
+
+def listing(data, file_start, n_lines, knowledge):
+    """
+    Yield the same lines `dis.py <addr> <count>` prints: a header, a blank
+    line, then the disassembly. knowledge is the tuple from load_knowledge().
+    """
+    labels, comments, ds_labels, dtypes = knowledge
+    seg, off = file_to_segoff(file_start)
+    ds_rel = file_to_ds(file_start)
+    ds_str = f'  DS:0x{ds_rel:04X}' if ds_rel is not None else ''
+    yield f'; 0x{file_start:05X}  {seg:04X}:{off:04X}{ds_str}  ({n_lines} instructions)'
+    yield ''
+    yield from disassemble(data, file_start, n_lines, labels, comments, ds_labels, dtypes)
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -492,25 +420,13 @@ def main():
         print(f'Error: EXE not found at {EXE_PATH}', file=sys.stderr)
         sys.exit(1)
 
-    with open(EXE_PATH, 'rb') as f:
-        data = f.read()
+    data = daemon.read_exe(EXE_PATH)
 
     if file_start >= len(data):
         print(f'Error: offset 0x{file_start:X} beyond file size 0x{len(data):X}', file=sys.stderr)
         sys.exit(1)
 
-    labels    = load_labels(LABELS_CSV)
-    comments  = load_comments(COMMENTS_CSV)
-    ds_labels = load_ds_labels(LABELS_CSV)
-    dtypes    = load_label_dtypes(LABELS_CSV)
-
-    seg, off = file_to_segoff(file_start)
-    ds_rel = file_to_ds(file_start)
-    ds_str = f'  DS:0x{ds_rel:04X}' if ds_rel is not None else ''
-    print(f'; 0x{file_start:05X}  {seg:04X}:{off:04X}{ds_str}  ({n_lines} instructions)')
-    print()
-
-    for line in disassemble(data, file_start, n_lines, labels, comments, ds_labels, dtypes):
+    for line in listing(data, file_start, n_lines, load_knowledge()):
         print(line)
 
 
@@ -33,23 +33,8 @@ Examples:
 import sys
 import struct
 
-# Scorched Earth v1.50 binary layout
-MZ_HEADER_SIZE = 0x6A00
-DS_SEGMENT = 0x4F38
-DS_FILE_BASE = 0x055D80  # DS:0x0000 in file
-
-
-def ds_to_file(ds_offset):
-    """Convert DS:offset to file offset."""
-    return DS_FILE_BASE + ds_offset
-
-
-def file_to_ds(file_offset):
-    """Convert file offset to DS:offset (returns None if outside DS)."""
-    ds_off = file_offset - DS_FILE_BASE
-    if 0 <= ds_off < 0x10000:
-        return ds_off
-    return None
+# Scorched Earth v1.50 binary layout (see addr.py)
+from addr import ds_to_file, file_to_ds
 
 
 def dump_at(exe_file, file_off, mode, num_bytes):
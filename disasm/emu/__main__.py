@@ -8,12 +8,12 @@ import argparse
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from emu.memory import Memory
-from emu.cpu import CPU
-from emu.loader import load_exe, setup_ivt, setup_cpu
-from emu.ports import PortIO
-from emu.interrupts import InterruptHandler, EmuExit
-from emu.execute import step, run_fast
-from emu.state import save_state, load_state
+from emu.interrupts import EmuExit
+from emu.execute import step
+from emu.session import Emulator
+from emu.breakpoints import parse_spec
+from emu.replay import Recorder
+from emu.dosfs import DosFS
 
 
 def main():
@@ -38,7 +38,14 @@ def main():
                         help='Redirect DOS stderr (handle 2) to file')
     parser.add_argument('--break', dest='breakpoints', action='append', default=[],
                         metavar='ADDR', help='Break at address (file offset 0xNNNNN, '
-                        'or SEG:OFF in emulator space). Can repeat.')
+                        'or SEG:OFF in emulator space). "ADDR if COND" breaks only when '
+                        'COND holds, e.g. "0x2A850 if ax == 3 and word(ds, 0x50F6) > 1" '
+                        '(see emu/breakpoints.py). Can repeat.')
+    parser.add_argument('--ignore', type=int, default=0, metavar='N',
+                        help='Skip the first N hits of each --break')
+    parser.add_argument('--tracepoint', dest='tracepoints', action='append', default=[],
+                        metavar='ADDR', help='Log registers each time ADDR executes, without '
+                        'stopping ("ADDR if COND" as for --break). Can repeat.')
     parser.add_argument('--save-state', type=str, metavar='FILE',
                         help='Save emulator state to binary file on exit')
     parser.add_argument('--load-state', type=str, metavar='FILE',
@@ -48,7 +55,66 @@ def main():
     parser.add_argument('--keys', action='append', default=[], metavar='STEP:SC[:ASC]',
                         help='Inject key at step N (e.g. 500000:1:27 = ESC at step 500k). '
                         'SC=scancode, ASC=ascii (default 0). Can repeat.')
+    parser.add_argument('--fpu', choices=('float', 'exact'), default='float',
+                        help='FPU backend: float (fast float64) or exact (bit-exact 80-bit, '
+                        'honours the control word)')
+    parser.add_argument('--dosfs', choices=('disk', 'overlay', 'mmap'), default='disk',
+                        help='DOS files: disk (real files), overlay (read into memory, writes '
+                        'kept in memory) or mmap (like overlay, reads from read-only mmaps)')
+    parser.add_argument('--preload', action='store_true',
+                        help='With --dosfs overlay/mmap, load the whole game directory up front')
+    parser.add_argument('--trace-bin', type=str, metavar='FILE',
+                        help='Write a binary trace (one fixed-width record per instruction) '
+                        'to FILE; view with disasm/trace_view.py')
+    parser.add_argument('--trace-regs', action='store_true',
+                        help='With --trace-bin, include flags and registers in each record')
+    parser.add_argument('--coverage', type=str, metavar='FILE',
+                        help='Save the executed-address map to FILE (with --calls, also the '
+                        'function entry points); report with disasm/coverage_map.py')
+    parser.add_argument('--calls', action='store_true',
+                        help='Keep a shadow call stack: print a backtrace when the run stops')
+    parser.add_argument('--call-trace', type=str, metavar='FILE',
+                        help="Write function entry/exit events to FILE ('-' = stdout); "
+                        'implies --calls')
+    parser.add_argument('--profile', type=int, metavar='N', nargs='?', const=20,
+                        help='Print the top N functions by exclusive instruction count '
+                        'and the top N interrupt functions by calls (default 20); implies --calls')
+    parser.add_argument('--frames', type=int, metavar='N',
+                        help='Stop after N frames (vsync waits, CRTC page flips, Fastgraph '
+                        'page calls); --max-steps still caps the run')
+    parser.add_argument('--frame-png', type=str, metavar='PATTERN',
+                        help="Dump the screen at every frame to PATTERN %% frame number, "
+                        "e.g. /tmp/frame%%04d.png")
+    parser.add_argument('--label', type=str, metavar='TEXT',
+                        help='Label --dump-screen/--frame-png images with TEXT in the EXE '
+                        'font; {frame} and {step} are replaced, e.g. "frame {frame}"')
+    parser.add_argument('--vga-log', type=str, metavar='FILE',
+                        help='Log palette and VGA register writes with frame boundaries to '
+                        'FILE; view with disasm/palette_timeline.py')
+    parser.add_argument('--record', type=int, default=0, metavar='N',
+                        help='Record mode: checkpoint every N instructions so the '
+                        '--reverse-* options can go back from where the run stopped')
+    parser.add_argument('--reverse-step', type=int, default=0, metavar='N',
+                        help='After the run, go back N instructions (needs --record)')
+    parser.add_argument('--reverse-continue', action='store_true',
+                        help='After the run, go back to the previous --break hit (needs --record)')
+    parser.add_argument('--last-write', type=str, metavar='ADDR[,SIZE]',
+                        help='After the run, go back to the instruction that last changed '
+                        'SIZE bytes (default 2) at ADDR, e.g. 4F38:50F6,2 (needs --record)')
     args = parser.parse_args()
+    if (args.reverse_step or args.reverse_continue or args.last_write) and not args.record:
+        parser.error('--reverse-step/--reverse-continue/--last-write need --record N')
+    if args.trace:
+        # The --trace loop steps the CPU itself, outside Emulator.run.
+        unsupported = [opt for opt, on in (('--trace-bin', args.trace_bin),
+                                           ('--coverage', args.coverage),
+                                           ('--frames', args.frames is not None),
+                                           ('--frame-png', args.frame_png),
+                                           ('--vga-log', args.vga_log),
+                                           ('--record', args.record),
+                                           ('--keys', args.keys)) if on]
+        if unsupported:
+            parser.error(f"--trace can't be combined with {', '.join(unsupported)}")
 
     # Resolve exe path relative to project root
     exe_path = args.exe
@@ -60,22 +126,42 @@ def main():
 
     # Always load EXE for info dict (file offsets, exe_data for disassembly)
     print(f"Loading {exe_path}...")
-    mem_obj = Memory()
-    setup_ivt(mem_obj)
-    info = load_exe(exe_path, mem_obj)
+    if args.load_state:
+        print(f"Restoring state from {args.load_state}...")
+    earth_dir = os.path.dirname(exe_path)
+    emu = Emulator(exe_path, state=args.load_state, fpu=args.fpu,
+                   dosfs=DosFS(earth_dir, args.dosfs, preload=args.preload))
+    info, cpu, mem_obj = emu.info, emu.cpu, emu.mem
+    ports, int_handler = emu.ports, emu.ints
 
-    cpu = CPU()
-    setup_cpu(cpu, info)
+    call_trace_file = None
+    if args.calls or args.call_trace or args.profile:
+        trace_fn = None
+        if args.call_trace:
+            call_trace_file = sys.stdout if args.call_trace == '-' else open(args.call_trace, 'w')
 
-    # Set up I/O (before potential state load)
-    ports = PortIO()
-    ports.mem = mem_obj
-    earth_dir = os.path.join(os.path.dirname(exe_path))
-    int_handler = InterruptHandler(mem_obj, cpu, earth_dir, ports)
+            def trace_fn(event, frame, depth, step_n, out=call_trace_file):
+                arrow = '->' if event == 'call' else '<-'
+                out.write(f"{step_n:10d} {'  ' * depth}{arrow} {emu.calls.name(frame.entry)}"
+                          f" ({frame.cs:04X}:{frame.ip:04X})\n")
+        emu.enable_calls(trace_fn)
+    if args.coverage:
+        emu.enable_coverage()
+    if args.trace_bin:
+        emu.start_trace(args.trace_bin, regs=args.trace_regs)
+    def label(frame, step):
+        return args.label and args.label.format(frame=frame, step=step)
+
+    if args.frames is not None or args.frame_png:
+        frame_cb = None
+        if args.frame_png:
+            def frame_cb(frame):
+                emu.dump_screen(args.frame_png % frame.index, label(frame.index, frame.step))
+        emu.enable_frames(frame_cb)
+    if args.vga_log:
+        emu.enable_vga_log()
 
     if args.load_state:
-        print(f"Restoring state from {args.load_state}...")
-        load_state(args.load_state, cpu, mem_obj, ports, int_handler)
         print(f"State restored. CS:IP = {cpu.segs[1]:04X}:{cpu.ip:04X}")
         print(cpu.dump())
     else:
@@ -86,25 +172,18 @@ def main():
               f"SS:SP = {cpu.segs[2]:04X}:{cpu.sp:04X}")
         print(cpu.dump())
 
-        # Heap starts after image + some space for stack
-        stack_end = Memory.phys(info['entry_ss'], info['entry_sp']) + 0x1000
-        int_handler.init_heap((stack_end >> 4) + 1)
-
     if args.dump_regs:
         # Also decode first 5 instructions using the text decoder
-        try:
-            from instruction_set_x86 import decode
-            # Entry point file offset = header_size + e_cs*16 + e_ip
-            e_cs = info['entry_cs'] - info['image_seg']
-            pos = info['header_size'] + e_cs * 16 + info['entry_ip']
-            print(f"\nFirst instructions at file offset 0x{pos:05X}:")
-            for _ in range(10):
-                length, mn, op_str, is_fpu, ds_ref = decode(info['exe_data'], pos)
-                raw = ' '.join(f'{info["exe_data"][pos+i]:02X}' for i in range(length))
-                print(f"  0x{pos:05X}  {raw:<20s}  {mn} {op_str}")
-                pos += length
-        except ImportError:
+        if emu.decode is None:
             print("(instruction_set_x86 not importable for disassembly)")
+            return
+        # Entry point file offset = header_size + e_cs*16 + e_ip
+        e_cs = info['entry_cs'] - info['image_seg']
+        pos = info['header_size'] + e_cs * 16 + info['entry_ip']
+        print(f"\nFirst instructions at file offset 0x{pos:05X}:")
+        for pos, raw, mn, op_str in emu.disasm(pos, 10):
+            raw = ' '.join(f'{b:02X}' for b in raw)
+            print(f"  0x{pos:05X}  {raw:<20s}  {mn} {op_str}")
         return
 
     # Redirect DOS stdout/stderr to files if requested
@@ -119,29 +198,26 @@ def main():
         int_handler.on_int = on_int
 
     # Trace decoder for --trace
-    trace_decode = None
-    if args.trace:
-        try:
-            from instruction_set_x86 import decode as _decode
-            trace_decode = _decode
-        except ImportError:
-            pass
+    trace_decode = emu.decode if args.trace else None
 
-    # Parse breakpoints → set of physical addresses
-    bp_set = set()
+    # Parse breakpoints → physical addresses
     for bp_str in args.breakpoints:
+        bp_str, cond = parse_spec(bp_str)
+        phys = emu.add_breakpoint(bp_str, cond, ignore=args.ignore).phys
+        where = f" if {cond}" if cond else ""
         if ':' in bp_str:
             # SEG:OFF — emulator physical address
             seg_s, off_s = bp_str.split(':')
-            phys = int(seg_s, 16) * 16 + int(off_s, 16)
-            bp_set.add(phys)
-            print(f"Breakpoint: {seg_s}:{off_s} (phys 0x{phys:05X})")
+            print(f"Breakpoint: {seg_s}:{off_s} (phys 0x{phys:05X}){where}")
         else:
             # File offset → convert to emulator physical
-            foff = int(bp_str, 16)
-            phys = foff - info['header_size'] + info['image_base']
-            bp_set.add(phys)
-            print(f"Breakpoint: file 0x{foff:05X} (phys 0x{phys:05X})")
+            print(f"Breakpoint: file 0x{int(bp_str, 16):05X} (phys 0x{phys:05X}){where}")
+    for tp_str in args.tracepoints:
+        tp_str, cond = parse_spec(tp_str)
+        emu.add_tracepoint(tp_str, log='AX={ax:04X} BX={bx:04X} CX={cx:04X} DX={dx:04X} '
+                           'SI={si:04X} DI={di:04X} BP={bp:04X} SP={sp:04X} DS={ds:04X}',
+                           cond=cond)
+    bp_set = emu.stop_table()
 
     # Parse scheduled key injections
     scheduled_keys = {}  # step → (scancode, ascii)
@@ -164,7 +240,7 @@ def main():
                     print(f"CPU halted after {i} instructions")
                     break
                 ip_phys = Memory.phys(cpu.segs[1], cpu.ip)
-                if ip_phys in bp_set:
+                if ip_phys in bp_set and bp_set[ip_phys](cpu, mem_obj):
                     file_off = ip_phys - info['image_base'] + info['header_size']
                     print(f"\n*** Breakpoint hit at step {i}: "
                           f"{cpu.segs[1]:04X}:{cpu.ip:04X} (file 0x{file_off:05X})")
@@ -178,7 +254,9 @@ def main():
                     print(f"  {cpu.segs[1]:04X}:{cpu.ip:04X}  {mn} {op_str}")
                 except Exception:
                     print(f"  {cpu.segs[1]:04X}:{cpu.ip:04X}  ???")
-                step(cpu, mem_obj, ports, int_handler, trace=True)
+                if emu.calls is not None:
+                    emu.calls.now = i
+                step(cpu, mem_obj, ports, int_handler, trace=True, calls=emu.calls)
             else:
                 print(f"Reached max steps ({args.max_steps})")
         except EmuExit as e:
@@ -191,21 +269,27 @@ def main():
             print(f"Bytes at CS:IP: {raw}")
     else:
         # Fast path using run_fast
-        reason, result = run_fast(cpu, mem_obj, ports, int_handler, args.max_steps,
-                                  bp_set=bp_set if bp_set else None,
-                                  timer_period=args.timer,
-                                  scheduled_keys=scheduled_keys if scheduled_keys else None)
+        if args.record:
+            emu.timer_period = args.timer
+            recorder = Recorder(emu, interval=args.record)
+            recorder.keys = {emu.steps + k: v for k, v in scheduled_keys.items()}
+            if args.frames is not None:
+                emu.frames.stop_at = emu.frames.count + args.frames
+            reason, result = recorder.run(max_steps=args.max_steps)
+        elif args.frames is not None:
+            reason, result = emu.run_frames(args.frames, max_steps=args.max_steps,
+                                            keys=scheduled_keys, timer_period=args.timer)
+        else:
+            reason, result = emu.run(max_steps=args.max_steps, keys=scheduled_keys,
+                                     timer_period=args.timer)
         if reason == 'halted':
             print(f"CPU halted after {result} instructions")
         elif reason == 'breakpoint':
-            ip_phys = result
-            file_off = ip_phys - info['image_base'] + info['header_size']
+            file_off = emu.phys_to_file(result)
             print(f"\n*** Breakpoint hit: "
                   f"{cpu.segs[1]:04X}:{cpu.ip:04X} (file 0x{file_off:05X})")
             print(cpu.dump())
-            sp_phys = Memory.phys(cpu.segs[2], cpu.sp)
-            words = [mem_obj.read16(sp_phys + j*2) for j in range(8)]
-            print("Stack: " + " ".join(f"{w:04X}" for w in words))
+            print("Stack: " + " ".join(f"{w:04X}" for w in emu.stack_words(8)))
         elif reason == 'exit':
             print(f"\nProgram exited with code {result} after execution")
         elif reason == 'error':
@@ -214,42 +298,109 @@ def main():
             ip_phys = Memory.phys(cpu.segs[1], cpu.ip)
             raw = ' '.join(f'{mem_obj.data[ip_phys+j]:02X}' for j in range(8))
             print(f"Bytes at CS:IP: {raw}")
+        elif reason == 'frame':
+            print(f"\nStopped at frame {result.index} ({'+'.join(sorted(result.kinds))}), "
+                  f"step {result.step}")
         elif reason == 'max_steps':
             print(f"Reached max steps ({args.max_steps})")
 
+        if args.record:
+            print(f"Recorded {len(recorder.checkpoints)} checkpoints "
+                  f"(every {args.record} instructions)")
+            if args.reverse_continue:
+                how, where = recorder.reverse_continue()
+                if how == 'breakpoint':
+                    print(f"\n*** Reverse-continue: previous hit at step {emu.steps}, "
+                          f"file 0x{emu.phys_to_file(where):05X}")
+                else:
+                    print(f"\n*** Reverse-continue: no earlier hit, at step {where}")
+            if args.reverse_step:
+                recorder.reverse_step(args.reverse_step)
+                print(f"\n*** Reverse-step {args.reverse_step}: now at step {emu.steps}")
+            if args.last_write:
+                addr, _, size = args.last_write.partition(',')
+                phys = emu.resolve(addr)
+                hit = recorder.last_write(phys, int(size, 0) if size else 2)
+                if hit is None:
+                    print(f"\n*** Last write: phys 0x{phys:05X} unchanged since step "
+                          f"{recorder.checkpoints[0].step}")
+                else:
+                    print(f"\n*** Last write to phys 0x{phys:05X}: step {hit}, "
+                          f"{cpu.segs[1]:04X}:{cpu.ip:04X} "
+                          f"(file 0x{emu.phys_to_file(emu.ip_phys):05X})")
+
+    if emu.trace_out is not None:
+        out = emu.trace_out
+        emu.stop_trace()
+        print(f"\nBinary trace: {out.records} records -> {out.path}")
+
+    if args.coverage:
+        cov = emu.coverage_snapshot()
+        cov.save(args.coverage)
+        print(f"\nCoverage: {cov.count()} instruction addresses, {len(cov.entries)} entry points"
+              f" -> {args.coverage}")
+
+    if emu.vga_log is not None:
+        emu.vga_log.save(args.vga_log)
+        print(f"\nVGA log: {len(emu.vga_log)} entries -> {args.vga_log}")
+
+    if emu.frames is not None:
+        last = emu.frames.last
+        print(f"\nFrames: {emu.frames.count}"
+              + (f", last at step {last.step} (CRTC start 0x{last.start:04X})" if last else ''))
+        if args.frame_png:
+            print(f"Frame screenshots -> {args.frame_png}")
+
+    if int_handler.fs.overlay:
+        print(f"\nDOS overlay (not written to {earth_dir or '.'}):")
+        for name, buf in sorted(int_handler.fs.overlay.items()):
+            print(f"  {name:12s} {len(buf):8d} bytes")
+
     # Save state if requested
     if args.save_state:
-        save_state(args.save_state, cpu, mem_obj, ports, int_handler)
+        emu.save_state(args.save_state)
         print(f"\nState saved to {args.save_state}")
 
     # Dump screen if requested (even after error)
     if args.dump_screen:
         w, h = ports.get_resolution()
         mode_desc = f"Mode X {w}x{h}" if ports.mode_x else f"Mode 13h {w}x{h}"
-        mem_obj.dump_screen_png(args.dump_screen, ports)
+        frame = emu.frames.last.index if emu.frames and emu.frames.last else ''
+        emu.dump_screen(args.dump_screen, label(frame, emu.steps))
         print(f"\nScreen dumped to {args.dump_screen} ({mode_desc})")
 
+    if args.ignore or args.tracepoints or any(bp.source for bps in emu.breakpoints.values()
+                                              for bp in bps):
+        print("\nBreakpoint hits:")
+        for bps in emu.breakpoints.values():
+            for bp in bps:
+                print(f"  {bp!r}")
+
+    if emu.calls is not None:
+        if call_trace_file is not None and call_trace_file is not sys.stdout:
+            call_trace_file.close()
+        print("\nBacktrace:")
+        print("\n".join(emu.calls.format_backtrace(cpu)))
+        if args.profile:
+            print(f"\nTop {args.profile} functions by exclusive instructions:")
+            print(f"  {'calls':>8s} {'inclusive':>12s} {'exclusive':>12s}  function")
+            for entry, (n, incl, excl) in emu.calls.top(args.profile):
+                print(f"  {n:8d} {incl:12d} {excl:12d}  {emu.calls.name(entry)}")
+            print(f"\nTop {args.profile} interrupt functions by calls:")
+            for name, n in int_handler.top(args.profile):
+                print(f"  {n:8d}  {name}")
+
     print("\nFinal state:")
     print(cpu.dump())
 
     # Disassemble at current CS:IP
-    try:
-        from instruction_set_x86 import decode
-        ip_phys = mem_obj.phys(cpu.segs[1], cpu.ip)
+    if emu.decode is not None:
         # Map to file offset: ip_phys - image_base + header_size
-        file_off = ip_phys - info['image_base'] + info['header_size']
+        file_off = emu.phys_to_file(emu.ip_phys)
         print(f"\nCode at CS:IP {cpu.segs[1]:04X}:{cpu.ip:04X} (file 0x{file_off:05X}):")
-        pos = file_off
-        for _ in range(10):
-            try:
-                length, mn, op_str, is_fpu, ds_ref = decode(info['exe_data'], pos)
-                raw = ' '.join(f'{info["exe_data"][pos+i]:02X}' for i in range(length))
-                print(f"  0x{pos:05X}  {raw:<24s}  {mn} {op_str}")
-                pos += length
-            except Exception:
-                break
-    except ImportError:
-        pass
+        for pos, raw, mn, op_str in emu.disasm(file_off, 10):
+            raw = ' '.join(f'{b:02X}' for b in raw)
+            print(f"  0x{pos:05X}  {raw:<24s}  {mn} {op_str}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+"""Conditional breakpoints, hit/ignore counts and tracepoints for run_fast.
+
+A condition is a Python expression over the CPU state, compiled once into
+a closure (cpu, mem) -> bool:
+
+    ax == 3 and word(ds, 0x50F6) > 10
+    cf or sbyte(ss, bp + 6) < 0
+
+Names:
+    ax bx cx dx sp bp si di       16-bit registers
+    al ah bl bh cl ch dl dh       8-bit registers
+    cs ds es ss ip                segment registers, IP
+    cf zf sf of pf af df          flags (0/1)
+Memory (seg, off) or (phys):
+    byte word dword  sbyte sword  (s* = signed)
+plus abs, min, max, bool and int.
+
+A Breakpoint is itself the predicate passed to run_fast(stops=...): it
+counts hits, skips the first `ignore` of them, logs (tracepoint), and
+returns whether to stop.
+"""
+
+import ast
+
+_REG16 = {'ax': 0, 'cx': 1, 'dx': 2, 'bx': 3, 'sp': 4, 'bp': 5, 'si': 6, 'di': 7}
+_REG8 = {'al': 0, 'cl': 1, 'dl': 2, 'bl': 3, 'ah': 4, 'ch': 5, 'dh': 6, 'bh': 7}
+_SEGS = {'es': 0, 'cs': 1, 'ss': 2, 'ds': 3}
+_FLAGS = ('cf', 'zf', 'sf', 'of', 'pf', 'af', 'df')
+
+
+def _phys(seg, off):
+    return (seg if off is None else (seg << 4) + (off & 0xFFFF)) & 0xFFFFF
+
+
+def _byte(mem, seg, off=None):
+    return mem.read8(_phys(seg, off))
+
+
+def _word(mem, seg, off=None):
+    return mem.read16(_phys(seg, off))
+
+
+def _dword(mem, seg, off=None):
+    phys = _phys(seg, off)
+    return mem.read16(phys) | (mem.read16(phys + 2) << 16)
+
+
+def _sbyte(mem, seg, off=None):
+    v = mem.read8(_phys(seg, off))
+    return v - 0x100 if v & 0x80 else v
+
+
+def _sword(mem, seg, off=None):
+    v = mem.read16(_phys(seg, off))
+    return v - 0x10000 if v & 0x8000 else v
+
+
+_BUILTINS = {'abs': abs, 'min': min, 'max': max, 'bool': bool, 'int': int}
+_MEM_FUNCS = {'byte': _byte, 'word': _word, 'dword': _dword, 'sbyte': _sbyte, 'sword': _sword}
+
+
+def _name_expr(name):
+    """Source for a register/flag name, or None."""
+    if name in _REG16:
+        return f'cpu.regs[{_REG16[name]}]'
+    if name in _REG8:
+        idx = _REG8[name]
+        return f'(cpu.regs[{idx}] & 0xFF)' if idx < 4 else f'(cpu.regs[{idx - 4}] >> 8)'
+    if name in _SEGS:
+        return f'cpu.segs[{_SEGS[name]}]'
+    if name == 'ip' or name in _FLAGS:
+        return f'cpu.{name}'
+    return None
+
+
+class _Rewrite(ast.NodeTransformer):
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id in _MEM_FUNCS:
+            node.func = ast.Name(id='_' + node.func.id, ctx=ast.Load())
+            node.args.insert(0, ast.Name(id='mem', ctx=ast.Load()))
+        return node
+
+    def visit_Name(self, node):
+        if node.id in _MEM_FUNCS or node.id in _BUILTINS:
+            return node
+        src = _name_expr(node.id)
+        if src is None:
+            raise ValueError(f"unknown name in condition: {node.id}")
+        return ast.parse(src, mode='eval').body
+
+
+def compile_condition(expr):
+    """Compile a condition expression into a closure (cpu, mem) -> bool."""
+    tree = _Rewrite().visit(ast.parse(expr.strip(), mode='eval'))
+    fn = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg('cpu'), ast.arg('mem')],
+                           kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=tree.body))
+    ast.fix_missing_locations(fn)
+    env = {'_' + k: f for k, f in _MEM_FUNCS.items()}
+    env['__builtins__'] = _BUILTINS
+    return eval(compile(fn, f'<condition {expr}>', 'eval'), env)
+
+
+class _Regs:
+    """Mapping view of the CPU for log format strings ('{ax:04X} {ds}')."""
+
+    def __init__(self, cpu, mem):
+        self.cpu = cpu
+        self.mem = mem
+
+    def __getitem__(self, name):
+        src = _name_expr(name)
+        if src is None:
+            raise KeyError(name)
+        return eval(src, {'cpu': self.cpu})
+
+
+class Breakpoint:
+    """One breakpoint or tracepoint at a physical address.
+
+    cond:   expression string (see module docstring) or callable(cpu, mem)
+    ignore: number of (condition-passing) hits to skip before acting
+    log:    format string over register names, or callable(bp, cpu, mem);
+            printed/called on every acting hit
+    stop:   False makes a tracepoint (log only, never stops)
+    """
+
+    __slots__ = ('phys', 'label', 'source', 'cond', 'ignore', 'log', 'stop',
+                 'enabled', 'hits')
+
+    def __init__(self, phys, cond=None, ignore=0, log=None, stop=True, label=None):
+        self.phys = phys & 0xFFFFF
+        self.label = label or f'0x{self.phys:05X}'
+        self.source = cond if isinstance(cond, str) else None
+        self.cond = compile_condition(cond) if isinstance(cond, str) else cond
+        self.ignore = ignore
+        self.log = log
+        self.stop = stop
+        self.enabled = True
+        self.hits = 0
+
+    def __call__(self, cpu, mem):
+        if not self.enabled:
+            return False
+        if self.cond is not None and not self.cond(cpu, mem):
+            return False
+        self.hits += 1
+        if self.hits <= self.ignore:
+            return False
+        if self.log is not None:
+            if callable(self.log):
+                self.log(self, cpu, mem)
+            else:
+                print(f"[{self.label} #{self.hits}] " + self.log.format_map(_Regs(cpu, mem)))
+        return self.stop
+
+    def __repr__(self):
+        kind = 'Breakpoint' if self.stop else 'Tracepoint'
+        cond = f' if {self.source}' if self.source else ''
+        return f'{kind}({self.label}{cond}, hits={self.hits})'
+
+
+def stop_table(breakpoints):
+    """{phys: [Breakpoint]} -> run_fast stops: one predicate per address.
+
+    Every breakpoint at an address is evaluated (so all hit counts advance);
+    the run stops if any of them asks to.
+    """
+    table = {}
+    for phys, bps in breakpoints.items():
+        if len(bps) == 1:
+            table[phys] = bps[0]
+        elif bps:
+            table[phys] = _any_of(tuple(bps))
+    return table
+
+
+def _any_of(bps):
+    def stop(cpu, mem):
+        hit = False
+        for bp in bps:
+            if bp(cpu, mem):
+                hit = True
+        return hit
+    return stop
+
+
+def parse_spec(spec):
+    """'ADDR [if COND]' -> (addr string, cond or None), as given to --break/--tracepoint."""
+    addr, sep, cond = spec.strip().partition(' if ')
+    return addr.strip(), (cond.strip() or None) if sep else None
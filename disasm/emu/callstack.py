@@ -0,0 +1,199 @@
+"""Shadow call stack for run_fast: function entry/exit events, per-function
+instruction counts and backtraces.
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    calls = emu.enable_calls()
+    emu.run(until=0x2A850, max_steps=10_000_000)
+    for line in calls.format_backtrace():
+        print(line)
+    for entry, (n, incl, excl) in calls.top(20):
+        print(calls.name(entry), n, incl, excl)
+
+run_fast(calls=...) swaps in a dispatch table whose CALL/RET/RETF/INT/
+IRET/FF-group handlers report to the CallStack; without calls the normal
+table runs and nothing is tracked. Hardware IRQs (timer, injected keys)
+push frames as well.
+
+A frame is popped when SS:SP rises above the stack slot that held its
+return address, so RET-as-jump (push addr / ret) does not pop anything
+and longjmp-style unwinds pop every frame they skip.
+
+Steps count completed instructions: a frame's inclusive count runs from
+its first instruction through its RET; exclusive excludes the frames it
+called. Recursive functions count nested activations in each caller's
+inclusive count.
+"""
+
+from .execute import _DISPATCH
+
+CALL, FAR, INT, IRQ = 'call', 'far', 'int', 'irq'
+
+
+class Frame:
+    """One active call: entry CS:IP, return CS:IP, SS:SP of the return slot."""
+
+    __slots__ = ('entry', 'cs', 'ip', 'ret_cs', 'ret_ip', 'sp', 'step', 'kind', 'child')
+
+    def __init__(self, cs, ip, ret_cs, ret_ip, sp, step, kind):
+        self.cs = cs
+        self.ip = ip
+        self.entry = ((cs << 4) + ip) & 0xFFFFF
+        self.ret_cs = ret_cs
+        self.ret_ip = ret_ip
+        self.sp = sp
+        self.step = step
+        self.kind = kind
+        self.child = 0    # instructions spent in callees so far
+
+    def copy(self):
+        f = Frame(self.cs, self.ip, self.ret_cs, self.ret_ip, self.sp, self.step, self.kind)
+        f.child = self.child
+        return f
+
+
+class CallStack:
+    """Maintained by run_fast(calls=self); see the module docstring.
+
+    names: callable(phys) -> str used by name()/format_backtrace()
+    trace: callable(event, frame, depth, step) called on every 'call' and
+           'ret' event (depth counts the frames below this one)
+    """
+
+    def __init__(self, names=None, trace=None):
+        self.frames = []
+        self.stats = {}      # entry phys -> [calls, inclusive, exclusive]
+        self.names = names
+        self.trace = trace
+        self.origin = 0      # absolute step of run_fast's i == 0 (set by the caller)
+        self.now = 0         # run_fast's i for the current instruction
+        self.dispatch = traced_dispatch(self)
+
+    # -- events (called from the traced dispatch table) ----------------------
+
+    def enter(self, cpu, mem, kind):
+        """A call has just executed: CS:IP is the callee, SS:SP the return slot."""
+        segs = cpu.segs
+        sp = ((segs[2] << 4) + cpu.regs[4]) & 0xFFFFF
+        ret_ip = mem.data[sp] | (mem.data[sp + 1] << 8)
+        ret_cs = segs[1] if kind == CALL else mem.data[sp + 2] | (mem.data[sp + 3] << 8)
+        step = self.origin + self.now + 1
+        frame = Frame(segs[1], cpu.ip, ret_cs, ret_ip, sp, step, kind)
+        self.frames.append(frame)
+        if self.trace is not None:
+            self.trace('call', frame, len(self.frames) - 1, step)
+
+    def leave(self, cpu):
+        """A return has just executed: pop every frame whose slot is now below SS:SP."""
+        sp = ((cpu.segs[2] << 4) + cpu.regs[4]) & 0xFFFFF
+        frames = self.frames
+        if not frames or frames[-1].sp >= sp:
+            return
+        step = self.origin + self.now + 1
+        stats = self.stats
+        while frames and frames[-1].sp < sp:
+            frame = frames.pop()
+            incl = step - frame.step
+            if frames:
+                frames[-1].child += incl
+            s = stats.get(frame.entry)
+            if s is None:
+                s = stats[frame.entry] = [0, 0, 0]
+            s[0] += 1
+            s[1] += incl
+            s[2] += incl - frame.child
+            if self.trace is not None:
+                self.trace('ret', frame, len(frames), step)
+
+    # -- queries ---------------------------------------------------------------
+
+    def name(self, phys):
+        if self.names is not None:
+            name = self.names(phys)
+            if name:
+                return name
+        return f'phys 0x{phys:05X}'
+
+    def backtrace(self):
+        """Active frames, innermost first."""
+        return self.frames[::-1]
+
+    def format_backtrace(self, cpu=None, limit=20):
+        """Lines '#N  name  (SEG:OFF, kind, entry step, return CS:IP)',
+        innermost first, at most limit frames; with cpu, a first line for
+        the current CS:IP."""
+        lines = []
+        if cpu is not None:
+            phys = ((cpu.segs[1] << 4) + cpu.ip) & 0xFFFFF
+            lines.append(f'  at  {self.name(phys)}  ({cpu.segs[1]:04X}:{cpu.ip:04X})')
+        frames = self.backtrace()
+        for n, f in enumerate(frames[:limit]):
+            lines.append(f'  #{n:<2d} {self.name(f.entry)}  ({f.cs:04X}:{f.ip:04X}, {f.kind}, '
+                         f'step {f.step}, returns to {f.ret_cs:04X}:{f.ret_ip:04X})')
+        if len(frames) > limit:
+            lines.append(f'  ... {len(frames) - limit} more (outermost: {self.name(frames[-1].entry)})')
+        return lines
+
+    def top(self, n=20, key='exclusive'):
+        """[(entry phys, [calls, inclusive, exclusive])] sorted by key, largest first."""
+        col = {'calls': 0, 'inclusive': 1, 'exclusive': 2}[key]
+        return sorted(self.stats.items(), key=lambda kv: -kv[1][col])[:n]
+
+    # -- state (for checkpoints) -------------------------------------------------
+
+    def save(self):
+        return [f.copy() for f in self.frames]
+
+    def load(self, frames):
+        self.frames = [f.copy() for f in frames]
+
+    def reset(self):
+        self.frames = []
+
+
+def traced_dispatch(calls):
+    """_DISPATCH with the call/return handlers wrapped to report to calls."""
+    table = list(_DISPATCH)
+
+    def wrap_call(handler, kind):
+        def h(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
+            length = handler(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler)
+            calls.enter(cpu, mem, kind)
+            return length
+        return h
+
+    def wrap_ret(handler):
+        def h(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
+            length = handler(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler)
+            calls.leave(cpu)
+            return length
+        return h
+
+    def wrap_int(handler):
+        # Only INTs that went through the IVT (not handled in Python, not FPU)
+        def h(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
+            sp = cpu.regs[4]
+            length = handler(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler)
+            if cpu.regs[4] == (sp - 6) & 0xFFFF:
+                calls.enter(cpu, mem, INT)
+            return length
+        return h
+
+    def wrap_grp5(handler):
+        call_kinds = {2: CALL, 3: FAR}
+
+        def h(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
+            length = handler(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler)
+            kind = call_kinds.get((mem.data[ip_phys + 1] >> 3) & 7)
+            if kind is not None:
+                calls.enter(cpu, mem, kind)
+            return length
+        return h
+
+    table[0xE8] = wrap_call(table[0xE8], CALL)
+    table[0x9A] = wrap_call(table[0x9A], FAR)
+    table[0xFF] = wrap_grp5(table[0xFF])
+    table[0xCD] = wrap_int(table[0xCD])
+    for op in (0xC3, 0xC2, 0xCB, 0xCA, 0xCF):
+        table[op] = wrap_ret(table[op])
+    return tuple(table)
@@ -0,0 +1,126 @@
+"""Code coverage for run_fast: which instruction addresses have executed.
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    cov = emu.enable_coverage()
+    emu.run(max_steps=50_000_000)
+    cov.save('/tmp/menu.cov')
+
+run_fast(coverage=cov.map) sets map[ip_phys] = 1 before each instruction:
+one byte per address of the 1 MB space, so the hot loop does a single
+bytearray store. Only instruction starts are marked; the tools recover
+instruction extents by decoding (disasm/coverage_map.py).
+
+Files store the map as a zlib-compressed bitset together with the image
+layout and the function entry points seen by a shadow call stack, if one
+was on (emu.callstack). Files from many runs merge by OR-ing the maps.
+
+    header   8s magic "EMUCOV\\0\\0", u16 version, u16 reserved,
+             u32 image_base, u32 header_size, u32 entry count   (24 bytes)
+    entries  u32 phys per entry point
+    bits     zlib(bitset), bit n = byte n >> 3 bit n & 7
+"""
+
+import struct
+import zlib
+
+MAGIC = b'EMUCOV\0\0'
+VERSION = 1
+SPACE = 1 << 20
+
+HEADER = struct.Struct('<8sHHIII')
+
+
+def _pack_bits(bytemap):
+    bits = bytearray(len(bytemap) >> 3)
+    find = bytemap.find
+    n = find(1)
+    while n >= 0:
+        bits[n >> 3] |= 1 << (n & 7)
+        n = find(1, n + 1)
+    return bits
+
+
+def _unpack_bits(bits):
+    bytemap = bytearray(len(bits) << 3)
+    for i, byte in enumerate(bits):
+        if byte:
+            base = i << 3
+            for b in range(8):
+                if byte >> b & 1:
+                    bytemap[base + b] = 1
+    return bytemap
+
+
+class Coverage:
+    """Executed-address map plus function entry points (phys addresses)."""
+
+    def __init__(self, image_base=0, header_size=0):
+        self.map = bytearray(SPACE)
+        self.entries = set()
+        self.image_base = image_base
+        self.header_size = header_size
+
+    def __contains__(self, phys):
+        return 0 <= phys < SPACE and self.map[phys] != 0
+
+    def addresses(self, start=0, end=SPACE):
+        """Executed phys addresses in [start, end), ascending."""
+        find = self.map.find
+        n = find(1, start, end)
+        while n >= 0:
+            yield n
+            n = find(1, n + 1, end)
+
+    def count(self):
+        return self.map.count(1)
+
+    def add_calls(self, calls):
+        """Record the entry points a CallStack has seen (finished and active)."""
+        self.entries.update(calls.stats)
+        self.entries.update(f.entry for f in calls.frames)
+
+    def merge(self, other):
+        """OR other's map and entries into this one."""
+        if (other.image_base, other.header_size) != (self.image_base, self.header_size):
+            raise ValueError("coverage maps come from different image layouts")
+        merged = int.from_bytes(self.map, 'little') | int.from_bytes(other.map, 'little')
+        self.map[:] = merged.to_bytes(SPACE, 'little')
+        self.entries |= other.entries
+        return self
+
+    def file_offset(self, phys):
+        return phys - self.image_base + self.header_size
+
+    def phys(self, file_off):
+        return file_off - self.header_size + self.image_base
+
+    # -- persistence -------------------------------------------------------------
+
+    def save(self, path):
+        entries = sorted(self.entries)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, self.image_base, self.header_size,
+                                len(entries)))
+            f.write(struct.pack(f'<{len(entries)}I', *entries))
+            f.write(zlib.compress(bytes(_pack_bits(self.map)), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            blob = f.read()
+        if len(blob) < HEADER.size:
+            raise ValueError(f"{path}: not a coverage file")
+        magic, version, _reserved, image_base, header_size, n = HEADER.unpack_from(blob, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a coverage file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unknown coverage version {version}")
+        cov = cls(image_base, header_size)
+        pos = HEADER.size
+        cov.entries = set(struct.unpack_from(f'<{n}I', blob, pos))
+        bits = zlib.decompress(blob[pos + 4 * n:])
+        if len(bits) != SPACE >> 3:
+            raise ValueError(f"{path}: bitset is {len(bits)} bytes, expected {SPACE >> 3}")
+        cov.map = _unpack_bits(bits)
+        return cov
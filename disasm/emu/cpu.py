@@ -1,12 +1,15 @@
 """CPU state: 16-bit registers, segment registers, flags, FPU stack."""
 
+from .fpu import FLOAT
+
 # Parity lookup table: 1 if even number of set bits in low byte
 _PARITY_TABLE = bytes(((bin(i).count('1') & 1) ^ 1) for i in range(256))
 
 
 class CPU:
     __slots__ = ('regs', 'segs', 'ip', 'cf', 'zf', 'sf', 'of', 'pf', 'af', 'df',
-                 'intf', 'tf', 'fpu_stack', 'fpu_top', 'fpu_sw', 'fpu_cw', 'halted')
+                 'intf', 'tf', 'fpu_stack', 'fpu_top', 'fpu_sw', 'fpu_cw', 'fpu',
+                 'halted')
 
     def __init__(self):
         # General-purpose (index matches R16 table: AX=0 CX=1 DX=2 BX=3 SP=4 BP=5 SI=6 DI=7)
@@ -31,6 +34,7 @@ class CPU:
         self.fpu_top = 0
         self.fpu_sw = 0  # status word
         self.fpu_cw = 0x037F  # control word (round-to-nearest, all masked)
+        self.fpu = FLOAT      # backend for stack values (fpu.get_backend)
 
         # Halted flag
         self.halted = False
@@ -195,7 +199,7 @@ class CPU:
 
     def fpu_pop(self):
         val = self.fpu_stack[self.fpu_top]
-        self.fpu_stack[self.fpu_top] = 0.0
+        self.fpu_stack[self.fpu_top] = self.fpu.zero
         self.fpu_top = (self.fpu_top + 1) & 7
         return val
 
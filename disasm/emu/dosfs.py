@@ -0,0 +1,215 @@
+"""DOS file layer for InterruptHandler: the game's flat directory (earth/).
+
+    from emu.session import Emulator
+    from emu.dosfs import DosFS
+    emu = Emulator('earth/SCORCH.EXE', dosfs='overlay')        # writes stay in memory
+    emu = Emulator('earth/SCORCH.EXE', dosfs=DosFS('earth', 'mmap', preload=True))
+    emu.run(max_steps=50_000_000)
+    emu.ints.fs.overlay                                         # name -> bytearray written
+
+Modes:
+    disk     real files, as DOS would see them (the default)
+    overlay  files are read into memory on first open (all at once with
+             preload=True); creates and writes go to an in-memory overlay
+    mmap     like overlay, but unmodified files are read-only mmaps
+
+In overlay and mmap modes nothing is written to disk, so parallel workers
+can share one directory and every run starts from the same files. Reads
+return memoryview slices of the cached contents, which Memory.load_bytes
+copies straight into Memory.data.
+
+Names are matched case-insensitively by their base name; drive letters
+and directories are ignored (the game only uses its own directory).
+"""
+
+import fnmatch
+import io
+import mmap
+import os
+
+MODES = ('disk', 'overlay', 'mmap')
+
+
+def base_name(dos_path):
+    """Base name of a DOS path, drive and directories stripped."""
+    if len(dos_path) >= 2 and dos_path[1] == ':':
+        dos_path = dos_path[2:]
+    return os.path.basename(dos_path.replace('\\', '/'))
+
+
+def dos_name(dos_path):
+    """Upper-case base name of a DOS path ('C:\\GAMES\\scorch.cfg' -> 'SCORCH.CFG')."""
+    return base_name(dos_path).upper()
+
+
+def dos_match(name, pattern):
+    """DOS wildcard match: base name and extension are matched separately,
+    so '*.*' also matches names without an extension."""
+    base, _, ext = name.partition('.')
+    pbase, _, pext = pattern.partition('.')
+    return fnmatch.fnmatchcase(base, pbase or '*') and fnmatch.fnmatchcase(ext, pext or '')
+
+
+class VFile:
+    """Open handle on an in-memory file (bytes, bytearray or mmap)."""
+
+    def __init__(self, name, buf, writable):
+        self.name = name
+        self.buf = buf
+        self.writable = writable
+        self.mode = 'r+b' if writable else 'rb'
+        self.pos = 0
+        self.closed = False
+
+    def read(self, n):
+        p = self.pos
+        end = min(p + n, len(self.buf))
+        if end <= p:
+            return b''
+        self.pos = end
+        return memoryview(self.buf)[p:end]
+
+    def write(self, data):
+        if not self.writable:
+            raise io.UnsupportedOperation(f"{self.name}: not open for writing")
+        buf, p = self.buf, self.pos
+        if p > len(buf):
+            buf.extend(bytes(p - len(buf)))
+        buf[p:p + len(data)] = data
+        self.pos = p + len(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.buf)
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        self.closed = True
+
+    def reopen(self):
+        """The same handle, usable again (replay restores closed handles)."""
+        self.closed = False
+        return self
+
+
+class DosFS:
+    """Name lookup, open/create and directory search over root (see module docstring)."""
+
+    def __init__(self, root, mode='disk', preload=False, _base=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown DOS filesystem mode {mode!r} (expected one of {MODES})")
+        self.root = root
+        self.mode = mode
+        self.preload = preload
+        self.overlay = {}                              # NAME -> bytearray (overlay/mmap)
+        self._base = {} if _base is None else _base    # NAME -> bytes/mmap, shared by forks
+        self._index = None                             # NAME -> (disk name, size)
+        if preload and mode != 'disk':
+            for name in self._listing():
+                self._load(name)
+
+    def fork(self):
+        """A DosFS on the same directory and cache, with an empty overlay."""
+        return DosFS(self.root, self.mode, False, self._base)
+
+    # -- directory ------------------------------------------------------------------
+
+    def _listing(self):
+        if self._index is None:
+            index = {}
+            try:
+                names = os.listdir(self.root or '.')
+            except OSError:
+                names = []
+            for fname in names:
+                path = os.path.join(self.root, fname)
+                if os.path.isfile(path):
+                    index[fname.upper()] = (fname, os.path.getsize(path))
+            self._index = index
+        return self._index
+
+    def _path(self, name, dos_path=''):
+        """Disk path for NAME: the existing file in any case, else dos_path's spelling."""
+        hit = self._listing().get(name)
+        return os.path.join(self.root, hit[0] if hit else base_name(dos_path) or name)
+
+    def _load(self, name):
+        """Cached contents of the disk file NAME (bytes or mmap)."""
+        buf = self._base.get(name)
+        if buf is None:
+            with open(self._path(name), 'rb') as f:
+                if self.mode == 'mmap' and self._listing()[name][1] > 0:
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    buf = f.read()
+            self._base[name] = buf
+        return buf
+
+    def exists(self, dos_path):
+        name = dos_name(dos_path)
+        return name in self.overlay or name in self._listing()
+
+    def find(self, pattern):
+        """[(NAME, size)] matching a DOS wildcard pattern, sorted by name."""
+        pattern = dos_name(pattern)
+        found = {name: size for name, (_f, size) in self._listing().items()}
+        for name, buf in self.overlay.items():
+            found[name] = len(buf)
+        return sorted((name, size) for name, size in found.items() if dos_match(name, pattern))
+
+    # -- open/create ------------------------------------------------------------------
+
+    def open(self, dos_path, access=0):
+        """File object for INT 21h/3Dh; access is AL & 3 (0 read, 1 write, 2 both).
+        Raises FileNotFoundError like open()."""
+        name = dos_name(dos_path)
+        writable = (access & 3) != 0
+        if self.mode == 'disk':
+            return open(self._path(name, dos_path), 'r+b' if writable else 'rb')
+        buf = self.overlay.get(name)
+        if buf is None:
+            if name not in self._listing():
+                raise FileNotFoundError(2, 'No such file', dos_path)
+            buf = self._load(name)
+            if writable:
+                buf = self.overlay[name] = bytearray(buf)
+        return VFile(name, buf, writable)
+
+    def create(self, dos_path):
+        """File object for INT 21h/3Ch: truncated or new, open for read/write."""
+        name = dos_name(dos_path)
+        if self.mode == 'disk':
+            f = open(self._path(name, dos_path), 'w+b')
+            self._index = None
+            return f
+        buf = self.overlay[name] = bytearray()
+        return VFile(name, buf, True)
+
+    def closed(self, f):
+        """Called after a handle is closed: disk sizes may have changed."""
+        if self.mode == 'disk' and getattr(f, 'mode', 'rb') != 'rb':
+            self._index = None
+
+    # -- state (for checkpoints) ------------------------------------------------------
+
+    def snapshot(self):
+        return {name: bytes(buf) for name, buf in self.overlay.items()}
+
+    def restore(self, snap):
+        """Overlay contents as of snapshot(); open handles keep their buffers."""
+        for name in list(self.overlay):
+            if name not in snap:
+                del self.overlay[name]
+        for name, data in snap.items():
+            buf = self.overlay.get(name)
+            if buf is None:
+                self.overlay[name] = bytearray(data)
+            else:
+                buf[:] = data
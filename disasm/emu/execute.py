@@ -35,8 +35,9 @@ _SEG_PUSH_TABLE = {0x06: 0, 0x0E: 1, 0x16: 2, 0x1E: 3}
 _SEG_POP_TABLE = {0x07: 0, 0x17: 2, 0x1F: 3}
 
 
-def step(cpu, mem, ports, int_handler, hooks=None, trace=False):
-    """Execute one instruction. Returns number of bytes consumed."""
+def step(cpu, mem, ports, int_handler, hooks=None, trace=False, calls=None):
+    """Execute one instruction. Returns number of bytes consumed.
+    calls: CallStack to maintain (the caller sets calls.now)."""
     segs = cpu.segs
     data = mem.data
     ip_phys = ((segs[1] << 4) + cpu.ip) & 0xFFFFF
@@ -61,7 +62,7 @@ def step(cpu, mem, ports, int_handler, hooks=None, trace=False):
     save_ip = cpu.ip
     cpu.ip = (cpu.ip + pfx_len) & 0xFFFF
 
-    handler = _DISPATCH[b]
+    handler = (_DISPATCH if calls is None else calls.dispatch)[b]
     if handler is None:
         raise RuntimeError(f"Unhandled opcode 0x{b:02X} at "
                            f"CS:IP={segs[1]:04X}:{cpu.ip:04X}")
@@ -73,21 +74,66 @@ def step(cpu, mem, ports, int_handler, hooks=None, trace=False):
     return total
 
 
+def probe_map(*tables):
+    """1MB bytearray with a 1 at every physical address keyed in tables."""
+    pmap = bytearray(1 << 20)
+    for table in tables:
+        for phys in table or ():
+            pmap[phys & 0xFFFFF] = 1
+    return pmap
+
+
+def timer_after(counter, period, n):
+    """run_fast's timer counter after n loop iterations starting from counter."""
+    if not period:
+        return counter
+    if n <= counter:
+        return counter - n
+    return period - 1 - (n - max(counter, 0) - 1) % period
+
+
 def run_fast(cpu, mem, ports, int_handler, max_steps, hooks=None, bp_set=None,
-             timer_period=0, scheduled_keys=None):
+             timer_period=0, scheduled_keys=None, stops=None, timer_phase=None, calls=None,
+             tracer=None, coverage=None, frames=None, vga_log=None, probes=None):
     """Tight execution loop — merges step+dispatch to avoid function call overhead.
 
     timer_period: if >0, fire INT 08h every N instructions (simulates hardware timer).
+    timer_phase: initial timer counter (default timer_period); pass timer_after()
+                 of the previous call to keep IRQ timing independent of how a
+                 run is split into calls.
     scheduled_keys: dict of step_number → (scancode, ascii) for key injection.
+    stops: dict of phys → predicate(cpu, mem); stop ('breakpoint') when it returns
+           true. Used for conditional breakpoints, hit/ignore counts and tracepoints.
+    calls: a callstack.CallStack to maintain (runs its traced dispatch table).
+    tracer: fn(i, cpu) called before each instruction (after hooks and the
+            breakpoint checks), e.g. tracefile.TraceWriter.recorder().
+    coverage: a 1 MB bytearray; coverage[ip_phys] is set to 1 before each
+              instruction, like tracer (see emu.coverage).
+    frames: a frames.FrameClock; events it has pending are committed before
+            the next instruction, returning ('frame', i) when it asks to stop.
+    vga_log: a vgalog.VgaLog; its step counter is kept current for PortIO.
+
+    probes: probe_map() of hooks, bp_set and stops (it may cover more
+            addresses), for callers that keep one across calls; built here
+            when None.
+
+    Hooks, bp_set and stops share one probe map indexed by ip_phys, so an
+    uninstrumented instruction pays a single bytearray lookup (none at all
+    when nothing is instrumented).
     """
     segs = cpu.segs
     data = mem.data
-    dispatch = _DISPATCH
+    dispatch = _DISPATCH if calls is None else calls.dispatch
     seg_pfx = _SEG_PFX
     seg_pfx_set = _SEG_PFX_SET
-    has_hooks = hooks is not None and len(hooks) > 0
-    has_bp = bp_set is not None and len(bp_set) > 0
-    timer_counter = timer_period
+    hooks = {} if hooks is None else hooks    # the caller may add to it mid-run
+    bp_set = bp_set or ()
+    stops = stops or {}
+    has_probes = bool(hooks or bp_set or stops or calls is not None or tracer is not None
+                      or coverage is not None or frames is not None or vga_log is not None)
+    if has_probes and probes is None:
+        probes = probe_map(hooks, bp_set, stops)
+    timer_counter = timer_period if timer_phase is None else timer_phase
     has_sched_keys = scheduled_keys is not None and len(scheduled_keys) > 0
 
     i = 0
@@ -122,6 +168,9 @@ def run_fast(cpu, mem, ports, int_handler, max_steps, hooks=None, bp_set=None,
                         _push16(cpu, mem, cpu.ip)
                         segs[1] = vec_seg
                         cpu.ip = vec_off
+                        if calls is not None:
+                            calls.now = i - 1
+                            calls.enter(cpu, mem, 'irq')
             timer_counter -= 1
 
             # Scheduled key injection: trigger INT 9 (hardware keyboard IRQ)
@@ -139,8 +188,10 @@ def run_fast(cpu, mem, ports, int_handler, max_steps, hooks=None, bp_set=None,
                 else:
                     mem.data[0x417] = 0x00
                 # Also push to INT 21h key queue (Fastgraph fg_intkey
-                # falls back to INT 21h AH=07/0Bh when DS:C960 is empty)
-                int_handler.push_key(sc, asc)
+                # falls back to INT 21h AH=07/0Bh when DS:C960 is empty).
+                # Break codes only go to port 0x60, as with the BIOS.
+                if not sc & 0x80:
+                    int_handler.push_key(sc, asc)
                 # Trigger INT 9 if interrupts enabled
                 if cpu.intf:
                     vec_off = mem.read16(0x09 * 4)
@@ -151,14 +202,32 @@ def run_fast(cpu, mem, ports, int_handler, max_steps, hooks=None, bp_set=None,
                         _push16(cpu, mem, cpu.ip)
                         segs[1] = vec_seg
                         cpu.ip = vec_off
+                        if calls is not None:
+                            calls.now = i - 1
+                            calls.enter(cpu, mem, 'irq')
 
             ip_phys = ((segs[1] << 4) + cpu.ip) & 0xFFFFF
 
-            if has_hooks and ip_phys in hooks:
-                hooks[ip_phys](cpu, mem)
-
-            if has_bp and ip_phys in bp_set:
-                return 'breakpoint', i
+            if has_probes:
+                if frames is not None and frames.pending and frames.commit(i):
+                    return 'frame', i
+                if calls is not None:
+                    calls.now = i
+                if vga_log is not None:
+                    vga_log.now = i
+                if probes[ip_phys]:
+                    if ip_phys in hooks:
+                        hooks[ip_phys](cpu, mem)
+                    if ip_phys in bp_set:
+                        return 'breakpoint', i
+                    if ip_phys in stops and stops[ip_phys](cpu, mem):
+                        return 'breakpoint', i
+                # After the stop checks: an instruction stopped at is
+                # recorded once, by the call that executes it.
+                if tracer is not None:
+                    tracer(i, cpu)
+                if coverage is not None:
+                    coverage[ip_phys] = 1
 
             seg_override = None
             rep_mode = 0
@@ -586,36 +655,40 @@ def _h_iret(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
 
 # ---- I/O ------------------------------------------------------------------
 
+# IN and 8-bit OUT index PortIO's handler lists directly (see
+# PortIO._build_tables); 16-bit OUT goes through port_out16 for the VGA
+# index/data pairs.
+
 def _h_in_imm8(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    cpu.set_reg8(0, ports.port_in(mem.data[ip_phys + 1]))
+    cpu.set_reg8(0, ports.in_handlers[mem.data[ip_phys + 1]]())
     return 2
 
 def _h_in_imm16(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    cpu.regs[0] = ports.port_in(mem.data[ip_phys + 1]) & 0xFFFF
+    cpu.regs[0] = ports.in_handlers[mem.data[ip_phys + 1]]() & 0xFFFF
     return 2
 
 def _h_out_imm8(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    ports.port_out(mem.data[ip_phys + 1], cpu.get_reg8(0))
+    ports.out_handlers[mem.data[ip_phys + 1]](cpu.regs[0] & 0xFF)
     return 2
 
 def _h_out_imm16(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    ports.port_out(mem.data[ip_phys + 1], cpu.regs[0])
+    ports.port_out16(mem.data[ip_phys + 1], cpu.regs[0])
     return 2
 
 def _h_in_dx8(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    cpu.set_reg8(0, ports.port_in(cpu.regs[2]))
+    cpu.set_reg8(0, ports.in_handlers[cpu.regs[2]]())
     return 1
 
 def _h_in_dx16(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    cpu.regs[0] = ports.port_in(cpu.regs[2]) & 0xFFFF
+    cpu.regs[0] = ports.in_handlers[cpu.regs[2]]() & 0xFFFF
     return 1
 
 def _h_out_dx8(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    ports.port_out(cpu.regs[2], cpu.get_reg8(0))
+    ports.out_handlers[cpu.regs[2]](cpu.regs[0] & 0xFF)
     return 1
 
 def _h_out_dx16(op, cpu, mem, ip_phys, seg_override, rep_mode, ports, int_handler):
-    ports.port_out(cpu.regs[2], cpu.regs[0])
+    ports.port_out16(cpu.regs[2], cpu.regs[0])
     return 1
 
 
@@ -3,6 +3,14 @@
 Handles both native ESC opcodes (D8-DF) and Borland INT 34h-3Dh sequences.
 Uses instruction_set_x86._decode_fpu_int() for Borland sequences and
 _fpu_op() to identify the operation, then executes on the CPU's FPU stack.
+
+Stack values and the arithmetic on them belong to the FPU backend in
+cpu.fpu, chosen per run (see get_backend):
+
+    float   FloatFPU: Python floats (float64); the control word's rounding
+            and precision fields are ignored. Fast; the default.
+    exact   fpu_exact.ExactFPU: 80-bit extended values with integer
+            arithmetic, rounded as the control word says. Bit-exact.
 """
 
 import math
@@ -53,35 +61,138 @@ def exec_fpu_native(op, cpu, mem, seg_override):
     return 1 + ml
 
 
-def _read_mem_float(mem, cpu, mod, rm, disp, seg_override, size):
-    """Read float from memory. size: 32 or 64."""
+
+
+# -- backends ---------------------------------------------------------------
+
+# Condition codes for compare(): C3/C2/C0 in the status word
+CMP_GT, CMP_LT, CMP_EQ, CMP_UN = 0x0000, 0x0100, 0x4000, 0x4500
+
+# arith() ops, indexed like the reg field of D8/DC/DA/DE memory forms
+OP_ADD, OP_MUL, OP_SUB, OP_SUBR, OP_DIV, OP_DIVR = 0, 1, 4, 5, 6, 7
+
+# Register forms of DC/DE compute ST(i) = ST(i) op ST(0), with the
+# reversed meaning of sub/div: reg -> arith op
+_REV = {0: OP_ADD, 1: OP_MUL, 4: OP_SUBR, 5: OP_SUB, 6: OP_DIVR, 7: OP_DIV}
+
+_FLOAT_OPS = [lambda a, b: a+b, lambda a, b: a*b, None, None,
+              lambda a, b: a-b, lambda a, b: b-a, lambda a, b: a/b, lambda a, b: b/a]
+
+_FLOAT_CONSTS = {
+    'one': 1.0, 'zero': 0.0, 'pi': math.pi,
+    'l2t': math.log2(10), 'l2e': math.log2(math.e),
+    'lg2': math.log10(2), 'ln2': math.log(2),
+}
+
+
+class FloatFPU:
+    """Stack values are Python floats; the control word is not honoured
+    (FIST rounds to nearest, results are float64)."""
+
+    name = 'float'
+    zero = 0.0
+
+    def load_real(self, mem, phys, size):
+        if size == 32:
+            return mem.read_float32(phys)
+        if size == 64:
+            return mem.read_float64(phys)
+        return _decode_float80(mem.read_bytes(phys, 10))
+
+    def store_real(self, cpu, mem, phys, size, val):
+        if size == 32:
+            mem.write_float32(phys, val)
+        elif size == 64:
+            mem.write_float64(phys, val)
+        else:
+            mem.load_bytes(phys, _encode_float80(val))
+
+    def load_int(self, ival):
+        return float(ival)
+
+    def store_int(self, cpu, val, bits):
+        return int(round(val))
+
+    def arith(self, cpu, op, a, b):
+        return _FLOAT_OPS[op](a, b)
+
+    def compare(self, a, b):
+        if math.isnan(a) or math.isnan(b):
+            return CMP_UN
+        if a > b:
+            return CMP_GT
+        if a < b:
+            return CMP_LT
+        return CMP_EQ
+
+    def const(self, name):
+        return _FLOAT_CONSTS[name]
+
+    def neg(self, val):
+        return -val
+
+    def abs(self, val):
+        return abs(val)
+
+    def sqrt(self, cpu, val):
+        return math.sqrt(val)
+
+    def rndint(self, cpu, val):
+        return float(round(val))
+
+    def scale(self, cpu, a, b):
+        return a * (2.0 ** int(b))
+
+    def to_float(self, val):
+        return val
+
+    def from_float(self, cpu, x):
+        return x
+
+
+FLOAT = FloatFPU()
+_backends = {'float': FLOAT}
+
+
+def get_backend(name='float'):
+    """FPU backend by name: 'float' or 'exact' (imported on first use)."""
+    if name not in _backends:
+        if name != 'exact':
+            raise ValueError(f"unknown FPU backend: {name!r} (float, exact)")
+        from .fpu_exact import ExactFPU
+        _backends[name] = ExactFPU()
+    return _backends[name]
+
+
+# -- execution --------------------------------------------------------------
+
+def _read_mem_real(mem, cpu, mod, rm, disp, seg_override, size):
+    """Read a real from memory. size: 32, 64 or 80."""
     phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-    if size == 32:
-        return mem.read_float32(phys)
-    return mem.read_float64(phys)
+    return cpu.fpu.load_real(mem, phys, size)
 
 
 def _read_mem_int(mem, cpu, mod, rm, disp, seg_override, size):
-    """Read integer from memory. size: 16 or 32."""
+    """Read integer from memory. size: 16, 32 or 64."""
     phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
     if size == 16:
         v = mem.read16(phys)
         return v if v < 0x8000 else v - 0x10000
-    v = mem.read32(phys)
-    return v if v < 0x80000000 else v - 0x100000000
+    if size == 32:
+        v = mem.read32(phys)
+        return v if v < 0x80000000 else v - 0x100000000
+    v = mem.read32(phys) | (mem.read32(phys + 4) << 32)
+    return v if v < (1 << 63) else v - (1 << 64)
 
 
-def _write_mem_float(mem, cpu, mod, rm, disp, seg_override, size, val):
+def _write_mem_real(mem, cpu, mod, rm, disp, seg_override, size, val):
     phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-    if size == 32:
-        mem.write_float32(phys, val)
-    else:
-        mem.write_float64(phys, val)
+    cpu.fpu.store_real(cpu, mem, phys, size, val)
 
 
 def _write_mem_int(mem, cpu, mod, rm, disp, seg_override, size, val):
     phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-    ival = int(round(val))
+    ival = cpu.fpu.store_int(cpu, val, size)
     if size == 16:
         mem.write16(phys, ival & 0xFFFF)
     elif size == 32:
@@ -94,18 +205,22 @@ def _write_mem_int(mem, cpu, mod, rm, disp, seg_override, size, val):
 
 def _fpu_compare(cpu, a, b):
     """Set FPU status word condition codes for comparison a vs b."""
-    if math.isnan(a) or math.isnan(b):
-        cpu.fpu_sw = (cpu.fpu_sw & 0x38FF) | 0x4500  # C0=C2=C3=1 (unordered)
-    elif a > b:
-        cpu.fpu_sw = (cpu.fpu_sw & 0x38FF)  # C0=C2=C3=0
-    elif a < b:
-        cpu.fpu_sw = (cpu.fpu_sw & 0x38FF) | 0x0100  # C0=1
-    else:
-        cpu.fpu_sw = (cpu.fpu_sw & 0x38FF) | 0x4000  # C3=1 (equal)
+    cpu.fpu_sw = (cpu.fpu_sw & 0x38FF) | cpu.fpu.compare(a, b)
+
+
+def _transcendental(cpu, fn, *args):
+    """fn over float64 operands, the result converted back (not bit-exact)."""
+    fp = cpu.fpu
+    return fp.from_float(cpu, fn(*(fp.to_float(a) for a in args)))
+
+
+_D9_CONSTS = {0xE8: 'one', 0xE9: 'l2t', 0xEA: 'l2e', 0xEB: 'pi',
+              0xEC: 'lg2', 0xED: 'ln2', 0xEE: 'zero'}
 
 
 def _exec_d9_reg(cpu, modrm_byte):
     """Execute D9 register-only forms (mod=3)."""
+    fp = cpu.fpu
     rm = modrm_byte & 7
     if 0xC0 <= modrm_byte <= 0xC7:  # FLD ST(i)
         cpu.fpu_push(cpu.fpu_st(rm))
@@ -116,76 +231,67 @@ def _exec_d9_reg(cpu, modrm_byte):
     elif modrm_byte == 0xD0:  # FNOP
         pass
     elif modrm_byte == 0xE0:  # FCHS
-        cpu.fpu_set_st(0, -cpu.fpu_st(0))
+        cpu.fpu_set_st(0, fp.neg(cpu.fpu_st(0)))
     elif modrm_byte == 0xE1:  # FABS
-        cpu.fpu_set_st(0, abs(cpu.fpu_st(0)))
+        cpu.fpu_set_st(0, fp.abs(cpu.fpu_st(0)))
     elif modrm_byte == 0xE4:  # FTST
-        _fpu_compare(cpu, cpu.fpu_st(0), 0.0)
-    elif modrm_byte == 0xE8:  # FLD1
-        cpu.fpu_push(1.0)
-    elif modrm_byte == 0xE9:  # FLDL2T
-        cpu.fpu_push(math.log2(10))
-    elif modrm_byte == 0xEA:  # FLDL2E
-        cpu.fpu_push(math.log2(math.e))
-    elif modrm_byte == 0xEB:  # FLDPI
-        cpu.fpu_push(math.pi)
-    elif modrm_byte == 0xEC:  # FLDLG2
-        cpu.fpu_push(math.log10(2))
-    elif modrm_byte == 0xED:  # FLDLN2
-        cpu.fpu_push(math.log(2))
-    elif modrm_byte == 0xEE:  # FLDZ
-        cpu.fpu_push(0.0)
+        _fpu_compare(cpu, cpu.fpu_st(0), fp.zero)
+    elif modrm_byte in _D9_CONSTS:  # FLD1 FLDL2T FLDL2E FLDPI FLDLG2 FLDLN2 FLDZ
+        cpu.fpu_push(fp.const(_D9_CONSTS[modrm_byte]))
     elif modrm_byte == 0xF0:  # F2XM1
-        cpu.fpu_set_st(0, 2.0 ** cpu.fpu_st(0) - 1.0)
+        cpu.fpu_set_st(0, _transcendental(cpu, lambda x: 2.0 ** x - 1.0, cpu.fpu_st(0)))
     elif modrm_byte == 0xF1:  # FYL2X
-        val = cpu.fpu_st(1) * math.log2(cpu.fpu_st(0))
+        val = _transcendental(cpu, lambda y, x: y * math.log2(x), cpu.fpu_st(1), cpu.fpu_st(0))
         cpu.fpu_pop()
         cpu.fpu_set_st(0, val)
     elif modrm_byte == 0xF2:  # FPTAN
-        cpu.fpu_set_st(0, math.tan(cpu.fpu_st(0)))
-        cpu.fpu_push(1.0)
+        cpu.fpu_set_st(0, _transcendental(cpu, math.tan, cpu.fpu_st(0)))
+        cpu.fpu_push(fp.const('one'))
     elif modrm_byte == 0xF3:  # FPATAN
-        val = math.atan2(cpu.fpu_st(1), cpu.fpu_st(0))
+        val = _transcendental(cpu, math.atan2, cpu.fpu_st(1), cpu.fpu_st(0))
         cpu.fpu_pop()
         cpu.fpu_set_st(0, val)
     elif modrm_byte == 0xFA:  # FSQRT
-        cpu.fpu_set_st(0, math.sqrt(cpu.fpu_st(0)))
+        cpu.fpu_set_st(0, fp.sqrt(cpu, cpu.fpu_st(0)))
     elif modrm_byte == 0xFB:  # FSINCOS
         v = cpu.fpu_st(0)
-        cpu.fpu_set_st(0, math.sin(v))
-        cpu.fpu_push(math.cos(v))
+        cpu.fpu_set_st(0, _transcendental(cpu, math.sin, v))
+        cpu.fpu_push(_transcendental(cpu, math.cos, v))
     elif modrm_byte == 0xFC:  # FRNDINT
-        cpu.fpu_set_st(0, float(round(cpu.fpu_st(0))))
+        cpu.fpu_set_st(0, fp.rndint(cpu, cpu.fpu_st(0)))
     elif modrm_byte == 0xFD:  # FSCALE
-        cpu.fpu_set_st(0, cpu.fpu_st(0) * (2.0 ** int(cpu.fpu_st(1))))
+        cpu.fpu_set_st(0, fp.scale(cpu, cpu.fpu_st(0), cpu.fpu_st(1)))
     elif modrm_byte == 0xFE:  # FSIN
-        cpu.fpu_set_st(0, math.sin(cpu.fpu_st(0)))
+        cpu.fpu_set_st(0, _transcendental(cpu, math.sin, cpu.fpu_st(0)))
     elif modrm_byte == 0xFF:  # FCOS
-        cpu.fpu_set_st(0, math.cos(cpu.fpu_st(0)))
+        cpu.fpu_set_st(0, _transcendental(cpu, math.cos, cpu.fpu_st(0)))
+
+
+def _arith_mem(cpu, reg, val):
+    """D8/DA/DC/DE memory forms: ST(0) = ST(0) op val, or FCOM/FCOMP."""
+    if reg in (2, 3):
+        _fpu_compare(cpu, cpu.fpu_st(0), val)
+        if reg == 3:
+            cpu.fpu_pop()
+    else:
+        cpu.fpu_set_st(0, cpu.fpu.arith(cpu, reg, cpu.fpu_st(0), val))
 
 
 def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
     """Execute an x87 ESC instruction (D8-DF) given decoded ModR/M."""
+    fp = cpu.fpu
 
     # -- D8: float32 arith / register arith ----------------------------------
     if base_op == 0xD8:
-        ops = [lambda a, b: a+b, lambda a, b: a*b, None, None,
-               lambda a, b: a-b, lambda a, b: b-a, lambda a, b: a/b, lambda a, b: b/a]
         if mod == 3:
             if reg in (2, 3):  # FCOM/FCOMP
                 _fpu_compare(cpu, cpu.fpu_st(0), cpu.fpu_st(rm))
                 if reg == 3:
                     cpu.fpu_pop()
             else:
-                cpu.fpu_set_st(0, ops[reg](cpu.fpu_st(0), cpu.fpu_st(rm)))
+                cpu.fpu_set_st(0, fp.arith(cpu, reg, cpu.fpu_st(0), cpu.fpu_st(rm)))
         else:
-            val = _read_mem_float(mem, cpu, mod, rm, disp, seg_override, 32)
-            if reg in (2, 3):
-                _fpu_compare(cpu, cpu.fpu_st(0), val)
-                if reg == 3:
-                    cpu.fpu_pop()
-            else:
-                cpu.fpu_set_st(0, ops[reg](cpu.fpu_st(0), val))
+            _arith_mem(cpu, reg, _read_mem_real(mem, cpu, mod, rm, disp, seg_override, 32))
 
     # -- D9: load/store/misc ------------------------------------------------
     elif base_op == 0xD9:
@@ -193,13 +299,14 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
             _exec_d9_reg(cpu, (mod << 6) | (reg << 3) | rm)
         else:
             if reg == 0:  # FLD dword
-                cpu.fpu_push(_read_mem_float(mem, cpu, mod, rm, disp, seg_override, 32))
+                cpu.fpu_push(_read_mem_real(mem, cpu, mod, rm, disp, seg_override, 32))
             elif reg == 2:  # FST dword
-                _write_mem_float(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_st(0))
+                _write_mem_real(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_st(0))
             elif reg == 3:  # FSTP dword
-                _write_mem_float(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_pop())
+                _write_mem_real(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_pop())
             elif reg == 5:  # FLDCW
-                pass  # no-op
+                phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
+                cpu.fpu_cw = mem.read16(phys)
             elif reg == 7:  # FNSTCW
                 phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
                 mem.write16(phys, cpu.fpu_cw)
@@ -212,15 +319,7 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
                 cpu.fpu_pop()
                 cpu.fpu_pop()
         else:
-            val = float(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 32))
-            ops = [lambda a, b: a+b, lambda a, b: a*b, None, None,
-                   lambda a, b: a-b, lambda a, b: b-a, lambda a, b: a/b, lambda a, b: b/a]
-            if reg in (2, 3):
-                _fpu_compare(cpu, cpu.fpu_st(0), val)
-                if reg == 3:
-                    cpu.fpu_pop()
-            else:
-                cpu.fpu_set_st(0, ops[reg](cpu.fpu_st(0), val))
+            _arith_mem(cpu, reg, fp.load_int(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 32)))
 
     # -- DB: integer load/store dword / FCLEX/FINIT --------------------------
     elif base_op == 0xDB:
@@ -232,42 +331,26 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
                 cpu.fpu_top = 0
                 cpu.fpu_sw = 0
                 cpu.fpu_cw = 0x037F
-                cpu.fpu_stack = [0.0] * 8
+                cpu.fpu_stack = [fp.zero] * 8
         else:
             if reg == 0:  # FILD dword
-                cpu.fpu_push(float(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 32)))
+                cpu.fpu_push(fp.load_int(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 32)))
             elif reg == 2:  # FIST dword
                 _write_mem_int(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_st(0))
             elif reg == 3:  # FISTP dword
                 _write_mem_int(mem, cpu, mod, rm, disp, seg_override, 32, cpu.fpu_pop())
-            elif reg == 5:  # FLD tword (80-bit) — approximate with float64
-                phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-                # Read 10 bytes, interpret as 80-bit extended
-                raw = mem.read_bytes(phys, 10)
-                val = _decode_float80(raw)
-                cpu.fpu_push(val)
-            elif reg == 7:  # FSTP tword — approximate
-                phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-                _encode_float80(mem, phys, cpu.fpu_pop())
+            elif reg == 5:  # FLD tword (80-bit)
+                cpu.fpu_push(_read_mem_real(mem, cpu, mod, rm, disp, seg_override, 80))
+            elif reg == 7:  # FSTP tword
+                _write_mem_real(mem, cpu, mod, rm, disp, seg_override, 80, cpu.fpu_pop())
 
     # -- DC: float64 arith / reverse register arith --------------------------
     elif base_op == 0xDC:
         if mod == 3:
-            rev = {0: lambda a, b: a+b, 1: lambda a, b: a*b,
-                   4: lambda a, b: b-a, 5: lambda a, b: a-b,
-                   6: lambda a, b: b/a, 7: lambda a, b: a/b}
-            if reg in rev:
-                cpu.fpu_set_st(rm, rev[reg](cpu.fpu_st(rm), cpu.fpu_st(0)))
+            if reg in _REV:
+                cpu.fpu_set_st(rm, fp.arith(cpu, _REV[reg], cpu.fpu_st(rm), cpu.fpu_st(0)))
         else:
-            val = _read_mem_float(mem, cpu, mod, rm, disp, seg_override, 64)
-            ops = [lambda a, b: a+b, lambda a, b: a*b, None, None,
-                   lambda a, b: a-b, lambda a, b: b-a, lambda a, b: a/b, lambda a, b: b/a]
-            if reg in (2, 3):
-                _fpu_compare(cpu, cpu.fpu_st(0), val)
-                if reg == 3:
-                    cpu.fpu_pop()
-            else:
-                cpu.fpu_set_st(0, ops[reg](cpu.fpu_st(0), val))
+            _arith_mem(cpu, reg, _read_mem_real(mem, cpu, mod, rm, disp, seg_override, 64))
 
     # -- DD: float64 load/store / FFREE/FUCOM --------------------------------
     elif base_op == 0xDD:
@@ -285,11 +368,11 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
                 cpu.fpu_pop()
         else:
             if reg == 0:  # FLD qword
-                cpu.fpu_push(_read_mem_float(mem, cpu, mod, rm, disp, seg_override, 64))
+                cpu.fpu_push(_read_mem_real(mem, cpu, mod, rm, disp, seg_override, 64))
             elif reg == 2:  # FST qword
-                _write_mem_float(mem, cpu, mod, rm, disp, seg_override, 64, cpu.fpu_st(0))
+                _write_mem_real(mem, cpu, mod, rm, disp, seg_override, 64, cpu.fpu_st(0))
             elif reg == 3:  # FSTP qword
-                _write_mem_float(mem, cpu, mod, rm, disp, seg_override, 64, cpu.fpu_pop())
+                _write_mem_real(mem, cpu, mod, rm, disp, seg_override, 64, cpu.fpu_pop())
             elif reg == 7:  # FNSTSW mem
                 phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
                 mem.write16(phys, cpu.fpu_sw)
@@ -302,34 +385,11 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
                 _fpu_compare(cpu, cpu.fpu_st(0), cpu.fpu_st(1))
                 cpu.fpu_pop()
                 cpu.fpu_pop()
-            elif reg == 0:  # FADDP
-                cpu.fpu_set_st(rm, cpu.fpu_st(rm) + cpu.fpu_st(0))
-                cpu.fpu_pop()
-            elif reg == 1:  # FMULP
-                cpu.fpu_set_st(rm, cpu.fpu_st(rm) * cpu.fpu_st(0))
-                cpu.fpu_pop()
-            elif reg == 4:  # FSUBRP
-                cpu.fpu_set_st(rm, cpu.fpu_st(0) - cpu.fpu_st(rm))
-                cpu.fpu_pop()
-            elif reg == 5:  # FSUBP
-                cpu.fpu_set_st(rm, cpu.fpu_st(rm) - cpu.fpu_st(0))
-                cpu.fpu_pop()
-            elif reg == 6:  # FDIVRP
-                cpu.fpu_set_st(rm, cpu.fpu_st(0) / cpu.fpu_st(rm))
-                cpu.fpu_pop()
-            elif reg == 7:  # FDIVP
-                cpu.fpu_set_st(rm, cpu.fpu_st(rm) / cpu.fpu_st(0))
+            elif reg in _REV:  # FADDP FMULP FSUBRP FSUBP FDIVRP FDIVP
+                cpu.fpu_set_st(rm, fp.arith(cpu, _REV[reg], cpu.fpu_st(rm), cpu.fpu_st(0)))
                 cpu.fpu_pop()
         else:
-            val = float(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 16))
-            ops = [lambda a, b: a+b, lambda a, b: a*b, None, None,
-                   lambda a, b: a-b, lambda a, b: b-a, lambda a, b: a/b, lambda a, b: b/a]
-            if reg in (2, 3):
-                _fpu_compare(cpu, cpu.fpu_st(0), val)
-                if reg == 3:
-                    cpu.fpu_pop()
-            else:
-                cpu.fpu_set_st(0, ops[reg](cpu.fpu_st(0), val))
+            _arith_mem(cpu, reg, fp.load_int(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 16)))
 
     # -- DF: FILD/FIST/FISTP word + FNSTSW AX + FILD/FISTP qword -----------
     elif base_op == 0xDF:
@@ -339,41 +399,55 @@ def _exec_esc(cpu, mem, base_op, mod, reg, rm, disp, seg_override):
                 cpu.ax = cpu.fpu_sw
         else:
             if reg == 0:  # FILD word
-                cpu.fpu_push(float(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 16)))
+                cpu.fpu_push(fp.load_int(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 16)))
             elif reg == 2:  # FIST word
                 _write_mem_int(mem, cpu, mod, rm, disp, seg_override, 16, cpu.fpu_st(0))
             elif reg == 3:  # FISTP word
                 _write_mem_int(mem, cpu, mod, rm, disp, seg_override, 16, cpu.fpu_pop())
             elif reg == 5:  # FILD qword
-                phys, _ = compute_ea(cpu, mod, rm, disp, seg_override)
-                lo = mem.read32(phys)
-                hi = mem.read32(phys + 4)
-                val = lo | (hi << 32)
-                if val >= (1 << 63):
-                    val -= (1 << 64)
-                cpu.fpu_push(float(val))
+                cpu.fpu_push(fp.load_int(_read_mem_int(mem, cpu, mod, rm, disp, seg_override, 64)))
             elif reg == 7:  # FISTP qword
                 _write_mem_int(mem, cpu, mod, rm, disp, seg_override, 64, cpu.fpu_pop())
 
 
 def _decode_float80(raw):
-    """Decode 80-bit x87 extended precision to Python float (approximate)."""
+    """Decode 80-bit x87 extended precision to Python float (rounded to float64)."""
     if len(raw) < 10:
         return 0.0
     sign = (raw[9] >> 7) & 1
     exp = ((raw[9] & 0x7F) << 8) | raw[8]
     mantissa = int.from_bytes(raw[0:8], 'little')
     if exp == 0 and mantissa == 0:
-        return 0.0
+        return -0.0 if sign else 0.0
     if exp == 0x7FFF:
+        if mantissa & 0x7FFFFFFFFFFFFFFF:
+            return math.nan
         return float('inf') if sign == 0 else float('-inf')
     # Bias is 16383
-    val = mantissa / (1 << 63) * (2.0 ** (exp - 16383))
+    try:
+        val = math.ldexp(float(mantissa), (exp or 1) - 16383 - 63)
+    except OverflowError:
+        val = float('inf')
     return -val if sign else val
 
 
-def _encode_float80(mem, phys, val):
-    """Encode Python float as 80-bit extended precision (approximate)."""
-    # Simple: just write as float64 in the first 8 bytes, fill rest
-    mem.write_float64(phys, val)
-    mem.write16(phys + 8, 0)
+def _encode_float80(val):
+    """Encode a Python float as 80-bit extended precision (exact: every
+    float64 is representable)."""
+    bits = struct.unpack('<Q', struct.pack('<d', val))[0]
+    sign = bits >> 63
+    exp = (bits >> 52) & 0x7FF
+    frac = bits & ((1 << 52) - 1)
+    if exp == 0x7FF:
+        exp80, mant = 0x7FFF, (1 << 63) | (frac << 11)
+    elif exp == 0 and frac == 0:
+        exp80, mant = 0, 0
+    else:
+        if exp == 0:   # float64 denormal: normalize
+            shift = 53 - frac.bit_length()
+            frac <<= shift
+            exp = 1 - shift
+        else:
+            frac |= 1 << 52
+        exp80, mant = exp - 1023 + 16383, frac << 11
+    return mant.to_bytes(8, 'little') + ((sign << 15) | exp80).to_bytes(2, 'little')
@@ -0,0 +1,440 @@
+"""Bit-exact x87 extended-precision FPU backend (fpu.get_backend('exact')).
+
+Stack values are Ext80: sign, biased exponent and 64-bit mantissa with the
+explicit integer bit, the fields FSTP TBYTE stores. Arithmetic is done
+on Python integers and rounded once, as the control word says:
+
+    PC (bits 8-9)    precision of FADD/FSUB/FMUL/FDIV/FSQRT results:
+                     00 = 24 bits, 10 = 53 bits, 11 = 64 bits
+    RC (bits 10-11)  00 nearest-even, 01 down, 10 up, 11 toward zero
+
+Loads (FLD, FILD) are exact; stores (FST m32/m64, FIST) round into the
+destination format with RC. Exceptions behave as masked, which is how
+the Borland runtime runs: the masked response is returned and the
+sticky exception flag is set in the status word.
+
+The transcendental instructions (F2XM1, FYL2X, FPTAN, FPATAN, FSIN, FCOS,
+FSINCOS) are computed in float64 and rounded to the current precision,
+so only they are not bit-exact. Saved state files hold the stack as
+float64 (see state.py).
+"""
+
+import math
+import struct
+
+from .fpu import CMP_GT, CMP_LT, CMP_EQ, CMP_UN, OP_ADD, OP_MUL, OP_SUB, OP_SUBR, OP_DIV
+
+BIAS = 16383
+_E0 = BIAS + 63           # exponent field -> exponent of the mantissa's lsb
+_MIN_LSB = 1 - _E0        # lsb exponent of denormals (2**-16445)
+
+# Status word exception flags
+IE, DE, ZE, OE, UE, PE = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20
+
+_PREC = (24, 64, 53, 64)  # PC field -> significant bits (01 is reserved)
+
+_ZERO, _FINITE, _INF, _NAN = 0, 1, 2, 3
+
+
+class Ext80:
+    """One 80-bit extended value, as its bit fields (immutable)."""
+
+    __slots__ = ('sign', 'exp', 'mant')
+
+    def __init__(self, sign, exp, mant):
+        self.sign = sign
+        self.exp = exp
+        self.mant = mant
+
+    @classmethod
+    def from_bytes(cls, raw):
+        se = raw[8] | (raw[9] << 8)
+        return cls(se >> 15, se & 0x7FFF, int.from_bytes(raw[0:8], 'little'))
+
+    def to_bytes(self):
+        return self.mant.to_bytes(8, 'little') + ((self.sign << 15) | self.exp).to_bytes(2, 'little')
+
+    def __float__(self):
+        if self.exp == 0x7FFF:
+            if self.mant & 0x7FFFFFFFFFFFFFFF:
+                return math.nan
+            return -math.inf if self.sign else math.inf
+        try:
+            val = math.ldexp(float(self.mant), (self.exp or 1) - _E0)
+        except OverflowError:
+            val = math.inf
+        return -val if self.sign else val
+
+    def __eq__(self, other):
+        return (isinstance(other, Ext80) and self.sign == other.sign
+                and self.exp == other.exp and self.mant == other.mant)
+
+    def __hash__(self):
+        return hash((self.sign, self.exp, self.mant))
+
+    def __repr__(self):
+        return f'Ext80({self.sign:d}:{self.exp:04X}:{self.mant:016X} = {float(self)!r})'
+
+
+ZERO = Ext80(0, 0, 0)
+INDEFINITE = Ext80(1, 0x7FFF, 0xC000000000000000)   # default quiet NaN
+
+# The constant ROM, rounded to nearest
+_CONSTS = {
+    'one': Ext80(0, 0x3FFF, 0x8000000000000000),
+    'zero': ZERO,
+    'pi': Ext80(0, 0x4000, 0xC90FDAA22168C235),
+    'l2t': Ext80(0, 0x4000, 0xD49A784BCD1B8AFE),
+    'l2e': Ext80(0, 0x3FFF, 0xB8AA3B295C17F0BC),
+    'lg2': Ext80(0, 0x3FFD, 0x9A209A84FBCFF799),
+    'ln2': Ext80(0, 0x3FFE, 0xB17217F7D1CF79AC),
+}
+
+
+def _ext(x):
+    """x as an Ext80. Python floats (empty stack slots, loaded state) are
+    converted exactly."""
+    if x.__class__ is Ext80:
+        return x
+    return _from_ieee(struct.unpack('<Q', struct.pack('<d', x))[0], 11, 52)
+
+
+def _parts(x):
+    """(kind, sign, m, e) with value m * 2**e for finite x."""
+    x = _ext(x)
+    if x.exp == 0x7FFF:
+        return (_NAN if x.mant & 0x7FFFFFFFFFFFFFFF else _INF), x.sign, 0, 0
+    if x.mant == 0:
+        return _ZERO, x.sign, 0, 0
+    return _FINITE, x.sign, x.mant, (x.exp or 1) - _E0
+
+
+def _pack(sign, m, e):
+    """Ext80 for m * 2**e, which must fit (m at most 65 bits, e >= _MIN_LSB)."""
+    if m == 0:
+        return Ext80(sign, 0, 0)
+    bl = m.bit_length()
+    exp = e + bl - 1 + BIAS
+    if exp >= 1:
+        return Ext80(sign, exp, m << (64 - bl) if bl <= 64 else m >> (bl - 64))
+    return Ext80(sign, 0, m << (e - _MIN_LSB))
+
+
+def _round_bits(sign, m, e, prec, rc, sticky, min_lsb):
+    """Round m * 2**e (plus a nonzero tail below it if sticky) to prec
+    significant bits with lsb exponent >= min_lsb.
+
+    Returns (m, e, inexact). A sticky tail needs m to carry at least
+    prec + 2 bits so that it lies below the rounding point.
+    """
+    shift = max(m.bit_length() - prec, min_lsb - e)
+    if shift <= 0:
+        return m, e, sticky
+    rem = m & ((1 << shift) - 1)
+    m >>= shift
+    e += shift
+    inexact = bool(rem) or sticky
+    if inexact:
+        if rc == 0:
+            half = 1 << (shift - 1)
+            up = rem > half or (rem == half and (sticky or m & 1))
+        elif rc == 1:
+            up = sign
+        elif rc == 2:
+            up = not sign
+        else:
+            up = False
+        if up:
+            m += 1
+    return m, e, inexact
+
+
+def _overflow(sign, rc, prec):
+    """Masked overflow response: infinity, or the largest finite value
+    when RC rounds toward zero from this side."""
+    if rc == 0 or (rc == 1 and sign) or (rc == 2 and not sign):
+        return Ext80(sign, 0x7FFF, 1 << 63)
+    return Ext80(sign, 0x7FFE, ((1 << prec) - 1) << (64 - prec))
+
+
+def _result(cpu, sign, m, e, sticky=False, prec=None):
+    """Round an exact result into an Ext80 per the control word."""
+    cw = cpu.fpu_cw
+    if prec is None:
+        prec = _PREC[(cw >> 8) & 3]
+    rc = (cw >> 10) & 3
+    m, e, inexact = _round_bits(sign, m, e, prec, rc, sticky, _MIN_LSB)
+    if m and e + m.bit_length() - 1 + BIAS >= 0x7FFF:
+        cpu.fpu_sw |= OE | PE
+        return _overflow(sign, rc, prec)
+    if inexact:
+        cpu.fpu_sw |= PE
+        if m == 0 or e + m.bit_length() - 1 + BIAS < 1:
+            cpu.fpu_sw |= UE
+    return _pack(sign, m, e)
+
+
+def _from_ieee(bits, ebits, mbits):
+    """Exact Ext80 for an IEEE single/double bit pattern."""
+    sign = bits >> (ebits + mbits)
+    exp = (bits >> mbits) & ((1 << ebits) - 1)
+    frac = bits & ((1 << mbits) - 1)
+    if exp == (1 << ebits) - 1:
+        return Ext80(sign, 0x7FFF, (1 << 63) | (frac << (63 - mbits)))
+    bias = (1 << (ebits - 1)) - 1
+    if exp == 0:
+        return _pack(sign, frac, 1 - bias - mbits)
+    return _pack(sign, frac | (1 << mbits), exp - bias - mbits)
+
+
+def _to_ieee(cpu, x, ebits, mbits):
+    """IEEE single/double bit pattern for x, rounded with RC."""
+    kind, sign, m, e = _parts(x)
+    top = (1 << ebits) - 1
+    sbit = sign << (ebits + mbits)
+    if kind == _ZERO:
+        return sbit
+    if kind == _INF:
+        return sbit | (top << mbits)
+    if kind == _NAN:
+        frac = ((_ext(x).mant >> (63 - mbits)) | (1 << (mbits - 1))) & ((1 << mbits) - 1)
+        return sbit | (top << mbits) | frac
+    bias = (1 << (ebits - 1)) - 1
+    rc = (cpu.fpu_cw >> 10) & 3
+    min_lsb = 1 - bias - mbits
+    m, e, inexact = _round_bits(sign, m, e, mbits + 1, rc, False, min_lsb)
+    if inexact:
+        cpu.fpu_sw |= PE
+    if m == 0:
+        cpu.fpu_sw |= UE
+        return sbit
+    bl = m.bit_length()
+    exp = e + bl - 1 + bias
+    if exp >= top:
+        cpu.fpu_sw |= OE | PE
+        if rc == 0 or (rc == 1 and sign) or (rc == 2 and not sign):
+            return sbit | (top << mbits)
+        return sbit | ((top - 1) << mbits) | ((1 << mbits) - 1)
+    if exp >= 1:
+        m = m << (mbits + 1 - bl) if bl <= mbits + 1 else m >> (bl - mbits - 1)
+        return sbit | (exp << mbits) | (m & ((1 << mbits) - 1))
+    if inexact:
+        cpu.fpu_sw |= UE
+    return sbit | (m << (e - min_lsb))
+
+
+def _to_integer(sign, m, e, rc):
+    """m * 2**e rounded to an integer with RC: (m, e) with e >= 0."""
+    return _round_bits(sign, m, e, m.bit_length() + abs(e) + 1, rc, False, 0)
+
+
+class ExactFPU:
+    """x87 arithmetic on Ext80 values, honouring the control word."""
+
+    name = 'exact'
+    zero = ZERO
+
+    # -- loads and stores ----------------------------------------------------
+
+    def load_real(self, mem, phys, size):
+        if size == 32:
+            return _from_ieee(mem.read32(phys), 8, 23)
+        if size == 64:
+            return _from_ieee(mem.read32(phys) | (mem.read32(phys + 4) << 32), 11, 52)
+        return Ext80.from_bytes(mem.read_bytes(phys, 10))
+
+    def store_real(self, cpu, mem, phys, size, val):
+        if size == 32:
+            mem.write32(phys, _to_ieee(cpu, val, 8, 23))
+        elif size == 64:
+            bits = _to_ieee(cpu, val, 11, 52)
+            mem.write32(phys, bits & 0xFFFFFFFF)
+            mem.write32(phys + 4, bits >> 32)
+        else:
+            mem.load_bytes(phys, _ext(val).to_bytes())
+
+    def load_int(self, ival):
+        return _pack(1 if ival < 0 else 0, abs(ival), 0)
+
+    def store_int(self, cpu, val, bits):
+        """Integer for FIST/FISTP, rounded with RC; out of range (or NaN/inf)
+        gives the integer indefinite (0x8000...) and sets IE."""
+        kind, sign, m, e = _parts(val)
+        if kind == _ZERO:
+            return 0
+        indefinite = -(1 << (bits - 1))
+        if kind != _FINITE or e + m.bit_length() > bits + 1:
+            cpu.fpu_sw |= IE
+            return indefinite
+        m, e, inexact = _to_integer(sign, m, e, (cpu.fpu_cw >> 10) & 3)
+        n = m << e
+        n = -n if sign else n
+        if not indefinite <= n < -indefinite:
+            cpu.fpu_sw |= IE
+            return indefinite
+        if inexact:
+            cpu.fpu_sw |= PE
+        return n
+
+    # -- arithmetic -----------------------------------------------------------
+
+    def arith(self, cpu, op, a, b):
+        if op == OP_ADD:
+            return self._add(cpu, a, b, 0)
+        if op == OP_SUB:
+            return self._add(cpu, a, b, 1)
+        if op == OP_SUBR:
+            return self._add(cpu, b, a, 1)
+        if op == OP_MUL:
+            return self._mul(cpu, a, b)
+        if op == OP_DIV:
+            return self._div(cpu, a, b)
+        return self._div(cpu, b, a)
+
+    def _add(self, cpu, a, b, negate):
+        ka, sa, ma, ea = _parts(a)
+        kb, sb, mb, eb = _parts(b)
+        sb ^= negate
+        if ka == _NAN or kb == _NAN:
+            return _ext(a if ka == _NAN else b)
+        if ka == _INF or kb == _INF:
+            if ka == kb and sa != sb:
+                cpu.fpu_sw |= IE
+                return INDEFINITE
+            return Ext80(sa if ka == _INF else sb, 0x7FFF, 1 << 63)
+        if ka == _ZERO and kb == _ZERO:
+            if sa == sb:
+                return Ext80(sa, 0, 0)
+            return Ext80(1 if (cpu.fpu_cw >> 10) & 3 == 1 else 0, 0, 0)
+        if ka == _ZERO:
+            return _result(cpu, sb, mb, eb)
+        if kb == _ZERO:
+            return _result(cpu, sa, ma, ea)
+        # A much smaller operand only matters as a sticky tail: stand it in
+        # by one bit far below the other's lsb (mantissas are <= 64 bits).
+        ta, tb = ea + ma.bit_length(), eb + mb.bit_length()
+        if ta - tb > 160:
+            mb, eb = 1, ta - 162
+        elif tb - ta > 160:
+            ma, ea = 1, tb - 162
+        e = min(ea, eb)
+        va = ma << (ea - e)
+        vb = mb << (eb - e)
+        s = (-va if sa else va) + (-vb if sb else vb)
+        if s == 0:
+            return Ext80(1 if (cpu.fpu_cw >> 10) & 3 == 1 else 0, 0, 0)
+        return _result(cpu, 1 if s < 0 else 0, abs(s), e)
+
+    def _mul(self, cpu, a, b):
+        ka, sa, ma, ea = _parts(a)
+        kb, sb, mb, eb = _parts(b)
+        sign = sa ^ sb
+        if ka == _NAN or kb == _NAN:
+            return _ext(a if ka == _NAN else b)
+        if ka == _INF or kb == _INF:
+            if ka == _ZERO or kb == _ZERO:
+                cpu.fpu_sw |= IE
+                return INDEFINITE
+            return Ext80(sign, 0x7FFF, 1 << 63)
+        if ka == _ZERO or kb == _ZERO:
+            return Ext80(sign, 0, 0)
+        return _result(cpu, sign, ma * mb, ea + eb)
+
+    def _div(self, cpu, a, b):
+        ka, sa, ma, ea = _parts(a)
+        kb, sb, mb, eb = _parts(b)
+        sign = sa ^ sb
+        if ka == _NAN or kb == _NAN:
+            return _ext(a if ka == _NAN else b)
+        if ka == kb and ka in (_INF, _ZERO):
+            cpu.fpu_sw |= IE
+            return INDEFINITE
+        if ka == _INF or kb == _ZERO:
+            if kb == _ZERO:
+                cpu.fpu_sw |= ZE
+            return Ext80(sign, 0x7FFF, 1 << 63)
+        if ka == _ZERO or kb == _INF:
+            return Ext80(sign, 0, 0)
+        prec = _PREC[(cpu.fpu_cw >> 8) & 3]
+        k = max(0, prec + 3 + mb.bit_length() - ma.bit_length())
+        q, r = divmod(ma << k, mb)
+        return _result(cpu, sign, q, ea - eb - k, sticky=r != 0, prec=prec)
+
+    def sqrt(self, cpu, val):
+        kind, sign, m, e = _parts(val)
+        if kind == _NAN or kind == _ZERO:
+            return _ext(val)
+        if sign:
+            cpu.fpu_sw |= IE
+            return INDEFINITE
+        if kind == _INF:
+            return _ext(val)
+        prec = _PREC[(cpu.fpu_cw >> 8) & 3]
+        if e & 1:
+            m <<= 1
+            e -= 1
+        k = max(0, prec + 3 - m.bit_length() // 2)
+        m <<= 2 * k
+        e -= 2 * k
+        r = math.isqrt(m)
+        return _result(cpu, 0, r, e // 2, sticky=r * r != m, prec=prec)
+
+    def compare(self, a, b):
+        ka, sa, ma, ea = _parts(a)
+        kb, sb, mb, eb = _parts(b)
+        if ka == _NAN or kb == _NAN:
+            return CMP_UN
+        if ka == _ZERO and kb == _ZERO:
+            return CMP_EQ
+        if ka == _ZERO:
+            sa = 1 - sb      # zero sorts between the signs
+        elif kb == _ZERO:
+            sb = 1 - sa
+        if sa != sb:
+            return CMP_LT if sa else CMP_GT
+        key_a = (ka, ea + ma.bit_length(), ma << (64 - ma.bit_length()) if ma else 0)
+        key_b = (kb, eb + mb.bit_length(), mb << (64 - mb.bit_length()) if mb else 0)
+        if key_a == key_b:
+            return CMP_EQ
+        return CMP_GT if (key_a > key_b) != bool(sa) else CMP_LT
+
+    def const(self, name):
+        return _CONSTS[name]
+
+    def neg(self, val):
+        val = _ext(val)
+        return Ext80(val.sign ^ 1, val.exp, val.mant)
+
+    def abs(self, val):
+        val = _ext(val)
+        return Ext80(0, val.exp, val.mant)
+
+    def rndint(self, cpu, val):
+        kind, sign, m, e = _parts(val)
+        if kind != _FINITE or e >= 0:
+            return _ext(val)
+        m, e, inexact = _to_integer(sign, m, e, (cpu.fpu_cw >> 10) & 3)
+        if inexact:
+            cpu.fpu_sw |= PE
+        return _pack(sign, m, e)
+
+    def scale(self, cpu, a, b):
+        kind, sign, m, e = _parts(a)
+        if kind != _FINITE:
+            return _ext(a)
+        n = float(b)
+        if math.isnan(n):
+            return _ext(b)
+        n = int(max(min(n, 1 << 20), -(1 << 20)))   # beyond this, over/underflow anyway
+        return _result(cpu, sign, m, e + n, prec=64)
+
+    # -- float64 bridge (transcendentals, display) -------------------------------
+
+    def to_float(self, val):
+        return float(val)
+
+    def from_float(self, cpu, x):
+        kind, sign, m, e = _parts(x)
+        if kind != _FINITE:
+            return _ext(x)
+        return _result(cpu, sign, m, e)
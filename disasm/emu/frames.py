@@ -0,0 +1,134 @@
+"""Frame boundaries: run the emulator in frames instead of instructions.
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    emu.enable_frames(lambda f: emu.dump_screen(f'/tmp/frame{f.index:04d}.png'))
+    reason, frame = emu.run_frames(30, max_steps=50_000_000)
+
+A new frame starts at the first of these events:
+    vsync   a read of the VGA status port 3DAh that reports vertical retrace
+            after one that did not. The emulated status toggles bit 3 on
+            every read, so a retrace wait loop ends after at most two reads;
+            one wait is one vsync.
+    flip    a change of the CRTC start address (registers 0Ch/0Dh): page
+            flipping in the 360x480 Mode X path, which bypasses Fastgraph
+    page    a call through Fastgraph's fg_copypage or fg_setpage dispatch
+            slots (DS:EF18, DS:EF1C; REVERSE.md "Function Dispatch Table").
+            The slots are empty until graphics init: a run that starts
+            before then looks them up again at each new frame.
+
+Events within `merge` instructions of a frame's first event belong to that
+frame: the two CRTC writes of one start address, a retrace wait followed by
+a flip, a page call followed by a retrace wait. Only a second vsync starts
+a new frame inside the window, since back-to-back retrace waits are frames
+the game deliberately waits out.
+
+Events are raised by PortIO and the page hooks and committed by run_fast at
+the next instruction (run_fast(frames=clock)), where a callback or
+run_frames() can stop the run with reason 'frame'.
+"""
+
+# Data segment layout (REVERSE.md "Function Dispatch Table")
+FG_COPYPAGE = 0xEF18
+FG_SETPAGE = 0xEF1C
+
+SOURCES = ('vsync', 'flip', 'page')
+
+
+class Frame:
+    """One frame: its number, the emulator step it started at and the events
+    that made it ({'vsync', 'flip', 'page'})."""
+
+    __slots__ = ('index', 'step', 'kinds', 'start', 'page')
+
+    def __init__(self, index, step, kinds, start, page):
+        self.index = index
+        self.step = step
+        self.kinds = kinds
+        self.start = start    # CRTC start address when the frame began
+        self.page = page      # first argument of the last page call, or None
+
+    def __repr__(self):
+        return (f"<Frame {self.index} step={self.step} {'+'.join(sorted(self.kinds))} "
+                f"start=0x{self.start:04X}>")
+
+
+class FrameClock:
+    """Frame boundary detector; see the module docstring.
+
+    callbacks: fn(frame) called when a frame starts; a true return value
+    stops the run. stop_at: stop when this many frames have been counted.
+    retarget: fn() called when a frame starts, before the callbacks; set by
+    Emulator.run while the page hooks are not installed yet.
+    """
+
+    def __init__(self, sources=SOURCES, merge=2000):
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            raise ValueError(f"unknown frame sources {sorted(unknown)} (expected {SOURCES})")
+        self.sources = frozenset(sources)
+        self.merge = merge
+        self.count = 0          # frames started so far
+        self.last = None        # the current Frame
+        self.callbacks = []
+        self.stop_at = None
+        self.retarget = None
+        self.pending = False    # events waiting for commit()
+        self.origin = 0         # emulator step of run_fast's step 0
+        self.start = 0          # CRTC start address last seen
+        self.page = None
+        self._kinds = set()
+
+    def sync(self, ports):
+        """Take the CRTC start address from ports (after a state restore)."""
+        self.start = (ports.crtc_regs[0x0C] << 8) | ports.crtc_regs[0x0D]
+
+    # -- events --------------------------------------------------------------------
+
+    def event(self, kind):
+        if kind in self.sources:
+            self._kinds.add(kind)
+            self.pending = True
+
+    def crtc_start(self, start):
+        """A write to CRTC register 0Ch or 0Dh; start is the new address."""
+        if start != self.start:
+            self.start = start
+            self.event('flip')
+
+    def page_call(self, cpu, mem):
+        """Hook on a Fastgraph page function (a far call: the first argument is at SS:SP+4)."""
+        self.page = mem.read16(((cpu.segs[2] << 4) + ((cpu.sp + 4) & 0xFFFF)) & 0xFFFFF)
+        self.event('page')
+
+    def page_targets(self, mem, ds_phys):
+        """Phys addresses of the Fastgraph page functions, once the dispatch
+        table is filled in (empty before graphics init)."""
+        targets = set()
+        for slot in (FG_COPYPAGE, FG_SETPAGE):
+            off, seg = mem.read16(ds_phys + slot), mem.read16(ds_phys + slot + 2)
+            if off or seg:
+                targets.add(((seg << 4) + off) & 0xFFFFF)
+        return targets
+
+    # -- boundaries ------------------------------------------------------------------
+
+    def commit(self, i):
+        """Fold pending events into a frame at run_fast step i; True to stop."""
+        step = self.origin + i
+        kinds, self._kinds = self._kinds, set()
+        self.pending = False
+        f = self.last
+        if (f is not None and step - f.step < self.merge
+                and not ('vsync' in kinds and 'vsync' in f.kinds)):
+            f.kinds |= kinds
+            return False
+        f = self.last = Frame(self.count, step, kinds, self.start, self.page)
+        self.count += 1
+        if self.retarget is not None:
+            self.retarget()
+        stop = False
+        for fn in self.callbacks:
+            if fn(f):
+                stop = True
+        return stop or (self.stop_at is not None and self.count >= self.stop_at)
@@ -0,0 +1,357 @@
+"""Scripted input: key sequences fired by events instead of fixed step numbers.
+
+    from emu.session import Emulator
+    from emu.input_script import InputScript
+    emu = Emulator('earth/SCORCH.EXE')
+    script = InputScript(emu)
+    menu = script.on_call('dialog_poll_input', 's')                  # first poll: press S
+    script.on_call('dialog_poll_input', 'enter', after=menu)         # then Enter
+    script.when('word(ds, 0x5030) == 1', 'esc', at=0x28B31)          # condition at an address
+    script.on_call(0x460C3, 'd', every=100, repeat=None)             # 'D' every 100th poll
+    script.at(emu.steps + 500_000, 'space')                          # plain timed key
+    script.run(until=0x2A855, max_steps=200_000_000)
+    script.run(max_steps=50_000_000, frames=60)                      # one second of frames
+
+A key sequence is a string of space-separated keys ('s', 'enter', 'f1',
+'up', 'esc', 'shift+a' ...), a list of those, (scancode, ascii) tuples or
+Key objects. Each key is pressed, released `hold` instructions later, and
+followed by the next key `gap` instructions after that.
+
+Triggers:
+    on_call(addr, keys)           when execution reaches addr (a label, file
+                                  offset, 'SEG:OFF' or ('phys', n))
+    when(cond, keys, at=None)     when cond (a breakpoint condition string or
+                                  callable(cpu, mem)) holds: checked at `at`,
+                                  or every `poll` instructions without one
+    at(step, keys)                at an absolute emulator step
+Each fires `repeat` times (None = forever), on every `every`th matching
+hit, once the trigger given as `after` has finished its keys.
+
+Delivery:
+    direct  (default) written straight into the game's key buffers in DS:
+            last_scancode (DS:D0B8), key_state_array (DS:D1BE, 128 words) and,
+            in INPUT_MODE 1, the circular buffer (DS:5032/5034, D2BE/D3BE),
+            plus the shift bit of the BIOS flags at 0040:0017. With
+            InputScript(queue=True) the key is also queued for INT 16h/21h.
+            The game sees a key in the instruction after its trigger.
+    irq     through run_fast's scheduled keys: port 60h and the game's INT 9
+            handler, as the hardware would.
+
+The run stops only at trigger hits and key events, so a scenario runs as
+many instructions as the game needs rather than padding between keys.
+"""
+
+import heapq
+import itertools
+
+from .breakpoints import compile_condition
+from .loader import DS_FILE_BASE
+
+# Data segment layout (REVERSE.md "Input Mode System")
+INPUT_MODE = 0x5030
+BUF_HEAD = 0x5032
+BUF_TAIL = 0x5034
+BUF_SCANCODES = 0xD2BE
+BUF_SHIFT = 0xD3BE
+BUF_MASK = 0x7F
+LAST_SCANCODE = 0xD0B8
+KEY_STATE = 0xD1BE
+
+DIRECT, IRQ = 'direct', 'irq'
+
+_ROWS = (
+    (0x02, '1234567890-='),
+    (0x10, 'qwertyuiop[]'),
+    (0x1E, "asdfghjkl;'`"),
+    (0x2B, '\\zxcvbnm,./'),
+)
+_CHARS = {ch: sc + i for sc, row in _ROWS for i, ch in enumerate(row)}
+_NAMES = {
+    'esc': (0x01, 0x1B), 'backspace': (0x0E, 0x08), 'tab': (0x0F, 0x09),
+    'enter': (0x1C, 0x0D), 'space': (0x39, 0x20),
+    'home': (0x47, 0), 'up': (0x48, 0), 'pgup': (0x49, 0), 'left': (0x4B, 0),
+    'right': (0x4D, 0), 'end': (0x4F, 0), 'down': (0x50, 0), 'pgdn': (0x51, 0),
+    'ins': (0x52, 0), 'del': (0x53, 0),
+}
+_NAMES.update({f'f{n}': (0x3A + n, 0) for n in range(1, 11)})
+
+
+class Key:
+    """One key press: scancode, ascii, instructions held down, gap after release."""
+
+    __slots__ = ('scancode', 'ascii', 'hold', 'gap', 'shift')
+
+    def __init__(self, scancode, ascii=0, hold=1000, gap=1000, shift=False):
+        self.scancode = scancode & 0x7F
+        self.ascii = ascii & 0xFF
+        self.hold = hold
+        self.gap = gap
+        self.shift = shift
+
+    def __repr__(self):
+        return f'Key(0x{self.scancode:02X}, 0x{self.ascii:02X}, hold={self.hold}, gap={self.gap})'
+
+
+def parse_key(token, hold=1000, gap=1000):
+    """'s', 'S', 'shift+s', ' ', 'enter', 'f1', '0x1F' or '0x1F:0x73' -> Key."""
+    name = token if token == ' ' else token.strip()
+    shift = name.lower().startswith('shift+')
+    if shift:
+        name = name[6:]
+    if len(name) == 1:
+        ch = name.lower()
+        if ch not in _CHARS and ch != ' ':
+            raise ValueError(f"no scancode for key {token!r}")
+        shift = shift or name.isupper()
+        if ch == ' ':
+            return Key(0x39, 0x20, hold, gap, shift)
+        return Key(_CHARS[ch], ord(name.upper() if shift and ch.isalpha() else ch),
+                   hold, gap, shift)
+    if name.lower() in _NAMES:
+        sc, asc = _NAMES[name.lower()]
+        return Key(sc, asc, hold, gap, shift)
+    if name.lower().startswith('0x'):
+        sc, _, asc = name.partition(':')
+        return Key(int(sc, 16), int(asc, 0) if asc else 0, hold, gap, shift)
+    raise ValueError(f"unknown key {token!r}")
+
+
+def parse_keys(keys, hold=1000, gap=1000):
+    """A key sequence (see module docstring) -> [Key]."""
+    if isinstance(keys, Key):
+        return [keys]
+    if isinstance(keys, str):
+        keys = keys.split()
+    out = []
+    for k in keys:
+        if isinstance(k, Key):
+            out.append(k)
+        elif isinstance(k, tuple):
+            out.append(Key(k[0], k[1] if len(k) > 1 else 0, hold, gap))
+        else:
+            out.append(parse_key(k, hold, gap))
+    return out
+
+
+def inject_direct(emu, scancode, ascii=0, make=True, shift=False, queue=False):
+    """Put one make or break code into the game's key buffers (module docstring);
+    queue: also queue a make code for INT 16h/21h."""
+    mem = emu.mem
+    ds = emu.file_to_phys(DS_FILE_BASE)
+    sc = scancode & 0x7F
+    mem.write16(ds + LAST_SCANCODE, sc if make else sc | 0x80)
+    mem.write16(ds + KEY_STATE + 2 * sc, 1 if make else 0)
+    # BIOS shift flags: only left shift, leaving the lock bits alone
+    mem.data[0x417] = (mem.data[0x417] & ~0x02) | (0x02 if make and shift else 0)
+    if not make:
+        return
+    if mem.read16(ds + INPUT_MODE) == 1:
+        tail = mem.read16(ds + BUF_TAIL) & BUF_MASK
+        new_tail = (tail + 1) & BUF_MASK
+        if new_tail != mem.read16(ds + BUF_HEAD) & BUF_MASK:    # else full: dropped
+            mem.write16(ds + BUF_SCANCODES + 2 * tail, sc)
+            mem.write16(ds + BUF_SHIFT + 2 * tail, 1 if shift else 0)
+            mem.write16(ds + BUF_TAIL, new_tail)
+    if queue:
+        emu.ints.push_key(sc, ascii)
+
+
+class Trigger:
+    """A key sequence and the event that fires it; see InputScript."""
+
+    def __init__(self, keys, repeat=1, every=1, after=None, via=DIRECT, phys=None, cond=None,
+                 step=None, label=None):
+        self.keys = keys
+        self.repeat = repeat
+        self.every = every
+        self.after = after
+        self.via = via
+        self.phys = phys
+        self.cond = compile_condition(cond) if isinstance(cond, str) else cond
+        self.step = step
+        self.label = label
+        self.hits = 0       # matching events seen while armed
+        self.fired = 0      # sequences started
+        self.done = 0       # sequences finished (last key released)
+        self.busy = False   # a sequence is in progress
+        self._hit = False   # set by the breakpoint predicate, cleared when handled
+
+    def armed(self):
+        if self.busy or (self.repeat is not None and self.fired >= self.repeat):
+            return False
+        return self.after is None or self.after.done > 0
+
+    def check(self, cpu, mem):
+        """Breakpoint predicate: count a hit and ask to stop when it should fire."""
+        if not self.armed() or (self.cond is not None and not self.cond(cpu, mem)):
+            return False
+        self.hits += 1
+        if (self.hits - 1) % self.every:
+            return False
+        self._hit = True
+        return True
+
+    def __repr__(self):
+        where = self.label or (f'step {self.step}' if self.step is not None else 'poll')
+        return f'Trigger({where}, {len(self.keys)} keys, fired={self.fired})'
+
+
+class InputScript:
+    """Event-driven key input for an Emulator (see module docstring)."""
+
+    def __init__(self, emu, hold=1000, gap=1000, poll=10_000, via=DIRECT, queue=False):
+        self.emu = emu
+        self.hold = hold
+        self.gap = gap
+        self.poll = poll
+        self.via = via
+        self.queue = queue        # direct keys also go to the INT 16h/21h queue
+        self.triggers = []
+        self.log = []             # (step, scancode | 0x80 on release, ascii, via)
+        self._events = []         # heap of (step, seq, trigger, key, make, last)
+        self._seq = itertools.count()
+
+    # -- triggers -----------------------------------------------------------------
+
+    def _add(self, keys, hold, gap, via, **kw):
+        keys = parse_keys(keys, self.hold if hold is None else hold,
+                          self.gap if gap is None else gap)
+        trig = Trigger(keys, via=via or self.via, **kw)
+        self.triggers.append(trig)
+        return trig
+
+    def on_call(self, addr, keys, repeat=1, every=1, after=None, hold=None, gap=None, via=None):
+        """Fire when execution reaches addr."""
+        label = addr if isinstance(addr, str) else None
+        return self._add(keys, hold, gap, via, repeat=repeat, every=every, after=after,
+                         phys=self.emu.resolve(addr), label=label)
+
+    def when(self, cond, keys, at=None, repeat=1, every=1, after=None, hold=None, gap=None,
+             via=None):
+        """Fire when cond holds: at address `at`, or checked every `poll` steps."""
+        label = cond if isinstance(cond, str) else None
+        return self._add(keys, hold, gap, via, repeat=repeat, every=every, after=after,
+                         phys=self.emu.resolve(at) if at is not None else None, cond=cond,
+                         label=label)
+
+    def at(self, step, keys, after=None, hold=None, gap=None, via=None):
+        """Fire at absolute emulator step `step` (or when `after` finishes, if later)."""
+        return self._add(keys, hold, gap, via, after=after, step=step)
+
+    # -- events -------------------------------------------------------------------
+
+    def _fire(self, trig):
+        """Schedule trig's keys from the current step."""
+        trig.fired += 1
+        trig.busy = True
+        t = self.emu.steps
+        for n, key in enumerate(trig.keys):
+            last = n == len(trig.keys) - 1
+            heapq.heappush(self._events, (t, next(self._seq), trig, key, True, False))
+            t += key.hold
+            heapq.heappush(self._events, (t, next(self._seq), trig, key, False, last))
+            t += key.gap
+
+    def _deliver(self, ev, step):
+        _t, _seq, trig, key, make, last = ev
+        if trig.via == DIRECT:
+            inject_direct(self.emu, key.scancode, key.ascii, make, key.shift, self.queue)
+        self.log.append((step, key.scancode | (0 if make else 0x80), key.ascii, trig.via))
+        if last:
+            trig.busy = False
+            trig.done += 1
+
+    def _due(self):
+        """Fire timed and polled triggers and deliver direct events due now."""
+        now = self.emu.steps
+        for trig in self.triggers:
+            if trig.phys is not None or not trig.armed():
+                continue
+            if trig.step is not None:
+                if trig.step <= now:
+                    self._fire(trig)
+            elif trig.cond(self.emu.cpu, self.emu.mem):
+                trig.hits += 1
+                if (trig.hits - 1) % trig.every == 0:
+                    self._fire(trig)
+        events = self._events
+        while events and events[0][0] <= now and events[0][2].via == DIRECT:
+            self._deliver(heapq.heappop(events), now)
+
+    def _horizon(self, now, end):
+        """Step at which run() must next regain control."""
+        nxt = end
+        for ev in self._events:
+            if ev[2].via == DIRECT:
+                nxt = min(nxt, ev[0])
+        for trig in self.triggers:
+            if trig.phys is None and trig.armed():
+                nxt = min(nxt, max(trig.step, now + 1) if trig.step is not None
+                          else now + self.poll)
+        return max(nxt, now + 1)
+
+    def pending(self):
+        """True while a trigger can still fire or keys are still queued."""
+        return bool(self._events) or any(
+            t.repeat is None or t.fired < t.repeat for t in self.triggers)
+
+    # -- running -----------------------------------------------------------------
+
+    def run(self, until=None, max_steps=100000, frames=None):
+        """Emulator.run with the script active. Returns (reason, result) like
+        Emulator.run; stops for triggers and key events are not reported.
+        frames: also stop once that many more frames have started (see
+        Emulator.run_frames)."""
+        emu = self.emu
+        clock = None
+        if frames is not None:
+            clock = emu.enable_frames()
+            clock.stop_at = clock.count + frames
+        end = emu.steps + max_steps
+        until_set = set()
+        if until is not None:
+            targets = until if isinstance(until, (list, set, frozenset)) else [until]
+            until_set = {emu.resolve(a) for a in targets}
+        bps = [emu.add_breakpoint(('phys', t.phys), cond=t.check)
+               for t in self.triggers if t.phys is not None]
+        try:
+            while True:
+                self._due()
+                now = emu.steps
+                if now >= end:
+                    return 'max_steps', max_steps
+                nxt = self._horizon(now, end)
+                keys = {}
+                events = self._events
+                while events and events[0][0] < nxt and events[0][2].via == IRQ:
+                    rel = max(events[0][0] - now, 0)
+                    if rel in keys:
+                        nxt = now + rel + 1    # one key per step: the rest go next chunk
+                        break
+                    keys[rel] = heapq.heappop(events)
+                # Break codes carry no character (a release types nothing).
+                reason, result = emu.run(until=until, max_steps=nxt - now,
+                                         keys={rel: (ev[3].scancode, ev[3].ascii) if ev[4]
+                                               else (ev[3].scancode | 0x80, 0)
+                                               for rel, ev in keys.items()})
+                ran = emu.steps - now
+                for rel, ev in keys.items():
+                    if rel <= ran or reason == 'max_steps':
+                        self._deliver(ev, now + rel)
+                    else:
+                        heapq.heappush(events, ev)    # not reached: keep for later
+                if reason == 'breakpoint':
+                    hit = [t for t in self.triggers if t._hit]
+                    for trig in hit:
+                        trig._hit = False
+                        self._fire(trig)
+                    if result in until_set or not hit:
+                        self._due()
+                        return reason, result
+                elif reason != 'max_steps':
+                    return reason, result
+        finally:
+            for bp in bps:
+                emu.remove_breakpoint(bp)
+            if clock is not None:
+                clock.stop_at = None
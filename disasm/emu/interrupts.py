@@ -1,8 +1,9 @@
 """DOS/BIOS interrupt handlers for INT 10h, 16h, 1Ah, 21h, 33h."""
 
-import os
 import collections
 
+from .dosfs import DosFS
+
 
 class EmuExit(Exception):
     """Raised by INT 21h/4Ch to terminate emulation."""
@@ -11,13 +12,22 @@ class EmuExit(Exception):
         super().__init__(f"Program exit with code {code}")
 
 
+def _handler_name(fn):
+    if fn is None:
+        return '(IVT)'
+    return getattr(fn, '__name__', repr(fn)).lstrip('_')
+
+
 class InterruptHandler:
-    def __init__(self, mem, cpu, earth_dir='earth', ports=None):
+    def __init__(self, mem, cpu, earth_dir='earth', ports=None, fs=None):
         self.mem = mem
         self.cpu = cpu
         self.earth_dir = earth_dir
         self.ports = ports
 
+        # DOS files: real earth/ directory unless given an overlay (emu.dosfs)
+        self.fs = fs if fs is not None else DosFS(earth_dir)
+
         # Keyboard input queue
         self.key_queue = collections.deque()
 
@@ -42,6 +52,11 @@ class InterruptHandler:
         # Callback for tracing
         self.on_int = None  # optional callback(int_num, ah)
 
+        # Call counters: INT number -> calls, (INT number, AH) -> calls
+        self.counts = collections.Counter()
+        self.function_counts = collections.Counter()
+        self._build_tables()
+
     def init_heap(self, after_image_seg):
         """Set heap start segment after the loaded image + stack."""
         self._heap_seg = after_image_seg
@@ -49,6 +64,111 @@ class InterruptHandler:
     def push_key(self, scancode, ascii_char=0):
         self.key_queue.append((scancode, ascii_char))
 
+    # -- Dispatch tables --------------------------------------------------------
+
+    def _build_tables(self):
+        """Per-vector handlers, and per-AH tables for the vectors that
+        dispatch on AH. Each handler takes no arguments and returns True
+        if handled, False to chain to the IVT handler in memory."""
+        self._vectors = {
+            0x00: self._divide_error,
+            0x11: self._equipment,
+            0x12: self._memory_size,
+            0x33: self._int33,
+        }
+        self._functions = {}   # int_num -> {ah: handler}
+        self._fallback = {}    # int_num -> handler for AHs without an entry
+        self._dispatchers = {}  # int_num -> the AH-table dispatcher
+        self._add_table(0x10, {
+            0x00: self._video_set_mode,
+            0x08: self._video_read_char,
+            0x0F: self._video_get_mode,
+            0x10: self._video_dac,
+            0x11: self._handled,          # Font: no-op
+            0x12: self._video_alt_select,
+        }, self._handled)
+        self._add_table(0x16, {
+            0x00: self._kbd_read,
+            0x01: self._kbd_peek,
+        }, self._handled)
+        self._add_table(0x1A, {
+            0x00: self._timer_ticks,
+        }, self._handled)
+        self._add_table(0x21, {
+            0x07: self._dos_getch,
+            0x0B: self._dos_stdin_status,
+            0x1A: self._dos_set_dta,
+            0x25: self._dos_set_vector,
+            0x2A: self._dos_get_date,
+            0x2C: self._dos_get_time,
+            0x2F: self._dos_get_dta,
+            0x30: self._dos_version,
+            0x35: self._dos_get_vector,
+            0x3C: self._dos_create,
+            0x3D: self._dos_open,
+            0x3E: self._dos_close,
+            0x3F: self._dos_read,
+            0x40: self._dos_write,
+            0x42: self._dos_seek,
+            0x43: self._dos_attributes,
+            0x44: self._dos_ioctl,
+            0x48: self._dos_alloc,
+            0x49: self._dos_ok,           # Free memory
+            0x4A: self._dos_ok,           # Resize memory block
+            0x4C: self._dos_exit,
+            0x4E: self._dos_find_first,
+            0x4F: self._dos_find_next,
+            0x58: self._dos_alloc_strategy,
+            0x67: self._dos_ok,           # Set max handles
+        }, self._dos_ok)                  # Unknown — succeed silently
+
+    def _add_table(self, int_num, table, fallback):
+        self._functions[int_num] = table
+        self._fallback[int_num] = fallback
+        cpu = self.cpu
+        counts = self.function_counts
+
+        def dispatch():
+            ah = cpu.get_reg8(4)
+            counts[int_num, ah] += 1
+            return table.get(ah, fallback)()
+        self._vectors[int_num] = self._dispatchers[int_num] = dispatch
+
+    def register(self, int_num, handler, ah=None):
+        """Handle INT int_num (only function AH=ah if given) with handler(),
+        which returns True if handled or False to chain to the IVT. Returns
+        the handler it replaces (None if there was none), so a custom handler
+        can delegate to it. Without AH the whole vector is replaced. With AH
+        on a vector that has no AH table, one is made with the current
+        vector handler for the other AHs."""
+        if ah is None:
+            prev = self._vectors.get(int_num)
+            self._vectors[int_num] = handler
+            return prev
+        dispatch = self._dispatchers.get(int_num)
+        if dispatch is None or self._vectors.get(int_num) is not dispatch:
+            self._add_table(int_num, {}, self._vectors.get(int_num) or self._unhandled)
+        table = self._functions[int_num]
+        prev = table.get(ah)
+        table[ah] = handler
+        return prev
+
+    def function_name(self, int_num, ah=None):
+        """'INT 21h/3Dh dos_open'-style name for counters and traces."""
+        if ah is None:
+            fn = self._vectors.get(int_num)
+            return f'INT {int_num:02X}h {_handler_name(fn)}'
+        fn = self._functions.get(int_num, {}).get(ah) or self._fallback.get(int_num)
+        return f'INT {int_num:02X}h/{ah:02X}h {_handler_name(fn)}'
+
+    def top(self, n=20):
+        """[(name, count)] of the most called interrupt functions."""
+        rows = [(self.function_name(int_num, ah), c)
+                for (int_num, ah), c in self.function_counts.items()]
+        rows += [(self.function_name(int_num), c) for int_num, c in self.counts.items()
+                 if int_num not in self._functions]
+        return sorted(rows, key=lambda r: -r[1])[:n]
+
     # -- Main dispatcher ------------------------------------------------------
 
     def handle(self, int_num):
@@ -56,128 +176,125 @@ class InterruptHandler:
         chain to IVT handler in memory."""
         if self.on_int:
             self.on_int(int_num, self.cpu.get_reg8(4))  # AH
-
-        if int_num == 0x10:
-            return self._int10()
-        if int_num == 0x11:
-            # Equipment check: return VGA + 1 floppy
-            self.cpu.ax = 0x0021  # bit5=0 (VGA), bit0=1 (floppy), bit1=0
-            return True
-        if int_num == 0x12:
-            # Memory size: 640KB conventional
-            self.cpu.ax = 640
-            return True
-        if int_num == 0x16:
-            return self._int16()
-        if int_num == 0x1A:
-            return self._int1a()
-        if int_num == 0x21:
-            return self._int21()
-        if int_num == 0x33:
-            return self._int33()
-
+        self.counts[int_num] += 1
+        fn = self._vectors.get(int_num)
         # INT 34h-3Dh: FPU — these should be handled by the executor, not here.
-        # INT 00h: divide error
-        if int_num == 0x00:
-            raise RuntimeError(f"Divide by zero at CS:IP={self.cpu.segs[1]:04X}:{self.cpu.ip:04X}")
-
         # Unhandled: return False to chain to IVT
+        return fn() if fn is not None else False
+
+    def _handled(self):
+        return True
+
+    def _unhandled(self):
         return False
 
+    def _divide_error(self):
+        raise RuntimeError(f"Divide by zero at CS:IP={self.cpu.segs[1]:04X}:{self.cpu.ip:04X}")
+
+    def _equipment(self):
+        # Equipment check: return VGA + 1 floppy
+        self.cpu.ax = 0x0021  # bit5=0 (VGA), bit0=1 (floppy), bit1=0
+        return True
+
+    def _memory_size(self):
+        # Memory size: 640KB conventional
+        self.cpu.ax = 640
+        return True
+
     # -- INT 10h: BIOS Video --------------------------------------------------
 
-    def _int10(self):
-        ah = self.cpu.get_reg8(4)
-        if ah == 0x00:  # Set video mode
-            mode = self.cpu.get_reg8(0)  # AL
+    def _video_set_mode(self):
+        mode = self.cpu.get_reg8(0)  # AL
+        if self.ports:
+            self.ports.set_mode(mode)
+        return True
+
+    def _video_get_mode(self):
+        mode = self.ports.video_mode if self.ports else 0x13
+        self.cpu.set_reg8(0, mode)  # AL = current mode
+        self.cpu.set_reg8(4, 0)     # AH = page 0
+        return True
+
+    def _video_read_char(self):
+        self.cpu.set_reg8(4, 0x07)  # AH = attribute (white on black)
+        self.cpu.set_reg8(0, 0x20)  # AL = space
+        return True
+
+    def _video_dac(self):
+        """Palette / DAC functions (AL selects)."""
+        al = self.cpu.get_reg8(0)
+        if al == 0x10:  # Set individual DAC register: BX=color#, DH=red, CH=green, CL=blue
+            idx = self.cpu.bx & 0xFF
+            dh = (self.cpu.dx >> 8) & 0x3F
+            cl_val = self.cpu.cx & 0x3F
+            ch_val = (self.cpu.cx >> 8) & 0x3F
             if self.ports:
-                self.ports.set_mode(mode)
-        elif ah == 0x0F:  # Get video mode
-            mode = self.ports.video_mode if self.ports else 0x13
-            self.cpu.set_reg8(0, mode)  # AL = current mode
-            self.cpu.set_reg8(4, 0)     # AH = page 0
-        elif ah == 0x08:  # Read character/attribute at cursor
-            self.cpu.set_reg8(4, 0x07)  # AH = attribute (white on black)
-            self.cpu.set_reg8(0, 0x20)  # AL = space
-        elif ah == 0x10:  # Palette / DAC functions
-            al = self.cpu.get_reg8(0)
-            if al == 0x10:  # Set individual DAC register
-                idx = self.cpu.bx & 0xFF
-                dh = (self.cpu.dx >> 8) & 0x3F
-                ch = self.cpu.get_reg8(5) & 0x3F  # CH
-                cl = self.cpu.get_reg8(4) & 0x3F   # CL — wait, CL is low byte of CX
-                # Actually: BX=color#, DH=red, CH=green, CL=blue
-                cl_val = self.cpu.cx & 0x3F
-                ch_val = (self.cpu.cx >> 8) & 0x3F
-                if self.ports:
-                    self.ports.palette[idx] = (dh, ch_val, cl_val)
-            elif al == 0x12:  # Set block of DAC registers
-                start = self.cpu.bx & 0xFFFF
-                count = self.cpu.cx & 0xFFFF
-                es = self.cpu.segs[0]  # ES
-                dx = self.cpu.dx & 0xFFFF
-                addr = (es << 4) + dx
-                if self.ports:
-                    for i in range(count):
-                        r = self.mem.data[(addr + i * 3) & 0xFFFFF] & 0x3F
-                        g = self.mem.data[(addr + i * 3 + 1) & 0xFFFFF] & 0x3F
-                        b = self.mem.data[(addr + i * 3 + 2) & 0xFFFFF] & 0x3F
-                        self.ports.palette[(start + i) & 0xFF] = (r, g, b)
-            elif al == 0x17:  # Read block of DAC registers
-                start = self.cpu.bx & 0xFFFF
-                count = self.cpu.cx & 0xFFFF
-                es = self.cpu.segs[0]
-                dx = self.cpu.dx & 0xFFFF
-                addr = (es << 4) + dx
-                if self.ports:
-                    for i in range(count):
-                        r, g, b = self.ports.palette[(start + i) & 0xFF]
-                        self.mem.data[(addr + i * 3) & 0xFFFFF] = r & 0x3F
-                        self.mem.data[(addr + i * 3 + 1) & 0xFFFFF] = g & 0x3F
-                        self.mem.data[(addr + i * 3 + 2) & 0xFFFFF] = b & 0x3F
-        elif ah == 0x11:  # Font
-            pass  # no-op
-        elif ah == 0x12:  # Alternate function select (VGA)
-            al = self.cpu.get_reg8(0)
-            bl = self.cpu.get_reg8(2) & 0xFF
-            if bl == 0x10:  # Get EGA info
-                self.cpu.bx = 0x0003  # BH=0 (color), BL=3 (256k)
-                self.cpu.cx = 0x0009  # feature bits, switch settings
+                self.ports.set_dac(idx, dh, ch_val, cl_val)
+        elif al == 0x12:  # Set block of DAC registers
+            start = self.cpu.bx & 0xFFFF
+            count = self.cpu.cx & 0xFFFF
+            es = self.cpu.segs[0]  # ES
+            dx = self.cpu.dx & 0xFFFF
+            addr = (es << 4) + dx
+            if self.ports:
+                for i in range(count):
+                    r = self.mem.data[(addr + i * 3) & 0xFFFFF] & 0x3F
+                    g = self.mem.data[(addr + i * 3 + 1) & 0xFFFFF] & 0x3F
+                    b = self.mem.data[(addr + i * 3 + 2) & 0xFFFFF] & 0x3F
+                    self.ports.set_dac((start + i) & 0xFF, r, g, b)
+        elif al == 0x17:  # Read block of DAC registers
+            start = self.cpu.bx & 0xFFFF
+            count = self.cpu.cx & 0xFFFF
+            es = self.cpu.segs[0]
+            dx = self.cpu.dx & 0xFFFF
+            addr = (es << 4) + dx
+            if self.ports:
+                for i in range(count):
+                    r, g, b = self.ports.palette[(start + i) & 0xFF]
+                    self.mem.data[(addr + i * 3) & 0xFFFFF] = r & 0x3F
+                    self.mem.data[(addr + i * 3 + 1) & 0xFFFFF] = g & 0x3F
+                    self.mem.data[(addr + i * 3 + 2) & 0xFFFFF] = b & 0x3F
+        return True
+
+    def _video_alt_select(self):
+        """Alternate function select (VGA)."""
+        bl = self.cpu.get_reg8(2) & 0xFF
+        if bl == 0x10:  # Get EGA info
+            self.cpu.bx = 0x0003  # BH=0 (color), BL=3 (256k)
+            self.cpu.cx = 0x0009  # feature bits, switch settings
         return True
 
     # -- INT 16h: Keyboard ----------------------------------------------------
 
-    def _int16(self):
-        ah = self.cpu.get_reg8(4)
-        if ah == 0x00:  # Blocking read
-            if self.key_queue:
-                sc, asc = self.key_queue.popleft()
-                self.cpu.set_reg8(4, sc)  # AH = scancode
-                self.cpu.set_reg8(0, asc)  # AL = ASCII
-            else:
-                # No key available — rewind IP to re-execute INT 16h (spin-wait)
-                # This allows timer interrupts to fire between iterations
-                self.cpu.ip = (self.cpu.ip - 2) & 0xFFFF  # back up over CD 16
-                return True
-        elif ah == 0x01:  # Peek
-            if self.key_queue:
-                sc, asc = self.key_queue[0]
-                self.cpu.set_reg8(4, sc)
-                self.cpu.set_reg8(0, asc)
-                self.cpu.zf = 0  # key available
-            else:
-                self.cpu.zf = 1  # no key
+    def _kbd_read(self):
+        """Blocking read."""
+        if self.key_queue:
+            sc, asc = self.key_queue.popleft()
+            self.cpu.set_reg8(4, sc)  # AH = scancode
+            self.cpu.set_reg8(0, asc)  # AL = ASCII
+        else:
+            # No key available — rewind IP to re-execute INT 16h (spin-wait)
+            # This allows timer interrupts to fire between iterations
+            self.cpu.ip = (self.cpu.ip - 2) & 0xFFFF  # back up over CD 16
+        return True
+
+    def _kbd_peek(self):
+        if self.key_queue:
+            sc, asc = self.key_queue[0]
+            self.cpu.set_reg8(4, sc)
+            self.cpu.set_reg8(0, asc)
+            self.cpu.zf = 0  # key available
+        else:
+            self.cpu.zf = 1  # no key
         return True
 
     # -- INT 1Ah: Timer -------------------------------------------------------
 
-    def _int1a(self):
-        ah = self.cpu.get_reg8(4)
-        if ah == 0x00:
-            self.tick_count += 1
-            self.cpu.cx = (self.tick_count >> 16) & 0xFFFF
-            self.cpu.dx = self.tick_count & 0xFFFF
-            self.cpu.set_reg8(0, 0)  # AL = midnight flag
+    def _timer_ticks(self):
+        self.tick_count += 1
+        self.cpu.cx = (self.tick_count >> 16) & 0xFFFF
+        self.cpu.dx = self.tick_count & 0xFFFF
+        self.cpu.set_reg8(0, 0)  # AL = midnight flag
         return True
 
     # -- INT 33h: Mouse -------------------------------------------------------
@@ -189,146 +306,109 @@ class InterruptHandler:
 
     # -- INT 21h: DOS ---------------------------------------------------------
 
-    def _int21(self):
-        ah = self.cpu.get_reg8(4)
+    def _dos_ok(self):
+        self.cpu.cf = 0
+        return True
 
-        if ah == 0x07:  # Direct char input without echo (blocking)
-            if self.key_queue:
-                sc, asc = self.key_queue.popleft()
-                self.cpu.set_reg8(0, asc)  # AL = character
-            else:
-                # Spin-wait: rewind IP to re-execute INT 21h
-                self.cpu.ip = (self.cpu.ip - 2) & 0xFFFF
-            return True
+    def _dos_getch(self):
+        """Direct char input without echo (blocking)."""
+        if self.key_queue:
+            sc, asc = self.key_queue.popleft()
+            self.cpu.set_reg8(0, asc)  # AL = character
+        else:
+            # Spin-wait: rewind IP to re-execute INT 21h
+            self.cpu.ip = (self.cpu.ip - 2) & 0xFFFF
+        return True
 
-        if ah == 0x0B:  # Check stdin status
-            if self.key_queue:
-                self.cpu.set_reg8(0, 0xFF)  # AL = FFh = input available
-            else:
-                self.cpu.set_reg8(0, 0x00)  # AL = 00h = no input
-            return True
-
-        if ah == 0x1A:  # Set DTA
-            self._dta_seg = self.cpu.segs[3]  # DS
-            self._dta_off = self.cpu.dx
-            return True
-
-        if ah == 0x25:  # Set interrupt vector
-            int_num = self.cpu.get_reg8(0)  # AL
-            off = self.cpu.dx
-            seg = self.cpu.segs[3]  # DS
-            self.mem.write16(int_num * 4, off)
-            self.mem.write16(int_num * 4 + 2, seg)
-            return True
-
-        if ah == 0x2A:  # Get date
-            self.cpu.cx = 1995  # year
-            self.cpu.set_reg8(6, 6)  # DH = month
-            self.cpu.set_reg8(2, 15)  # DL = day
-            self.cpu.set_reg8(0, 4)  # AL = day of week (Thursday)
-            return True
-
-        if ah == 0x2C:  # Get time
-            self.cpu.set_reg8(4, 12)  # CH = hour
-            self.cpu.set_reg8(0, 0)   # CL = minute
-            self.cpu.set_reg8(6, 0)   # DH = second
-            self.cpu.set_reg8(2, 0)   # DL = hundredths
-            return True
-
-        if ah == 0x2F:  # Get DTA address
-            self.cpu.segs[0] = self._dta_seg  # ES
-            self.cpu.bx = self._dta_off
-            return True
-
-        if ah == 0x30:  # Get DOS version
-            self.cpu.set_reg8(0, 3)    # AL = major version
-            self.cpu.set_reg8(4, 10)   # AH = minor version
-            self.cpu.bx = 0
-            self.cpu.cx = 0
-            return True
-
-        if ah == 0x35:  # Get interrupt vector
-            int_num = self.cpu.get_reg8(0)  # AL
-            off = self.mem.read16(int_num * 4)
-            seg = self.mem.read16(int_num * 4 + 2)
-            self.cpu.bx = off
-            self.cpu.segs[0] = seg  # ES
-            return True
-
-        if ah == 0x3C:  # Create file
-            return self._dos_create()
-
-        if ah == 0x3D:  # Open file
-            return self._dos_open()
-        if ah == 0x3E:  # Close file
-            return self._dos_close()
-        if ah == 0x3F:  # Read file
-            return self._dos_read()
-        if ah == 0x40:  # Write file
-            return self._dos_write()
-        if ah == 0x42:  # Seek
-            return self._dos_seek()
-
-        if ah == 0x43:  # Get/set file attributes
-            al = self.cpu.get_reg8(0)
-            if al == 0:  # Get attributes
-                dos_path = self._read_dos_string(self.cpu.segs[3], self.cpu.dx)
-                local_path = self._resolve_path(dos_path)
-                if os.path.exists(local_path):
-                    self.cpu.cx = 0x20  # Archive attribute
-                    self.cpu.cf = 0
-                else:
-                    self.cpu.ax = 2  # File not found
-                    self.cpu.cf = 1
-            else:  # Set attributes — no-op
-                self.cpu.cf = 0
-            return True
+    def _dos_stdin_status(self):
+        if self.key_queue:
+            self.cpu.set_reg8(0, 0xFF)  # AL = FFh = input available
+        else:
+            self.cpu.set_reg8(0, 0x00)  # AL = 00h = no input
+        return True
 
-        if ah == 0x44:  # IOCTL
-            al = self.cpu.get_reg8(0)
-            if al == 0x00:  # Get device info
-                self.cpu.dx = 0x80  # character device
-                self.cpu.cf = 0
-            elif al == 0x01:  # Set device info
-                self.cpu.cf = 0
-            else:
-                self.cpu.cf = 0
-            return True
+    def _dos_set_dta(self):
+        self._dta_seg = self.cpu.segs[3]  # DS
+        self._dta_off = self.cpu.dx
+        return True
 
-        if ah == 0x48:  # Allocate memory
-            paras = self.cpu.bx
-            seg = self._heap_seg
-            self._heap_seg += paras
-            self.cpu.ax = seg
-            self.cpu.cf = 0
-            return True
+    def _dos_set_vector(self):
+        int_num = self.cpu.get_reg8(0)  # AL
+        off = self.cpu.dx
+        seg = self.cpu.segs[3]  # DS
+        self.mem.write16(int_num * 4, off)
+        self.mem.write16(int_num * 4 + 2, seg)
+        return True
 
-        if ah == 0x49:  # Free memory
-            self.cpu.cf = 0
-            return True
+    def _dos_get_date(self):
+        self.cpu.cx = 1995  # year
+        self.cpu.set_reg8(6, 6)  # DH = month
+        self.cpu.set_reg8(2, 15)  # DL = day
+        self.cpu.set_reg8(0, 4)  # AL = day of week (Thursday)
+        return True
 
-        if ah == 0x4A:  # Resize memory block
-            self.cpu.cf = 0
-            return True
+    def _dos_get_time(self):
+        self.cpu.set_reg8(4, 12)  # CH = hour
+        self.cpu.set_reg8(0, 0)   # CL = minute
+        self.cpu.set_reg8(6, 0)   # DH = second
+        self.cpu.set_reg8(2, 0)   # DL = hundredths
+        return True
 
-        if ah == 0x4C:  # Exit
-            raise EmuExit(self.cpu.get_reg8(0))
+    def _dos_get_dta(self):
+        self.cpu.segs[0] = self._dta_seg  # ES
+        self.cpu.bx = self._dta_off
+        return True
 
-        if ah == 0x4E:  # Find first
-            return self._dos_find_first()
-        if ah == 0x4F:  # Find next
-            return self._dos_find_next()
+    def _dos_version(self):
+        self.cpu.set_reg8(0, 3)    # AL = major version
+        self.cpu.set_reg8(4, 10)   # AH = minor version
+        self.cpu.bx = 0
+        self.cpu.cx = 0
+        return True
 
-        if ah == 0x58:  # Get/set allocation strategy
-            self.cpu.ax = 0
-            self.cpu.cf = 0
-            return True
+    def _dos_get_vector(self):
+        int_num = self.cpu.get_reg8(0)  # AL
+        off = self.mem.read16(int_num * 4)
+        seg = self.mem.read16(int_num * 4 + 2)
+        self.cpu.bx = off
+        self.cpu.segs[0] = seg  # ES
+        return True
 
-        if ah == 0x67:  # Set max handles
+    def _dos_attributes(self):
+        """Get/set file attributes."""
+        al = self.cpu.get_reg8(0)
+        if al == 0:  # Get attributes
+            dos_path = self._read_dos_string(self.cpu.segs[3], self.cpu.dx)
+            if self.fs.exists(dos_path):
+                self.cpu.cx = 0x20  # Archive attribute
+                self.cpu.cf = 0
+            else:
+                self.cpu.ax = 2  # File not found
+                self.cpu.cf = 1
+        else:  # Set attributes — no-op
             self.cpu.cf = 0
-            return True
+        return True
 
-        # Unknown — succeed silently
+    def _dos_ioctl(self):
+        al = self.cpu.get_reg8(0)
+        if al == 0x00:  # Get device info
+            self.cpu.dx = 0x80  # character device
+        self.cpu.cf = 0
+        return True
+
+    def _dos_alloc(self):
+        paras = self.cpu.bx
+        seg = self._heap_seg
+        self._heap_seg += paras
+        self.cpu.ax = seg
+        self.cpu.cf = 0
+        return True
+
+    def _dos_exit(self):
+        raise EmuExit(self.cpu.get_reg8(0))
+
+    def _dos_alloc_strategy(self):
+        self.cpu.ax = 0
         self.cpu.cf = 0
         return True
 
@@ -345,24 +425,16 @@ class InterruptHandler:
             off += 1
         return ''.join(chars)
 
-    def _resolve_path(self, dos_path):
-        """Map DOS filename to local earth/ path."""
-        # Strip any drive letter
-        if len(dos_path) >= 2 and dos_path[1] == ':':
-            dos_path = dos_path[2:]
-        dos_path = dos_path.replace('\\', '/')
-        fname = os.path.basename(dos_path)
-        return os.path.join(self.earth_dir, fname)
+    def _new_handle(self, f):
+        handle = self._next_handle
+        self._next_handle += 1
+        self._files[handle] = f
+        return handle
 
     def _dos_create(self):
         dos_path = self._read_dos_string(self.cpu.segs[3], self.cpu.dx)
-        local_path = self._resolve_path(dos_path)
         try:
-            f = open(local_path, 'w+b')
-            handle = self._next_handle
-            self._next_handle += 1
-            self._files[handle] = f
-            self.cpu.ax = handle
+            self.cpu.ax = self._new_handle(self.fs.create(dos_path))
             self.cpu.cf = 0
         except Exception:
             self.cpu.ax = 5  # access denied
@@ -371,19 +443,9 @@ class InterruptHandler:
 
     def _dos_open(self):
         dos_path = self._read_dos_string(self.cpu.segs[3], self.cpu.dx)
-        local_path = self._resolve_path(dos_path)
         mode = self.cpu.get_reg8(0)  # AL = access mode
         try:
-            if mode == 0:
-                f = open(local_path, 'rb')
-            elif mode == 1:
-                f = open(local_path, 'r+b')
-            else:
-                f = open(local_path, 'r+b')
-            handle = self._next_handle
-            self._next_handle += 1
-            self._files[handle] = f
-            self.cpu.ax = handle
+            self.cpu.ax = self._new_handle(self.fs.open(dos_path, mode & 3))
             self.cpu.cf = 0
         except FileNotFoundError:
             self.cpu.ax = 2  # file not found
@@ -393,12 +455,14 @@ class InterruptHandler:
     def _dos_close(self):
         handle = self.cpu.bx
         if handle in self._files:
-            self._files[handle].close()
-            del self._files[handle]
+            f = self._files.pop(handle)
+            f.close()
+            self.fs.closed(f)
         self.cpu.cf = 0
         return True
 
     def _dos_read(self):
+        # Overlay files return a memoryview: copied straight into memory
         handle = self.cpu.bx
         count = self.cpu.cx
         buf_addr = self.mem.phys(self.cpu.segs[3], self.cpu.dx)
@@ -449,9 +513,7 @@ class InterruptHandler:
 
     def _dos_find_first(self):
         pattern = self._read_dos_string(self.cpu.segs[3], self.cpu.dx)
-        local_pattern = self._resolve_path(pattern)
-        import glob
-        matches = sorted(glob.glob(local_pattern))
+        matches = self.fs.find(pattern)
         if matches:
             self._find_results = matches
             self._find_idx = 0
@@ -473,13 +535,13 @@ class InterruptHandler:
             self.cpu.cf = 1
         return True
 
-    def _fill_dta(self, filepath):
-        """Write find result to DTA."""
+    def _fill_dta(self, match):
+        """Write find result (name, size) to DTA."""
         dta = self.mem.phys(self._dta_seg, self._dta_off)
         # DTA layout: 0x00-0x14 reserved, 0x15 attr, 0x16-0x19 time/date,
         # 0x1A-0x1D size, 0x1E-0x2A filename (13 bytes, NUL-terminated)
-        fname = os.path.basename(filepath).upper()[:12]
-        size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        fname, size = match
+        fname = fname[:12]
         self.mem.write8(dta + 0x15, 0x20)  # archive attribute
         self.mem.write16(dta + 0x16, 0)  # time
         self.mem.write16(dta + 0x18, 0)  # date
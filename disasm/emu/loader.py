@@ -4,53 +4,124 @@ import struct
 import os
 
 
-def load_exe(path, mem):
-    """Load MZ EXE into Memory, apply relocations.
-    Returns dict with load info: load_seg, entry_cs, entry_ip, entry_ss, entry_sp,
-    ds_seg, image_size, num_relocs.
-    """
-    with open(path, 'rb') as f:
-        exe = f.read()
+# Load segment: env at 0x0060, PSP at 0x0080, image at 0x0090
+# IVT IRET stubs occupy 0x0500-0x05FF; env must not overlap.
+LOAD_SEG = 0x0080   # PSP paragraph
+ENV_SEG = 0x0060    # phys 0x600, above IVT stubs (0x500-0x5FF)
 
-    # Parse MZ header
-    if exe[0:2] != b'MZ' and exe[0:2] != b'ZM':
-        raise ValueError(f"Not an MZ executable: {path}")
-
-    e_cblp = struct.unpack_from('<H', exe, 0x02)[0]
-    e_cp = struct.unpack_from('<H', exe, 0x04)[0]
-    e_crlc = struct.unpack_from('<H', exe, 0x06)[0]
-    e_cparhdr = struct.unpack_from('<H', exe, 0x08)[0]
-    e_ss = struct.unpack_from('<H', exe, 0x0E)[0]
-    e_sp = struct.unpack_from('<H', exe, 0x10)[0]
-    e_cs = struct.unpack_from('<H', exe, 0x14)[0]
-    e_ip = struct.unpack_from('<H', exe, 0x16)[0]
-    e_lfarlc = struct.unpack_from('<H', exe, 0x18)[0]
+# SCORCH.EXE file offset of DS:0000 (disasm/addr.py); file_to_phys() it
+# for the data segment in emulator memory.
+DS_FILE_BASE = 0x055D80
+
+# path -> (mtime_ns, size, exe, hdr, {image_seg: relocated image})
+_exe_cache = {}
 
+
+def parse_header(exe):
+    """MZ header fields needed by the loader, as a dict."""
+    if exe[0:2] != b'MZ' and exe[0:2] != b'ZM':
+        raise ValueError("Not an MZ executable")
+    (e_cblp, e_cp, e_crlc, e_cparhdr, _minalloc, _maxalloc, e_ss, e_sp,
+     _csum, e_cs, e_ip, e_lfarlc) = struct.unpack_from('<12H', exe, 0x02)
     header_size = e_cparhdr * 16
     image_size = e_cp * 512
     if e_cblp:
         image_size -= (512 - e_cblp)
     image_size -= header_size
-    image_data = exe[header_size:header_size + image_size]
-
-    # Load segment: env at 0x0060, PSP at 0x0080, image at 0x0090
-    # IVT IRET stubs occupy 0x0500-0x05FF; env must not overlap.
-    load_seg = 0x0080  # PSP paragraph
-    image_seg = load_seg + 0x10  # image starts one segment (256 bytes) after PSP
-    image_base = image_seg << 4  # physical address
-
-    # Copy image into memory
-    mem.load_bytes(image_base, image_data)
-
-    # Apply relocations
-    reloc_count = e_crlc
-    for i in range(reloc_count):
-        rpos = e_lfarlc + i * 4
-        r_off = struct.unpack_from('<H', exe, rpos)[0]
-        r_seg = struct.unpack_from('<H', exe, rpos + 2)[0]
-        phys = image_base + r_seg * 16 + r_off
-        old_val = mem.read16(phys)
-        mem.write16(phys, (old_val + image_seg) & 0xFFFF)
+    return {'e_ss': e_ss, 'e_sp': e_sp, 'e_cs': e_cs, 'e_ip': e_ip,
+            'num_relocs': e_crlc, 'reloc_table': e_lfarlc,
+            'header_size': header_size, 'image_size': image_size}
+
+
+def parse_relocs(exe, hdr):
+    """Image offsets (seg * 16 + off) of every relocation entry, in table order."""
+    table = exe[hdr['reloc_table']:hdr['reloc_table'] + hdr['num_relocs'] * 4]
+    return [seg * 16 + off for off, seg in struct.iter_unpack('<HH', table)]
+
+
+def relocate_image(exe, hdr, image_seg):
+    """
+    Load image with every relocated segment word incremented by image_seg.
+
+    The words are patched through two 16-bit memoryviews of one bytearray,
+    one for even and one for odd offsets. A duplicate table entry is
+    applied twice, as DOS does. Words past the image are patched in zero
+    fill, so the result can be longer than the image.
+    """
+    header_size = hdr['header_size']
+    image = bytearray(exe[header_size:header_size + hdr['image_size']])
+    relocs = parse_relocs(exe, hdr)
+    need = max(relocs) + 2 if relocs else 0
+    if need > len(image):
+        image.extend(bytes(need - len(image)))
+    if len(image) & 1:
+        image.append(0)
+    buf = memoryview(image)
+    views = (buf.cast('H'), buf[1:-1].cast('H'))   # little-endian host (x86)
+    for pos in relocs:
+        words = views[pos & 1]
+        words[pos >> 1] = (words[pos >> 1] + image_seg) & 0xFFFF
+    views[0].release()
+    views[1].release()
+    buf.release()
+    return bytes(image)
+
+
+def _read_exe(path):
+    """EXE bytes and parsed header, cached per path until the file changes."""
+    st = os.stat(path)
+    hit = _exe_cache.get(path)
+    if hit is None or hit[:2] != (st.st_mtime_ns, st.st_size):
+        with open(path, 'rb') as f:
+            exe = f.read()
+        try:
+            hdr = parse_header(exe)
+        except ValueError:
+            raise ValueError(f"Not an MZ executable: {path}") from None
+        hit = _exe_cache[path] = (st.st_mtime_ns, st.st_size, exe, hdr, {})
+    return hit
+
+
+def exe_info(path):
+    """
+    Load info for path (see load_exe) without loading the image: enough
+    for tools that restore a saved state over a fresh Memory anyway.
+    """
+    _mtime, _size, exe, hdr, _images = _read_exe(path)
+    image_seg = LOAD_SEG + 0x10  # image starts one segment (256 bytes) after PSP
+    return {
+        'load_seg': LOAD_SEG,
+        'image_seg': image_seg,
+        'entry_cs': image_seg + hdr['e_cs'],
+        'entry_ip': hdr['e_ip'],
+        'entry_ss': image_seg + hdr['e_ss'],
+        'entry_sp': hdr['e_sp'],
+        'image_base': image_seg << 4,
+        'image_size': hdr['image_size'],
+        'num_relocs': hdr['num_relocs'],
+        'header_size': hdr['header_size'],
+        'exe_data': exe,
+    }
+
+
+def load_exe(path, mem):
+    """Load MZ EXE into Memory, apply relocations.
+    Returns dict with load info: load_seg, entry_cs, entry_ip, entry_ss, entry_sp,
+    ds_seg, image_size, num_relocs.
+
+    The relocated image is cached per process (keyed by path, mtime and
+    size), so re-loading the same EXE is one bulk copy.
+    """
+    info = exe_info(path)
+    _mtime, _size, exe, hdr, images = _read_exe(path)
+    load_seg = info['load_seg']
+    image_seg = info['image_seg']
+
+    # Copy relocated image into memory
+    image = images.get(image_seg)
+    if image is None:
+        image = images[image_seg] = relocate_image(exe, hdr, image_seg)
+    mem.load_bytes(info['image_base'], image)
 
     # Set up minimal PSP at load_seg
     psp_base = load_seg << 4
@@ -61,7 +132,7 @@ def load_exe(path, mem):
     # PSP:0x02 = top of memory segment
     mem.write16(psp_base + 0x02, 0x9FFF)
     # PSP:0x2C = environment segment (point to a small empty env block)
-    env_seg = 0x0060  # phys 0x600, above IVT stubs (0x500-0x5FF)
+    env_seg = ENV_SEG
     mem.write16(psp_base + 0x2C, env_seg)
     # Write empty environment at env_seg (double NUL = end of env)
     env_base = env_seg << 4
@@ -77,20 +148,6 @@ def load_exe(path, mem):
     # DS segment = (image_base + 0x4F380) >> 4
     # But actually DS is set by the C runtime, not by the loader.
     # The initial DS=ES=PSP segment per DOS convention.
-
-    info = {
-        'load_seg': load_seg,
-        'image_seg': image_seg,
-        'entry_cs': image_seg + e_cs,
-        'entry_ip': e_ip,
-        'entry_ss': image_seg + e_ss,
-        'entry_sp': e_sp,
-        'image_base': image_base,
-        'image_size': image_size,
-        'num_relocs': reloc_count,
-        'header_size': header_size,
-        'exe_data': exe,
-    }
     return info
 
 
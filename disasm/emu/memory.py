@@ -2,12 +2,15 @@
 
 import struct
 
+from .png import write_png, vga_palette
+
 
 class Memory:
     """1MB flat memory: IVT at 0, VGA at 0xA0000, everything else available.
 
     For Mode X (planar VGA), the 0xA0000-0xAFFFF region is backed by 4 planes
-    of 64KB each instead of the flat data array.
+    of 64KB each instead of the flat data array. The planes are allocated on
+    first access, so sessions that never leave Mode 13h don't pay for them.
     """
 
     SIZE = 1 << 20  # 1MB
@@ -17,13 +20,18 @@ class Memory:
 
     def __init__(self):
         self.data = bytearray(self.SIZE)
-        # 4 VGA planes for Mode X (each 64KB)
-        self.vga_planes = [bytearray(self.VGA_PLANE_SIZE) for _ in range(4)]
         # Cached VGA state (updated by PortIO.port_out via notify)
         self._mode_x = False
         self._map_mask = 0x0F
         self._read_plane = 0
 
+    def __getattr__(self, name):
+        # Only called while self.vga_planes is unset: 4 VGA planes for Mode X (each 64KB)
+        if name == 'vga_planes':
+            self.vga_planes = [bytearray(self.VGA_PLANE_SIZE) for _ in range(4)]
+            return self.vga_planes
+        raise AttributeError(f"'Memory' object has no attribute '{name}'")
+
     # -- byte/word/dword reads ------------------------------------------------
 
     def read8(self, addr):
@@ -117,14 +125,13 @@ class Memory:
 
     # -- VGA framebuffer dump -------------------------------------------------
 
-    def dump_screen_png(self, path, ports):
+    def dump_screen_png(self, path, ports, overlay=None):
         """Dump VGA framebuffer to PNG file using current palette.
 
         Supports both Mode 13h (linear) and Mode X (planar).
-        Uses only stdlib (zlib + struct) — no PIL needed.
+        Uses only stdlib (emu/png.py) — no PIL needed.
+        overlay(pixels, width, height) may draw into the copied pixels first.
         """
-        import zlib
-
         width, height = ports.get_resolution()
 
         if ports.mode_x:
@@ -140,32 +147,8 @@ class Memory:
                         pixels[y * width + x] = self.vga_planes[plane][off]
         else:
             # Mode 13h: linear framebuffer at 0xA0000
-            pixels = bytes(self.data[self.VGA_BASE:self.VGA_BASE + width * height])
-
-        # Build 8-bit indexed PNG with PLTE chunk
-        def _chunk(tag, data):
-            c = tag + data
-            return struct.pack('>I', len(data)) + c + struct.pack('>I', zlib.crc32(c) & 0xFFFFFFFF)
-
-        # IHDR
-        ihdr = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)  # 8-bit indexed (type 3)
-        # PLTE: 256 entries, VGA 6-bit → 8-bit
-        plte = bytearray(768)
-        for i in range(256):
-            r, g, b = ports.palette[i]
-            plte[i*3] = min(255, r * 4 + (r >> 4))    # 6-bit → 8-bit
-            plte[i*3+1] = min(255, g * 4 + (g >> 4))
-            plte[i*3+2] = min(255, b * 4 + (b >> 4))
-        # IDAT: filtered rows (filter byte 0 = None for each row)
-        raw = bytearray()
-        for y in range(height):
-            raw.append(0)  # filter: none
-            raw.extend(pixels[y*width:(y+1)*width])
-        idat = zlib.compress(bytes(raw), 9)
-
-        with open(path, 'wb') as f:
-            f.write(b'\x89PNG\r\n\x1a\n')
-            f.write(_chunk(b'IHDR', ihdr))
-            f.write(_chunk(b'PLTE', bytes(plte)))
-            f.write(_chunk(b'IDAT', idat))
-            f.write(_chunk(b'IEND', b''))
+            pixels = bytearray(self.data[self.VGA_BASE:self.VGA_BASE + width * height])
+
+        if overlay is not None:
+            overlay(pixels, width, height)
+        write_png(path, width, height, pixels, vga_palette(ports.palette[:256]))
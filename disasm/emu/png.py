@@ -0,0 +1,36 @@
+"""Minimal 8-bit indexed PNG writer (stdlib only: zlib + struct)."""
+
+import struct
+import zlib
+
+
+def _chunk(tag, data):
+    c = tag + data
+    return struct.pack('>I', len(data)) + c + struct.pack('>I', zlib.crc32(c) & 0xFFFFFFFF)
+
+
+def png_bytes(width, height, pixels, palette):
+    """
+    Encode width*height palette indices (row-major bytes-like) as a PNG.
+    palette: sequence of (r, g, b) 8-bit entries (at most 256).
+    """
+    # IHDR: 8-bit indexed (type 3)
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    plte = bytes(c for rgb in palette for c in rgb)
+    # IDAT: filtered rows (filter byte 0 = None for each row)
+    pixels = bytes(pixels)
+    raw = b''.join(b'\x00' + pixels[y * width:(y + 1) * width] for y in range(height))
+    idat = zlib.compress(raw, 9)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', ihdr) + _chunk(b'PLTE', plte)
+            + _chunk(b'IDAT', idat) + _chunk(b'IEND', b''))
+
+
+def write_png(path, width, height, pixels, palette):
+    with open(path, 'wb') as f:
+        f.write(png_bytes(width, height, pixels, palette))
+
+
+def vga_palette(dac):
+    """VGA DAC entries (6-bit r, g, b) → 8-bit palette for png_bytes."""
+    return [(min(255, r * 4 + (r >> 4)), min(255, g * 4 + (g >> 4)), min(255, b * 4 + (b >> 4)))
+            for r, g, b in dac]
@@ -1,5 +1,7 @@
 """VGA port I/O handlers: palette, sequencer, CRTC, GC, vsync."""
 
+from .vgalog import DAC_R, SEQ, CRTC, GC
+
 
 class PortIO:
     def __init__(self):
@@ -9,6 +11,7 @@ class PortIO:
         self._pal_read_idx = 0
         self._pal_read_comp = 0
         self._vsync_toggle = 0
+        self._vsync_low = False   # a status read has reported no retrace since the last vsync
 
         # VGA Sequencer (port 0x3C4/0x3C5)
         self._seq_index = 0
@@ -31,27 +34,25 @@ class PortIO:
         # Mode tracking
         self.video_mode = 0x13  # default mode 13h
         self.mem = None  # set by __main__ for cache sync
-    @property
-    def mode_x(self):
-        """True if VGA is in unchained/planar mode (Mode X): seq reg 4 chain-4 bit cleared."""
-        return not (self.seq_regs[4] & 0x08)
-
-    @property
-    def map_mask(self):
-        """Sequencer register 2: which planes are written."""
-        return self.seq_regs[2] & 0x0F
+        self.frames = None  # frames.FrameClock while frame detection is on
+        self.vga_log = None  # vgalog.VgaLog while register logging is on
 
-    @property
-    def read_plane(self):
-        """GC register 4: which plane is read."""
-        return self.gc_regs[4] & 0x03
+        # Cached from seq_regs/gc_regs by _sync_mem() whenever those change:
+        #   mode_x      unchained/planar mode (Mode X): seq reg 4 chain-4 bit cleared
+        #   map_mask    sequencer register 2: which planes are written
+        #   read_plane  GC register 4: which plane is read
+        self._sync_mem()
+        self._build_tables()
 
     def _sync_mem(self):
-        """Push cached VGA state to Memory for fast path."""
+        """Recompute the cached VGA state and push it to Memory for the fast path."""
+        self.mode_x = not (self.seq_regs[4] & 0x08)
+        self.map_mask = self.seq_regs[2] & 0x0F
+        self.read_plane = self.gc_regs[4] & 0x03
         if self.mem:
-            self.mem._mode_x = not (self.seq_regs[4] & 0x08)
-            self.mem._map_mask = self.seq_regs[2] & 0x0F
-            self.mem._read_plane = self.gc_regs[4] & 0x03
+            self.mem._mode_x = self.mode_x
+            self.mem._map_mask = self.map_mask
+            self.mem._read_plane = self.read_plane
 
     def set_mode(self, mode):
         """Called by INT 10h AH=00 to reset VGA state."""
@@ -60,85 +61,236 @@ class PortIO:
         self.seq_regs[2] = 0x0F
         self.gc_regs[4] = 0
         self._sync_mem()
+        if self.vga_log is not None:
+            self.vga_log.append(SEQ, 4, 0x08)
+            self.vga_log.append(SEQ, 2, 0x0F)
+            self.vga_log.append(GC, 4, 0)
+
+    def set_dac(self, idx, r, g, b):
+        """Set one palette entry (INT 10h AX=1010h/1012h)."""
+        self.palette[idx] = (r, g, b)
+        if self.vga_log is not None:
+            for comp, val in enumerate((r, g, b)):
+                self.vga_log.append(DAC_R + comp, idx, val)
+
+    # -- dispatch -----------------------------------------------------------------
+
+    def _build_tables(self):
+        """Per-port handler lists indexed by port number (all 64K ports, so
+        execute's IN/OUT handlers index them without a lookup miss): reads
+        take no arguments and return the byte, writes take the byte. 16-bit
+        OUTs to the VGA index ports write the index and the data register in
+        one handler."""
+        reads = {
+            0x3DA: self._in_status,
+            0x3C9: self._in_dac_data,
+            0x3C5: self._in_seq_data,
+            0x3D5: self._in_crtc_data,
+            0x3CF: self._in_gc_data,
+            0x3C4: self._in_seq_index,
+            0x3D4: self._in_crtc_index,
+            0x60: self._in_kbd_data,
+            0x61: self._in_zero,       # keyboard controller status
+            0x201: self._in_zero,      # Joystick: no buttons pressed, all axes done
+        }
+        writes = {
+            0x3C8: self._out_dac_write_index,
+            0x3C7: self._out_dac_read_index,
+            0x3C9: self._out_dac_data,
+            0x3C4: self._out_seq_index,
+            0x3C5: self._out_seq_data,
+            0x3D4: self._out_crtc_index,
+            0x3D5: self._out_crtc_data,
+            0x3CE: self._out_gc_index,
+            0x3CF: self._out_gc_data,
+        }
+        self.in_handlers = [self._in_ff] * 0x10000
+        self.out_handlers = [self._out_ignore] * 0x10000
+        for port, handler in reads.items():
+            self.in_handlers[port] = handler
+        for port, handler in writes.items():
+            self.out_handlers[port] = handler
+        self._out16 = {
+            0x3C4: self._out16_seq,
+            0x3CE: self._out16_gc,
+            0x3D4: self._out16_crtc,
+        }
+
+    def register(self, port, read=None, write=None):
+        """Handle IN from port with read() and/or OUT to it with write(val).
+        Returns the (read, write) pair replaced (None where there was none),
+        so a custom handler can delegate to it. A 16-bit OUT to a port with a
+        new write handler goes to that handler with the low byte."""
+        port &= 0xFFFF
+        prev_in, prev_out = self.in_handlers[port], self.out_handlers[port]
+        if read is not None:
+            self.in_handlers[port] = read
+        if write is not None:
+            self.out_handlers[port] = write
+            self._out16.pop(port, None)
+        return (None if prev_in == self._in_ff else prev_in,
+                None if prev_out == self._out_ignore else prev_out)
 
     def port_in(self, port):
-        if port == 0x3DA:
-            # VGA status: toggle bit 3 (vsync) so wait loops terminate
-            self._vsync_toggle ^= 0x08
-            return self._vsync_toggle
-        if port == 0x3C9:
-            # Read palette RGB component
-            idx = self._pal_read_idx
-            comp = self._pal_read_comp
-            val = self.palette[idx][comp]
-            self._pal_read_comp += 1
-            if self._pal_read_comp >= 3:
-                self._pal_read_comp = 0
-                self._pal_read_idx = (self._pal_read_idx + 1) & 0xFF
-            return val
-        if port == 0x3C5:
-            return self.seq_regs[self._seq_index & 7]
-        if port == 0x3D5:
-            return self.crtc_regs[self._crtc_index & 0x3F]
-        if port == 0x3CF:
-            return self.gc_regs[self._gc_index & 0x0F]
-        if port == 0x3C4:
-            return self._seq_index
-        if port == 0x3D4:
-            return self._crtc_index
-        if port == 0x60:
-            return self.kbd_scancode
-        if port == 0x61:
-            return 0x00  # keyboard controller status
-        if port == 0x201:
-            return 0x00  # Joystick: no buttons pressed, all axes done
-        # All other ports: return 0xFF
-        return 0xFF
+        return self.in_handlers[port & 0xFFFF]()
 
     def port_out(self, port, val):
-        # VGA 16-bit OUT to even index ports: low byte = index, high byte = data
-        if val > 0xFF and port in (0x3C4, 0x3CE, 0x3D4):
-            self.port_out(port, val & 0xFF)
-            self.port_out(port + 1, (val >> 8) & 0xFF)
-            return
-        if port == 0x3C8:
-            self._pal_write_idx = val & 0xFF
-            self._pal_write_comp = 0
-        elif port == 0x3C7:
-            self._pal_read_idx = val & 0xFF
+        if val > 0xFF:
+            self.port_out16(port, val)
+        else:
+            self.out_handlers[port & 0xFFFF](val)
+
+    def port_out16(self, port, val):
+        """OUT DX, AX: index/data pairs for the VGA index ports, otherwise the
+        low byte to port."""
+        handler = self._out16.get(port)
+        if handler is not None:
+            handler(val)
+        else:
+            self.out_handlers[port & 0xFFFF](val & 0xFF)
+
+    # -- reads --------------------------------------------------------------------
+
+    def _in_status(self):
+        # VGA status: toggle bit 3 (vsync) so wait loops terminate
+        # One retrace wait reads 8 at most twice (the first read, and the end
+        # of the wait), so only 0 -> 8 counts as a vsync.
+        self._vsync_toggle ^= 0x08
+        if not self._vsync_toggle:
+            self._vsync_low = True
+        elif self._vsync_low:
+            self._vsync_low = False
+            if self.frames is not None:
+                self.frames.event('vsync')
+        return self._vsync_toggle
+
+    def _in_dac_data(self):
+        # Read palette RGB component
+        idx = self._pal_read_idx
+        comp = self._pal_read_comp
+        val = self.palette[idx][comp]
+        self._pal_read_comp += 1
+        if self._pal_read_comp >= 3:
             self._pal_read_comp = 0
-        elif port == 0x3C9:
-            idx = self._pal_write_idx
-            r, g, b = self.palette[idx]
-            comp = self._pal_write_comp
-            if comp == 0:
-                r = val & 0x3F
-            elif comp == 1:
-                g = val & 0x3F
-            else:
-                b = val & 0x3F
-            self.palette[idx] = (r, g, b)
-            self._pal_write_comp += 1
-            if self._pal_write_comp >= 3:
-                self._pal_write_comp = 0
-                self._pal_write_idx = (self._pal_write_idx + 1) & 0xFF
-        elif port == 0x3C4:
-            self._seq_index = val & 0xFF
-        elif port == 0x3C5:
-            idx = self._seq_index & 7
-            self.seq_regs[idx] = val & 0xFF
-            if idx in (2, 4):
-                self._sync_mem()
-        elif port == 0x3D4:
-            self._crtc_index = val & 0xFF
-        elif port == 0x3D5:
-            self.crtc_regs[self._crtc_index & 0x3F] = val & 0xFF
-        elif port == 0x3CE:
-            self._gc_index = val & 0xFF
-        elif port == 0x3CF:
-            self.gc_regs[self._gc_index & 0x0F] = val & 0xFF
-            if self._gc_index & 0x0F == 4:
-                self._sync_mem()
+            self._pal_read_idx = (self._pal_read_idx + 1) & 0xFF
+        return val
+
+    def _in_seq_data(self):
+        return self.seq_regs[self._seq_index & 7]
+
+    def _in_crtc_data(self):
+        return self.crtc_regs[self._crtc_index & 0x3F]
+
+    def _in_gc_data(self):
+        return self.gc_regs[self._gc_index & 0x0F]
+
+    def _in_seq_index(self):
+        return self._seq_index
+
+    def _in_crtc_index(self):
+        return self._crtc_index
+
+    def _in_kbd_data(self):
+        return self.kbd_scancode
+
+    def _in_zero(self):
+        return 0x00
+
+    def _in_ff(self):
+        return 0xFF    # All other ports: return 0xFF
+
+    # -- writes -------------------------------------------------------------------
+
+    def _out_ignore(self, val):
+        pass
+
+    def _out_dac_write_index(self, val):
+        self._pal_write_idx = val & 0xFF
+        self._pal_write_comp = 0
+
+    def _out_dac_read_index(self, val):
+        self._pal_read_idx = val & 0xFF
+        self._pal_read_comp = 0
+
+    def _out_dac_data(self, val):
+        idx = self._pal_write_idx
+        r, g, b = self.palette[idx]
+        comp = self._pal_write_comp
+        if comp == 0:
+            r = val & 0x3F
+        elif comp == 1:
+            g = val & 0x3F
+        else:
+            b = val & 0x3F
+        self.palette[idx] = (r, g, b)
+        if self.vga_log is not None:
+            self.vga_log.append(DAC_R + comp, idx, val & 0x3F)
+        self._pal_write_comp += 1
+        if self._pal_write_comp >= 3:
+            self._pal_write_comp = 0
+            self._pal_write_idx = (self._pal_write_idx + 1) & 0xFF
+
+    def _out_seq_index(self, val):
+        self._seq_index = val & 0xFF
+
+    def _out_seq_data(self, val):
+        idx = self._seq_index & 7
+        self.seq_regs[idx] = val & 0xFF
+        if self.vga_log is not None:
+            self.vga_log.append(SEQ, idx, val)
+        if idx == 2:
+            # Map Mask: rewritten before nearly every Mode X plane write
+            self.map_mask = val & 0x0F
+            if self.mem:
+                self.mem._map_mask = self.map_mask
+        elif idx == 4:
+            self._sync_mem()
+
+    def _out_crtc_index(self, val):
+        self._crtc_index = val & 0xFF
+
+    def _out_crtc_data(self, val):
+        idx = self._crtc_index & 0x3F
+        self.crtc_regs[idx] = val & 0xFF
+        if self.vga_log is not None:
+            self.vga_log.append(CRTC, idx, val)
+        if idx in (0x0C, 0x0D) and self.frames is not None:
+            self.frames.crtc_start((self.crtc_regs[0x0C] << 8) | self.crtc_regs[0x0D])
+
+    def _out_gc_index(self, val):
+        self._gc_index = val & 0xFF
+
+    def _out_gc_data(self, val):
+        idx = self._gc_index & 0x0F
+        self.gc_regs[idx] = val & 0xFF
+        if self.vga_log is not None:
+            self.vga_log.append(GC, idx, val)
+        if idx == 4:
+            self._sync_mem()
+
+    # VGA 16-bit OUT to even index ports: low byte = index, high byte = data
+
+    def _out16_seq(self, val):
+        idx = val & 0xFF
+        self._seq_index = idx
+        if idx == 2 and self.vga_log is None:
+            # OUT 3C4h, xx02h: the Map Mask write on every Mode X plane switch
+            self.seq_regs[2] = val >> 8
+            self.map_mask = (val >> 8) & 0x0F
+            if self.mem:
+                self.mem._map_mask = self.map_mask
+        else:
+            self._out_seq_data(val >> 8)
+
+    def _out16_crtc(self, val):
+        self._crtc_index = val & 0xFF
+        self._out_crtc_data(val >> 8)
+
+    def _out16_gc(self, val):
+        self._gc_index = val & 0xFF
+        self._out_gc_data(val >> 8)
+
+    # -- display ------------------------------------------------------------------
 
     def get_resolution(self):
         """Estimate screen resolution from CRTC registers."""
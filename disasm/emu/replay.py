@@ -0,0 +1,303 @@
+"""Record/replay for an Emulator: periodic checkpoints and reverse execution.
+
+    from emu.session import Emulator
+    from emu.replay import Recorder
+    emu = Emulator('earth/SCORCH.EXE')
+    rec = Recorder(emu, interval=10_000)
+    rec.keys[3_000_000] = (0x1F, 0x73)          # input log: absolute step -> key
+    rec.run(until=0x2A850, max_steps=10_000_000)
+    rec.reverse_step(50_000)                     # state 50k instructions earlier
+    rec.reverse_continue()                       # previous breakpoint hit
+    rec.last_write(emu.resolve('4F38:50F6'), 2)  # instruction that last changed a word
+
+Checkpoints are taken every `interval` instructions. Memory is kept as
+4 KB pages shared with the previous checkpoint when unchanged, so a
+checkpoint costs roughly the pages written since the last one.
+
+Replay is deterministic given the checkpoint and the input log:
+- Key injections are logged in `keys` and replayed at the same step.
+- The timer counter is saved in each checkpoint, so INT 08h fires at the
+  same instructions.
+- INT 1Ah ticks derive from tick_count, which is part of the state.
+- DOS file positions are saved and sought back on restore; with an
+  in-memory DOS filesystem (emu.dosfs) its overlay contents are too.
+Hooks stay active during replay, since they may change state.
+Breakpoints and tracepoints are suppressed while replaying. Replay, including
+the scans behind reverse_continue and last_write, goes through Emulator.run,
+so the call stack, frame clock, VGA log and coverage see replayed
+instructions too. A shadow call stack (Emulator.enable_calls) is restored
+with each checkpoint; its per-function counts include replayed instructions.
+"""
+
+import bisect
+import collections
+
+
+PAGE = 0x1000
+
+# Attributes that are wiring, not state
+_PORT_SKIP = frozenset(('mem', 'frames', 'vga_log', 'in_handlers', 'out_handlers',
+                        '_out16'))
+_INT_SKIP = frozenset(('mem', 'cpu', 'ports', 'earth_dir', 'on_int', '_files',
+                       'fs', '_vectors', '_functions', '_fallback', '_dispatchers',
+                       'counts', 'function_counts'))
+
+
+def _copy(v):
+    if isinstance(v, list):
+        return list(v)
+    if isinstance(v, collections.deque):
+        return collections.deque(v)
+    if isinstance(v, dict):
+        return dict(v)
+    return v
+
+
+def _vars(obj, skip):
+    return {k: _copy(v) for k, v in vars(obj).items() if k not in skip}
+
+
+def _pages(buf, prev):
+    """buf split into PAGE-sized bytes, reusing prev's page objects where equal."""
+    view = memoryview(buf)
+    out = []
+    for n, a in enumerate(range(0, len(buf), PAGE)):
+        chunk = view[a:a + PAGE]
+        if prev is not None and chunk == prev[n]:
+            out.append(prev[n])
+        else:
+            out.append(bytes(chunk))
+    view.release()
+    return out
+
+
+class Checkpoint:
+    """Full emulator state at one step, with memory as shared pages."""
+
+    __slots__ = ('step', 'timer', 'pages', 'planes', 'cpu', 'vga', 'ports', 'ints', 'files',
+                 'overlay', 'calls')
+
+    def __init__(self, emu, prev=None):
+        mem, cpu = emu.mem, emu.cpu
+        self.step = emu.steps
+        self.timer = emu._timer
+        self.pages = _pages(mem.data, prev.pages if prev else None)
+        if 'vga_planes' in vars(mem):
+            prev_planes = prev.planes if prev and prev.planes else (None,) * 4
+            self.planes = [_pages(p, pp) for p, pp in zip(mem.vga_planes, prev_planes)]
+        else:
+            self.planes = None
+        self.cpu = {k: _copy(getattr(cpu, k)) for k in cpu.__slots__}
+        self.vga = (mem._mode_x, mem._map_mask, mem._read_plane)
+        self.ports = _vars(emu.ports, _PORT_SKIP)
+        self.ints = _vars(emu.ints, _INT_SKIP)
+        self.calls = emu.calls.save() if emu.calls is not None else None
+        self.overlay = emu.ints.fs.snapshot()
+        self.files = {}
+        for handle, f in emu.ints._files.items():
+            try:
+                self.files[handle] = (f, f.name, f.mode, f.tell())
+            except (AttributeError, OSError, ValueError):
+                self.files[handle] = (f, None, None, None)
+
+    def restore(self, emu):
+        mem, cpu = emu.mem, emu.cpu
+        mem.data[:] = b''.join(self.pages)
+        if self.planes is not None:
+            for plane, pages in zip(mem.vga_planes, self.planes):
+                plane[:] = b''.join(pages)
+        elif 'vga_planes' in vars(mem):
+            del mem.vga_planes    # not allocated yet at this checkpoint
+        for k, v in self.cpu.items():
+            setattr(cpu, k, _copy(v))
+        mem._mode_x, mem._map_mask, mem._read_plane = self.vga
+        for k, v in self.ports.items():
+            setattr(emu.ports, k, _copy(v))
+        for k, v in self.ints.items():
+            setattr(emu.ints, k, _copy(v))
+        emu.ints.fs.restore(self.overlay)
+        files = {}
+        for handle, (f, name, mode, pos) in self.files.items():
+            if pos is not None:
+                if f.closed and hasattr(f, 'reopen'):
+                    f = f.reopen()    # emu.dosfs in-memory file
+                elif f.closed:
+                    # Closed after the checkpoint: reopen without truncating.
+                    f = open(name, mode.replace('w', 'r+').replace('a', 'r+').replace('x', 'r+'))
+                f.seek(pos)
+            files[handle] = f
+        emu.ints._files = files
+        if emu.calls is not None:
+            emu.calls.load(self.calls or [])
+        emu.steps = self.step
+        emu._timer = self.timer
+        emu._stopped_at = None
+
+
+class Recorder:
+    """Runs an Emulator in record mode and answers reverse-execution queries."""
+
+    def __init__(self, emu, interval=10_000, keep=None):
+        self.emu = emu
+        self.interval = interval
+        self.keep = keep               # max checkpoints kept (oldest dropped), None = all
+        self.keys = {}                 # input log: absolute step -> (scancode, ascii)
+        self.checkpoints = [Checkpoint(emu)]
+
+    # -- recording ------------------------------------------------------------
+
+    def _keys(self, start, n):
+        return {s - start: k for s, k in self.keys.items() if start <= s < start + n}
+
+    def checkpoint(self):
+        cps = self.checkpoints
+        if cps[-1].step >= self.emu.steps:
+            # Re-recording after a reverse jump: the future is rewritten.
+            del cps[bisect.bisect_left([c.step for c in cps], self.emu.steps):]
+        cps.append(Checkpoint(self.emu, cps[-1] if cps else None))
+        if self.keep and len(cps) > self.keep:
+            del cps[0]
+
+    def run(self, until=None, max_steps=100000):
+        """Emulator.run in chunks that end on checkpoint boundaries."""
+        emu = self.emu
+        end = emu.steps + max_steps
+        while emu.steps < end:
+            boundary = (emu.steps // self.interval + 1) * self.interval
+            n = min(boundary, end) - emu.steps
+            start = emu.steps
+            reason, result = emu.run(until=until, max_steps=n, keys=self._keys(start, n))
+            if emu.steps % self.interval == 0 and reason in ('max_steps', 'breakpoint'):
+                self.checkpoint()
+            if reason != 'max_steps':
+                return reason, result
+        return 'max_steps', max_steps
+
+    # -- replay ---------------------------------------------------------------
+
+    def _nearest(self, step):
+        steps = [c.step for c in self.checkpoints]
+        i = bisect.bisect_right(steps, step) - 1
+        if i < 0:
+            raise ValueError(f"step {step} is before the oldest checkpoint ({steps[0]})")
+        return self.checkpoints[i]
+
+    def _replay(self, n, tracer=None):
+        """Execute n instructions from the current state: hooks on, breakpoints
+        off. tracer is passed to Emulator.run."""
+        emu = self.emu
+        saved, emu.breakpoints = emu.breakpoints, {}
+        emu._probes = None
+        try:
+            while n > 0:
+                start = emu.steps
+                reason, result = emu.run(max_steps=n, keys=self._keys(start, n), tracer=tracer)
+                n -= emu.steps - start
+                if reason not in ('max_steps', 'frame'):
+                    return reason, result
+        finally:
+            emu.breakpoints = saved
+            emu._probes = None
+        return 'max_steps', 0
+
+    def seek(self, step):
+        """Put the emulator in its state at `step` (restore + replay)."""
+        cp = self._nearest(step)
+        cp.restore(self.emu)
+        return self._replay(step - cp.step)
+
+    def reverse_step(self, n=1):
+        return self.seek(max(self.emu.steps - n, self.checkpoints[0].step))
+
+    def _single_steps(self, cp, end, before):
+        """Restore cp and replay to `end`, calling before(step) ahead of each
+        instruction; returns the last step for which before() was true."""
+        emu = self.emu
+        cp.restore(emu)
+        last = None
+
+        def tracer(step, cpu):
+            nonlocal last
+            if before(step):
+                last = step
+
+        self._replay(end - emu.steps, tracer)
+        return last
+
+    def _search_back(self, make_test):
+        """Latest step before now where the test holds, scanning segments newest first."""
+        here = self.emu.steps
+        steps = [c.step for c in self.checkpoints]
+        i = bisect.bisect_left(steps, here) - 1
+        end = here
+        while i >= 0:
+            cp = self.checkpoints[i]
+            hit = self._single_steps(cp, end, make_test())
+            if hit is not None:
+                self.seek(hit)
+                return hit
+            end = cp.step
+            i -= 1
+        self.seek(here)
+        return None
+
+    def reverse_continue(self):
+        """Go back to the previous step where a breakpoint's condition held.
+        Returns ('breakpoint', phys) or ('start', step) if none was found."""
+        emu = self.emu
+
+        def make_test():
+            table = {phys: [bp for bp in bps if bp.enabled and bp.stop]
+                     for phys, bps in emu.breakpoints.items()}
+
+            def test(step):
+                bps = table.get(emu.ip_phys)
+                return bool(bps) and any(bp.cond is None or bp.cond(emu.cpu, emu.mem)
+                                         for bp in bps)
+            return test
+
+        here = emu.steps
+        hit = self._search_back(make_test) if here > self.checkpoints[0].step else None
+        if hit is None:
+            return 'start', emu.steps
+        emu._stopped_at = emu.ip_phys
+        return 'breakpoint', emu.ip_phys
+
+    def last_write(self, phys, size=1):
+        """Go back to the instruction that last changed the `size` bytes at phys
+        (the emulator stops before it executes). Returns its step, or None.
+        Writes that store the value already there are not seen."""
+        here = self.emu.steps
+        steps = [c.step for c in self.checkpoints]
+        i = bisect.bisect_left(steps, here) - 1
+        end = here
+        while i >= 0:
+            cp = self.checkpoints[i]
+            watch = _Watch(self.emu.mem.data, phys, size)
+            self._single_steps(cp, end, watch)
+            watch(None)    # a change made by the segment's last instruction
+            if watch.hit is not None:
+                self.seek(watch.hit)
+                return watch.hit
+            end = cp.step
+            i -= 1
+        self.seek(here)
+        return None
+
+
+class _Watch:
+    """before(step) callback recording the last step whose instruction changed a range."""
+
+    def __init__(self, data, phys, size):
+        self.data = data
+        self.lo, self.hi = phys, phys + size
+        self.prev = None
+        self.prev_step = None
+        self.hit = None
+
+    def __call__(self, step):
+        cur = bytes(self.data[self.lo:self.hi])
+        if self.prev is not None and cur != self.prev:
+            self.hit = self.prev_step    # made by the instruction before this one
+        self.prev, self.prev_step = cur, step
+        return False
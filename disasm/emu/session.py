@@ -0,0 +1,571 @@
+"""Emulator session: Memory, CPU, PortIO and InterruptHandler wired together.
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    emu.add_hook(0x460C3, lambda cpu, mem: ...)      # file offset, 'SEG:OFF' or phys
+    reason, result = emu.run(until=0x2A850, max_steps=10_000_000)
+    reason, frame = emu.run_frames(30, max_steps=50_000_000)
+    snap = emu.snapshot()
+    ...
+    emu.restore(snap)
+
+Emulator.warm(exe_path) returns a per-process session reset to its boot
+state, so batch workers pay for loading the EXE once.
+"""
+
+import os
+
+from .memory import Memory
+from .cpu import CPU
+from .loader import load_exe, exe_info, setup_ivt, setup_cpu, DS_FILE_BASE
+from .ports import PortIO
+from .interrupts import InterruptHandler
+from .execute import run_fast, timer_after, probe_map
+from .state import save_state, load_state, state_bytes, restore_bytes
+from .breakpoints import Breakpoint, stop_table
+from .fpu import get_backend
+from .callstack import CallStack
+from .tracefile import TraceWriter
+from .coverage import Coverage
+from .dosfs import DosFS
+from .frames import FrameClock, SOURCES as FRAME_SOURCES
+from .vgalog import VgaLog
+
+
+def _chain(fns):
+    def hook(cpu, mem):
+        for fn in fns:
+            fn(cpu, mem)
+    return hook
+
+
+class Emulator:
+    """One emulated SCORCH.EXE process.
+
+    Addresses given to add_hook/add_breakpoint/run are file offsets (int or
+    '0xNNNNN'), 'SEG:OFF' strings in emulator space, labels.csv names, or
+    ('phys', addr).
+    fpu selects the FPU backend: 'float' (fast) or 'exact' (bit-exact
+    80-bit, see emu.fpu_exact); set_fpu() switches it between runs.
+    dosfs is the DOS file layer's mode ('disk', 'overlay', 'mmap') or a
+    DosFS (see emu.dosfs); reset() starts it over with an empty overlay.
+    """
+
+    _warm = {}   # (exe_path, earth_dir, dosfs) -> Emulator, see warm()
+
+    def __init__(self, exe_path='earth/SCORCH.EXE', earth_dir=None, state=None, fpu='float',
+                 dosfs='disk'):
+        self.exe_path = exe_path
+        self.earth_dir = earth_dir if earth_dir is not None else os.path.dirname(exe_path)
+        self._dosfs = dosfs if isinstance(dosfs, DosFS) else DosFS(self.earth_dir, dosfs)
+        self.hooks = {}          # phys -> [fn(cpu, mem)]
+        self.breakpoints = {}    # phys -> [Breakpoint]
+        self.timer_period = 0
+        self.steps = 0           # instructions executed by run() so far
+        self._stopped_at = None  # phys of the breakpoint run() last stopped on
+        self._probes = None      # (until/page key, probe map); reset by add_*/remove_*
+        self._timer = (0, None)  # (period, run_fast timer counter) to carry into the next run
+        self.calls = None        # CallStack while enable_calls() is on
+        self.trace_out = None    # TraceWriter while start_trace() is on
+        self.coverage = None     # Coverage while enable_coverage() is on
+        self.frames = None       # FrameClock while enable_frames() is on
+        self.vga_log = None      # VgaLog while enable_vga_log() is on
+        self._decode = None
+        self._font = None
+        self._kb = None
+        self._boot = None
+
+        self.mem = Memory()
+        if state is None:
+            setup_ivt(self.mem)
+            self.info = load_exe(exe_path, self.mem)
+        else:
+            # The state overwrites all of memory: only the load info is needed.
+            self.info = exe_info(exe_path)
+        self.cpu = CPU()
+        self.cpu.fpu = get_backend(fpu)
+        setup_cpu(self.cpu, self.info)
+        self._new_devices()
+        if state is None:
+            # Heap starts after image + some space for stack
+            stack_end = Memory.phys(self.info['entry_ss'], self.info['entry_sp']) + 0x1000
+            self.ints.init_heap((stack_end >> 4) + 1)
+        else:
+            self.load_state(state)
+
+    def _new_devices(self):
+        self.ports = PortIO()
+        self.ports.mem = self.mem
+        self.ports.frames = self.frames
+        self.ports.vga_log = self.vga_log
+        self.ints = InterruptHandler(self.mem, self.cpu, self.earth_dir, self.ports,
+                                     fs=self._dosfs.fork())
+
+    # -- address helpers ------------------------------------------------------
+
+    def file_to_phys(self, foff):
+        return foff - self.info['header_size'] + self.info['image_base']
+
+    def phys_to_file(self, phys):
+        return phys - self.info['image_base'] + self.info['header_size']
+
+    @property
+    def ip_phys(self):
+        return Memory.phys(self.cpu.segs[1], self.cpu.ip)
+
+    def _knowledge(self):
+        """kb.load() on first use, or None if disasm/kb.py is not importable."""
+        if self._kb is None:
+            try:
+                import kb
+                self._kb = kb.load()
+            except (ImportError, OSError):
+                self._kb = False
+        return self._kb or None
+
+    def symbol(self, phys):
+        """'name+0xNN' from labels.csv for a physical code address, or None."""
+        k = self._knowledge()
+        if k is None:
+            return None
+        return k.symbolize(self.phys_to_file(phys))
+
+    def resolve(self, addr):
+        """Physical address of a file offset, 'SEG:OFF', '0xFILEOFF', a
+        labels.csv name or ('phys', addr)."""
+        if isinstance(addr, tuple):
+            return addr[1] & 0xFFFFF
+        if isinstance(addr, str):
+            if ':' in addr:
+                seg_s, off_s = addr.split(':')
+                return Memory.phys(int(seg_s, 16), int(off_s, 16))
+            try:
+                addr = int(addr, 16)
+            except ValueError:
+                k = self._knowledge()
+                foff = k.lookup(addr) if k is not None else None
+                if foff is None:
+                    raise ValueError(f"unknown address or label {addr!r}")
+                addr = foff
+        return self.file_to_phys(addr)
+
+    def set_fpu(self, name):
+        """Switch the FPU backend; stack values are carried over via float64."""
+        fp = get_backend(name)
+        if fp is not self.cpu.fpu:
+            old = self.cpu.fpu
+            self.cpu.fpu_stack = [fp.from_float(self.cpu, old.to_float(v))
+                                  for v in self.cpu.fpu_stack]
+            self.cpu.fpu = fp
+
+    # -- hooks and breakpoints ------------------------------------------------
+
+    def add_hook(self, addr, fn):
+        """Call fn(cpu, mem) before the instruction at addr executes."""
+        phys = self.resolve(addr)
+        self.hooks.setdefault(phys, []).append(fn)
+        self._probes = None
+        return phys
+
+    def remove_hook(self, addr, fn=None):
+        phys = self.resolve(addr)
+        fns = self.hooks.get(phys, [])
+        if fn is None:
+            fns.clear()
+        elif fn in fns:
+            fns.remove(fn)
+        if not fns:
+            self.hooks.pop(phys, None)
+        self._probes = None
+
+    def add_breakpoint(self, addr, cond=None, ignore=0, log=None, stop=True):
+        """Stop before addr executes, if cond holds (see emu.breakpoints)
+        and after `ignore` such hits. Returns the Breakpoint (hit count etc.)."""
+        phys = self.resolve(addr)
+        if isinstance(addr, int):
+            label = f'0x{addr:05X}'
+        else:
+            label = addr if isinstance(addr, str) else None
+        bp = Breakpoint(phys, cond, ignore, log, stop, label)
+        self.breakpoints.setdefault(phys, []).append(bp)
+        self._probes = None
+        return bp
+
+    def add_tracepoint(self, addr, log='{ax:04X} {bx:04X} {cx:04X} {dx:04X}', cond=None):
+        """Log (format string over register names, or callable) without stopping."""
+        return self.add_breakpoint(addr, cond, log=log, stop=False)
+
+    def remove_breakpoint(self, addr_or_bp):
+        """Remove one Breakpoint, or every breakpoint at an address."""
+        if isinstance(addr_or_bp, Breakpoint):
+            bps = self.breakpoints.get(addr_or_bp.phys, [])
+            if addr_or_bp in bps:
+                bps.remove(addr_or_bp)
+            phys = addr_or_bp.phys
+        else:
+            phys = self.resolve(addr_or_bp)
+            self.breakpoints.pop(phys, None)
+        if not self.breakpoints.get(phys, True):
+            del self.breakpoints[phys]
+        self._probes = None
+
+    def stop_table(self):
+        """Breakpoints in run_fast's stops form: one predicate per address."""
+        return stop_table(self.breakpoints)
+
+    def _hook_table(self):
+        """hooks in run_fast's form: one callable per address."""
+        table = {}
+        for phys, fns in self.hooks.items():
+            if len(fns) == 1:
+                table[phys] = fns[0]
+            elif fns:
+                table[phys] = _chain(tuple(fns))
+        return table
+
+    def enable_calls(self, trace=None):
+        """Maintain a shadow call stack during run() (see emu.callstack);
+        trace(event, frame, depth, step) gets every call and return."""
+        if self.calls is None:
+            self.calls = CallStack(names=self.symbol)
+        self.calls.trace = trace
+        return self.calls
+
+    def disable_calls(self):
+        self.calls = None
+
+    def enable_coverage(self):
+        """Mark every instruction address run() executes (see emu.coverage).
+        Entry points from enable_calls() are added by coverage_snapshot()."""
+        if self.coverage is None:
+            self.coverage = Coverage(self.info['image_base'], self.info['header_size'])
+        return self.coverage
+
+    def disable_coverage(self):
+        self.coverage = None
+
+    def coverage_snapshot(self):
+        """The Coverage with the call stack's entry points folded in."""
+        if self.coverage is not None and self.calls is not None:
+            self.coverage.add_calls(self.calls)
+        return self.coverage
+
+    def start_trace(self, path, regs=False):
+        """Write a binary trace record per instruction run() executes
+        (see emu.tracefile); regs adds flags and registers to each."""
+        self.stop_trace()
+        self.trace_out = TraceWriter(path, regs, self.info['image_base'], self.info['header_size'])
+        return self.trace_out
+
+    def stop_trace(self):
+        if self.trace_out is not None:
+            self.trace_out.close()
+            self.trace_out = None
+
+    def enable_frames(self, callback=None, sources=FRAME_SOURCES, merge=2000):
+        """Detect frame boundaries during run() (see emu.frames); callback(frame)
+        is called at each, and a true return value stops the run."""
+        if self.frames is None:
+            self.frames = FrameClock(sources, merge)
+            self.frames.sync(self.ports)
+            self.ports.frames = self.frames
+        if callback is not None:
+            self.frames.callbacks.append(callback)
+        return self.frames
+
+    def disable_frames(self):
+        self.frames = self.ports.frames = None
+
+    def enable_vga_log(self):
+        """Log palette and VGA register writes during run(), with frame
+        boundaries from enable_frames() (see emu.vgalog)."""
+        if self.vga_log is None:
+            self.vga_log = VgaLog(self.ports)
+            self.ports.vga_log = self.vga_log
+            self.enable_frames(self.vga_log.frame)
+        return self.vga_log
+
+    def disable_vga_log(self):
+        if self.vga_log is not None and self.frames is not None:
+            self.frames.callbacks.remove(self.vga_log.frame)
+        self.vga_log = self.ports.vga_log = None
+
+    def _frame_hooks(self, hooks):
+        """Add the frame clock's Fastgraph page hooks to a run_fast hook table;
+        returns their addresses."""
+        clock = self.frames
+        targets = clock.page_targets(self.mem, self.file_to_phys(DS_FILE_BASE))
+        for phys in targets:
+            hook = hooks.get(phys)
+            hooks[phys] = clock.page_call if hook is None else _chain((hook, clock.page_call))
+        return targets
+
+    def _retarget_pages(self, hooks, probes):
+        """FrameClock.retarget during run(): once the Fastgraph dispatch slots
+        are filled in, add the page hooks to the running hook table and
+        probe map."""
+        targets = self._frame_hooks(hooks)
+        if targets:
+            for phys in targets:
+                probes[phys] = 1
+            self._probes = None
+            self.frames.retarget = None
+
+    def _probe_map(self, hooks, bp, stops, pages):
+        """run_fast's probe map for run(), kept while only the hook and
+        breakpoint tables feed it: add_*/remove_* reset it, and a change in
+        the until or page-hook addresses rebuilds it."""
+        key = (frozenset(bp), frozenset(pages))
+        if self._probes is None or self._probes[0] != key:
+            self._probes = (key, probe_map(hooks, bp, stops))
+        return self._probes[1]
+
+    # -- execution ------------------------------------------------------------
+
+    def run(self, until=None, max_steps=100000, keys=None, timer_period=None, tracer=None):
+        """Run until a breakpoint, an `until` address (one or a list), exit,
+        error, halt or max_steps.
+
+        keys: {step: (scancode, ascii)} with steps counted from this call.
+        tracer: fn(step, cpu) called before each instruction, with the
+        emulator step (alongside start_trace()'s writer, if any).
+        Returns run_fast's (reason, result), except that for 'breakpoint'
+        result is the physical address stopped at, and for 'frame' (a frame
+        callback or run_frames() stopped it) the Frame. Continuing from a
+        breakpoint first executes the instruction there.
+        """
+        bp = set()
+        if until is not None:
+            targets = until if isinstance(until, (list, set, frozenset)) else [until]
+            bp.update(self.resolve(a) for a in targets)
+        stops = self.stop_table()
+        hooks = self._hook_table()
+        frames = self.frames
+        pages = ()
+        if frames is not None and 'page' in frames.sources:
+            pages = self._frame_hooks(hooks)
+        probes = self._probe_map(hooks, bp, stops, pages)
+        if frames is not None and 'page' in frames.sources and not pages:
+            # Graphics not initialised yet: look again as frames start.
+            frames.retarget = lambda: self._retarget_pages(hooks, probes)
+        timer = self.timer_period if timer_period is None else timer_period
+        keys = dict(keys) if keys else {}
+
+        phase = self._timer[1] if self._timer[0] == timer else None
+        if phase is None:
+            phase = timer
+
+        calls = self.calls
+        if calls is not None:
+            calls.origin = self.steps
+        cov = self.coverage.map if self.coverage is not None else None
+        if frames is not None:
+            frames.origin = self.steps
+        vga_log = self.vga_log
+        if vga_log is not None:
+            vga_log.origin = self.steps
+        done = 0
+        if self._stopped_at is not None and self._stopped_at == self.ip_phys and max_steps > 0:
+            reason, result = run_fast(self.cpu, self.mem, self.ports, self.ints, 1,
+                                      hooks=hooks, timer_period=timer, timer_phase=phase,
+                                      scheduled_keys={0: keys[0]} if 0 in keys else None,
+                                      calls=calls, tracer=self._tracer(self.steps, tracer),
+                                      coverage=cov, frames=frames, vga_log=vga_log,
+                                      probes=probes)
+            self._stopped_at = None
+            if reason != 'max_steps':
+                return self._finish(reason, result, 0, timer, phase)
+            done = 1
+            phase = timer_after(phase, timer, 1)
+            keys = {k - 1: v for k, v in keys.items() if k >= 1}
+            if calls is not None:
+                calls.origin += 1
+            if frames is not None:
+                frames.origin += 1
+            if vga_log is not None:
+                vga_log.origin += 1
+        self._stopped_at = None
+
+        reason, result = run_fast(self.cpu, self.mem, self.ports, self.ints, max_steps - done,
+                                  hooks=hooks, bp_set=bp or None, stops=stops or None,
+                                  timer_period=timer, timer_phase=phase,
+                                  scheduled_keys=keys or None, calls=calls,
+                                  tracer=self._tracer(self.steps + done, tracer),
+                                  coverage=cov, frames=frames, vga_log=vga_log,
+                                  probes=probes)
+        return self._finish(reason, result, done, timer, phase)
+
+    def _tracer(self, base, fn):
+        """run_fast tracer for a call starting at emulator step base."""
+        rec = self.trace_out.recorder(base) if self.trace_out is not None else None
+        if fn is None:
+            return rec
+        if rec is None:
+            return lambda i, cpu: fn(base + i, cpu)
+
+        def both(i, cpu):
+            rec(i, cpu)
+            fn(base + i, cpu)
+        return both
+
+    def _finish(self, reason, result, done, timer, phase):
+        if self.frames is not None:
+            self.frames.retarget = None
+        if reason in ('max_steps', 'halted'):
+            self._timer = (timer, timer_after(phase, timer, result))
+        elif reason in ('breakpoint', 'frame'):
+            # The stopping iteration already counted its timer tick; the
+            # instruction runs on the next call, which counts it again.
+            self._timer = (timer, timer_after(phase, timer, result + 1) + 1)
+        else:
+            self._timer = (timer, None)
+        if reason in ('max_steps', 'halted', 'breakpoint', 'frame'):
+            result += done
+            self.steps += result
+        else:
+            self.steps += done
+        if reason == 'breakpoint':
+            result = self._stopped_at = self.ip_phys
+        elif reason == 'frame':
+            result = self.frames.last
+        return reason, result
+
+    def run_frames(self, n, until=None, max_steps=50_000_000, keys=None, timer_period=None,
+                   callback=None):
+        """run() until n more frames have started (turning frame detection on
+        if needed). Returns ('frame', Frame) at the nth, otherwise run()'s
+        result; max_steps still bounds a game that never ends a frame."""
+        clock = self.enable_frames()
+        if callback is not None:
+            clock.callbacks.append(callback)
+        clock.stop_at = clock.count + n
+        try:
+            return self.run(until, max_steps, keys, timer_period)
+        finally:
+            clock.stop_at = None
+            if callback is not None:
+                clock.callbacks.remove(callback)
+
+    # -- state ----------------------------------------------------------------
+
+    def snapshot(self):
+        """In-memory snapshot (the state file format, plus the step count)."""
+        return (self.steps, state_bytes(self.cpu, self.mem, self.ports, self.ints))
+
+    def restore(self, snap):
+        self.steps, blob = snap
+        restore_bytes(blob, self.cpu, self.mem, self.ports, self.ints)
+        self._stopped_at = None
+        self._timer = (0, None)
+        if self.calls is not None:
+            self.calls.reset()
+        if self.frames is not None:
+            self.frames.sync(self.ports)
+
+    def save_state(self, path):
+        save_state(path, self.cpu, self.mem, self.ports, self.ints)
+
+    def load_state(self, path):
+        load_state(path, self.cpu, self.mem, self.ports, self.ints)
+        self._stopped_at = None
+        if self.calls is not None:
+            self.calls.reset()
+        if self.frames is not None:
+            self.frames.sync(self.ports)
+
+    def reset(self):
+        """Back to the mark_boot() state, with fresh ports and DOS handles
+        (open files, key queue); hooks and breakpoints are kept."""
+        if self._boot is None:
+            raise RuntimeError("reset() needs a boot snapshot (take one with mark_boot())")
+        self._new_devices()
+        self.restore(self._boot)
+
+    def mark_boot(self):
+        """Make the current state the one reset() returns to."""
+        self._boot = self.snapshot()
+
+    @classmethod
+    def warm(cls, exe_path='earth/SCORCH.EXE', earth_dir=None, fpu='float', dosfs='disk'):
+        """A session for exe_path reset to its boot state, created once per
+        process; hooks, breakpoints, the timer, call tracking, coverage, the
+        binary trace (closed), frame detection and the VGA log are cleared.
+        dosfs is a mode name here; 'overlay'/'mmap' keep workers off the disk."""
+        key = (os.path.abspath(exe_path), earth_dir, dosfs)
+        emu = cls._warm.get(key)
+        if emu is None:
+            emu = cls._warm[key] = cls(exe_path, earth_dir, dosfs=dosfs)
+            emu.mark_boot()
+        else:
+            emu.reset()
+        emu.hooks.clear()
+        emu.breakpoints.clear()
+        emu._probes = None
+        emu.timer_period = 0
+        emu.disable_calls()
+        emu.disable_coverage()
+        emu.stop_trace()
+        emu.disable_vga_log()
+        emu.disable_frames()
+        emu.set_fpu(fpu)
+        return emu
+
+    # -- inspection -----------------------------------------------------------
+
+    @property
+    def decode(self):
+        """instruction_set_x86.decode, imported on first use (None if unavailable)."""
+        if self._decode is None:
+            try:
+                from instruction_set_x86 import decode
+            except ImportError:
+                return None
+            self._decode = decode
+        return self._decode
+
+    def disasm(self, file_off, count=10):
+        """[(file_off, raw bytes, mnemonic, operands)] decoded from the EXE image."""
+        decode = self.decode
+        exe = self.info['exe_data']
+        out = []
+        if decode is None:
+            return out
+        pos = file_off
+        for _ in range(count):
+            try:
+                length, mn, op_str, _fpu, _ds = decode(exe, pos)
+            except Exception:
+                break
+            out.append((pos, exe[pos:pos + length], mn, op_str))
+            pos += length
+        return out
+
+    def stack_words(self, n=8):
+        sp_phys = Memory.phys(self.cpu.segs[2], self.cpu.sp)
+        return [self.mem.read16(sp_phys + j * 2) for j in range(n)]
+
+    @property
+    def font(self):
+        """font_verify.FontAtlas of this EXE, built on first use (None if unavailable)."""
+        if self._font is None:
+            try:
+                from font_verify import load_atlas
+            except ImportError:
+                return None
+            self._font = load_atlas(self.info['exe_data'])
+        return self._font
+
+    def dump_screen(self, path, label=None):
+        """Write the screen to a PNG. label is drawn at the top left in the
+        EXE font, brightest palette entry on the darkest."""
+        overlay = None
+        font = self.font if label else None
+        if font is not None:
+            def overlay(pixels, width, height):
+                pal = self.ports.palette
+                order = sorted(range(256), key=lambda i: sum(pal[i]))
+                w = min(font.measure(label) + 3, width)
+                for y in range(min(font.height + 2, height)):
+                    pixels[y * width:y * width + w] = bytes([order[0]]) * w
+                font.draw(pixels, width, height, 2, 1, label, order[-1])
+        self.mem.dump_screen_png(path, self.ports, overlay)
@@ -0,0 +1,138 @@
+"""Binary execution traces: fixed-width records written by run_fast.
+
+File layout (little-endian):
+
+    header   8s magic "EMUTRACE", u16 version, u16 flags, u16 record size,
+             u16 reserved, u32 image_base, u32 header_size     (24 bytes)
+    records  u32 step, u16 CS, u16 IP                          (8 bytes)
+             with F_REGS also u16 flags, 8 x u16 regs
+             (AX CX DX BX SP BP SI DI), u16 ES, SS, DS         (32 bytes)
+
+One record per executed instruction, before it executes; steps are the
+Emulator's absolute step count (mod 2**32). image_base/header_size map
+CS:IP to EXE file offsets (see trace_view.py).
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    emu.start_trace('/tmp/round.trace', regs=True)
+    emu.run(max_steps=50_000_000)
+    emu.stop_trace()
+"""
+
+import bisect
+import mmap
+import struct
+
+MAGIC = b'EMUTRACE'
+VERSION = 1
+F_REGS = 1
+
+HEADER = struct.Struct('<8sHHHHII')
+REC_IP = struct.Struct('<IHH')
+REC_REGS = struct.Struct('<IHHH8H3H')
+
+
+class TraceWriter:
+    """Buffered writer; run_fast calls the function from recorder() per instruction."""
+
+    def __init__(self, path, regs=False, image_base=0, header_size=0, buffer_size=1 << 20):
+        self.path = path
+        self.regs = regs
+        self.rec = REC_REGS if regs else REC_IP
+        self.buffer_size = buffer_size
+        self.records = 0
+        self._buf = bytearray()
+        self._f = open(path, 'wb')
+        self._f.write(HEADER.pack(MAGIC, VERSION, F_REGS if regs else 0, self.rec.size, 0,
+                                  image_base, header_size))
+
+    def recorder(self, origin):
+        """fn(i, cpu) appending the record for step origin + i."""
+        buf = self._buf
+        pack = self.rec.pack
+        limit = self.buffer_size
+        flush = self.flush
+
+        if self.regs:
+            def rec(i, cpu):
+                segs = cpu.segs
+                r = cpu.regs
+                buf.extend(pack((origin + i) & 0xFFFFFFFF, segs[1], cpu.ip, cpu.get_flags(),
+                                r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7],
+                                segs[0], segs[2], segs[3]))
+                if len(buf) >= limit:
+                    flush()
+        else:
+            def rec(i, cpu):
+                buf.extend(pack((origin + i) & 0xFFFFFFFF, cpu.segs[1], cpu.ip))
+                if len(buf) >= limit:
+                    flush()
+        return rec
+
+    def flush(self):
+        if self._buf:
+            self.records += len(self._buf) // self.rec.size
+            self._f.write(self._buf)
+            del self._buf[:]
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    """Memory-mapped trace file: len(), [n] -> record tuple, step-range lookup."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.flags, size, _reserved,
+         self.image_base, self.header_size) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a trace file")
+        if version != VERSION:
+            raise ValueError(f"{path}: unknown trace version {version}")
+        self.regs = bool(self.flags & F_REGS)
+        self.rec = REC_REGS if self.regs else REC_IP
+        if size != self.rec.size:
+            raise ValueError(f"{path}: record size {size}, expected {self.rec.size}")
+        self.count = (len(self._mm) - HEADER.size) // size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        """(step, cs, ip) or (step, cs, ip, flags, ax, cx, dx, bx, sp, bp, si, di, es, ss, ds)."""
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError(n)
+        return self.rec.unpack_from(self._mm, HEADER.size + n * self.rec.size)
+
+    def step(self, n):
+        return struct.unpack_from('<I', self._mm, HEADER.size + n * self.rec.size)[0]
+
+    def index(self, step):
+        """Index of the first record with step >= step (steps are increasing)."""
+        return bisect.bisect_left(range(self.count), step, key=self.step)
+
+    def iter(self, start=0, end=None, chunk=1 << 16):
+        """Records with index in [start, end), unpacked a chunk at a time."""
+        end = self.count if end is None else min(end, self.count)
+        size = self.rec.size
+        for a in range(start, end, chunk):
+            b = min(a + chunk, end)
+            yield from self.rec.iter_unpack(self._mm[HEADER.size + a * size:HEADER.size + b * size])
+
+    def file_offset(self, cs, ip):
+        return ((cs << 4) + ip) - self.image_base + self.header_size
+
+    def close(self):
+        self._mm.close()
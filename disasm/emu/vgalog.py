@@ -0,0 +1,176 @@
+"""VGA register change log: palette (DAC), sequencer, CRTC and GC writes.
+
+    from emu.session import Emulator
+    emu = Emulator('earth/SCORCH.EXE')
+    log = emu.enable_vga_log()          # also turns on frame detection
+    emu.run(max_steps=50_000_000)
+    log.save('/tmp/menu.vga')
+    for f in VgaLog.load('/tmp/menu.vga').frames():
+        print(f.index, f.step, sorted(f.changed))
+
+Every write PortIO sees is appended as one entry (step, register, index,
+value) to four array buffers, so a long run costs a few bytes per write
+and nothing per instruction beyond run_fast's step counter:
+
+    DAC_R/G/B   index = palette entry, value = 6-bit component
+                (port 3C9h, and INT 10h AX=1010h/1012h)
+    SEQ, CRTC, GC   index = register, value = byte written
+    FRAME       a frame boundary from emu.frames (index, value 0)
+
+The log starts with a copy of the palette and registers, so replaying it
+(VgaLog.frames()) rebuilds the DAC and registers at the end of every frame.
+
+File layout (little-endian):
+
+    header   8s magic "EMUVGA\\0\\0", u16 version, u16 reserved, u32 entries
+    state    768 palette bytes, 8 SEQ, 64 CRTC, 16 GC register bytes
+    entries  u64 step[n], u8 register[n], u8 index[n], u8 value[n]
+"""
+
+import struct
+import sys
+from array import array
+
+MAGIC = b'EMUVGA\0\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHI')
+
+DAC_R, DAC_G, DAC_B, SEQ, CRTC, GC, FRAME = range(7)
+NAMES = ('DAC_R', 'DAC_G', 'DAC_B', 'SEQ', 'CRTC', 'GC', 'FRAME')
+
+
+class LogFrame:
+    """A frame rebuilt by VgaLog.frames(): its palette and registers at the
+    end, and the palette entries and (register, index) pairs written in it."""
+
+    __slots__ = ('index', 'step', 'palette', 'seq', 'crtc', 'gc', 'changed', 'regs')
+
+    def __init__(self, index, step, palette, seq, crtc, gc, changed, regs):
+        self.index = index
+        self.step = step
+        self.palette = palette    # 256 (r, g, b)
+        self.seq = seq
+        self.crtc = crtc
+        self.gc = gc
+        self.changed = changed    # palette entries written
+        self.regs = regs          # {(SEQ/CRTC/GC, index)} written
+
+
+class VgaLog:
+    """Change log appended to by PortIO (see the module docstring)."""
+
+    def __init__(self, ports=None):
+        self.steps = array('Q')
+        self.regs = array('B')
+        self.index = array('B')
+        self.value = array('B')
+        self.now = 0       # run_fast step, kept current by run_fast(vga_log=)
+        self.origin = 0    # emulator step of run_fast's step 0
+        if ports is not None:
+            self.palette = [tuple(rgb) for rgb in ports.palette]
+            self.seq = bytes(ports.seq_regs[:8])
+            self.crtc = bytes(ports.crtc_regs[:64])
+            self.gc = bytes(ports.gc_regs[:16])
+        else:
+            self.palette = [(0, 0, 0)] * 256
+            self.seq, self.crtc, self.gc = bytes(8), bytes(64), bytes(16)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def append(self, reg, index, value):
+        self.steps.append(self.origin + self.now)
+        self.regs.append(reg)
+        self.index.append(index & 0xFF)
+        self.value.append(value & 0xFF)
+
+    def frame(self, frame):
+        """FrameClock callback: mark the boundary at the frame's step."""
+        self.steps.append(frame.step)
+        self.regs.append(FRAME)
+        self.index.append(frame.index & 0xFF)
+        self.value.append(0)
+
+    def entries(self, start=0, end=None):
+        """(step, register, index, value) tuples."""
+        return zip(self.steps[start:end], self.regs[start:end],
+                   self.index[start:end], self.value[start:end])
+
+    # -- replay --------------------------------------------------------------------
+
+    def frames(self, all_frames=False):
+        """Yield a LogFrame per frame, replaying the log from its initial state.
+
+        Entries before the first FRAME form frame -1. Frames without writes
+        are skipped unless all_frames. The palette and register lists are
+        copies.
+        """
+        pal = list(self.palette)
+        banks = {SEQ: bytearray(self.seq), CRTC: bytearray(self.crtc), GC: bytearray(self.gc)}
+        changed, regs = set(), set()
+        index, step = -1, 0
+
+        def finish():
+            return LogFrame(index, step, list(pal), bytes(banks[SEQ]), bytes(banks[CRTC]),
+                            bytes(banks[GC]), changed, regs)
+
+        for s, reg, idx, val in self.entries():
+            if reg == FRAME:
+                if changed or regs or all_frames:
+                    yield finish()
+                    changed, regs = set(), set()
+                index += 1
+                step = s
+            elif reg <= DAC_B:
+                rgb = list(pal[idx])
+                rgb[reg] = val
+                pal[idx] = tuple(rgb)
+                changed.add(idx)
+            else:
+                bank = banks[reg]
+                bank[idx % len(bank)] = val
+                regs.add((reg, idx))
+        if changed or regs or all_frames:
+            yield finish()
+
+    # -- persistence -------------------------------------------------------------
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(self.steps)))
+            f.write(bytes(c for rgb in self.palette for c in rgb))
+            f.write(self.seq + self.crtc + self.gc)
+            for buf in (self.steps, self.regs, self.index, self.value):
+                if sys.byteorder != 'little' and buf.itemsize > 1:
+                    buf = array(buf.typecode, buf)
+                    buf.byteswap()
+                f.write(buf.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            blob = f.read()
+        if len(blob) < HEADER.size:
+            raise ValueError(f"{path}: not a VGA log")
+        magic, version, _reserved, n = HEADER.unpack_from(blob, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a VGA log")
+        if version != VERSION:
+            raise ValueError(f"{path}: unknown VGA log version {version}")
+        log = cls()
+        pos = HEADER.size
+        pal = blob[pos:pos + 768]
+        log.palette = [tuple(pal[i:i + 3]) for i in range(0, 768, 3)]
+        pos += 768
+        log.seq, log.crtc, log.gc = blob[pos:pos + 8], blob[pos + 8:pos + 72], blob[pos + 72:pos + 88]
+        pos += 88
+        if len(blob) != pos + 11 * n:
+            raise ValueError(f"{path}: truncated VGA log ({n} entries expected)")
+        log.steps.frombytes(blob[pos:pos + 8 * n])
+        if sys.byteorder != 'little':
+            log.steps.byteswap()
+        pos += 8 * n
+        for buf in (log.regs, log.index, log.value):
+            buf.frombytes(blob[pos:pos + n])
+            pos += n
+        return log
@@ -21,41 +21,30 @@ Examples:
 import sys
 import struct
 
-HEADER = 0x6A00
-
-# Known code segment bases (file offset of segment start)
-CODE_SEGS = [
-    (0x0000, 0x6A00),   # seg 0x0000
-    (0x1A4A, 0x21AA0),  # extras.cpp
-    (0x1F7F, 0x263F0),  # icons.cpp
-    (0x28B9, 0x2F830),  # play.cpp
-    (0x2B3B, 0x31FB0),  # player.cpp
-    (0x2CBF, 0x33690),  # ranges.cpp
-    (0x3167, 0x38070),  # shark.cpp
-    (0x31D8, 0x38780),  # shields.cpp
-    (0x34ED, 0x3B8D0),  # menu module
-    (0x3F19, 0x45990),  # dialog module
-    (0x4589, 0x4C290),  # font module
-]
+import artifacts
+from addr import MZ_HEADER as HEADER, segoff_to_file
+
+# Known code segments (paragraph); the file base of each is segoff_to_file(seg, 0)
+CODE_SEGS = [(seg, segoff_to_file(seg, 0)) for seg in (
+    0x0000,   # startup + libs
+    0x1A4A,   # extras.cpp
+    0x1F7F,   # icons.cpp
+    0x28B9,   # play.cpp
+    0x2B3B,   # player.cpp
+    0x2CBF,   # ranges.cpp
+    0x3167,   # shark.cpp
+    0x31D8,   # shields.cpp
+    0x34ED,   # menu module
+    0x3F19,   # dialog module
+    0x4589,   # font module
+)]
 
 def parse_mz_relocs(data):
     """Return set of file offsets that hold relocated segment words."""
-    reloc_off = struct.unpack_from('<H', data, 0x18)[0]
-    reloc_cnt = struct.unpack_from('<H', data, 0x06)[0]
-    relocs = set()
-    for i in range(reloc_cnt):
-        off, seg = struct.unpack_from('<HH', data, reloc_off + i * 4)
-        file_off = HEADER + seg * 16 + off
-        relocs.add(file_off)
-    return relocs
+    return set(artifacts.relocs(data))
 
 def seg_to_file(seg):
-    return HEADER + seg * 16
-
-def file_to_seg_off(file_off):
-    seg = (file_off - HEADER) >> 4
-    off = (file_off - HEADER) & 0xF
-    return seg, off
+    return segoff_to_file(seg, 0)
 
 def main():
     if len(sys.argv) < 3:
@@ -66,7 +55,7 @@ def main():
     target_file = int(sys.argv[2], 16)
 
     data = open(exe_path, 'rb').read()
-    relocs = parse_mz_relocs(data)
+    relocs = artifacts.relocs(data)   # sorted
 
     # Compute target seg:off
     target_seg = (target_file - HEADER) >> 4
@@ -77,7 +66,7 @@ def main():
 
     # Far call pattern: 9A OFF_LO OFF_HI SEG_LO SEG_HI
     # Segment value is MZ-relocated, so search via relocation table
-    for roff in sorted(relocs):
+    for roff in relocs:
         if roff + 4 > len(data):
             continue
         # The segment word is at roff; the call opcode is at roff-3
@@ -103,12 +92,13 @@ def main():
         if target_file < seg_file_base or target_file >= seg_end:
             continue
         target_seg_off = target_file - seg_file_base
-        for i in range(seg_file_base, seg_end - 2):
-            if data[i] == 0xE8:
-                rel = struct.unpack_from('<h', data, i + 1)[0]
-                called_off = (i - seg_file_base + 3 + rel) & 0xFFFF
-                if called_off == target_seg_off:
-                    near_results.append(i)
+        i = data.find(b'\xE8', seg_file_base, seg_end - 2)
+        while i != -1:
+            rel = struct.unpack_from('<h', data, i + 1)[0]
+            called_off = (i - seg_file_base + 3 + rel) & 0xFFFF
+            if called_off == target_seg_off:
+                near_results.append(i)
+            i = data.find(b'\xE8', i + 1, seg_end - 2)
 
     print(f"Callers of file 0x{target_file:05X} (seg 0x{target_seg:04X}:0x{target_off:04X}):")
     print(f"\nFar calls ({len(far_results)}):")
@@ -2,14 +2,44 @@
 """Verify web font.js glyph data against EXE font data.
 
 Reads the font pointer table from font_init (0x4C290) to build char→DS_offset mapping,
-then reads each glyph's width + bitmap from the EXE, converts to packed 1-bit format,
-and compares against web font.js WIDTHS/GLYPHS arrays.
+then decodes all 256 glyphs into a packed atlas (12 bytes per char, 1 byte per row,
+MSB = leftmost pixel — the font.js format) plus a width table, and compares it against
+web font.js WIDTHS/GLYPHS/WIDTHS_EXT/GLYPHS_EXT in one pass.
+
+The atlas is cached per EXE in the artifact store (artifacts.py). It also backs a small
+text renderer (FontAtlas.draw / render), which labels emulator screenshots
+(Emulator.dump_screen(path, label=...), emu --label).
+
+Usage:
+    python3 disasm/font_verify.py                  # verify against web/js/font.js
+    python3 disasm/font_verify.py --render "TEXT"  # print TEXT as rendered by the EXE font
 """
 
-import struct, re
+import os
+import re
+import sys
+import struct
+
+import artifacts
+from addr import load_numpy
 
 EXE = "earth/SCORCH.EXE"
 DS_FILE_BASE = 0x055D80
+FONT_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'js', 'font.js')
+
+FONT_HEIGHT = 12
+DEFAULT_GLYPH = 0x70E4      # DS offset every char points to before font_init overrides it
+ATLAS_VERSION = 1           # bump when the atlas layout or decoding changes
+
+# font_init pointer stores: mov word [imm16], imm16 (C7 06) and mov [imm16], ds (8C 1E)
+_STORE_RE = re.compile(rb'\xC7\x06(..)(..)|\x8C\x1E..', re.DOTALL)
+
+# Web font.js ranges: (first char, WIDTHS array, GLYPHS array, count)
+WEB_RANGES = [
+    (32, 'WIDTHS', 'GLYPHS', 95),
+    (0x80, 'WIDTHS_EXT', 'GLYPHS_EXT', 126),
+]
+
 
 def read_exe():
     with open(EXE, "rb") as f:
@@ -24,46 +54,33 @@ def build_char_map(data):
     Default: all chars point to DS:0x70E4 (the "default" glyph).
     Then specific chars get overridden.
     """
-    # Parse the disassembly to find all 'mov word [XXXX], YYYY' instructions
-    # in font_init. Instead, let's just scan the binary for the pattern.
-    # The instructions are: C7 06 XX XX YY YY (mov word [imm16], imm16)
-
-    char_map = {}
-
-    # Default: all 256 chars → DS:0x70E4
-    for c in range(256):
-        char_map[c] = 0x70E4
+    # The instructions are: C7 06 XX XX YY YY (mov word [imm16], imm16); segment
+    # stores (8C 1E XX XX, mov [imm16], ds) are matched only to be stepped over.
+    char_map = [DEFAULT_GLYPH] * 256
 
     # Scan font_init region (0x4C2BF to 0x4C905) for mov word [xxxx], yyyy
     start = 0x4C2BB
     end = 0x4C905
-    pos = start
-    while pos < end:
-        if data[pos] == 0xC7 and data[pos+1] == 0x06:
-            table_off = struct.unpack_from("<H", data, pos+2)[0]
-            glyph_ds = struct.unpack_from("<H", data, pos+4)[0]
-            # Check if this is a pointer table entry (even offset in the right range)
-            char_code = ((table_off + 0x0CA6) & 0xFFFF) // 4
-            remainder = ((table_off + 0x0CA6) & 0xFFFF) % 4
-            if remainder == 0 and 0 <= char_code <= 255:
-                # Only update if this sets the offset part (not the segment part)
-                # Segment entries set table_off + 2 (odd alignment)
-                char_map[char_code] = glyph_ds
-            pos += 6
-        elif data[pos] == 0x8C and data[pos+1] == 0x1E:
-            # mov [imm16], ds — segment store, skip
-            pos += 4
-        else:
-            pos += 1
-
-    return char_map
+    for m in _STORE_RE.finditer(data, start, end + 5):
+        if m.start() >= end:
+            break
+        if m.group(1) is None:
+            continue
+        table_off = struct.unpack("<H", m.group(1))[0]
+        glyph_ds = struct.unpack("<H", m.group(2))[0]
+        # Pointer table entry: offset part only (segment parts are at +2, not /4)
+        entry = (table_off + 0x0CA6) & 0xFFFF
+        if entry % 4 == 0 and entry // 4 <= 255:
+            char_map[entry // 4] = glyph_ds
+
+    return dict(enumerate(char_map))
 
 def glyph_to_packed(width, raw_bytes):
     """Convert EXE row-major byte-per-pixel to packed 1-bit-per-row."""
     packed = []
     for row in range(12):
         byte_val = 0
-        for col in range(width):
+        for col in range(min(width, 8)):
             idx = row * width + col
             pixel = raw_bytes[idx] if idx < len(raw_bytes) else 0
             if pixel:
@@ -79,138 +96,270 @@ def read_glyph(data, ds_offset):
     packed = glyph_to_packed(width, raw)
     return width, packed
 
-def main():
-    data = read_exe()
+
+# ---------------------------------------------------------------------------
+# Glyph atlas
+# ---------------------------------------------------------------------------
+
+class FontAtlas:
+    """
+    All 256 glyphs: widths (256 bytes) and rows (256 * 12 packed bytes, the
+    font.js layout). draw()/render() follow the EXE text routines: width + 1
+    advance per char, '~' hotkey markers skipped.
+    """
+
+    height = FONT_HEIGHT
+
+    def __init__(self, char_map, widths, rows):
+        self.char_map = char_map
+        self.widths = widths
+        self.rows = rows
+        self._pixels = {}     # char -> [(dx, dy)] of set pixels
+
+    def glyph(self, ch):
+        """(width, packed 12-byte bitmap) for a char code."""
+        return self.widths[ch], self.rows[ch * FONT_HEIGHT:(ch + 1) * FONT_HEIGHT]
+
+    def glyph_pixels(self, ch):
+        pts = self._pixels.get(ch)
+        if pts is None:
+            width, rows = self.glyph(ch)
+            pts = [(col, row) for row, bits in enumerate(rows)
+                   for col in range(min(width, 8)) if bits & (0x80 >> col)]
+            self._pixels[ch] = pts
+        return pts
+
+    def measure(self, text):
+        """Width in pixels (EXE text_measure: width + 1 per char, '~' skipped)."""
+        return sum(self.widths[b] + 1 for b in text.encode('cp437', 'replace') if b != 0x7E)
+
+    def draw(self, pixels, width, height, x, y, text, color):
+        """Draw text into a width*height indexed pixel buffer, clipped. Returns the advance."""
+        cx = x
+        for b in text.encode('cp437', 'replace'):
+            if b == 0x7E:
+                continue
+            for dx, dy in self.glyph_pixels(b):
+                px, py = cx + dx, y + dy
+                if 0 <= px < width and 0 <= py < height:
+                    pixels[py * width + px] = color
+            cx += self.widths[b] + 1
+        return cx - x
+
+    def render(self, text, color=1, background=0):
+        """Return (width, height, pixels) of text on its own background."""
+        w = max(self.measure(text), 1)
+        pixels = bytearray([background]) * (w * FONT_HEIGHT)
+        self.draw(pixels, w, FONT_HEIGHT, 0, 0, text, color)
+        return w, FONT_HEIGHT, pixels
+
+
+def build_atlas(data, char_map):
+    """Decode every glyph once per distinct DS offset into (widths, rows)."""
+    widths = bytearray(256)
+    rows = bytearray(256 * FONT_HEIGHT)
+    glyphs = {}
+    np = load_numpy()
+    if np is not None:
+        # Gather each distinct glyph as a 12x8 pixel block, then pack all at once.
+        order = sorted(set(char_map.values()))
+        block = np.zeros((len(order), FONT_HEIGHT, 8), dtype=bool)
+        gw = []
+        for n, ds in enumerate(order):
+            file_off = DS_FILE_BASE + ds
+            w = data[file_off]
+            raw = np.frombuffer(data[file_off + 1:file_off + 1 + w * FONT_HEIGHT], dtype=np.uint8)
+            px = np.zeros(w * FONT_HEIGHT, dtype=np.uint8)
+            px[:len(raw)] = raw
+            if w:
+                cols = min(w, 8)
+                block[n, :, :cols] = px.reshape(FONT_HEIGHT, w)[:, :cols] != 0
+            gw.append(w)
+        packed = np.packbits(block, axis=2).reshape(len(order), FONT_HEIGHT)
+        glyphs = {ds: (gw[n], packed[n].tobytes()) for n, ds in enumerate(order)}
+    for ch in range(256):
+        ds = char_map[ch]
+        g = glyphs.get(ds)
+        if g is None:
+            g = glyphs[ds] = read_glyph(data, ds)
+        widths[ch] = g[0]
+        rows[ch * FONT_HEIGHT:(ch + 1) * FONT_HEIGHT] = g[1]
+    return bytes(widths), bytes(rows)
+
+
+_atlas = (None, None)   # (data, FontAtlas)
+
+
+def _build_tables(data):
     char_map = build_char_map(data)
+    return (char_map,) + build_atlas(data, char_map)
+
+
+def load_atlas(data):
+    """FontAtlas for the EXE bytes, from the in-process memo or the 'font' artifact."""
+    global _atlas
+    if _atlas[0] is data:
+        return _atlas[1]
+    atlas = FontAtlas(*artifacts.load_pickle(data, 'font', ATLAS_VERSION, _build_tables))
+    _atlas = (data, atlas)
+    return atlas
 
-    # Read web font.js data inline for comparison
-    # ASCII 32-126 widths
-    web_widths = [
-        4, 1, 3, 5, 5, 6, 5, 2, 3, 3, 5, 5, 3, 5, 2, 5,
-        5, 4, 5, 5, 5, 5, 5, 5, 5, 5, 2, 2, 4, 5, 4, 5,
-        5, 5, 5, 5, 5, 5, 5, 5, 5, 3, 5, 5, 5, 5, 5, 5,
-        5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 5, 3, 5, 3, 5, 5,
-        3, 5, 5, 5, 5, 5, 3, 5, 5, 3, 3, 4, 3, 5, 5, 5,
-        5, 5, 4, 5, 3, 5, 5, 5, 5, 5, 5, 4, 1, 4, 5,
-    ]
+
+# ---------------------------------------------------------------------------
+# web/js/font.js
+# ---------------------------------------------------------------------------
+
+def extract_js_array(content, var_name):
+    """Bytes of `const NAME = new Uint8Array([...])` (hex or decimal entries), or None."""
+    pattern = rf'const {var_name}\s*=\s*new Uint8Array\(\[([\s\S]*?)\]\)'
+    m = re.search(pattern, content)
+    if not m:
+        return None
+    body = re.sub(r'//[^\n]*', '', m.group(1))
+    return bytes(int(v, 0) for v in re.findall(r'0x[0-9A-Fa-f]+|\d+', body))
+
+
+def load_web_atlas(path=FONT_JS):
+    """
+    font.js arrays laid out like FontAtlas: (widths, rows, covered) where
+    covered[ch] is True for chars font.js defines.
+    """
+    with open(path) as f:
+        content = f.read()
+    widths = bytearray(256)
+    rows = bytearray(256 * FONT_HEIGHT)
+    covered = [False] * 256
+    for first, w_name, g_name, count in WEB_RANGES:
+        w = extract_js_array(content, w_name)
+        g = extract_js_array(content, g_name)
+        if not w or not g:
+            continue
+        n = min(count, len(w), len(g) // FONT_HEIGHT)
+        widths[first:first + n] = w[:n]
+        rows[first * FONT_HEIGHT:(first + n) * FONT_HEIGHT] = g[:n * FONT_HEIGHT]
+        for ch in range(first, first + n):
+            covered[ch] = True
+    return bytes(widths), bytes(rows), covered
+
+
+def compare_atlas(atlas, web):
+    """
+    Compare the EXE atlas with font.js in one pass over all 256 chars.
+    Returns (width_errs, glyph_errs): sorted char codes. Bitmaps are compared
+    only where the widths agree; zero-width extended chars are not compared.
+    """
+    web_widths, web_rows, covered = web
+    np = load_numpy()
+    if np is not None:
+        ew = np.frombuffer(atlas.widths, dtype=np.uint8)
+        ww = np.frombuffer(web_widths, dtype=np.uint8)
+        cov = np.array(covered)
+        er = np.frombuffer(atlas.rows, dtype=np.uint8).reshape(256, FONT_HEIGHT)
+        wr = np.frombuffer(web_rows, dtype=np.uint8).reshape(256, FONT_HEIGHT)
+        width_err = cov & (ew != ww)
+        ascii = np.arange(256) < 0x80
+        glyph_err = cov & ~width_err & (ascii | (ew > 0)) & (er != wr).any(axis=1)
+        return np.flatnonzero(width_err).tolist(), np.flatnonzero(glyph_err).tolist()
+    width_errs, glyph_errs = [], []
+    for ch in range(256):
+        if not covered[ch]:
+            continue
+        if atlas.widths[ch] != web_widths[ch]:
+            width_errs.append(ch)
+        elif (ch < 0x80 or atlas.widths[ch] > 0) and \
+                atlas.glyph(ch)[1] != web_rows[ch * FONT_HEIGHT:(ch + 1) * FONT_HEIGHT]:
+            glyph_errs.append(ch)
+    return width_errs, glyph_errs
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def bits(b, w):
+    return ''.join('#' if b & (0x80>>c) else '.' for c in range(w))
+
+def print_row_diff(ep, wp, w):
+    for row in range(12):
+        if ep[row] != wp[row]:
+            print(f"    row {row:2d}: EXE={bits(ep[row], w)} (0x{ep[row]:02X})  web={bits(wp[row], w)} (0x{wp[row]:02X})")
+
+def main():
+    args = sys.argv[1:]
+    data = read_exe()
+    atlas = load_atlas(data)
+
+    if args and args[0] == '--render':
+        text = ' '.join(args[1:])
+        w, h, px = atlas.render(text)
+        try:
+            for y in range(h):
+                print(''.join('#' if px[y * w + x] else '.' for x in range(w)))
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Reader went away (e.g. | head): point stdout at devnull so the
+            # flush at exit doesn't raise again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return
+
+    char_map = atlas.char_map
 
     # Count non-default chars
-    non_default = sum(1 for c in range(256) if char_map[c] != 0x70E4)
+    non_default = sum(1 for c in range(256) if char_map[c] != DEFAULT_GLYPH)
     print(f"Font pointer table: {non_default} chars with custom glyphs (rest → default at DS:0x70E4)")
 
     # Default glyph info
-    def_w, def_p = read_glyph(data, 0x70E4)
+    def_w, def_p = read_glyph(data, DEFAULT_GLYPH)
     print(f"Default glyph: width={def_w}, all-zero={all(b==0 for b in def_p)}")
 
-    # Compare ASCII 32-126
-    width_errs = []
-    glyph_errs = []
+    web = load_web_atlas()
+    web_widths, web_rows, covered = web
+    width_errs, glyph_errs = compare_atlas(atlas, web)
+    web_glyph = lambda ch: web_rows[ch * FONT_HEIGHT:(ch + 1) * FONT_HEIGHT]
 
-    for i in range(95):
-        ch = 32 + i
-        exe_w, exe_packed = read_glyph(data, char_map[ch])
-        web_w = web_widths[i]
-
-        if exe_w != web_w:
-            width_errs.append((ch, exe_w, web_w))
-        else:
-            # Compare bitmap - need web GLYPHS data
-            # We'll do this comparison by re-reading font.js
-            pass
+    ascii_w = [ch for ch in width_errs if ch < 0x80]
+    ascii_g = [ch for ch in glyph_errs if ch < 0x80]
+    ext_w = [ch for ch in width_errs if ch >= 0x80]
+    ext_g = [ch for ch in glyph_errs if ch >= 0x80]
 
     print(f"\n=== ASCII 32-126 Width Comparison ===")
-    if width_errs:
-        print(f"WIDTH MISMATCHES: {len(width_errs)}")
-        for ch, ew, ww in width_errs:
-            print(f"  char {ch} ({chr(ch)}): EXE={ew} web={ww}")
+    if ascii_w:
+        print(f"WIDTH MISMATCHES: {len(ascii_w)}")
+        for ch in ascii_w:
+            print(f"  char {ch} ({chr(ch)}): EXE={atlas.widths[ch]} web={web_widths[ch]}")
     else:
         print("All 95 widths match!")
 
-    # Now let's do full glyph comparison by reading font.js
-    import os
-    font_js = os.path.join(os.path.dirname(__file__), '..', 'web', 'js', 'font.js')
-    with open(font_js) as f:
-        content = f.read()
-
-    # Extract GLYPHS array bytes
-    def extract_hex_array(content, var_name):
-        pattern = rf'const {var_name}\s*=\s*new Uint8Array\(\[([\s\S]*?)\]\)'
-        m = re.search(pattern, content)
-        if not m: return None
-        hex_str = m.group(1)
-        # Remove comments and whitespace
-        hex_str = re.sub(r'//[^\n]*', '', hex_str)
-        vals = re.findall(r'0x([0-9A-Fa-f]{2})', hex_str)
-        return bytes(int(v, 16) for v in vals)
-
-    web_glyphs = extract_hex_array(content, 'GLYPHS')
-    web_glyphs_ext = extract_hex_array(content, 'GLYPHS_EXT')
-
-    web_widths_ext_raw = extract_hex_array(content, 'WIDTHS_EXT')
-
-    if web_glyphs:
+    if covered[32]:
         print(f"\n=== ASCII 32-126 Glyph Bitmap Comparison ===")
-        mismatches = 0
-        for i in range(95):
-            ch = 32 + i
-            exe_w, exe_packed = read_glyph(data, char_map[ch])
-            web_w = web_widths[i]
-            web_packed = web_glyphs[i*12:(i+1)*12]
-
-            if exe_w == web_w and exe_packed != web_packed:
-                mismatches += 1
-                print(f"  char {ch} ({chr(ch)}) width={exe_w}:")
-                for row in range(12):
-                    if exe_packed[row] != web_packed[row]:
-                        # Show visual diff
-                        def bits(b, w):
-                            return ''.join('#' if b & (0x80>>c) else '.' for c in range(w))
-                        print(f"    row {row:2d}: EXE={bits(exe_packed[row], exe_w)} (0x{exe_packed[row]:02X})  web={bits(web_packed[row], exe_w)} (0x{web_packed[row]:02X})")
-
-        if mismatches == 0:
+        for ch in ascii_g:
+            exe_w, exe_packed = atlas.glyph(ch)
+            print(f"  char {ch} ({chr(ch)}) width={exe_w}:")
+            print_row_diff(exe_packed, web_glyph(ch), exe_w)
+        if not ascii_g:
             print("  All matching-width glyphs have identical bitmaps!")
 
     # Extended chars (0x80-0xFD)
-    if web_widths_ext_raw and web_glyphs_ext:
+    if covered[0x80]:
         print(f"\n=== Extended Chars 0x80-0xFD Width Comparison ===")
-        ext_w_errs = []
-        ext_g_errs = []
-        for i in range(126):  # 0x80 to 0xFD
-            ch = 0x80 + i
-            exe_w, exe_packed = read_glyph(data, char_map[ch])
-            web_w = web_widths_ext_raw[i]
-
-            if exe_w != web_w:
-                ext_w_errs.append((ch, exe_w, web_w))
-            elif exe_w > 0:
-                web_packed = web_glyphs_ext[i*12:(i+1)*12]
-                if exe_packed != web_packed:
-                    ext_g_errs.append((ch, exe_w, exe_packed, web_packed))
-
-        if ext_w_errs:
-            print(f"WIDTH MISMATCHES: {len(ext_w_errs)}")
-            for ch, ew, ww in ext_w_errs:
-                print(f"  char 0x{ch:02X}: EXE={ew} web={ww}")
+        if ext_w:
+            print(f"WIDTH MISMATCHES: {len(ext_w)}")
+            for ch in ext_w:
+                print(f"  char 0x{ch:02X}: EXE={atlas.widths[ch]} web={web_widths[ch]}")
         else:
             print("All extended widths match!")
 
-        if ext_g_errs:
-            print(f"\nGLYPH MISMATCHES: {len(ext_g_errs)}")
-            for ch, w, ep, wp in ext_g_errs:
+        if ext_g:
+            print(f"\nGLYPH MISMATCHES: {len(ext_g)}")
+            for ch in ext_g:
+                w, ep = atlas.glyph(ch)
                 print(f"  char 0x{ch:02X} width={w}:")
-                for row in range(12):
-                    if ep[row] != wp[row]:
-                        def bits(b, w):
-                            return ''.join('#' if b & (0x80>>c) else '.' for c in range(w))
-                        print(f"    row {row:2d}: EXE={bits(ep[row], w)} (0x{ep[row]:02X})  web={bits(wp[row], w)} (0x{wp[row]:02X})")
+                print_row_diff(ep, web_glyph(ch), w)
         else:
             print("All extended glyph bitmaps match!")
 
     # Summary
-    ext_total = 0
-    if web_widths_ext_raw:
-        ext_total = len(ext_w_errs) + len(ext_g_errs)
-    total = len(width_errs) + (mismatches if web_glyphs else 0) + ext_total
+    total = len(width_errs) + len(glyph_errs)
     print(f"\n{'PASS' if total == 0 else 'FAIL'}: {total} total discrepancies")
 
 if __name__ == "__main__":
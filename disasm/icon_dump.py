@@ -15,6 +15,14 @@ Usage:
     python3 icon_dump.py earth/SCORCH.EXE 0 -n 8     # render icons 0-7
     python3 icon_dump.py earth/SCORCH.EXE 0 --raw    # dump raw hex bytes
     python3 icon_dump.py earth/SCORCH.EXE 0 --png /tmp/icon.png  # export PNG
+    python3 icon_dump.py earth/SCORCH.EXE --atlas /tmp/icons.png # all icons: PNG atlas + .json
+    python3 icon_dump.py earth/SCORCH.EXE --check                # CRC32 per icon vs web/js/hud.js
+
+Atlas: every icon is extracted in one pass and packed into a grid of equal
+cells (ATLAS_COLUMNS per row, 1px gutter); pixel 1 = set, 0 = background.
+The .json sidecar lists each icon's cell position, size, type, file offset
+and CRC32. --check compares those checksums against the ICONS array the web
+port draws (web/js/hud.js) and lists the icons that drifted.
 
 DS memory layout:
     DS:0x3826 → file 0x059BA6
@@ -26,23 +34,25 @@ Related:
     draw_icon_alive, draw_icon_dead, draw_icon_blank variants
 """
 
+import os
+import re
 import sys
+import json
+import zlib
 import struct
 
-HEADER_SIZE  = 0x6A00        # MZ header + relocations
-DS_BASE_FILE = 0x055D80      # DS segment file offset (DS=0x4F38, para 0x4F38*16=0x4F380, +header=0x055D80 ... wait, actual = 0x4F38*16? No.)
-# Correct: DS segment paragraphs = 0x4F38, file base = 0x6A00 + 0x4F38*16 - <exe_load_offset>
-# Actually from project notes: "Data segment (DS): 0x4F38 (file base 0x055D80)"
-# ds_to_file(off) = off + 0x055D80 - (0x4F38 * 16) ... no
-# From ds_lookup.py: file = DS_OFFSET + 0x4F38_base_file
-# DS offset 0x0000 → file 0x055D80, so: file = ds_off + 0x055D80
+import tables
+from addr import ds_to_file
+from emu.png import write_png
 
 ICON_DS_BASE = 0x3826        # DS offset of icon array
 ICON_STRIDE  = 125           # bytes per icon struct
 ICON_COUNT   = 48
 
-def ds_to_file(ds_off):
-    return ds_off + 0x055D80
+ICON_LAYOUT   = tables.compile_layout('struct:125:type=u8,width=u8,height=u8')
+ATLAS_COLUMNS = 8
+ATLAS_PALETTE = [(0, 0, 0), (255, 255, 255)]
+HUD_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'js', 'hud.js')
 
 def render_icon_ascii(width, height, pixel_data):
     """Render icon pixels as ASCII art (. = background, # = set pixel).
@@ -58,6 +68,87 @@ def render_icon_ascii(width, height, pixel_data):
         lines.append(line)
     return lines
 
+def icon_checksum(pattern_type, width, height, bits):
+    """CRC32 of an icon as the web port sees it: type, size and 0/1 pixels (column-major)."""
+    return zlib.crc32(bytes((pattern_type, width, height)) + bytes(bits)) & 0xFFFFFFFF
+
+
+def extract_icons(exe_data, count=ICON_COUNT):
+    """
+    All icons in one pass: [dict(index, file_off, type, w, h, px, crc)] where
+    px is the w*h column-major pixel run normalized to 0/1 (the hud.js format).
+    """
+    base = ds_to_file(ICON_DS_BASE)
+    t = tables.read_table(exe_data, base, count, ICON_LAYOUT)
+    icons = []
+    nz = bytes([0] + [1] * 255)
+    for i, (file_off, h) in enumerate(zip(t.row_offsets(), t.rows())):
+        n_px = h['width'] * h['height']
+        bits = exe_data[file_off + 3:file_off + 3 + n_px].translate(nz)
+        icons.append({'index': i, 'file_off': file_off, 'type': h['type'],
+                      'w': h['width'], 'h': h['height'], 'px': bits,
+                      'crc': icon_checksum(h['type'], h['width'], h['height'], bits)})
+    return icons
+
+
+def load_web_icons(path=HUD_JS):
+    """ICONS from web/js/hud.js as [dict(t, w, h, px)], or None if the array is missing."""
+    with open(path) as f:
+        hud = f.read()
+    m = re.search(r'const ICONS = \[(.*?)\];', hud, re.DOTALL)
+    if not m:
+        return None
+    web_icons = []
+    for im in re.finditer(r'\{t:(\d+),w:(\d+),h:(\d+),px:\[(.*?)\]\}', m.group(1)):
+        t, w, h = int(im.group(1)), int(im.group(2)), int(im.group(3))
+        px_str = im.group(4).strip()
+        px = [int(x) for x in px_str.split(',')] if px_str else []
+        web_icons.append({'t': t, 'w': w, 'h': h, 'px': px,
+                          'crc': icon_checksum(t, w, h, [min(max(p, 0), 255) for p in px])})
+    return web_icons
+
+
+def build_atlas(icons, columns=ATLAS_COLUMNS):
+    """Pack icons into a grid; returns (width, height, pixels, placements)."""
+    cell_w = max([ic['w'] for ic in icons] + [1]) + 1
+    cell_h = max([ic['h'] for ic in icons] + [1]) + 1
+    rows = (len(icons) + columns - 1) // columns
+    aw, ah = columns * cell_w, max(rows, 1) * cell_h
+    pixels = bytearray(aw * ah)
+    placements = []
+    for n, ic in enumerate(icons):
+        x0, y0 = (n % columns) * cell_w, (n // columns) * cell_h
+        w, h, px = ic['w'], ic['h'], ic['px']
+        for col in range(w):
+            # Column-major source: one column of the icon is px[col*h:(col+1)*h]
+            column = px[col * h:(col + 1) * h]
+            for row, b in enumerate(column):
+                if b:
+                    pixels[(y0 + row) * aw + x0 + col] = 1
+        placements.append({'index': ic['index'], 'x': x0, 'y': y0, 'w': w, 'h': h,
+                           'type': ic['type'], 'file_offset': f"0x{ic['file_off']:05X}",
+                           'crc32': f"{ic['crc']:08X}"})
+    return aw, ah, pixels, placements
+
+
+def write_atlas(icons, png_path):
+    """Write the atlas PNG and its JSON metadata (same name, .json)."""
+    aw, ah, pixels, placements = build_atlas(icons)
+    write_png(png_path, aw, ah, pixels, ATLAS_PALETTE)
+    meta_path = os.path.splitext(png_path)[0] + '.json'
+    with open(meta_path, 'w') as f:
+        json.dump({'image': os.path.basename(png_path), 'width': aw, 'height': ah,
+                   'ds_base': f'0x{ICON_DS_BASE:04X}', 'stride': ICON_STRIDE,
+                   'icons': placements}, f, indent=1)
+    return meta_path
+
+
+def check_icons(icons, web_icons):
+    """Indices whose checksum differs from the web port (missing web icons count as drift)."""
+    return [ic['index'] for ic in icons
+            if ic['index'] >= len(web_icons) or web_icons[ic['index']]['crc'] != ic['crc']]
+
+
 def dump_icon(exe_data, icon_idx):
     file_off = ds_to_file(ICON_DS_BASE) + icon_idx * ICON_STRIDE
     if file_off + ICON_STRIDE > len(exe_data):
@@ -94,6 +185,27 @@ def main():
             args = [a for a in args if a not in ('--png', png_path)]
     args = [a for a in args if a not in ('--raw',)]
 
+    if '--atlas' in args or '--check' in args:
+        icons = extract_icons(exe_data)
+        if '--atlas' in args:
+            atlas_path = args[args.index('--atlas') + 1]
+            meta_path = write_atlas(icons, atlas_path)
+            print(f"Saved atlas: {atlas_path} ({len(icons)} icons), metadata: {meta_path}")
+        if '--check' in args:
+            web_icons = load_web_icons()
+            if web_icons is None:
+                print("ERROR: Could not find ICONS array in hud.js")
+                sys.exit(1)
+            drift = check_icons(icons, web_icons)
+            for i in drift:
+                ic = icons[i]
+                web_crc = f"{web_icons[i]['crc']:08X}" if i < len(web_icons) else 'missing'
+                print(f"Icon {i:2d}: EXE crc={ic['crc']:08X} (t={ic['type']} {ic['w']}x{ic['h']})  web crc={web_crc}")
+            print(f"{len(icons) - len(drift)}/{len(icons)} icons match web/js/hud.js")
+            if drift:
+                sys.exit(1)
+        return
+
     # Determine which icons to show
     start_idx = 0
     count     = 1
@@ -131,17 +243,12 @@ def main():
                 print('  ' + line)
 
         if png_path and width > 0 and height > 0:
-            try:
-                from PIL import Image
-                img = Image.new('P', (width, height), 0)
-                pixels = []
-                for b in pixel_data[:width * height]:
-                    pixels.append(b)
-                img.putdata(pixels)
-                img.save(png_path)
-                print(f"  Saved PNG: {png_path}")
-            except ImportError:
-                print("  (PIL not available for PNG export)")
+            # Column-major source → row-major PNG rows
+            n = len(pixel_data)
+            pixels = bytes(1 if col * height + row < n and pixel_data[col * height + row] else 0
+                           for row in range(height) for col in range(width))
+            write_png(png_path, width, height, pixels, ATLAS_PALETTE)
+            print(f"  Saved PNG: {png_path}")
 
 if __name__ == '__main__':
     main()
@@ -1,45 +1,40 @@
 #!/usr/bin/env python3
-"""Compare web ICONS array against EXE icon data at DS:0x3826."""
+"""Compare web ICONS array against EXE icon data at DS:0x3826.
 
-import json, re, sys
+Icons are extracted in one pass (icon_dump.extract_icons) and compared by CRC32
+first; only icons whose checksum differs are diffed pixel by pixel.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from icon_dump import extract_icons, load_web_icons
 
 data = open('earth/SCORCH.EXE', 'rb').read()
 
 # Read web ICONS from hud.js
-with open('web/js/hud.js') as f:
-    hud = f.read()
-
-# Extract ICONS array
-m = re.search(r'const ICONS = \[(.*?)\];', hud, re.DOTALL)
-if not m:
+web_icons = load_web_icons('web/js/hud.js')
+if web_icons is None:
     print("ERROR: Could not find ICONS array in hud.js")
     sys.exit(1)
 
-# Parse each icon object
-icon_text = m.group(1)
-web_icons = []
-for im in re.finditer(r'\{t:(\d+),w:(\d+),h:(\d+),px:\[(.*?)\]\}', icon_text):
-    t, w, h = int(im.group(1)), int(im.group(2)), int(im.group(3))
-    px_str = im.group(4).strip()
-    px = [int(x) for x in px_str.split(',')] if px_str else []
-    web_icons.append({'t': t, 'w': w, 'h': h, 'px': px})
-
 print(f"Web icons: {len(web_icons)}")
 
 # Compare against EXE
-ICON_FILE_BASE = 0x595A6
-STRIDE = 125
 diffs = 0
 
-for i in range(min(len(web_icons), 48)):
-    off = ICON_FILE_BASE + i * STRIDE
-    exe_t = data[off]
-    exe_w = data[off + 1]
-    exe_h = data[off + 2]
-    n_px = exe_w * exe_h
-    exe_px = [1 if data[off + 3 + j] else 0 for j in range(n_px)]
-
+for ic in extract_icons(data, min(len(web_icons), 48)):
+    i = ic['index']
     wi = web_icons[i]
+    if wi['crc'] == ic['crc']:
+        continue  # identical type, size and pixels
+
+    off = ic['file_off']
+    exe_t, exe_w, exe_h = ic['type'], ic['w'], ic['h']
+    n_px = exe_w * exe_h
+    exe_px = ic['px']
 
     if wi['t'] != exe_t or wi['w'] != exe_w or wi['h'] != exe_h:
         print(f"Icon {i:2d}: STRUCT MISMATCH — EXE t={exe_t} w={exe_w} h={exe_h}, web t={wi['t']} w={wi['w']} h={wi['h']}")
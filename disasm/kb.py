@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+kb.py — Shared knowledge base for labels.csv and comments.csv.
+
+Parses both CSV files once into indexed structures used by every tool
+(dis.py, xref.py, decode_tables.py, search_bytes.py) and by the emulator:
+
+    labels        file_offset -> name     (DS: keys converted to file offsets)
+    ds_labels     ds_offset   -> name     (only DS: keys)
+    comments      file_offset -> comment
+    dtypes        file_offset -> dtype    (3rd column, only non-'code' entries)
+    by_name       name        -> file_offset
+    func_offsets  sorted file offsets of code labels (for bisect lookups)
+
+Keys may be written as '0x20EA0' / '20EA0' (file offset), 'DS:0x1234'
+(DS offset) or '1A4A:0000' (SEG:OFF, load-relative paragraph).
+
+The parsed form is pickled to ~/.cache/scorch-disasm/ and reused while the
+CSV files keep the same mtime and size.
+
+Usage:
+    python3 disasm/kb.py <addr>       # which function/label contains addr
+    python3 disasm/kb.py --stats      # counts per table
+
+    addr   : file offset (hex), DS:XXXX, or label name
+
+Library:
+    import kb
+    k = kb.load()
+    k.function_at(0x25E00)            # -> (0x25DE9, 'ai_inject_noise')
+    k.symbolize(0x25E00)              # -> 'ai_inject_noise+0x17'
+"""
+
+import sys
+import os
+import csv
+import bisect
+import pickle
+import hashlib
+
+from addr import DS_FILE_BASE, module_at, ds_to_file, segoff_to_file
+
+SCRIPT_DIR   = os.path.dirname(os.path.abspath(__file__))
+LABELS_CSV   = os.path.join(SCRIPT_DIR, 'labels.csv')
+COMMENTS_CSV = os.path.join(SCRIPT_DIR, 'comments.csv')
+CACHE_DIR    = os.path.join(os.path.expanduser('~'), '.cache', 'scorch-disasm')
+
+KB_VERSION = 1     # bump when the pickled layout changes
+
+
+def parse_addr_key(s):
+    """
+    Parse a CSV key into (kind, value):
+      '0x20EA0' or '20EA0' → ('file', 0x20EA0)
+      'DS:0x1234'          → ('ds',   0x1234)
+      '1A4A:0000'          → ('file', segoff_to_file(0x1A4A, 0))
+    Returns None on failure.
+    """
+    s = s.strip()
+    sl = s.lower()
+    try:
+        if sl.startswith('ds:'):
+            return ('ds', int(s[3:], 16))
+        if ':' in s:
+            seg_s, off_s = s.split(':', 1)
+            return ('file', segoff_to_file(int(seg_s, 16), int(off_s, 16)))
+        return ('file', int(s, 16))
+    except ValueError:
+        return None
+
+
+class KnowledgeBase:
+    """Indexed labels/comments. Build with kb.load(), not directly."""
+
+    def __init__(self, labels, ds_labels, comments, dtypes):
+        self.labels = labels
+        self.ds_labels = ds_labels
+        self.comments = comments
+        self.dtypes = dtypes
+        self.by_name = {name: off for off, name in labels.items()}
+        # Code labels: file-offset keys outside DS with no data dtype.
+        funcs = sorted(off for off in labels
+                       if off < DS_FILE_BASE and off not in dtypes)
+        self.func_offsets = funcs
+        self.func_names = [labels[off] for off in funcs]
+
+    # -- queries ------------------------------------------------------------
+
+    def label_at(self, file_off):
+        """Exact label at file_off, or None."""
+        return self.labels.get(file_off)
+
+    def function_at(self, file_off):
+        """
+        Return (start, name) of the nearest code label at or before file_off,
+        or None. The label must lie in the same module as file_off; DS
+        addresses never resolve to a function.
+        """
+        if file_off >= DS_FILE_BASE:
+            return None
+        i = bisect.bisect_right(self.func_offsets, file_off) - 1
+        if i < 0:
+            return None
+        start = self.func_offsets[i]
+        mod = module_at(file_off)
+        if mod is not None and start < mod[0]:
+            return None
+        return start, self.func_names[i]
+
+    def symbolize(self, file_off):
+        """Return 'name' or 'name+0xNN' for file_off, or None if no function precedes it."""
+        hit = self.function_at(file_off)
+        if hit is None:
+            return None
+        start, name = hit
+        return name if start == file_off else f'{name}+0x{file_off - start:X}'
+
+    def symbolize_many(self, file_offs):
+        """symbolize() for every element, computed once per distinct offset."""
+        memo = {}
+        out = []
+        for off in file_offs:
+            if off not in memo:
+                memo[off] = self.symbolize(off)
+            out.append(memo[off])
+        return out
+
+    def lookup(self, name):
+        """File offset for a label name, or None."""
+        return self.by_name.get(name)
+
+
+# ---------------------------------------------------------------------------
+# CSV parsing
+# ---------------------------------------------------------------------------
+
+def _parse_labels(path):
+    labels, ds_labels, dtypes = {}, {}, {}
+    if not os.path.exists(path):
+        return labels, ds_labels, dtypes
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            if len(row) < 2:
+                continue
+            key = parse_addr_key(row[0])
+            name = row[1].strip()
+            if not key or not name:
+                continue
+            kind, val = key
+            foff = ds_to_file(val) if kind == 'ds' else val
+            labels[foff] = name
+            if kind == 'ds':
+                ds_labels[val] = name
+            if len(row) >= 3:
+                dtype = row[2].strip()
+                if dtype and dtype != 'code':
+                    dtypes[foff] = dtype
+    return labels, ds_labels, dtypes
+
+
+def _parse_comments(path):
+    comments = {}
+    if not os.path.exists(path):
+        return comments
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            if len(row) < 2:
+                continue
+            key = parse_addr_key(row[0])
+            cmt = ','.join(row[1:]).strip()
+            if key and cmt:
+                kind, val = key
+                foff = ds_to_file(val) if kind == 'ds' else val
+                comments[foff] = cmt
+    return comments
+
+
+# ---------------------------------------------------------------------------
+# Loading with pickle cache
+# ---------------------------------------------------------------------------
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def _cache_path(labels_path, comments_path):
+    key = f'{os.path.abspath(labels_path)}|{os.path.abspath(comments_path)}'
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f'kb-{digest}.pickle')
+
+
+_loaded = {}   # (labels_path, comments_path) -> (stamps, KnowledgeBase)
+
+
+def load(labels_path=LABELS_CSV, comments_path=COMMENTS_CSV):
+    """
+    Return the KnowledgeBase for the given CSV files.
+
+    Reuses the in-process copy or the pickle cache when both files are
+    unchanged (same mtime and size); otherwise re-parses and rewrites the cache.
+    """
+    stamps = (KB_VERSION, _stamp(labels_path), _stamp(comments_path))
+    memo_key = (labels_path, comments_path)
+    hit = _loaded.get(memo_key)
+    if hit is not None and hit[0] == stamps:
+        return hit[1]
+
+    # Only plain dicts are pickled (not KnowledgeBase), so the cache stays
+    # loadable whether kb is imported as a module or run as __main__.
+    cache = _cache_path(labels_path, comments_path)
+    tables = None
+    try:
+        with open(cache, 'rb') as f:
+            cached_stamps, tables = pickle.load(f)
+        if cached_stamps != stamps:
+            tables = None
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+        tables = None
+
+    if tables is None:
+        labels, ds_labels, dtypes = _parse_labels(labels_path)
+        comments = _parse_comments(comments_path)
+        tables = (labels, ds_labels, comments, dtypes)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = cache + f'.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump((stamps, tables), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache)
+        except OSError:
+            pass   # cache is an optimization only
+
+    kb = KnowledgeBase(*tables)
+
+    _loaded[memo_key] = (stamps, kb)
+    return kb
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(0)
+
+    k = load()
+    if args[0] == '--stats':
+        print(f'labels     : {len(k.labels)}')
+        print(f'ds_labels  : {len(k.ds_labels)}')
+        print(f'comments   : {len(k.comments)}')
+        print(f'dtypes     : {len(k.dtypes)}')
+        print(f'functions  : {len(k.func_offsets)}')
+        return
+
+    for arg in args:
+        foff = k.lookup(arg)
+        if foff is None:
+            key = parse_addr_key(arg)
+            if key is None:
+                print(f'{arg}: not a label or address')
+                continue
+            kind, val = key
+            foff = ds_to_file(val) if kind == 'ds' else val
+        mod = module_at(foff)
+        mod_str = f'  ({mod[3]})' if mod else ''
+        label = k.label_at(foff)
+        sym = k.symbolize(foff) or label or '?'
+        extra = f'  [label: {label}]' if label and label != sym else ''
+        cmt = k.comments.get(foff)
+        cmt_str = f'  ; {cmt}' if cmt else ''
+        print(f'0x{foff:05X}  {sym}{mod_str}{extra}{cmt_str}')
+
+
+if __name__ == '__main__':
+    main()
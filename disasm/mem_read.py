@@ -31,14 +31,13 @@ Examples:
 """
 import sys, os, re, argparse
 
+import daemon
+if __name__ == '__main__':
+    daemon.forward('mem_read', sys.argv[1:])   # runs in the resident daemon if one is up
+
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from disasm.emu.memory import Memory
-from disasm.emu.cpu import CPU
-from disasm.emu.loader import load_exe, setup_ivt, setup_cpu
-from disasm.emu.ports import PortIO
-from disasm.emu.interrupts import InterruptHandler
-from disasm.emu.state import load_state
+from disasm.emu.session import Emulator
 
 
 def dump_struct(mem, phys, fmt_str, prefix='  '):
@@ -173,15 +172,8 @@ def main():
     args = parser.parse_args()
 
     # Load state
-    mem = Memory()
-    setup_ivt(mem)
-    info = load_exe(args.exe, mem)
-    cpu = CPU()
-    setup_cpu(cpu, info)
-    ports = PortIO()
-    ports.mem = mem
-    ih = InterruptHandler(mem, cpu, 'earth', ports)
-    load_state(args.state_file, cpu, mem, ports, ih)
+    emu = Emulator(args.exe, state=args.state_file)
+    info, cpu, mem = emu.info, emu.cpu, emu.mem
 
     if args.regs:
         print(f'AX={cpu.ax:04X} BX={cpu.bx:04X} CX={cpu.cx:04X} DX={cpu.dx:04X}')
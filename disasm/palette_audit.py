@@ -1,87 +1,233 @@
 #!/usr/bin/env python3
 """Extract all fg_setrgb(index, R, G, B) calls with immediate args from EXE.
-Prints index, R, G, B for each call where all 4 args are immediate pushes."""
+Prints index, R, G, B for each call where all 4 args are immediate pushes.
 
-data = open('earth/SCORCH.EXE', 'rb').read()
+With --timeline LOG (an emulator --vga-log), diff the per-frame palettes the
+EXE actually produced against web/js/palette.js instead. The web palette is
+computed by node: initPalette(--terrain, --sky) after seedRandom(--seed),
+plus tickAccentPalette(k) for the shop animation with --accent. Only entries
+the EXE has written by that frame are compared.
+
+  python3 disasm/palette_audit.py                               # static scan
+  python3 disasm/palette_audit.py --timeline /tmp/round.vga --terrain 0 --sky 0
+  python3 disasm/palette_audit.py --timeline /tmp/shop.vga --accent -v
+"""
+import sys, os, json, argparse, subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from disasm.emu.vgalog import VgaLog
 
 # fg_setrgb call pattern: 9A 05 00 6B 45
 CALL_PATTERN = bytes([0x9A, 0x05, 0x00, 0x6B, 0x45])
 
-results = []
-pos = 0x6A00  # skip header
-while True:
-    pos = data.find(CALL_PATTERN, pos)
-    if pos == -1:
-        break
-
-    # Walk backwards to find 4 pushes
-    # Each push is either: 6A xx (push imm8) or 68 xx xx (push imm16) or FF 36 xx xx (push [mem])
-    args = []
-    bp = pos
-    for _ in range(4):
-        # Check what's before bp
-        if bp >= 2 and data[bp-2] == 0x6A:  # push imm8
-            args.insert(0, ('imm', data[bp-1]))
-            bp -= 2
-        elif bp >= 3 and data[bp-3] == 0x68:  # push imm16
-            args.insert(0, ('imm', data[bp-2] | (data[bp-1] << 8)))
-            bp -= 3
-        elif bp >= 4 and data[bp-4] == 0xFF and data[bp-3] == 0x36:  # push [mem16]
-            addr = data[bp-2] | (data[bp-1] << 8)
-            args.insert(0, ('mem', addr))
-            bp -= 4
-        else:
-            args.insert(0, ('?', 0))
-
-    # args[0]=index, args[1]=R, args[2]=G, args[3]=B (right-to-left push, so B pushed first)
-    # Actually: fg_setrgb(index, R, G, B) in C → push B, push G, push R, push index
-    # So reading backwards from call: index is closest, then R, G, B
-    # Wait - stack grows down, args pushed right-to-left:
-    #   push B  (first push, furthest from call)
-    #   push G
-    #   push R
-    #   push index (last push, closest to call)
-    # So args[0]=B (furthest), args[1]=G, args[2]=R, args[3]=index (closest to call)
-    # Actually my loop reads backwards from call, so args[0] is closest = index
-    # Let me re-check: I insert(0,...) each time, and go backwards
-    # Iteration 1: bp before call → finds closest push = index → args = [index]
-    # Iteration 2: bp before that → finds R → args = [R, index]
-    # Iteration 3: → args = [G, R, index]
-    # Iteration 4: → args = [B, G, R, index]
-    # So: args = [B, G, R, index]
-    idx_info = args[3]
-    r_info = args[2]
-    g_info = args[1]
-    b_info = args[0]
-
-    all_imm = all(a[0] == 'imm' for a in args)
-
-    if all_imm:
-        results.append((idx_info[1], r_info[1], g_info[1], b_info[1], pos))
-    else:
-        # Show mem refs too
-        parts = []
-        for name, info in zip(['idx','R','G','B'], [idx_info, r_info, g_info, b_info]):
-            if info[0] == 'imm':
-                parts.append(f"{name}={info[1]}")
-            elif info[0] == 'mem':
-                parts.append(f"{name}=[DS:{info[1]:04X}]")
+WEB_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'js')
+
+# Palette layout from the web/js/palette.js header
+REGIONS = [
+    (0, 79, 'players'),
+    (80, 104, 'sky'),
+    (105, 119, 'unused'),
+    (120, 149, 'terrain'),
+    (150, 150, 'wall'),
+    (151, 169, 'other'),
+    (170, 199, 'explosion'),
+    (200, 209, 'other'),
+    (210, 219, 'shields'),
+    (220, 251, 'other'),
+    (252, 254, 'system'),
+    (255, 255, 'other'),
+]
+
+# Entries tickAccentPalette() animates in the shop
+ACCENT = [2, 8, 9, 10, 11, 14, 15, 16, 17, 18]
+
+NODE_SCRIPT = r'''
+const [pal, utils] = await Promise.all([import(process.argv[1]), import(process.argv[2])]);
+const [terrain, sky, seed, ticks] = process.argv.slice(3).map(Number);
+utils.seedRandom(seed);
+pal.initPalette(terrain, sky);
+const out = [Array.from(pal.palette6)];
+for (let k = 0; k < ticks; k++) {
+  pal.tickAccentPalette(k);
+  out.push(Array.from(pal.palette6));
+}
+console.log(JSON.stringify(out));
+'''
+
+
+def region(i):
+    for lo, hi, name in REGIONS:
+        if lo <= i <= hi:
+            return name
+    return 'other'
+
+
+def scan(data):
+    results = []
+    pos = 0x6A00  # skip header
+    while True:
+        pos = data.find(CALL_PATTERN, pos)
+        if pos == -1:
+            break
+
+        # Walk backwards to find 4 pushes
+        # Each push is either: 6A xx (push imm8) or 68 xx xx (push imm16) or FF 36 xx xx (push [mem])
+        args = []
+        bp = pos
+        for _ in range(4):
+            # Check what's before bp
+            if bp >= 2 and data[bp-2] == 0x6A:  # push imm8
+                args.insert(0, ('imm', data[bp-1]))
+                bp -= 2
+            elif bp >= 3 and data[bp-3] == 0x68:  # push imm16
+                args.insert(0, ('imm', data[bp-2] | (data[bp-1] << 8)))
+                bp -= 3
+            elif bp >= 4 and data[bp-4] == 0xFF and data[bp-3] == 0x36:  # push [mem16]
+                addr = data[bp-2] | (data[bp-1] << 8)
+                args.insert(0, ('mem', addr))
+                bp -= 4
             else:
-                parts.append(f"{name}=?")
-        results.append(tuple(parts) + (pos,))
-
-    pos += 5
-
-# Print grouped by index
-print("=== All-immediate fg_setrgb calls ===")
-print(f"{'Index':>5} {'R':>3} {'G':>3} {'B':>3}  file_offset")
-print("-" * 45)
-imm_calls = [(idx, r, g, b, off) for x in results if isinstance(x[0], int) for idx, r, g, b, off in [x]]
-imm_calls.sort(key=lambda x: (x[0], x[4]))
-for idx, r, g, b, off in imm_calls:
-    print(f"{idx:>5} {r:>3} {g:>3} {b:>3}  0x{off:05X}")
-
-print(f"\n=== Calls with memory-indirect args ({sum(1 for x in results if isinstance(x[0], str))}) ===")
-for x in results:
-    if isinstance(x[0], str):
-        print(f"  {x[0]}, {x[1]}, {x[2]}, {x[3]}  @ 0x{x[4]:05X}")
+                args.insert(0, ('?', 0))
+
+        # args[0]=index, args[1]=R, args[2]=G, args[3]=B (right-to-left push, so B pushed first)
+        # Actually: fg_setrgb(index, R, G, B) in C → push B, push G, push R, push index
+        # So reading backwards from call: index is closest, then R, G, B
+        # Wait - stack grows down, args pushed right-to-left:
+        #   push B  (first push, furthest from call)
+        #   push G
+        #   push R
+        #   push index (last push, closest to call)
+        # So args[0]=B (furthest), args[1]=G, args[2]=R, args[3]=index (closest to call)
+        # Actually my loop reads backwards from call, so args[0] is closest = index
+        # Let me re-check: I insert(0,...) each time, and go backwards
+        # Iteration 1: bp before call → finds closest push = index → args = [index]
+        # Iteration 2: bp before that → finds R → args = [R, index]
+        # Iteration 3: → args = [G, R, index]
+        # Iteration 4: → args = [B, G, R, index]
+        # So: args = [B, G, R, index]
+        idx_info = args[3]
+        r_info = args[2]
+        g_info = args[1]
+        b_info = args[0]
+
+        all_imm = all(a[0] == 'imm' for a in args)
+
+        if all_imm:
+            results.append((idx_info[1], r_info[1], g_info[1], b_info[1], pos))
+        else:
+            # Show mem refs too
+            parts = []
+            for name, info in zip(['idx','R','G','B'], [idx_info, r_info, g_info, b_info]):
+                if info[0] == 'imm':
+                    parts.append(f"{name}={info[1]}")
+                elif info[0] == 'mem':
+                    parts.append(f"{name}=[DS:{info[1]:04X}]")
+                else:
+                    parts.append(f"{name}=?")
+            results.append(tuple(parts) + (pos,))
+
+        pos += 5
+    return results
+
+
+def print_scan(results):
+    # Print grouped by index
+    print("=== All-immediate fg_setrgb calls ===")
+    print(f"{'Index':>5} {'R':>3} {'G':>3} {'B':>3}  file_offset")
+    print("-" * 45)
+    imm_calls = [(idx, r, g, b, off) for x in results if isinstance(x[0], int) for idx, r, g, b, off in [x]]
+    imm_calls.sort(key=lambda x: (x[0], x[4]))
+    for idx, r, g, b, off in imm_calls:
+        print(f"{idx:>5} {r:>3} {g:>3} {b:>3}  0x{off:05X}")
+
+    print(f"\n=== Calls with memory-indirect args ({sum(1 for x in results if isinstance(x[0], str))}) ===")
+    for x in results:
+        if isinstance(x[0], str):
+            print(f"  {x[0]}, {x[1]}, {x[2]}, {x[3]}  @ 0x{x[4]:05X}")
+
+
+# -- timeline diff -------------------------------------------------------------
+
+def web_palettes(terrain=0, sky=0, seed=1, ticks=0):
+    """[palette] from web/js/palette.js: after initPalette, then after each of
+    `ticks` tickAccentPalette calls; each palette is 256 (r, g, b)."""
+    urls = ['file://' + os.path.abspath(os.path.join(WEB_JS, name))
+            for name in ('palette.js', 'utils.js')]
+    try:
+        proc = subprocess.run(['node', '--input-type=module', '-e', NODE_SCRIPT, *urls,
+                               str(terrain), str(sky), str(seed), str(ticks)],
+                              capture_output=True, text=True, timeout=30)
+    except FileNotFoundError:
+        sys.exit('palette_audit: --timeline needs node to evaluate web/js/palette.js')
+    if proc.returncode != 0:
+        sys.exit(f'palette_audit: node failed:\n{proc.stderr}')
+    return [[tuple(flat[i:i + 3]) for i in range(0, 768, 3)]
+            for flat in json.loads(proc.stdout)]
+
+
+def diff_timeline(log, webs, lo, hi, accent, verbose):
+    """Print the per-frame differences; returns {region: frames differing}."""
+    written = set()
+    per_region = {}
+    frames = 0
+    for f in log.frames():
+        written |= f.changed
+        indices = [i for i in sorted(written) if lo <= i <= hi]
+        if not f.changed or not indices:
+            continue
+        frames += 1
+        if accent:
+            # The shop counter's phase is unknown: take the closest web tick.
+            def misses(web):
+                return sum(1 for i in ACCENT if i in written and f.palette[i] != web[i])
+            tick = min(range(1, len(webs)), key=lambda k: misses(webs[k]))
+            web = webs[tick]
+        else:
+            tick, web = None, webs[0]
+        bad = [i for i in indices if f.palette[i] != web[i]]
+        regions = {}
+        for i in bad:
+            regions.setdefault(region(i), []).append(i)
+        for name in regions:
+            per_region[name] = per_region.get(name, 0) + 1
+        line = f'frame {f.index:6d}  step {f.step:12d}  {len(bad):3d}/{len(indices):<3d} differ'
+        if tick is not None:
+            line += f'  (web tick {tick - 1})'
+        if regions:
+            line += '  ' + ' '.join(f'{name} {len(ix)}' for name, ix in regions.items())
+        print(line)
+        if verbose:
+            for i in bad:
+                print(f'    {i:3d} {region(i):10s} exe {f.palette[i]}  web {web[i]}')
+    print(f'\n{frames} frames compared')
+    for name, n in sorted(per_region.items(), key=lambda kv: -kv[1]):
+        print(f'  {name:10s} differs in {n} frames')
+    return per_region
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fg_setrgb scan, or EXE vs web palette timeline')
+    parser.add_argument('--exe', default='earth/SCORCH.EXE', help='EXE to scan')
+    parser.add_argument('--timeline', metavar='LOG', help='Diff a --vga-log against the web palette')
+    parser.add_argument('--terrain', type=int, default=0, help='Web initPalette terrain type')
+    parser.add_argument('--sky', type=int, default=0, help='Web initPalette sky type')
+    parser.add_argument('--seed', type=int, default=1, help='Web seedRandom value')
+    parser.add_argument('--accent', action='store_true',
+                        help='Compare shop accent animation (tickAccentPalette) frames')
+    parser.add_argument('--range', default='0-255', metavar='A-B', help='Palette entries')
+    parser.add_argument('-v', '--verbose', action='store_true', help='List differing entries')
+    args = parser.parse_args()
+
+    if not args.timeline:
+        data = open(args.exe, 'rb').read()
+        print_scan(scan(data))
+        return
+    a, _, b = args.range.partition('-')
+    lo, hi = int(a, 0), int(b, 0) if b else int(a, 0)
+    webs = web_palettes(args.terrain, args.sky, args.seed, 101 if args.accent else 0)
+    diff_timeline(VgaLog.load(args.timeline), webs, lo, hi, args.accent, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ Known palette regions (from RE notes):
 
 Usage:
     python3 palette_dump.py earth/SCORCH.EXE --scan      # scan for 768-byte palette blocks
+    python3 palette_dump.py earth/SCORCH.EXE --rank [N]  # rank 16/32/64-entry partial palettes
     python3 palette_dump.py earth/SCORCH.EXE DS:0x1F62   # dump accent animation table
     python3 palette_dump.py earth/SCORCH.EXE 0xFILEOFF -n 16  # dump 16 palette entries
     python3 palette_dump.py earth/SCORCH.EXE --accent    # show accent color table
@@ -23,12 +24,11 @@ Output: palette index, R/G/B as 6-bit (0-63) and 8-bit (0-255), and a color swat
 """
 
 import sys
+import re
+import math
 import struct
 
-DS_FILE_BASE = 0x055D80
-
-def ds_to_file(ds_off):
-    return ds_off + DS_FILE_BASE
+from addr import ds_to_file, file_to_ds
 
 def to_8bit(v6):
     return round(v6 * 255 / 63)
@@ -66,17 +66,52 @@ def dump_accent_table(exe_data):
         name = names[i] if i < len(names) else f'entry {i}'
         print(f"  {i}: {name:12s}  R={r:2d} G={g:2d} B={b:2d}  → #{r8:02X}{g8:02X}{b8:02X}  {swatch}")
 
+# Maximal runs of bytes that are valid 6-bit DAC values (0-63), found in C.
+_RUN_RGB8_768 = re.compile(rb'[\x00-\x3F]{768,}')
+_RUN_RGB8 = re.compile(rb'[\x00-\x3F]{48,}')                # >= 16 entries x 3 bytes
+_RUN_RGB16 = re.compile(rb'(?:[\x00-\x3F]\x00){48,}')       # >= 16 entries x 3 words
+
+# n*log2(n) for histogram counts, so window entropy updates in O(1) per byte
+_NLOGN = [0.0] + [n * math.log2(n) for n in range(1, 769)]
+
+
 def scan_palette_blocks(exe_data):
-    """Scan for 768-byte blocks that look like full VGA palette data (values 0-63)."""
+    """Scan for 768-byte blocks that look like full VGA palette data (values 0-63).
+
+    Only windows inside a run of in-range bytes can qualify, so runs are found
+    with one regex pass and a 64-bin histogram (one bin per 6-bit value) slides
+    over each run in 16-byte steps (each byte enters and leaves the window once).
+    """
     print("Scanning for 768-byte VGA palette blocks (all bytes 0-63)...")
     hits = []
-    for off in range(0, len(exe_data) - 768, 16):
-        chunk = exe_data[off:off+768]
-        if all(b <= 63 for b in chunk):
-            # Additional heuristic: should have non-trivial spread of values
-            unique = len(set(chunk))
+    for m in _RUN_RGB8_768.finditer(exe_data):
+        run_start, run_end = m.span()
+        # Windows are aligned to 16 bytes and must leave room for one more step
+        first = (run_start + 15) & ~15
+        last = min(run_end - 768, len(exe_data) - 768 - 1)
+        if first > last:
+            continue
+        hist = [0] * 64
+        unique = 0
+        for b in exe_data[first:first + 768]:
+            if hist[b] == 0:
+                unique += 1
+            hist[b] += 1
+        off = first
+        while True:
             if unique > 20:
                 hits.append((off, unique))
+            if off + 16 > last:
+                break
+            for b in exe_data[off:off + 16]:
+                hist[b] -= 1
+                if hist[b] == 0:
+                    unique -= 1
+            for b in exe_data[off + 768:off + 784]:
+                if hist[b] == 0:
+                    unique += 1
+                hist[b] += 1
+            off += 16
     if hits:
         for off, u in hits:
             print(f"  file 0x{off:05X}  ({u} unique values)")
@@ -84,6 +119,106 @@ def scan_palette_blocks(exe_data):
         print("  No clean 768-byte palette blocks found.")
     return hits
 
+
+def _best_window(vals, n_entries):
+    """
+    Slide an n_entries-entry window over vals (flat R,G,B values) one entry at
+    a time. Returns (score, entry_index, unique, entropy, roughness) of the
+    best window, where entropy is Shannon entropy of the values in bits and
+    roughness is the mean |delta| between consecutive entries (0 = smooth
+    ramp, 1 = noise). score = entropy * (1 - roughness).
+    """
+    n = n_entries * 3
+    hist = [0] * 64
+    unique = 0
+    sum_nlogn = 0.0
+    for v in vals[:n]:
+        c = hist[v]
+        sum_nlogn += _NLOGN[c + 1] - _NLOGN[c]
+        unique += c == 0
+        hist[v] = c + 1
+    # deltas[k] = sum over channels of |entry k+1 - entry k|
+    deltas = [abs(vals[i + 3] - vals[i]) + abs(vals[i + 4] - vals[i + 1]) +
+              abs(vals[i + 5] - vals[i + 2]) for i in range(0, len(vals) - 5, 3)]
+    dsum = sum(deltas[:n_entries - 1])
+    norm = (n_entries - 1) * 3 * 63
+    log_n = math.log2(n)
+
+    best = None
+    n_windows = len(vals) // 3 - n_entries + 1
+    for k in range(n_windows):
+        entropy = log_n - sum_nlogn / n
+        rough = dsum / norm
+        score = entropy * (1.0 - rough)
+        if best is None or score > best[0]:
+            best = (score, k, unique, entropy, rough)
+        if k + 1 == n_windows:
+            break
+        # Slide one entry: drop 3 values at the front, add 3 at the back
+        for v in vals[k * 3:k * 3 + 3]:
+            c = hist[v]
+            sum_nlogn += _NLOGN[c - 1] - _NLOGN[c]
+            unique -= c == 1
+            hist[v] = c - 1
+        for v in vals[k * 3 + n:k * 3 + n + 3]:
+            c = hist[v]
+            sum_nlogn += _NLOGN[c + 1] - _NLOGN[c]
+            unique += c == 0
+            hist[v] = c + 1
+        dsum += deltas[k + n_entries - 1] - deltas[k]
+    return best
+
+
+def rank_palette_candidates(exe_data, scales=(16, 32, 64), top=20):
+    """
+    Multi-scale search for partial palettes in one pass over the EXE.
+
+    Layouts: 'rgb8' (3 bytes per entry) and 'rgb16' (3 little-endian words
+    per entry, as in the accent table at DS:0x1F62). For every run of
+    in-range values and every scale that fits, the best-scoring window is a
+    candidate; candidates are ranked by score (see _best_window).
+    Returns [(score, file_off, layout, entries, unique, entropy, roughness)].
+    """
+    cands = []
+    for layout, regex, step in (('rgb8', _RUN_RGB8, 1), ('rgb16', _RUN_RGB16, 2)):
+        for m in regex.finditer(exe_data):
+            run = m.group()
+            vals = run[::step]
+            vals = vals[:len(vals) - len(vals) % 3]
+            for n_entries in scales:
+                if len(vals) < n_entries * 3:
+                    continue
+                score, k, unique, entropy, rough = _best_window(vals, n_entries)
+                if unique < 4:
+                    continue   # zero fill / constant runs
+                cands.append((score, m.start() + k * 3 * step, layout,
+                              n_entries, unique, entropy, rough))
+    cands.sort(key=lambda c: -c[0])
+    return cands[:top]
+
+
+def print_ranked(exe_data, top=20):
+    print(f"Ranked partial-palette candidates ({'/'.join(map(str, (16, 32, 64)))} entries, "
+          f"top {top}; score = entropy x (1 - roughness)):")
+    cands = rank_palette_candidates(exe_data, top=top)
+    if not cands:
+        print("  No candidates found.")
+        return cands
+    print(f"  {'#':>3}  {'file':>7}  {'DS':>9}  {'layout':6}  {'n':>3}  {'uniq':>4}  "
+          f"{'entropy':>7}  {'rough':>5}  {'score':>5}  preview")
+    for i, (score, off, layout, n, unique, entropy, rough) in enumerate(cands):
+        ds_rel = file_to_ds(off)
+        ds_str = f'DS:0x{ds_rel:04X}' if ds_rel is not None else ''
+        step = 2 if layout == 'rgb16' else 1
+        preview = ''.join(color_swatch(exe_data[off + j * 3 * step],
+                                       exe_data[off + (j * 3 + 1) * step],
+                                       exe_data[off + (j * 3 + 2) * step])
+                          for j in range(0, n, max(1, n // 8)))
+        print(f"  {i + 1:>3}  0x{off:05X}  {ds_str:>9}  {layout:6}  {n:>3}  {unique:>4}  "
+              f"{entropy:7.3f}  {rough:5.3f}  {score:5.2f}  {preview}")
+    return cands
+
+
 def main():
     if len(sys.argv) < 2:
         print(__doc__)
@@ -99,6 +234,12 @@ def main():
         scan_palette_blocks(exe_data)
         return
 
+    if '--rank' in args:
+        ri = args.index('--rank')
+        top = int(args[ri + 1]) if ri + 1 < len(args) and args[ri + 1].isdigit() else 20
+        print_ranked(exe_data, top)
+        return
+
     if '--accent' in args:
         dump_accent_table(exe_data)
         return
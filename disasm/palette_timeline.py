@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Per-frame palettes from an emulator VGA log (written with --vga-log).
+
+Usage:
+  python3 disasm/palette_timeline.py LOG [options]
+
+By default, one line per frame that wrote the palette: frame number, step
+and the palette entries written (as index ranges).
+
+Options:
+  --range A-B   — only these palette entries (default 0-255)
+  --frame N     — the palette at the end of frame N, with swatches
+  --regs        — also list SEQ/CRTC/GC registers written in each frame
+  --all         — include frames without writes
+  --entries     — raw log entries (step, register, index, value)
+  --json OUT    — write [{frame, step, changed: {index: [r, g, b]}}] for the
+                  listed frames
+  --png OUT     — palette strip: one row per listed frame, 4 pixels per entry
+
+Frame -1 holds writes before the first frame boundary (mode and palette
+setup). Palettes are 6-bit VGA DAC values (0-63).
+
+Examples:
+  python3 -m emu earth/SCORCH.EXE --max-steps 50000000 --vga-log /tmp/menu.vga
+  python3 disasm/palette_timeline.py /tmp/menu.vga
+  python3 disasm/palette_timeline.py /tmp/menu.vga --range 170-199 --png /tmp/fire.png
+  python3 disasm/palette_timeline.py /tmp/menu.vga --frame 120 --range 80-104
+
+Library:
+  import palette_timeline
+  palette_timeline.load('/tmp/menu.vga')       # -> VgaLog, see emu/vgalog.py
+  palette_timeline.index_ranges([1, 2, 3, 7])  # -> '1-3,7'
+"""
+import sys, os, json, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from palette_dump import color_swatch
+from disasm.emu.vgalog import VgaLog, NAMES, FRAME
+from disasm.emu.png import write_png, vga_palette
+
+
+def load(path):
+    return VgaLog.load(path)
+
+
+def parse_range(text):
+    a, _, b = text.partition('-')
+    lo = int(a, 0)
+    return lo, int(b, 0) if b else lo
+
+
+def index_ranges(indices):
+    """'a-b,c' for a set of palette indices."""
+    out = []
+    for i in sorted(indices):
+        if out and out[-1][1] == i - 1:
+            out[-1][1] = i
+        else:
+            out.append([i, i])
+    return ','.join(f'{a}-{b}' if a != b else f'{a}' for a, b in out)
+
+
+def selected(log, lo, hi, all_frames):
+    """LogFrames with palette writes inside [lo, hi] (all frames with all_frames)."""
+    for f in log.frames(all_frames):
+        changed = {i for i in f.changed if lo <= i <= hi}
+        if changed or all_frames:
+            f.changed = changed
+            yield f
+
+
+def show_frames(frames, regs):
+    for f in frames:
+        line = f'frame {f.index:6d}  step {f.step:12d}  {len(f.changed):3d} entries'
+        if f.changed:
+            line += f'  {index_ranges(f.changed)}'
+        print(line)
+        if regs and f.regs:
+            print(f'{"":8s}' + ' '.join(f'{NAMES[r]}[{i:02X}]' for r, i in sorted(f.regs)))
+
+
+def show_palette(f, lo, hi):
+    print(f'frame {f.index}, step {f.step}:')
+    print(f'  {"idx":>4}  {"R":>3} {"G":>3} {"B":>3}  swatch')
+    for i in range(lo, hi + 1):
+        r, g, b = f.palette[i]
+        mark = '*' if i in f.changed else ' '
+        print(f'  {i:>4}{mark} {r:>3} {g:>3} {b:>3}  {color_swatch(r, g, b)}')
+
+
+def write_strip(path, frames, lo, hi):
+    """One row per frame, 4 pixels per entry. A PNG palette holds 256
+    colours; past that, new colours share the last slot."""
+    n = hi - lo + 1
+    colours, pixels = {}, bytearray()
+    for f in frames:
+        row = bytearray()
+        for i in range(lo, hi + 1):
+            rgb = f.palette[i]
+            c = colours.get(rgb)
+            if c is None:
+                c = colours[rgb] = min(len(colours), 255)
+            row.append(c)
+        pixels += bytes(b for b in row for _ in range(4))
+    dac = [(0, 0, 0)] * 256
+    for rgb, c in colours.items():
+        dac[c] = rgb
+    write_png(path, 4 * n, len(frames), pixels, vga_palette(dac))
+    if len(colours) > 256:
+        print(f'(more than 256 distinct colours: {path} is approximate)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-frame palettes from a VGA log')
+    parser.add_argument('log', help='VGA log written by --vga-log')
+    parser.add_argument('--range', default='0-255', metavar='A-B', help='Palette entries')
+    parser.add_argument('--frame', type=int, metavar='N', help='Palette at the end of frame N')
+    parser.add_argument('--regs', action='store_true', help='List register writes')
+    parser.add_argument('--all', action='store_true', help='Include frames without writes')
+    parser.add_argument('--entries', action='store_true', help='Raw log entries')
+    parser.add_argument('--json', metavar='OUT', help='Write changed entries per frame as JSON')
+    parser.add_argument('--png', metavar='OUT', help='Write a palette strip PNG')
+    args = parser.parse_args()
+
+    log = load(args.log)
+    lo, hi = parse_range(args.range)
+    if args.entries:
+        for step, reg, idx, val in log.entries():
+            print(f'{step:12d}  {NAMES[reg]:5s}  {idx:3d}  {val:3d}')
+        return
+    if args.frame is not None:
+        for f in log.frames(all_frames=True):
+            if f.index == args.frame:
+                show_palette(f, lo, hi)
+                return
+        sys.exit(f'{args.log}: no frame {args.frame}')
+
+    frames = list(selected(log, lo, hi, args.all))
+    n_frames = log.regs.count(FRAME)
+    print(f'{args.log}: {len(log)} entries, {n_frames} frames, '
+          f'{len(frames)} with palette writes in {lo}-{hi}')
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump([{'frame': f.index, 'step': f.step,
+                        'changed': {str(i): list(f.palette[i]) for i in sorted(f.changed)}}
+                       for f in frames], out)
+        print(f'-> {args.json}')
+    if args.png:
+        write_strip(args.png, frames, lo, hi)
+        print(f'-> {args.png} ({hi - lo + 1} entries x {len(frames)} frames)')
+    if not (args.json or args.png):
+        show_frames(frames, args.regs)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,17 @@
 search_bytes.py — Byte-pattern search across Scorched Earth v1.50 EXE.
 
 Usage:
-    python3 disasm/search_bytes.py <hex_pattern> [--context N] [--disasm [lines]]
+    python3 disasm/search_bytes.py <hex_pattern> [<hex_pattern> ...] [--context N] [--disasm [lines]]
 
     hex_pattern  — hex bytes to find, e.g. "8B 46 FC" or "8B46FC"
-                   Use ?? as wildcard for any single byte: "CD ?? 8B 46"
+                   ??         any single byte: "CD ?? 8B 46"
+                   [A0-AF]    byte in a range; several ranges/bytes: "[50-57 5E]"
+                   (8B|89 46) one of several byte sequences
+                   SEG        a word patched by an MZ relocation (far call/ptr segment)
+                   Several patterns are searched together in one pass over the EXE;
+                   matches are listed in file order, tagged with the pattern number.
     --context N  — show N raw bytes before/after each match (default 4)
-    --disasm     — invoke dis.py at each match location
+    --disasm     — disassemble at each match location (same output as dis.py)
     lines        — number of instructions to disassemble (default 8, only with --disasm)
 
 Examples:
@@ -17,47 +22,248 @@ Examples:
     python3 disasm/search_bytes.py "FF 1E" --disasm 12
     python3 disasm/search_bytes.py "CD ?? 8B 46 FC" --disasm
     python3 disasm/search_bytes.py "9A ?? ?? ?? ?? 83 C4"
+    python3 disasm/search_bytes.py "9A ?? ?? 4A 1A" "0E E8" --disasm 4
+    python3 disasm/search_bytes.py "9A ?? ?? SEG 83 C4 [02-08]"
+    python3 disasm/search_bytes.py "(8B|89) 46 [F0-FE]"
 """
 
 import sys
 import os
-import subprocess
 import struct
+import re
+
+import daemon
+if __name__ == '__main__':
+    daemon.forward('search_bytes', sys.argv[1:])   # runs in the resident daemon if one is up
+
+import addr
+from addr import file_to_ds
 
 SCRIPT_DIR   = os.path.dirname(os.path.abspath(__file__))
 ROOT         = os.path.dirname(SCRIPT_DIR)
 EXE_PATH     = os.path.join(ROOT, 'earth', 'SCORCH.EXE')
 
-MZ_HEADER    = 0x6A00
-DS_FILE_BASE = 0x055D80
+def file_to_segoff(file_off):
+    """Return (seg, off, module_name); module is 'data' before the load image."""
+    seg, off = addr.file_to_segoff(file_off)
+    name = addr.module_name(file_off, '?' if file_off >= addr.MZ_HEADER else 'data')
+    return seg, off, name
 
-MODULES = [
-    (0x20EA0, 0x263F0, 0x1A4A, 'extras.cpp'),
-    (0x263F0, 0x2F830, 0x1F7F, 'icons.cpp'),
-    (0x2F830, 0x31FB0, 0x28B9, 'play.cpp'),
-    (0x31FB0, 0x33690, 0x2B3B, 'player.cpp'),
-    (0x33690, 0x38070, 0x2CBF, 'ranges.cpp'),
-    (0x38070, 0x38780, 0x3167, 'shark.cpp'),
-    (0x38780, 0x3B8D0, 0x31D8, 'shields.cpp'),
-    (0x3B8D0, 0x4C290, 0x34ED, 'menu+dialogs'),
-    (0x4C290, 0x4D000, 0x4589, 'font module'),
-]
 
+# ---------------------------------------------------------------------------
+# Pattern engine
+#
+# A pattern is parsed into nodes and compiled to a bytes regex:
+#   ('byte', v)          one literal byte
+#   ('any',)             ?? / ** — any single byte
+#   ('set', [(lo, hi)])  [A0-AF] / [50-57 5E] — byte in one of the ranges
+#   ('alt', [nodes...])  (8B | 89 46) — one of several byte sequences
+#   ('seg',)             SEG — a word patched by an MZ relocation (segment value)
+# ---------------------------------------------------------------------------
+
+HEX_DIGITS = set('0123456789abcdefABCDEF')
+
+
+class BytePattern:
+    """A compiled search pattern: source text, parse tree and regex."""
+
+    def __init__(self, text, nodes):
+        self.text = text
+        self.nodes = nodes
+        self.has_seg = _has_seg(nodes)
+        if all(n[0] == 'byte' for n in nodes):
+            self.literal = bytes(n[1] for n in nodes)
+        else:
+            self.literal = None
+        self._seg_count = 0
+        self.regex = re.compile(self._to_regex(nodes, named=True).encode('latin-1'),
+                                re.DOTALL)
+
+    def __len__(self):
+        """Minimum match length in bytes."""
+        return _min_len(self.nodes)
+
+    def _to_regex(self, nodes, named):
+        parts = []
+        for n in nodes:
+            kind = n[0]
+            if kind == 'byte':
+                parts.append(re.escape(bytes([n[1]])).decode('latin-1'))
+            elif kind == 'any':
+                parts.append('.')
+            elif kind == 'set':
+                parts.append('[' + ''.join(
+                    f'\\x{lo:02x}' if lo == hi else f'\\x{lo:02x}-\\x{hi:02x}'
+                    for lo, hi in n[1]) + ']')
+            elif kind == 'alt':
+                parts.append('(?:' + '|'.join(self._to_regex(alt, named)
+                                              for alt in n[1]) + ')')
+            elif kind == 'seg':
+                if named:
+                    parts.append(f'(?P<seg{self._seg_count}>..)')
+                    self._seg_count += 1
+                else:
+                    parts.append('..')
+        return ''.join(parts)
+
+    def unnamed_source(self):
+        """Regex source without SEG capture groups (for combining patterns)."""
+        return self._to_regex(self.nodes, named=False)
+
+    def display(self):
+        return _display(self.nodes)
+
+    def match(self, exe, pos, relocs=None):
+        """Return match length at pos, or None. SEG words must sit on a relocation."""
+        m = self.regex.match(exe, pos)
+        if m is None:
+            return None
+        if self.has_seg:
+            for k in range(self._seg_count):
+                start = m.start(f'seg{k}')
+                if start != -1 and start not in relocs:
+                    return None
+        return m.end() - pos
+
+
+def _has_seg(nodes):
+    for n in nodes:
+        if n[0] == 'seg' or (n[0] == 'alt' and any(_has_seg(a) for a in n[1])):
+            return True
+    return False
+
+
+def _min_len(nodes):
+    total = 0
+    for n in nodes:
+        if n[0] == 'seg':
+            total += 2
+        elif n[0] == 'alt':
+            total += min(_min_len(a) for a in n[1])
+        else:
+            total += 1
+    return total
+
+
+def _display(nodes):
+    parts = []
+    for n in nodes:
+        kind = n[0]
+        if kind == 'byte':
+            parts.append(f'{n[1]:02X}')
+        elif kind == 'any':
+            parts.append('??')
+        elif kind == 'set':
+            parts.append('[' + ' '.join(f'{lo:02X}' if lo == hi else f'{lo:02X}-{hi:02X}'
+                                        for lo, hi in n[1]) + ']')
+        elif kind == 'alt':
+            parts.append('(' + ' | '.join(_display(a) for a in n[1]) + ')')
+        elif kind == 'seg':
+            parts.append('SEG')
+    return ' '.join(parts)
 
-def file_to_segoff(file_off):
-    for start, end, seg, name in MODULES:
-        if start <= file_off < end:
-            off = (file_off - MZ_HEADER) - (seg * 16)
-            return seg, off, name
-    code_off = file_off - MZ_HEADER
-    if code_off >= 0:
-        return code_off >> 4, code_off & 0xF, '?'
-    return 0, file_off, 'data'
 
+def parse_pattern(text):
+    """
+    Parse and compile a pattern string into a BytePattern.
+    Raises ValueError with a user-facing message on malformed input.
+    """
+    pos = 0
 
-def file_to_ds(file_off):
-    v = file_off - DS_FILE_BASE
-    return v if 0 <= v < 0x10000 else None
+    def skip_ws():
+        nonlocal pos
+        while pos < len(text) and text[pos] in ' \t,':
+            pos += 1
+
+    def hex_byte():
+        nonlocal pos
+        tok = text[pos:pos+2]
+        if len(tok) < 2 or tok[0] not in HEX_DIGITS or tok[1] not in HEX_DIGITS:
+            raise ValueError(f"Invalid hex byte: {tok!r} in {text!r}")
+        pos += 2
+        return int(tok, 16)
+
+    def seq(stop):
+        nonlocal pos
+        nodes = []
+        while True:
+            skip_ws()
+            if pos >= len(text) or text[pos] in stop:
+                return nodes
+            c = text[pos]
+            if text[pos:pos+2] in ('??', '**'):
+                nodes.append(('any',)); pos += 2
+            elif text[pos:pos+3].upper() == 'SEG':
+                nodes.append(('seg',)); pos += 3
+            elif c == '[':
+                pos += 1
+                ranges = []
+                while True:
+                    skip_ws()
+                    if pos >= len(text):
+                        raise ValueError(f"Unclosed '[' in {text!r}")
+                    if text[pos] == ']':
+                        pos += 1
+                        break
+                    lo = hi = hex_byte()
+                    if text[pos:pos+1] == '-':
+                        pos += 1
+                        hi = hex_byte()
+                    if lo > hi:
+                        raise ValueError(f"Empty byte range {lo:02X}-{hi:02X} in {text!r}")
+                    ranges.append((lo, hi))
+                if not ranges:
+                    raise ValueError(f"Empty byte set '[]' in {text!r}")
+                nodes.append(('set', ranges))
+            elif c == '(':
+                pos += 1
+                alts = [seq('|)')]
+                while pos < len(text) and text[pos] == '|':
+                    pos += 1
+                    alts.append(seq('|)'))
+                if pos >= len(text) or text[pos] != ')':
+                    raise ValueError(f"Unclosed '(' in {text!r}")
+                pos += 1
+                if any(not a for a in alts):
+                    raise ValueError(f"Empty alternative in {text!r}")
+                nodes.append(('alt', alts))
+            else:
+                nodes.append(('byte', hex_byte()))
+
+    nodes = seq('')
+    if not nodes:
+        raise ValueError(f"Empty hex pattern: {text!r}")
+    return BytePattern(text, nodes)
+
+
+def find_matches(exe, patterns, relocs=None):
+    """
+    Find every pattern in exe. Returns a sorted list of (file_off, pattern_index, length).
+
+    A single literal pattern uses bytes.find. Otherwise all patterns are OR-ed
+    into one lookahead regex, so the EXE is scanned once in C; each candidate
+    position is then verified against the individual patterns (which also
+    checks SEG placeholders against relocs, the set from xref.parse_mz_relocs).
+    """
+    if len(patterns) == 1 and patterns[0].literal is not None:
+        lit = patterns[0].literal
+        matches = []
+        pos = exe.find(lit)
+        while pos != -1:
+            matches.append((pos, 0, len(lit)))
+            pos = exe.find(lit, pos + 1)
+        return matches
+
+    union = re.compile(b'(?=' + '|'.join(p.unnamed_source() for p in patterns)
+                       .encode('latin-1') + b')', re.DOTALL)
+    matches = []
+    for m in union.finditer(exe):
+        pos = m.start()
+        for idx, p in enumerate(patterns):
+            length = p.match(exe, pos, relocs)
+            if length is not None:
+                matches.append((pos, idx, length))
+    return matches
 
 
 def main():
@@ -66,30 +272,11 @@ def main():
         print(__doc__)
         sys.exit(0)
 
-    # Parse pattern with ?? wildcard support
-    tokens = args[0].replace(' ', '')
-    # Split into 2-char tokens
-    if len(tokens) % 2 != 0:
-        print(f"Invalid hex pattern (odd length): {args[0]!r}")
-        sys.exit(1)
-    pattern = []  # list of (byte_val, is_wild)
-    for j in range(0, len(tokens), 2):
-        tok = tokens[j:j+2]
-        if tok == '??' or tok == '**':
-            pattern.append((0, True))
-        else:
-            try:
-                pattern.append((int(tok, 16), False))
-            except ValueError:
-                print(f"Invalid hex byte: {tok!r} in {args[0]!r}")
-                sys.exit(1)
-    has_wildcards = any(w for _, w in pattern)
-    pat_len = len(pattern)
-
+    pattern_args = []
     context   = 4
     do_disasm = False
     disasm_n  = 8
-    i = 1
+    i = 0
     while i < len(args):
         if args[i] == '--context' and i + 1 < len(args):
             context = int(args[i + 1]); i += 2
@@ -99,44 +286,51 @@ def main():
                 disasm_n = int(args[i + 1]); i += 2
             else:
                 i += 1
-        else:
+        elif args[i].startswith('--'):
             i += 1
+        else:
+            pattern_args.append(args[i]); i += 1
 
-    with open(EXE_PATH, 'rb') as f:
-        exe = f.read()
+    if not pattern_args:
+        print("No hex pattern given")
+        sys.exit(1)
+    patterns = []
+    for text in pattern_args:
+        try:
+            patterns.append(parse_pattern(text))
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
 
-    matches = []
-    if has_wildcards:
-        # Wildcard search: scan byte by byte
-        for pos in range(len(exe) - pat_len + 1):
-            match = True
-            for k, (bval, wild) in enumerate(pattern):
-                if not wild and exe[pos + k] != bval:
-                    match = False
-                    break
-            if match:
-                matches.append(pos)
-    else:
-        # Fast path: no wildcards, use bytes.find
-        pat_bytes = bytes(b for b, _ in pattern)
-        pos = 0
-        while True:
-            idx = exe.find(pat_bytes, pos)
-            if idx == -1:
-                break
-            matches.append(idx)
-            pos = idx + 1
-
-    pat_display = ' '.join('??' if w else f'{b:02X}' for b, w in pattern)
-    print(f"Pattern: {pat_display}  ({pat_len} bytes)")
+    exe = daemon.read_exe(EXE_PATH)
+
+    relocs = None
+    if any(p.has_seg for p in patterns):
+        from xref import parse_mz_relocs
+        relocs = parse_mz_relocs(exe)
+
+    matches = find_matches(exe, patterns, relocs)
+
+    multi = len(patterns) > 1
+    for idx, pattern in enumerate(patterns):
+        tag = f"Pattern {idx + 1}" if multi else "Pattern"
+        print(f"{tag}: {pattern.display()}  ({len(pattern)} bytes)")
     print(f"Found {len(matches)} match(es)")
     print()
 
-    for off in matches:
+    knowledge = None
+    if do_disasm and matches:
+        # Import lazily: dis.py loads the decoder and the labels/comments CSVs,
+        # which are only needed (once) when disassembling matches.
+        import dis
+        knowledge = dis.load_knowledge()
+
+    for off, idx, pat_len in matches:
         seg, segoff, module = file_to_segoff(off)
         ds_rel = file_to_ds(off)
         ds_str = f'  DS:0x{ds_rel:04X}' if ds_rel is not None else ''
-        print(f"  0x{off:05X}  {seg:04X}:{segoff:04X}{ds_str}  ({module})")
+        tag = f"[{idx + 1}] " if multi else ''
+        print(f"  {tag}0x{off:05X}  {seg:04X}:{segoff:04X}{ds_str}  ({module})")
 
         # Context bytes with match highlighted in [brackets]
         start = max(0, off - context)
@@ -152,12 +346,7 @@ def main():
         print(f"    {''.join(hex_parts)}")
 
         if do_disasm:
-            result = subprocess.run(
-                [sys.executable, os.path.join(SCRIPT_DIR, 'dis.py'),
-                 f'0x{off:05X}', str(disasm_n)],
-                capture_output=True, text=True
-            )
-            for line in result.stdout.splitlines():
+            for line in dis.listing(exe, off, disasm_n, knowledge):
                 print('    ' + line)
 
         print()
@@ -20,6 +20,7 @@ Usage:
     python3 seg_offset.py SEG:OFF            # → file offset
     python3 seg_offset.py DS:OFF             # → file offset (DS segment)
     python3 seg_offset.py 0xFILEOFF          # → DS:OFF or nearest seg:off
+    python3 seg_offset.py PHYS:0xADDR        # emulator physical address → as file offset
     python3 seg_offset.py SEG:OFF DS:OFF ... # multiple in one call
 
 Examples:
@@ -32,24 +33,10 @@ Examples:
 import sys
 import re
 
-HEADER    = 0x6A00
-DS_SEG    = 0x4F38           # DS paragraph (matches file base 0x055D80 when: DS_SEG*16 + ... hmm)
-# Actual mapping verified: ds_off + 0x055D80 = file offset
-# => DS file base = 0x055D80, DS_SEG * 16 = 0x4F380
-# => file_base_of_DS = 0x055D80 means: header_end - exe_load_offset + DS_SEG*16
-# => load_seg = (0x6A00/16) = 0x6A0? No...
-# From ds_lookup.py: file = ds_off + (DS_SEG * 16) - ???
-# Actually: file = ds_off + 0x055D80 directly (the project uses this constant)
-DS_FILE_BASE = 0x055D80      # file offset of DS:0x0000
+from addr import (MZ_HEADER as HEADER, DS_SEG, DS_FILE_BASE, LOAD_SEG,
+                  ds_to_file, file_to_ds, phys_to_file, module_at, file_to_segoff)
+from addr import segoff_to_file as seg_off_to_file
 
-# Code segment file base formula (from project notes):
-# file_off = (seg - LOAD_SEG) * 16 + HEADER
-# We need LOAD_SEG. From: DS_FILE_BASE = (DS_SEG - LOAD_SEG)*16 + HEADER
-# => LOAD_SEG = DS_SEG - (DS_FILE_BASE - HEADER) / 16
-LOAD_SEG = DS_SEG - (DS_FILE_BASE - HEADER) // 16
-
-def seg_off_to_file(seg, off):
-    return (seg - LOAD_SEG) * 16 + off + HEADER
 
 def file_to_seg_off(file_off, seg=None):
     """Convert file offset to seg:off. Uses DS by default, or supplied seg."""
@@ -58,22 +45,15 @@ def file_to_seg_off(file_off, seg=None):
     off = file_off - (seg - LOAD_SEG) * 16 - HEADER
     return seg, off
 
-def ds_to_file(ds_off):
-    return ds_off + DS_FILE_BASE
-
-def file_to_ds(file_off):
-    ds_off = file_off - DS_FILE_BASE
-    if 0 <= ds_off <= 0xFFFF:
-        return ds_off
-    return None
-
 def parse_addr(token):
-    """Parse 'SEG:OFF', 'DS:OFF', '0xFILE', or plain hex. Returns (kind, value)."""
+    """Parse 'SEG:OFF', 'DS:OFF', 'PHYS:ADDR', '0xFILE', or plain hex. Returns (kind, value)."""
     token = token.strip()
     lo = token.lower()
     if lo.startswith('ds:'):
         off = int(token[3:], 16)
         return ('ds', off)
+    if lo.startswith('phys:'):
+        return ('file', phys_to_file(int(token[5:], 16)))
     m = re.match(r'^([0-9A-Fa-f]{1,5}):([0-9A-Fa-f]{1,5})$', token)
     if m:
         seg = int(m.group(1), 16)
@@ -110,6 +90,9 @@ def main():
             _, off_in_ds = file_to_seg_off(file_off, DS_SEG)
             if ds_off is not None:
                 print(f"file 0x{file_off:05X}  →  DS:0x{ds_off:04X}  ({DS_SEG:04X}:{ds_off:04X})")
+            elif module_at(file_off):
+                seg, off = file_to_segoff(file_off)
+                print(f"file 0x{file_off:05X}  →  {seg:04X}:{off:04X}  ({module_at(file_off)[3]})")
             else:
                 # Show as nearest code seg:off using DS_SEG as base
                 seg_approx = (file_off - HEADER) // 16 + LOAD_SEG
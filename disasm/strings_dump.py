@@ -6,6 +6,11 @@ Scans the DS region for printable ASCII/CP437 strings and reports their
 DS offset, file offset, and content. Useful for finding UI labels, format
 strings, error messages, and debug strings.
 
+The scan results and the code/data sites that reference each string are
+kept in a string index, built once per EXE and kept in the artifact store
+(artifacts.py, keyed by the EXE's SHA-256). -g searches the index instead of
+rescanning the file.
+
 Usage:
     python3 strings_dump.py <exe_path> [options]
 
@@ -14,9 +19,14 @@ Usage:
         -g PATTERN  — grep: only show strings matching pattern (case-insensitive)
         -r START END — restrict scan to DS:START..DS:END (hex)
         --all       — scan entire file, not just DS segment
+        -x          — list the sites referencing each string ("who prints this?"):
+                      instructions whose DS operand (decode's ds_ref) or imm16
+                      (mov reg/push/mov [mem]) is the string's DS offset, and
+                      DS far pointers (off, 4F38) to it
 
 Examples:
     python3 strings_dump.py earth/SCORCH.EXE -g "wind"
+    python3 strings_dump.py earth/SCORCH.EXE -g "wind" -x
     python3 strings_dump.py earth/SCORCH.EXE -g "~" -m 2
     python3 strings_dump.py earth/SCORCH.EXE -r 0x2000 0x3000
     python3 strings_dump.py earth/SCORCH.EXE -g "%s" -m 2
@@ -24,14 +34,158 @@ Examples:
 
 import sys
 import re
+import bisect
+import struct
+
+import daemon
+if __name__ == '__main__':
+    daemon.forward('strings_dump', sys.argv[1:])   # runs in the resident daemon if one is up
+
+import addr
+import artifacts
+from addr import MZ_HEADER, DS_FILE_BASE, DS_SEG, ds_to_file, file_to_ds
 
-DS_FILE_BASE = 0x055D80
 DS_SIZE = 0x10000  # 64KB segment
 
+INDEX_VERSION = 1     # bump when the index layout or the scan rules change
+
+# A printable run (0x20-0x7E) that is NUL-terminated or ends the buffer.
+STRING_RE = re.compile(rb'(?<![\x20-\x7E])[\x20-\x7E]+(?=\x00|\Z)')
+
+_PREFIXES = frozenset((0x26, 0x2E, 0x36, 0x3E, 0xF0, 0xF2, 0xF3))
+
+
+def scan_strings(data, base_offset):
+    """Return [(file_offset, text)] for every string run in data (any length)."""
+    return [(base_offset + m.start(), m.group().decode('cp437'))
+            for m in STRING_RE.finditer(data)]
+
+
+# ---------------------------------------------------------------------------
+# String index
+# ---------------------------------------------------------------------------
+
+class StringIndex:
+    """
+    Strings of one scan scope in file order, with a lowercased search blob
+    for substring queries and the reference sites of each string.
+    """
+
+    def __init__(self, strings, refs):
+        self.offsets = [off for off, _ in strings]
+        self.texts = [text for _, text in strings]
+        self.refs = refs                          # file_offset -> [(site, kind)]
+        # Texts joined by NUL (never part of a string): a match can't span two.
+        self._starts = []
+        pos = 0
+        for text in self.texts:
+            self._starts.append(pos)
+            pos += len(text) + 1
+        self._blob = '\0'.join(self.texts).lower()
+
+    def grep(self, pattern):
+        """Indices of strings containing pattern (case-insensitive), in file order."""
+        pattern = pattern.lower()
+        if not pattern:
+            return range(len(self.texts))
+        hits = []
+        last = -1
+        blob, starts = self._blob, self._starts
+        i = blob.find(pattern)
+        while i != -1:
+            n = bisect.bisect_right(starts, i) - 1
+            if n != last:
+                hits.append(n)
+                last = n
+            # Continue after the end of this string
+            i = blob.find(pattern, starts[n] + len(self.texts[n]) + 1)
+        return hits
+
+
+def find_string_refs(data, targets):
+    """
+    Map each file offset in targets (DS string starts) to the sites that
+    reference it: [(site_file_offset, kind)] with kind
+      'mem'    instruction whose direct DS operand is the string (decode ds_ref)
+      'imm'    mov reg, imm16 / push imm16 / mov [mem], imm16 of its DS offset
+      'farptr' DS far pointer off:4F38 to the string
+    """
+    from instruction_set_x86 import decode
+    refs = {}
+    code_end = min(len(data), DS_FILE_BASE)
+    pos = MZ_HEADER
+    while pos < code_end:
+        length, _mn, _ops, _fpu, ds_ref = decode(data, pos, None)
+        if ds_ref is not None and ds_to_file(ds_ref) in targets:
+            refs.setdefault(ds_to_file(ds_ref), []).append((pos, 'mem'))
+        q = pos
+        while q < code_end and data[q] in _PREFIXES:
+            q += 1
+        op = data[q] if q < code_end else 0
+        imm = None
+        if (0xB8 <= op <= 0xBF or op == 0x68) and q + 3 <= len(data):
+            imm = struct.unpack_from('<H', data, q + 1)[0]
+        elif op == 0xC7 and length >= 4:
+            imm = struct.unpack_from('<H', data, pos + length - 2)[0]
+        if imm is not None and ds_to_file(imm) in targets:
+            refs.setdefault(ds_to_file(imm), []).append((pos, 'imm'))
+        pos += length
+
+    ds_end = min(len(data), DS_FILE_BASE + DS_SIZE)
+    seg = struct.pack('<H', DS_SEG)
+    i = data.find(seg, DS_FILE_BASE + 2, ds_end)
+    while i != -1:
+        tgt = ds_to_file(struct.unpack_from('<H', data, i - 2)[0])
+        if tgt in targets:
+            refs.setdefault(tgt, []).append((i - 2, 'farptr'))
+        i = data.find(seg, i + 1, ds_end)
+    return refs
 
-def is_printable_cp437(b):
-    """Check if byte is printable in CP437 (ASCII 0x20-0x7E + extended 0x80-0xFE)."""
-    return 0x20 <= b <= 0x7E
+
+def build_index(data):
+    """Return (ds_strings, all_strings, refs): the picklable parts of the index."""
+    ds_strings = scan_strings(data[DS_FILE_BASE:DS_FILE_BASE + DS_SIZE], DS_FILE_BASE)
+    all_strings = scan_strings(data, 0)
+    targets = {off for off, _ in ds_strings}
+    refs = find_string_refs(data, targets)
+    return ds_strings, all_strings, refs
+
+
+_index = (None, None)   # (data, {scope: StringIndex}); kept resident by the daemon
+
+
+def load_index(data):
+    """
+    String indexes for the EXE bytes: in-process memo, else the 'strings'
+    artifact (built and stored on first use).
+    """
+    global _index
+    if _index[0] is data:
+        return _index[1]
+    ds_strings, all_strings, refs = artifacts.load_pickle(data, 'strings', INDEX_VERSION, build_index)
+    indexes = {'ds': StringIndex(ds_strings, refs), 'all': StringIndex(all_strings, refs)}
+    _index = (data, indexes)
+    return indexes
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def print_refs(data, sites):
+    import kb
+    from instruction_set_x86 import decode
+    k = kb.load()
+    for site, kind in sites:
+        if kind == 'farptr':
+            ds = file_to_ds(site)
+            owner = k.labels.get(site, '')
+            print(f"        <- DS:0x{ds:04X}  file 0x{site:05X}  far ptr {owner}".rstrip())
+            continue
+        _len, mn, ops, _fpu, _ds = decode(data, site, None)
+        sym = k.symbolize(site)
+        where = f"  in {sym}" if sym else f"  [{addr.module_name(site)}]"
+        print(f"        <- 0x{site:05X}  {addr.segoff_str(site)}  {mn} {ops}{where}")
 
 
 def main():
@@ -47,6 +201,7 @@ def main():
     range_start = 0
     range_end = DS_SIZE
     scan_all = False
+    show_refs = False
 
     i = 0
     while i < len(args):
@@ -63,56 +218,42 @@ def main():
         elif args[i] == '--all':
             scan_all = True
             i += 1
+        elif args[i] == '-x':
+            show_refs = True
+            i += 1
         else:
             print(f"Unknown option: {args[i]}")
             sys.exit(1)
 
-    with open(exe_path, 'rb') as f:
-        if scan_all:
-            data = f.read()
-            base_offset = 0
-        else:
-            f.seek(DS_FILE_BASE + range_start)
-            length = range_end - range_start
-            data = f.read(length)
-            base_offset = DS_FILE_BASE + range_start
-
-    # Scan for strings
-    current = []
-    start_pos = 0
-    count = 0
+    data = daemon.read_exe(exe_path)
 
-    for pos in range(len(data)):
-        b = data[pos]
-        if is_printable_cp437(b):
-            if not current:
-                start_pos = pos
-            current.append(b)
-        else:
-            if len(current) >= min_len and b == 0:  # null-terminated
-                text = bytes(current).decode('cp437', errors='replace')
-                file_off = base_offset + start_pos
-                ds_off = file_off - DS_FILE_BASE
-
-                if grep_pat is None or grep_pat in text.lower():
-                    if 0 <= ds_off < DS_SIZE and not scan_all:
-                        print(f"DS:0x{ds_off:04X}  file 0x{file_off:05X}  [{len(current):3d}]  \"{text}\"")
-                    else:
-                        print(f"file 0x{file_off:05X}  [{len(current):3d}]  \"{text}\"")
-                    count += 1
-            current = []
-
-    # Handle string at end of buffer
-    if len(current) >= min_len:
-        text = bytes(current).decode('cp437', errors='replace')
-        file_off = base_offset + start_pos
+    indexes = load_index(data)
+    if scan_all:
+        idx = indexes['all']
+    elif (range_start, range_end) == (0, DS_SIZE):
+        idx = indexes['ds']
+    else:
+        # Sub-range: runs may be cut at its edges, so scan it directly.
+        base_offset = DS_FILE_BASE + range_start
+        sub = data[base_offset:base_offset + max(0, range_end - range_start)]
+        idx = StringIndex(scan_strings(sub, base_offset), indexes['ds'].refs)
+
+    hits = idx.grep(grep_pat) if grep_pat is not None else range(len(idx.texts))
+
+    count = 0
+    for n in hits:
+        text = idx.texts[n]
+        if len(text) < min_len:
+            continue
+        file_off = idx.offsets[n]
         ds_off = file_off - DS_FILE_BASE
-        if grep_pat is None or grep_pat in text.lower():
-            if 0 <= ds_off < DS_SIZE and not scan_all:
-                print(f"DS:0x{ds_off:04X}  file 0x{file_off:05X}  [{len(current):3d}]  \"{text}\"")
-            else:
-                print(f"file 0x{file_off:05X}  [{len(current):3d}]  \"{text}\"")
-            count += 1
+        if 0 <= ds_off < DS_SIZE and not scan_all:
+            print(f"DS:0x{ds_off:04X}  file 0x{file_off:05X}  [{len(text):3d}]  \"{text}\"")
+        else:
+            print(f"file 0x{file_off:05X}  [{len(text):3d}]  \"{text}\"")
+        if show_refs:
+            print_refs(data, idx.refs.get(file_off, ()))
+        count += 1
 
     print(f"\n--- {count} strings found ---")
 
@@ -18,163 +18,196 @@ Usage:
     Options:
         -n N        — number of entries to dump (default: all or 10)
         -r          — dump raw hex of each entry
-        -f FIELD    — show only specific field(s), comma-separated
+        -f FIELD    — with --csv/--json: only these column(s), comma-separated
+        --csv       — CSV, one row per entry
+        --json      — columnar JSON (one array per field)
+        --js        — weapon/mode only: ES module fragment in the web port's
+                      format (WEAPONS / GRAPHICS_MODES) for diffing against web/js
+
+    Each table is decoded in one pass by tables.py (one struct.Struct per
+    row layout); far-pointer names are resolved once per distinct pointer.
 
 Examples:
     python3 struct_dump.py earth/SCORCH.EXE weapon 5        # weapon index 5
     python3 struct_dump.py earth/SCORCH.EXE weapon -n 60    # first 60 weapons
     python3 struct_dump.py earth/SCORCH.EXE glyph 65        # glyph for 'A'
     python3 struct_dump.py earth/SCORCH.EXE mode -n 9       # all 9 graphics modes
+    python3 struct_dump.py earth/SCORCH.EXE weapon --csv -f name,price,bundle
+    python3 struct_dump.py earth/SCORCH.EXE weapon -n 57 --js > /tmp/weapons_exe.js
 """
 
 import sys
-import struct as st
-
-DS_FILE_BASE = 0x055D80
-MZ_HEADER = 0x6A00
+import json
 
+import tables
+from addr import DS_SEG, ds_to_file
 
-def ds_to_file(ds_off):
-    return DS_FILE_BASE + ds_off
+WEAPON_BASE = 0x11F6
+WEAPON_LAYOUT = tables.compile_layout(
+    'struct:52:name_ptr=farptr,price=u16,bundle=u16,arms=u16,'
+    'radius=s16,damage=s16,category=u16@20')
+# Field names of web/js/weapons.js: +0A:+0C is the behaviour far pointer
+# (BhvType, handler segment), +0E the blast radius / parameter.
+WEAPON_JS_LAYOUT = tables.compile_layout(
+    'struct:52:name_ptr=farptr,price=u16,bundle=u16,arms=u16,'
+    'bhv=u16,handler=u16,param=s16')
 
+MODE_BASE = 0x6234
+MODE_LAYOUT = tables.compile_layout(
+    'struct:16:width=u16,height=u16,mode_id=u16,aspect=u16@A')
 
-def read_u16(data, off):
-    return st.unpack_from('<H', data, off)[0]
+GLYPH_LAYOUT = tables.compile_layout('struct:4:glyph_ptr=farptr')
 
 
-def read_u32(data, off):
-    return st.unpack_from('<I', data, off)[0]
+def glyph_ptr_ds(ch):
+    """DS offset of the far pointer for character ch: DS:[(ch*4) - 0xCA6], wraps 16-bit."""
+    return (ch * 4 - 0xCA6) & 0xFFFF
 
 
-def read_i16(data, off):
-    return st.unpack_from('<h', data, off)[0]
+def _bounds(index, count, first, total):
+    if index is not None:
+        return index, index + 1
+    return first, min(first + (count or total), first + total)
 
 
-def read_string_at(data, file_off, max_len=64):
-    """Read null-terminated string at file offset."""
-    end = min(file_off + max_len, len(data))
-    s = []
-    for i in range(file_off, end):
-        if data[i] == 0:
-            break
-        s.append(data[i])
-    return bytes(s).decode('cp437', errors='replace')
+# ---------------------------------------------------------------------------
+# Table readers — one iter_unpack pass per table (tables.read_table)
+# ---------------------------------------------------------------------------
 
+def weapon_table(data, start, end, layout=WEAPON_LAYOUT):
+    t = tables.read_table(data, ds_to_file(WEAPON_BASE + start * layout.stride),
+                          end - start, layout)
+    t.add_strings('name_ptr', 'name', data)
+    return t
 
-def dump_weapon(data, index, count, raw, fields):
-    """Dump weapon struct entries."""
-    base_ds = 0x11F6
-    stride = 0x34  # 52 bytes
-    total = 60  # approximate weapon count
 
-    if index is not None:
-        start, end = index, index + 1
-    else:
-        start, end = 0, min(count or total, total)
+def mode_table(data, start, end):
+    return tables.read_table(data, ds_to_file(MODE_BASE + start * MODE_LAYOUT.stride),
+                             end - start, MODE_LAYOUT)
 
-    print(f"{'Idx':>3}  {'Name':<24s}  {'Price':>6}  {'Bndl':>4}  {'Arms':>4}  {'Radius':>6}  {'Damage':>6}  {'Cat':>3}  DS Offset")
-    print("-" * 95)
 
-    for i in range(start, end):
-        ds_off = base_ds + i * stride
-        file_off = ds_to_file(ds_off)
-        if file_off + stride > len(data):
-            break
-
-        # Read fields from weapon struct
-        # +0x00/+0x02: far ptr to name string
-        name_off = read_u16(data, file_off + 0x00)
-        name_seg = read_u16(data, file_off + 0x02)
-        # Name pointer: if segment == DS (0x4F38), resolve directly
-        if name_seg == 0x4F38:
-            name = read_string_at(data, ds_to_file(name_off))
+def glyph_table(data, start, end):
+    """Glyph pointers for chars start..end-1, with width and data preview columns."""
+    t = tables.read_table(data, ds_to_file(glyph_ptr_ds(start)), end - start, GLYPH_LAYOUT)
+    widths, previews = [], []
+    for p in t.columns['glyph_ptr']:
+        if p >> 16 == DS_SEG:
+            glyph_file = ds_to_file(p & 0xFFFF)
+            if glyph_file < len(data):
+                width = data[glyph_file]
+                # First few bytes of glyph data
+                preview = data[glyph_file:glyph_file + min(1 + width * 12, 20)]
+                widths.append(width)
+                previews.append(' '.join(f'{b:02X}' for b in preview[:13]))
+                continue
+            widths.append('?')
+            previews.append('')
         else:
-            name = f"({name_seg:04X}:{name_off:04X})"
+            widths.append('?')
+            previews.append(f"seg {p >> 16:04X}")
+    t.columns['char'] = [chr(ch) if 32 <= ch < 127 else f'x{ch:02X}'
+                         for ch in range(start, start + t.count)]
+    t.columns['width'] = widths
+    t.columns['preview'] = previews
+    return t
+
+
+# ---------------------------------------------------------------------------
+# Text output
+# ---------------------------------------------------------------------------
+
+def _raw_line(data, file_off, stride):
+    chunk = data[file_off:file_off + stride]
+    return f"     RAW: {' '.join(f'{b:02X}' for b in chunk)}"
 
-        price = read_u16(data, file_off + 0x04)
-        bundle = read_u16(data, file_off + 0x06)
-        arms = read_u16(data, file_off + 0x08)
-        radius = read_i16(data, file_off + 0x0A)
-        damage = read_i16(data, file_off + 0x0C)
-        category = read_u16(data, file_off + 0x20)
 
-        print(f"{i:3d}  {name:<24s}  {price:6d}  {bundle:4d}  {arms:4d}  {radius:6d}  {damage:6d}  {category:3d}  DS:0x{ds_off:04X}")
+def dump_weapon(data, index, count, raw, fields):
+    """Dump weapon struct entries."""
+    start, end = _bounds(index, count, 0, 60)   # approximate weapon count
+    t = weapon_table(data, start, end)
+
+    print(f"{'Idx':>3}  {'Name':<24s}  {'Price':>6}  {'Bndl':>4}  {'Arms':>4}  {'Radius':>6}  {'Damage':>6}  {'Cat':>3}  DS Offset")
+    print("-" * 95)
 
+    for i, (file_off, w) in enumerate(zip(t.row_offsets(), t.rows()), start):
+        ds_off = WEAPON_BASE + i * WEAPON_LAYOUT.stride
+        print(f"{i:3d}  {w['name']:<24s}  {w['price']:6d}  {w['bundle']:4d}  {w['arms']:4d}  "
+              f"{w['radius']:6d}  {w['damage']:6d}  {w['category']:3d}  DS:0x{ds_off:04X}")
         if raw:
-            chunk = data[file_off:file_off + stride]
-            hex_str = ' '.join(f'{b:02X}' for b in chunk)
-            print(f"     RAW: {hex_str}")
+            print(_raw_line(data, file_off, WEAPON_LAYOUT.stride))
 
 
 def dump_glyph(data, index, count, raw, fields):
     """Dump font glyph pointer table entries."""
-    if index is not None:
-        start, end = index, index + 1
-    else:
-        start, end = 32, min(32 + (count or 95), 127)
+    start, end = _bounds(index, count, 32, 95)
+    t = glyph_table(data, start, end)
 
     print(f"{'Char':>4}  {'Code':>4}  {'Width':>5}  {'DS Ptr':>10}  {'Data Loc':>10}  Glyph")
     print("-" * 65)
 
-    for ch in range(start, end):
-        # Pointer at DS:[(ch*4) - 0xCA6], wraps 16-bit
-        ptr_ds = (ch * 4 - 0xCA6) & 0xFFFF
-        ptr_file = ds_to_file(ptr_ds)
-        if ptr_file + 4 > len(data):
-            continue
-
-        glyph_off = read_u16(data, ptr_file)
-        glyph_seg = read_u16(data, ptr_file + 2)
-
-        if glyph_seg == 0x4F38:  # DS segment
-            glyph_file = ds_to_file(glyph_off)
-            if glyph_file < len(data):
-                width = data[glyph_file]
-                # Show first few bytes of glyph data
-                preview = data[glyph_file:glyph_file + min(1 + width * 12, 20)]
-                hex_preview = ' '.join(f'{b:02X}' for b in preview[:13])
-            else:
-                width = '?'
-                hex_preview = ''
-        else:
-            width = '?'
-            hex_preview = f"seg {glyph_seg:04X}"
-            glyph_off_str = f"{glyph_seg:04X}:{glyph_off:04X}"
-
-        ch_repr = chr(ch) if 32 <= ch < 127 else f'x{ch:02X}'
-        print(f" '{ch_repr}'  0x{ch:02X}  {width:>5}  DS:0x{ptr_ds:04X}  DS:0x{glyph_off:04X}  {hex_preview}")
+    for ch, g in enumerate(t.rows(), start):
+        print(f" '{g['char']}'  0x{ch:02X}  {g['width']:>5}  DS:0x{glyph_ptr_ds(ch):04X}  "
+              f"DS:0x{g['glyph_ptr'] & 0xFFFF:04X}  {g['preview']}")
 
 
 def dump_mode(data, index, count, raw, fields):
     """Dump graphics mode table."""
-    base_ds = 0x6234
-    stride = 0x10  # 16 bytes per mode entry (estimated)
-    total = 9
-
-    if index is not None:
-        start, end = index, index + 1
-    else:
-        start, end = 0, min(count or total, total)
+    start, end = _bounds(index, count, 0, 9)
+    t = mode_table(data, start, end)
 
     print(f"{'Idx':>3}  {'Width':>5}  {'Height':>6}  {'Aspect':>6}  {'ModeID':>6}  DS Offset")
     print("-" * 50)
 
-    for i in range(start, end):
-        ds_off = base_ds + i * stride
-        file_off = ds_to_file(ds_off)
-        if file_off + stride > len(data):
-            break
+    for i, (file_off, m) in enumerate(zip(t.row_offsets(), t.rows()), start):
+        ds_off = MODE_BASE + i * MODE_LAYOUT.stride
+        print(f"{i:3d}  {m['width']:5d}  {m['height']:6d}  {m['aspect']:6d}  "
+              f"0x{m['mode_id']:04X}  DS:0x{ds_off:04X}")
+        if raw:
+            print(_raw_line(data, file_off, MODE_LAYOUT.stride))
 
-        width = read_u16(data, file_off + 0x00)
-        height = read_u16(data, file_off + 0x02)
-        mode_id = read_u16(data, file_off + 0x04)
-        aspect = read_u16(data, file_off + 0x0A)
 
-        print(f"{i:3d}  {width:5d}  {height:6d}  {aspect:6d}  0x{mode_id:04X}  DS:0x{ds_off:04X}")
+# ---------------------------------------------------------------------------
+# Export (CSV / columnar JSON / web port JS)
+# ---------------------------------------------------------------------------
 
-        if raw:
-            chunk = data[file_off:file_off + stride]
-            print(f"     RAW: {' '.join(f'{b:02X}' for b in chunk)}")
+def _select(t, fields):
+    if fields:
+        missing = [f for f in fields if f not in t.columns]
+        if missing:
+            print(f"Unknown field(s): {', '.join(missing)}  (have: {', '.join(t.columns)})")
+            sys.exit(1)
+        t.columns = {f: t.columns[f] for f in fields}
+    return t
+
+
+def _js_str(s):
+    return json.dumps(s) if "'" in s else f"'{s}'"
+
+
+def emit_js(data, struct_type, start, end):
+    """Print an ES module fragment in the web port's format (web/js/*.js)."""
+    if struct_type == 'weapon':
+        t = weapon_table(data, start, end, WEAPON_JS_LAYOUT)
+        print("// Generated by disasm/struct_dump.py from SCORCH.EXE")
+        print(f"// EXE: weapon struct array at DS:0x{WEAPON_BASE:04X}, stride {WEAPON_JS_LAYOUT.stride} bytes, {t.count} entries")
+        print("export const WEAPONS = [")
+        for w in t.rows():
+            print(f"  {{ name: {_js_str(w['name'])}, price: {w['price']}, bundle: {w['bundle']}, "
+                  f"arms: {w['arms']}, bhv: 0x{w['bhv']:04X}, param: {w['param']} }},"
+                  f"  // handler seg 0x{w['handler']:04X}")
+        print("];")
+    elif struct_type == 'mode':
+        t = mode_table(data, start, end)
+        print("// Generated by disasm/struct_dump.py from SCORCH.EXE")
+        print(f"// EXE: graphics mode table at DS:0x{MODE_BASE:04X}, stride {MODE_LAYOUT.stride} bytes")
+        print("export const GRAPHICS_MODES = [")
+        for i, m in enumerate(t.rows(), start):
+            print(f"  {{ name: '{m['width']}x{m['height']}', w: {m['width']}, h: {m['height']} }},"
+                  f"  // {i}: mode 0x{m['mode_id']:04X}, aspect {m['aspect']}")
+        print("];")
+    else:
+        print(f"--js is not available for {struct_type}")
+        sys.exit(1)
 
 
 def main():
@@ -190,6 +223,7 @@ def main():
     count = None
     raw = False
     fields = None
+    out = 'text'
 
     i = 0
     while i < len(args):
@@ -202,6 +236,9 @@ def main():
         elif args[i] == '-f' and i + 1 < len(args):
             fields = args[i + 1].split(',')
             i += 2
+        elif args[i] in ('--csv', '--json', '--js'):
+            out = args[i][2:]
+            i += 1
         elif args[i].isdigit() or (args[i].startswith('0x') and len(args[i]) > 2):
             index = int(args[i], 0)
             i += 1
@@ -213,18 +250,31 @@ def main():
         data = f.read()
 
     dispatch = {
-        'weapon': dump_weapon,
-        'glyph': dump_glyph,
-        'mode': dump_mode,
+        # type: (text dumper, table reader, first index, total entries)
+        'weapon': (dump_weapon, weapon_table, 0, 60),
+        'glyph': (dump_glyph, glyph_table, 32, 95),
+        'mode': (dump_mode, mode_table, 0, 9),
     }
 
-    fn = dispatch.get(struct_type)
-    if fn is None:
+    entry = dispatch.get(struct_type)
+    if entry is None:
         print(f"Unknown struct type: {struct_type}")
         print(f"Available: {', '.join(dispatch.keys())}")
         sys.exit(1)
-
-    fn(data, index, count, raw, fields)
+    fn, reader, first, total = entry
+
+    if out == 'text':
+        fn(data, index, count, raw, fields)
+        return
+    start, end = _bounds(index, count, first, total)
+    if out == 'js':
+        emit_js(data, struct_type, start, end)
+        return
+    t = _select(reader(data, start, end), fields)
+    if out == 'csv':
+        t.to_csv(sys.stdout)
+    else:
+        print(t.to_json())
 
 
 if __name__ == '__main__':
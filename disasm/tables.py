@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+tables.py — Declarative struct-table extraction for Scorched Earth v1.50.
+
+A row layout is compiled once into a single struct.Struct (gaps become pad
+bytes, the row is padded out to its stride) and the whole table slice is
+decoded with Struct.iter_unpack. The result is columnar: one list per
+field, plus typed array.array columns for numeric fields. Far pointers into
+DS are resolved to strings in bulk, once per distinct pointer.
+
+Layout spec (same syntax as decode_tables.py `struct:` formats):
+
+    struct:<stride>:<field>,<field>,...
+
+    field  = [name=]type[@offset]
+    type   = u8 s8 b8 u16 s16 u32 ptr16 farptr
+    offset = byte offset in the row (hex, e.g. @0x20 or @20); default follows the
+             previous field. Unnamed fields are called after their type and
+             offset, e.g. u16_04.
+
+Examples:
+    struct:52:name=farptr,price=u16,bundle=u16,arms=u16
+    struct:16:width=u16,height=u16,mode_id=u16,aspect=u16@0xA
+
+Usage:
+    python3 disasm/tables.py <exe> <addr> <count> <layout> [--csv | --json]
+
+    addr   : file offset (hex) or DS:XXXX
+
+Library:
+    import tables
+    layout = tables.compile_layout('struct:16:width=u16,height=u16')
+    t = tables.read_table(data, ds_to_file(0x6234), 9, layout)
+    t.columns['width']                  # -> [320, 320, ...]
+    t.arrays()['height']                # -> array('H', [...])
+    t.to_csv(sys.stdout)
+"""
+
+import sys
+import csv
+import json
+import struct
+from array import array
+
+from addr import DS_SEG, ds_to_file, file_to_ds, segoff_to_file
+
+# type -> (struct code, size, array typecode)
+TYPES = {
+    'u8':     ('B', 1, 'B'),
+    's8':     ('b', 1, 'b'),
+    'b8':     ('B', 1, 'B'),
+    'u16':    ('H', 2, 'H'),
+    's16':    ('h', 2, 'h'),
+    'u32':    ('I', 4, 'I'),
+    'ptr16':  ('H', 2, 'H'),
+    'farptr': ('I', 4, 'I'),   # seg << 16 | off
+}
+
+
+class Field:
+    __slots__ = ('name', 'type', 'offset', 'size', 'label')
+
+    def __init__(self, name, type_, offset, label=None):
+        self.name = name
+        self.type = type_
+        self.offset = offset
+        self.size = TYPES[type_][1]
+        self.label = label or name     # display name (the spec token if unnamed)
+
+    def __repr__(self):
+        return f'Field({self.name}={self.type}@0x{self.offset:X})'
+
+
+class Layout:
+    """A compiled row layout: fields in offset order and one Struct for the row."""
+
+    def __init__(self, stride, fields):
+        self.stride = stride
+        self.fields = sorted(fields, key=lambda f: f.offset)
+        fmt = ['<']
+        pos = 0
+        for f in self.fields:
+            if f.offset < pos:
+                raise ValueError(f'field {f.name} at +0x{f.offset:X} overlaps the previous field')
+            if f.offset > pos:
+                fmt.append(f'{f.offset - pos}x')
+            fmt.append(TYPES[f.type][0])
+            pos = f.offset + f.size
+        if pos < stride:
+            fmt.append(f'{stride - pos}x')
+        self.struct = struct.Struct(''.join(fmt))
+        self.names = [f.name for f in self.fields]
+
+    def field(self, name):
+        for f in self.fields:
+            if f.name == name:
+                return f
+        raise KeyError(name)
+
+
+def compile_layout(spec):
+    """
+    Compile 'struct:<stride>:<fields>' (or just '<stride>:<fields>') into a Layout.
+    Unknown types fall back to u8, as decode_tables always did.
+    """
+    if spec.startswith('struct:'):
+        spec = spec[len('struct:'):]
+    stride_s, _, fields_s = spec.partition(':')
+    stride = int(stride_s, 0)
+    fields = []
+    pos = 0
+    for item in fields_s.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, eq, type_ = item.partition('=')
+        if not eq:
+            name, type_ = '', item
+        type_, at, off_s = type_.partition('@')
+        label = name.strip() or type_.strip()
+        type_ = type_.strip()
+        if type_ not in TYPES:
+            type_ = 'u8'
+        if at:
+            pos = int(off_s, 16)
+        fields.append(Field(name.strip() or f'{type_}_{pos:02X}', type_, pos, label))
+        pos += TYPES[type_][1]
+    return Layout(stride, fields)
+
+
+# ---------------------------------------------------------------------------
+# Decoding
+# ---------------------------------------------------------------------------
+
+def read_string(data, file_off, max_len=64):
+    """Null-terminated cp437 string at file_off (at most max_len bytes)."""
+    end = data.find(b'\0', file_off, min(file_off + max_len, len(data)))
+    if end < 0:
+        end = min(file_off + max_len, len(data))
+    return bytes(data[file_off:end]).decode('cp437', errors='replace')
+
+
+def resolve_strings(data, ptrs, far=True, max_len=64):
+    """
+    Map far (seg << 16 | off) or near DS pointers to strings, reading each
+    distinct pointer once. Far pointers outside DS map to '(SEG:OFF)'.
+    """
+    memo = {}
+    out = []
+    for p in ptrs:
+        s = memo.get(p)
+        if s is None:
+            if far and (p >> 16) != DS_SEG:
+                s = f'({p >> 16:04X}:{p & 0xFFFF:04X})'
+            else:
+                s = read_string(data, ds_to_file(p & 0xFFFF), max_len)
+            memo[p] = s
+        out.append(s)
+    return out
+
+
+class Table:
+    """Columnar result of read_table()."""
+
+    def __init__(self, layout, file_off, columns, count):
+        self.layout = layout
+        self.file_off = file_off
+        self.columns = columns
+        self.count = count
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def row_offsets(self):
+        return range(self.file_off, self.file_off + self.count * self.layout.stride,
+                     self.layout.stride)
+
+    def rows(self):
+        """Rows as dicts (field order preserved)."""
+        cols = list(self.columns.items())
+        for i in range(self.count):
+            yield {name: col[i] for name, col in cols}
+
+    def arrays(self):
+        """Numeric columns as typed array.array columns (string columns are skipped)."""
+        out = {}
+        for f in self.layout.fields:
+            col = self.columns.get(f.name)
+            if col and not isinstance(col[0], str):
+                out[f.name] = array(TYPES[f.type][2], col)
+        return out
+
+    def add_strings(self, ptr_field, name, data, max_len=64):
+        """Add a column of strings resolved from a farptr/ptr16 column."""
+        f = self.layout.field(ptr_field)
+        self.columns[name] = resolve_strings(data, self.columns[ptr_field],
+                                             far=f.type == 'farptr', max_len=max_len)
+        return self.columns[name]
+
+    def to_csv(self, fp):
+        w = csv.writer(fp, lineterminator='\n')
+        w.writerow(['index', 'ds_offset'] + self.names)
+        for i, (off, row) in enumerate(zip(self.row_offsets(), self.rows())):
+            ds = file_to_ds(off)
+            w.writerow([i, f'0x{ds:04X}' if ds is not None else f'0x{off:05X}']
+                       + list(row.values()))
+
+    def to_json(self):
+        """Columnar JSON: {"file_offset": ..., "stride": ..., "columns": {...}}."""
+        return json.dumps({'file_offset': self.file_off, 'stride': self.layout.stride,
+                           'count': self.count, 'columns': self.columns}, indent=1)
+
+
+def read_table(data, file_off, count, layout):
+    """
+    Decode `count` rows of `layout` starting at file_off in one iter_unpack
+    pass. Rows that would run past the end of data are dropped.
+    """
+    if isinstance(layout, str):
+        layout = compile_layout(layout)
+    stride = layout.stride
+    size = layout.struct.size
+    avail = (len(data) - file_off - size) // stride + 1 if file_off + size <= len(data) else 0
+    count = max(0, min(count, avail))
+    if size == stride:
+        view = memoryview(data)[file_off:file_off + count * stride]
+        rows = list(layout.struct.iter_unpack(view))
+    else:
+        # Fields extend past the stride (overlapping rows): one unpack per row.
+        unpack = layout.struct.unpack_from
+        rows = [unpack(data, file_off + i * stride) for i in range(count)]
+    cols = list(zip(*rows)) if rows else [()] * len(layout.fields)
+    columns = {f.name: list(c) for f, c in zip(layout.fields, cols)}
+    return Table(layout, file_off, columns, count)
+
+
+def farptr_file(p):
+    """File offset targeted by a farptr column value."""
+    return segoff_to_file(p >> 16, p & 0xFFFF)
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def parse_addr(s):
+    if s.lower().startswith('ds:'):
+        return ds_to_file(int(s[3:], 16))
+    return int(s, 16)
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 4 or args[0] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(0 if args and args[0] in ('-h', '--help') else 1)
+
+    with open(args[0], 'rb') as f:
+        data = f.read()
+    t = read_table(data, parse_addr(args[1]), int(args[2], 0), args[3])
+    if '--json' in args[4:]:
+        print(t.to_json())
+    else:
+        t.to_csv(sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
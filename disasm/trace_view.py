@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""View binary execution traces written by the emulator (--trace-bin).
+
+Usage:
+  python3 disasm/trace_view.py TRACE_FILE [options]
+
+Selection (combined with AND):
+  --from STEP / --to STEP  — step range (absolute emulator steps)
+  --addr FILEOFF           — only records at this EXE file offset (repeatable)
+  --func NAME              — only records inside this labelled function (repeatable)
+  --match REGEX            — only instructions whose disassembly matches
+  -n N                     — stop after N printed records (default 200, 0 = all)
+
+Output:
+  --regs                   — registers on entry to each listed instruction that
+                             differ from the previous listed record (trace
+                             written with --trace-regs)
+  --hist N                 — instead of a listing, the N hottest functions and
+                             addresses among the selected records
+  --info                   — header and step range only
+
+Only the selected records are decoded; each distinct address is
+disassembled and symbolized once.
+
+Examples:
+  python3 -m emu earth/SCORCH.EXE --max-steps 5000000 --trace-bin /tmp/t.trace --trace-regs
+  python3 disasm/trace_view.py /tmp/t.trace --func draw_hud --regs
+  python3 disasm/trace_view.py /tmp/t.trace --from 4200000 --to 4200100
+  python3 disasm/trace_view.py /tmp/t.trace --match 'out|in ' -n 50
+  python3 disasm/trace_view.py /tmp/t.trace --hist 30
+"""
+import sys, os, re, argparse
+
+import daemon
+if __name__ == '__main__':
+    daemon.forward('trace_view', sys.argv[1:])   # runs in the resident daemon if one is up
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import dis
+import kb
+from disasm.emu.tracefile import TraceReader
+
+REG_NAMES = ('flags', 'ax', 'cx', 'dx', 'bx', 'sp', 'bp', 'si', 'di', 'es', 'ss', 'ds')
+
+
+class Lister:
+    """Per-address disassembly and symbol lookups, memoized."""
+
+    def __init__(self, data, k, image_base, header_size):
+        self.data = data
+        self.kb = k
+        self.image_base = image_base
+        self.header_size = header_size
+        self._text = {}
+        self._sym = {}
+
+    def file_offset(self, cs, ip):
+        return ((cs << 4) + ip) - self.image_base + self.header_size
+
+    def text(self, foff):
+        t = self._text.get(foff)
+        if t is None:
+            if 0 <= foff < len(self.data):
+                try:
+                    _, mn, op_str, _, _ = dis.cached_decode(self.data, foff, self.kb.labels)
+                    t = f'{mn} {op_str}'.rstrip()
+                except Exception as e:
+                    t = f'?? ({e})'
+            else:
+                t = '(outside EXE image)'
+            self._text[foff] = t
+        return t
+
+    def symbol(self, foff):
+        s = self._sym.get(foff, False)
+        if s is False:
+            s = self._sym[foff] = self.kb.symbolize(foff)
+        return s
+
+
+def func_ranges(k, names):
+    """[(start, end)] file-offset ranges of the labelled functions; end is the next label."""
+    ranges = []
+    for name in names:
+        start = k.lookup(name)
+        if start is None:
+            sys.exit(f"unknown function label: {name}")
+        i = k.func_offsets.index(start) if start in k.func_offsets else -1
+        end = k.func_offsets[i + 1] if 0 <= i < len(k.func_offsets) - 1 else start + 0x10000
+        ranges.append((start, end))
+    return ranges
+
+
+def select(trace, lister, args):
+    """Yield the records matching the selection options."""
+    start = trace.index(args.start) if args.start is not None else 0
+    end = trace.index(args.end + 1) if args.end is not None else len(trace)
+    addrs = set(args.addr) if args.addr else None
+    ranges = func_ranges(lister.kb, args.func) if args.func else None
+    pattern = re.compile(args.match, re.I) if args.match else None
+    wanted = {}    # file offset -> bool, so each address is tested once
+    for r in trace.iter(start, end):
+        foff = lister.file_offset(r[1], r[2])
+        ok = wanted.get(foff)
+        if ok is None:
+            ok = ((addrs is None or foff in addrs) and
+                  (ranges is None or any(a <= foff < b for a, b in ranges)) and
+                  (pattern is None or pattern.search(lister.text(foff)) is not None))
+            wanted[foff] = ok
+        if ok:
+            yield r
+
+
+def reg_delta(prev, cur):
+    if prev is None:
+        return ' '.join(f'{n}={v:04X}' for n, v in zip(REG_NAMES, cur[3:]))
+    return ' '.join(f'{n}={v:04X}' for n, p, v in zip(REG_NAMES, prev[3:], cur[3:]) if p != v)
+
+
+def show_listing(trace, lister, args):
+    shown = 0
+    prev = None
+    for r in select(trace, lister, args):
+        step, cs, ip = r[0], r[1], r[2]
+        foff = lister.file_offset(cs, ip)
+        sym = lister.symbol(foff)
+        line = f'{step:10d}  {cs:04X}:{ip:04X}  [{foff:05X}]  {lister.text(foff):<32s}'
+        if sym:
+            line += f'  ; {sym}'
+        print(line.rstrip())
+        if args.regs and trace.regs:
+            delta = reg_delta(prev, r)
+            if delta:
+                print(f'{"":30s}{delta}')
+            prev = r
+        shown += 1
+        if args.n and shown >= args.n:
+            print(f'... (stopped after {shown} records; -n 0 for all)')
+            break
+
+
+def show_hist(trace, lister, args):
+    by_addr = {}
+    for r in select(trace, lister, args):
+        foff = lister.file_offset(r[1], r[2])
+        by_addr[foff] = by_addr.get(foff, 0) + 1
+    total = sum(by_addr.values())
+    by_func = {}
+    for foff, n in by_addr.items():
+        hit = lister.kb.function_at(foff)
+        name = hit[1] if hit else f'[{foff:05X}]'
+        by_func[name] = by_func.get(name, 0) + n
+    print(f'{total} records selected')
+    print('\nTop functions:')
+    for name, n in sorted(by_func.items(), key=lambda kv: -kv[1])[:args.hist]:
+        print(f'  {n:10d} {100.0 * n / total:6.2f}%  {name}')
+    print('\nTop addresses:')
+    for foff, n in sorted(by_addr.items(), key=lambda kv: -kv[1])[:args.hist]:
+        sym = lister.symbol(foff) or ''
+        print(f'  {n:10d}  [{foff:05X}]  {lister.text(foff):<32s}  {sym}'.rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='View a binary emulator trace')
+    parser.add_argument('trace_file', help='Trace written by --trace-bin')
+    parser.add_argument('--exe', default='earth/SCORCH.EXE', help='EXE for disassembly')
+    parser.add_argument('--from', dest='start', type=lambda s: int(s, 0), metavar='STEP',
+                        help='First step')
+    parser.add_argument('--to', dest='end', type=lambda s: int(s, 0), metavar='STEP',
+                        help='Last step')
+    parser.add_argument('--addr', type=lambda s: int(s, 16), action='append',
+                        metavar='FILEOFF', help='EXE file offset (hex), repeatable')
+    parser.add_argument('--func', action='append', metavar='NAME',
+                        help='Labelled function, repeatable')
+    parser.add_argument('--match', metavar='REGEX', help='Disassembly regex')
+    parser.add_argument('-n', type=int, default=200, help='Max records printed (0 = all)')
+    parser.add_argument('--regs', action='store_true', help='Show changed registers')
+    parser.add_argument('--hist', type=int, metavar='N', help='Hottest functions/addresses')
+    parser.add_argument('--info', action='store_true', help='Header and step range only')
+    args = parser.parse_args()
+
+    trace = TraceReader(args.trace_file)
+    try:
+        if args.info or not len(trace):
+            print(f'{args.trace_file}: {len(trace)} records, '
+                  f'{"CS:IP + registers" if trace.regs else "CS:IP"}, '
+                  f'image_base 0x{trace.image_base:X}, header 0x{trace.header_size:X}')
+            if len(trace):
+                print(f'steps {trace[0][0]} .. {trace[-1][0]}')
+            return
+        if args.regs and not trace.regs:
+            print('(trace has no registers; record with --trace-regs)')
+
+        lister = Lister(daemon.read_exe(args.exe), kb.load(), trace.image_base, trace.header_size)
+        if args.hist:
+            show_hist(trace, lister, args)
+        else:
+            show_listing(trace, lister, args)
+    finally:
+        trace.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,9 @@ Usage:
 
     Caller search (find all call sites targeting a function):
         --callers <file_offset>  — find far+near calls to function at file offset
+        --strict                 — with --callers: drop sites that are not instruction
+                                   starts in the linear-sweep decode (E8/9A bytes inside
+                                   other instructions or data)
 
 Examples:
     python3 xref.py earth/SCORCH.EXE DS:0xED58       # who reads/writes font selector?
@@ -34,12 +37,15 @@ Examples:
 
 import sys
 import struct
-import os
 
-DS_FILE_BASE = 0x055D80
-MZ_HEADER = 0x6A00
-DS_SEG = 0x4F38
-LOAD_SEG = DS_SEG - (DS_FILE_BASE - MZ_HEADER) // 16
+import daemon
+if __name__ == '__main__':
+    daemon.forward('xref', sys.argv[1:])   # runs in the resident daemon if one is up
+
+import addr
+import artifacts
+import kb
+from addr import MZ_HEADER, DS_FILE_BASE
 
 # Known code segment file ranges (from CLAUDE.md source file segments)
 CODE_SEGMENTS = [
@@ -54,52 +60,35 @@ CODE_SEGMENTS = [
     (0x4C290, 0x4D000, "font/text module"),
 ]
 
-# Known code modules with segment paragraphs (for near call resolution)
-MODULES = [
-    (0x06A00, 0x20EA0, 0x0000, "startup+libs"),
-    (0x20EA0, 0x263F0, 0x1A4A, "extras.cpp"),
-    (0x263F0, 0x2F830, 0x1F7F, "icons.cpp"),
-    (0x2F830, 0x31FB0, 0x28B9, "play.cpp"),
-    (0x31FB0, 0x33690, 0x2B3B, "player.cpp"),
-    (0x33690, 0x38070, 0x2CBF, "ranges.cpp"),
-    (0x38070, 0x38780, 0x3167, "shark.cpp"),
-    (0x38780, 0x3B8D0, 0x31D8, "shields.cpp"),
-    (0x3B8D0, 0x4C290, 0x34ED, "menu+dialogs"),
-    (0x4C290, 0x4D000, 0x4589, "font module"),
-]
+# Startup code + Borland libs precede the named modules (addr.MODULES)
+STARTUP_END = addr.MODULES[0][0]
 
 
 def parse_mz_relocs(data):
-    """Parse MZ relocation table, return set of file offsets where relocations apply."""
-    assert data[:2] == b'MZ', "Not an MZ executable"
-    num_relocs = struct.unpack_from('<H', data, 0x06)[0]
-    reloc_table_off = struct.unpack_from('<H', data, 0x18)[0]
-    relocs = set()
-    for i in range(num_relocs):
-        pos = reloc_table_off + i * 4
-        off, seg = struct.unpack_from('<HH', data, pos)
-        reloc_file = seg * 16 + off + MZ_HEADER
-        relocs.add(reloc_file)
-    return relocs
+    """Set of file offsets where MZ relocations apply (from the artifact store)."""
+    return set(artifacts.relocs(data))
 
 
 def seg_name_for_file_off(file_off):
     """Return module name for a file offset."""
-    for start, end, _seg, name in MODULES:
-        if start <= file_off < end:
-            return name
+    name = addr.module_name(file_off, None)
+    if name is not None:
+        return name
+    if MZ_HEADER <= file_off < STARTUP_END:
+        return "startup+libs"
     return "unknown"
 
 
 def file_to_segoff_str(file_off):
     """Return SEG:OFF string for a file offset."""
-    for start, end, seg, name in MODULES:
-        if start <= file_off < end:
-            seg_off = file_off - start
-            if seg_off <= 0xFFFF:
-                return f"{seg:04X}:{seg_off:04X}"
-            # Offset exceeds 16-bit — use raw paragraph:offset
-            break
+    mod = addr.module_at(file_off)
+    if mod is not None:
+        seg, seg_off = addr.file_to_segoff(file_off)
+        if seg_off <= 0xFFFF:
+            return f"{seg:04X}:{seg_off:04X}"
+        # Offset exceeds 16-bit — use raw paragraph:offset
+    elif MZ_HEADER <= file_off < STARTUP_END and file_off - MZ_HEADER <= 0xFFFF:
+        return f"0000:{file_off - MZ_HEADER:04X}"
     linear = file_off - MZ_HEADER
     if linear >= 0:
         return f"{(linear >> 4):04X}:{(linear & 0xF):04X}"
@@ -108,34 +97,16 @@ def file_to_segoff_str(file_off):
 
 def load_labels():
     """Load labels.csv if available, return dict of file_offset -> name."""
-    labels = {}
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    labels_path = os.path.join(script_dir, 'labels.csv')
-    if not os.path.exists(labels_path):
-        return labels
-    with open(labels_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            parts = line.split(',', 1)
-            if len(parts) != 2:
-                continue
-            addr_str, name = parts
-            addr_str = addr_str.strip()
-            name = name.strip()
-            if addr_str.lower().startswith('ds:'):
-                ds_off = int(addr_str[3:], 16)
-                file_off = ds_off + DS_FILE_BASE
-                labels[file_off] = name
-            else:
-                file_off = int(addr_str, 16)
-                labels[file_off] = name
-    return labels
+    return kb.load().labels
 
 
-def find_callers(data, target_file_offset):
-    """Find all call sites (far and near) targeting a given function file offset.
+# Call-target index for one EXE image: (data, {target: [(kind, off, desc)]}).
+# Built once per process; the daemon keeps it across --callers queries.
+_call_index = (None, None)
+
+
+def build_call_index(data):
+    """Map every call target (file offset) to its call sites.
 
     Far calls: 9A off16 seg16 where seg field is MZ-relocated.
     Target file offset = MZ_HEADER + raw_seg * 16 + off16.
@@ -147,58 +118,69 @@ def find_callers(data, target_file_offset):
 
     Push CS + near call: 0E E8 rel16.
     Target file offset = call_file + 4 + rel16 (signed).
+
+    Returns dict target_file_offset -> [(kind, call_file_offset, desc)] sorted by offset.
     """
-    relocs = parse_mz_relocs(data)
-    results = []
+    relocs = artifacts.relocs(data)
+    index = {}
 
     # Scan range: all code from header to data segment start
     code_end = min(len(data), DS_FILE_BASE)
 
     # 1. Far calls: 0x9A off16 seg16, where seg field is relocated
     #    target_file = MZ_HEADER + raw_seg * 16 + off16
-    for i in range(MZ_HEADER, code_end - 4):
-        if data[i] != 0x9A:
+    for seg_reloc_pos in relocs:
+        i = seg_reloc_pos - 3
+        if not (MZ_HEADER <= i < code_end - 4) or data[i] != 0x9A:
             continue
-        seg_reloc_pos = i + 3
-        if seg_reloc_pos not in relocs:
-            continue
-        call_off = struct.unpack_from('<H', data, i + 1)[0]
-        raw_seg = struct.unpack_from('<H', data, i + 3)[0]
-        computed_target = MZ_HEADER + raw_seg * 16 + call_off
-        if computed_target == target_file_offset:
-            results.append(('far', i, f"CALL FAR {raw_seg:04X}:{call_off:04X}"))
-
-    # 2. Near calls (0xE8 rel16) — target = call_file + 3 + rel16
-    for i in range(MZ_HEADER, code_end - 2):
-        if data[i] == 0xE8:
+        call_off, raw_seg = struct.unpack_from('<HH', data, i + 1)
+        target = MZ_HEADER + raw_seg * 16 + call_off
+        index.setdefault(target, []).append(('far', i, f"CALL FAR {raw_seg:04X}:{call_off:04X}"))
+
+    # 2. push cs; call near (0x0E 0xE8 rel16) — target = call_file + 4 + rel16
+    pushcs_e8 = set()
+    i = data.find(b'\x0E\xE8', MZ_HEADER, code_end - 2)
+    while i != -1:
+        rel = struct.unpack_from('<h', data, i + 2)[0]
+        index.setdefault(i + 4 + rel, []).append(('pushcs_near', i, f"PUSH CS; CALL NEAR {rel:+05X}"))
+        pushcs_e8.add(i + 1)
+        i = data.find(b'\x0E\xE8', i + 1, code_end - 2)
+
+    # 3. Near calls (0xE8 rel16) — target = call_file + 3 + rel16.
+    #    The E8 of a push cs + call near pair is reported once, as pushcs_near.
+    i = data.find(b'\xE8', MZ_HEADER, code_end - 2)
+    while i != -1:
+        if i not in pushcs_e8:
             rel = struct.unpack_from('<h', data, i + 1)[0]  # signed 16-bit
-            target_file = i + 3 + rel
-            if target_file == target_file_offset:
-                results.append(('near', i, f"CALL NEAR {rel:+05X}"))
+            index.setdefault(i + 3 + rel, []).append(('near', i, f"CALL NEAR {rel:+05X}"))
+        i = data.find(b'\xE8', i + 1, code_end - 2)
+
+    for sites in index.values():
+        sites.sort(key=lambda x: x[1])
+    return index
 
-    # 3. push cs; call near (0x0E 0xE8 rel16) — target = call_file + 4 + rel16
-    for i in range(MZ_HEADER, code_end - 3):
-        if data[i] == 0x0E and data[i + 1] == 0xE8:
-            rel = struct.unpack_from('<h', data, i + 2)[0]
-            target_file = i + 4 + rel
-            if target_file == target_file_offset:
-                results.append(('pushcs_near', i, f"PUSH CS; CALL NEAR {rel:+05X}"))
 
-    # Deduplicate: when push cs (0x0E) + call near (0xE8) overlap,
-    # the near scan finds the 0xE8 at offset+1 — suppress it
-    pushcs_e8_offsets = {off + 1 for kind, off, _ in results if kind == 'pushcs_near'}
-    deduped = [(kind, off, desc) for kind, off, desc in results
-               if not (kind == 'near' and off in pushcs_e8_offsets)]
+def call_index(data):
+    """build_call_index(data), memoized for the current EXE bytes object."""
+    global _call_index
+    if _call_index[0] is not data:
+        _call_index = (data, build_call_index(data))
+    return _call_index[1]
 
-    return sorted(deduped, key=lambda x: x[1])
+
+def find_callers(data, target_file_offset):
+    """Find all call sites (far and near) targeting a given function file offset.
+
+    Returns [(kind, call_file_offset, desc)] sorted by offset; see build_call_index.
+    """
+    return list(call_index(data).get(target_file_offset, ()))
 
 
-def run_callers_mode(exe_path, target_str):
+def run_callers_mode(exe_path, target_str, strict=False):
     """Run --callers mode: find all callers of a function."""
     target_file_offset = int(target_str, 16)
 
-    with open(exe_path, 'rb') as f:
-        data = f.read()
+    data = daemon.read_exe(exe_path)
 
     labels = load_labels()
     target_name = labels.get(target_file_offset, "")
@@ -209,6 +191,10 @@ def run_callers_mode(exe_path, target_str):
     print()
 
     results = find_callers(data, target_file_offset)
+    if strict:
+        starts = artifacts.insn_starts(data)
+        # pushcs_near sites are reported at the push, itself an instruction start
+        results = [r for r in results if r[1] in starts]
 
     for kind, offset, desc in results:
         module = seg_name_for_file_off(offset)
@@ -230,9 +216,9 @@ def main():
     # Check for --callers mode
     if sys.argv[2] == '--callers':
         if len(sys.argv) < 4:
-            print("Usage: xref.py <exe> --callers <file_offset>")
+            print("Usage: xref.py <exe> --callers <file_offset> [--strict]")
             sys.exit(1)
-        run_callers_mode(exe_path, sys.argv[3])
+        run_callers_mode(exe_path, sys.argv[3], strict='--strict' in sys.argv[4:])
         return
 
     target_str = sys.argv[2]
@@ -284,8 +270,7 @@ def main():
             needle = struct.pack('<I', val)
             desc = f"dword 0x{val:08X}"
 
-    with open(exe_path, 'rb') as f:
-        data = f.read()
+    data = daemon.read_exe(exe_path)
 
     if scan_end is None:
         scan_end = len(data)
@@ -3,12 +3,14 @@
 # Usage: ./re_loop.sh [--max N] [--tasks N] [--dry-run]
 set -euo pipefail
 
+stop_daemon() { python3 disasm/daemon.py stop >/dev/null 2>&1 || true; }
 cleanup() {
   echo ""; echo "Interrupted — killing session..."
   kill %1 2>/dev/null || true
   exit 130
 }
 trap cleanup INT TERM
+trap stop_daemon EXIT
 
 MAX=50; TASKS=1; DRY=false
 while [[ $# -gt 0 ]]; do
@@ -25,6 +27,10 @@ remaining() { grep -c '^- \[ \]' REVERSE.md 2>/dev/null || true; }
 mkdir -p re_loop_sessions
 RUN_TS=$(date '+%Y%m%d_%H%M%S')
 
+# Keep EXE, labels and indexes resident; the disasm CLIs forward to it
+# (and run in-process if it is not up).
+[[ "$DRY" == true ]] || python3 disasm/daemon.py start || true
+
 for (( i=1; i<=MAX; i++ )); do
   [[ $(remaining) -eq 0 ]] && echo "All tasks done!" && break
   echo ""
@@ -80,6 +86,7 @@ RE tools (all under disasm/):
   python3 disasm/xref.py earth/SCORCH.EXE --callers 0xFILEOFF  # far-call callers of function
   python3 disasm/find_callers.py earth/SCORCH.EXE 0xFILEOFF    # far+near callers of function
   python3 disasm/seg_offset.py SEG:OFF DS:0xXXXX 0xFILEOFF     # convert between address forms
+  python3 disasm/kb.py 0xFILEOFF                               # which labelled function contains an address
   python3 disasm/struct_dump.py earth/SCORCH.EXE weapon -n 60
   python3 disasm/strings_dump.py earth/SCORCH.EXE -g \"pattern\"
   python3 disasm/icon_dump.py earth/SCORCH.EXE 0 -n 8
@@ -95,7 +102,7 @@ Do not re-document already-covered addresses. Stop after $TASKS tasks."
   echo "$PROMPT" | claude -p \
     --output-format stream-json \
     --max-turns 150 \
-    --allowedTools "Bash(python3 disasm/dis.py*),Bash(python3 disasm/ds_lookup.py*),Bash(python3 disasm/xref.py*),Bash(python3 disasm/find_callers.py*),Bash(python3 disasm/struct_dump.py*),Bash(python3 disasm/strings_dump.py*),Bash(python3 disasm/decode_float64.py*),Bash(python3 disasm/seg_offset.py*),Bash(python3 disasm/icon_dump.py*),Bash(python3 disasm/palette_dump.py*),Bash(git add*),Bash(git commit*),Bash(git log*),Bash(git status*),Bash(git diff*),Read,Edit,Write,Glob,Grep" \
+    --allowedTools "Bash(python3 disasm/dis.py*),Bash(python3 disasm/ds_lookup.py*),Bash(python3 disasm/xref.py*),Bash(python3 disasm/find_callers.py*),Bash(python3 disasm/struct_dump.py*),Bash(python3 disasm/strings_dump.py*),Bash(python3 disasm/decode_float64.py*),Bash(python3 disasm/seg_offset.py*),Bash(python3 disasm/kb.py*),Bash(python3 disasm/icon_dump.py*),Bash(python3 disasm/palette_dump.py*),Bash(git add*),Bash(git commit*),Bash(git log*),Bash(git status*),Bash(git diff*),Read,Edit,Write,Glob,Grep" \
     | jq --unbuffered -r '
         if .type == "assistant" then
           .message.content[] |